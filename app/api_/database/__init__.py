@@ -3,11 +3,18 @@
 from .setup.setup_citation_db import setup_citation_db
 from .setup.setup_embeddings_db import setup_embeddings_db
 from .setup.setup_html_db import setup_html_db
+from .connection_pool import ConnectionPool, PooledConnection, PoolTimeout
 from .database import Database
+from .async_database_executor import AsyncDatabaseExecutor, DB_EXECUTOR
 
 __all__ = [
     "setup_citation_db",
     "setup_embeddings_db",
     "setup_html_db",
+    "ConnectionPool",
+    "PooledConnection",
+    "PoolTimeout",
     "Database",
+    "AsyncDatabaseExecutor",
+    "DB_EXECUTOR",
 ]
\ No newline at end of file
@@ -0,0 +1,315 @@
+"""
+Async facade for read-only DuckDB queries, run off the event loop.
+
+DuckDB calls block the thread they run on. Made from `async def` code on the
+event loop, a large scan stalls every other SSE stream and static file response
+until it finishes. AsyncDatabaseExecutor runs them on its own bounded thread pool
+instead, so the loop only awaits their results.
+
+Every worker thread gets its own cursor on one shared read-only connection,
+because a DuckDB cursor must not be used by two threads at once. DB_EXECUTOR checks
+that connection out of the READ_ONLY_DB pool, so a server worker holds one set of
+connections to the law database, and a forked worker opens its own. Nothing writes to
+the law database while the app runs (the search cache has its own, see SearchCacheStore),
+so the connection stays checked out until shutdown. With close_when_idle, it is released
+whenever the executor goes idle instead, so a read-write connection can open the file in between.
+"""
+from __future__ import annotations
+import asyncio
+import concurrent.futures as cf
+from dataclasses import dataclass, field
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+
+import duckdb
+import pyarrow as pa
+
+
+from configs import configs
+from logger import logger as module_logger
+
+
+T = TypeVar('T')
+
+
+@dataclass
+class _Job:
+    """Timing of one call, and the cursor it runs on once it has started."""
+    submitted_at: float = field(default_factory=time.perf_counter)
+    started_at: Optional[float] = None
+    cursor: Optional[duckdb.DuckDBPyConnection] = None
+
+
+def connect_from_pool(db_path: str, read_only: bool = True) -> duckdb.DuckDBPyConnection:
+    """
+    Check a connection to the law database out of the READ_ONLY_DB pool. Closing it releases it.
+
+    Args:
+        db_path: Unused. READ_ONLY_DB opens configs.AMERICAN_LAW_DB_PATH.
+        read_only: Unused. READ_ONLY_DB's connections are read-only.
+    """
+    # Imported here, as read_only_database imports this package through api_.database.
+    from read_only_database import READ_ONLY_DB
+    return READ_ONLY_DB.connect()
+
+
+class AsyncDatabaseExecutor:
+    """
+    A bounded thread pool that runs DuckDB work for async code.
+
+    Attributes:
+        db_path: The DuckDB database file.
+        max_workers: Number of worker threads, i.e. how many queries run at once.
+            Calls beyond that wait in the queue, see stats.
+        close_when_idle: Close, or release to its pool, the connection whenever no call is running.
+        logger: Logger for start up and shutdown messages.
+    """
+
+    def __init__(self,
+                 db_path: Path = configs.AMERICAN_LAW_DB_PATH,
+                 max_workers: int = 4,
+                 connect: Callable[..., duckdb.DuckDBPyConnection] = duckdb.connect,
+                 close_when_idle: bool = True,
+                 logger: logging.Logger = module_logger
+                ):
+        self.db_path:         Path           = db_path
+        self.max_workers:     int            = max(1, max_workers)
+        self.close_when_idle: bool           = close_when_idle
+        self.logger:          logging.Logger = logger
+        self._connect:    Callable[..., duckdb.DuckDBPyConnection] = connect
+
+        self._executor:   Optional[cf.ThreadPoolExecutor]      = None
+        self._lock:       threading.Lock                       = threading.Lock()
+        self._connected:  threading.Condition                  = threading.Condition(self._lock)
+        self._connecting: bool                                 = False  # A thread is opening the connection.
+        self._local:      threading.local                      = threading.local()
+        self._connection: Optional[duckdb.DuckDBPyConnection]  = None
+        self._cursors:    list[duckdb.DuckDBPyConnection]      = []
+        self._generation: int = 0  # Bumped when the connection closes, so threads make new cursors.
+        self._pid:        int = os.getpid()
+
+        self._submitted:          int   = 0
+        self._completed:          int   = 0
+        self._failed:             int   = 0
+        self._in_flight:          int   = 0
+        self._queue_wait_seconds: float = 0.0
+        self._max_queue_wait:     float = 0.0
+        self._run_seconds:        float = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    def start(self) -> None:
+        """Start the worker threads. Does nothing if the executor is already running."""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = cf.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="duckdb")
+        self.logger.info(f"Started database executor with {self.max_workers} threads.")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker threads. Queued calls that haven't started are cancelled."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+            with self._lock:
+                self._close_connection()
+            self.logger.info(f"Shut down database executor. Final stats: {self.stats()}")
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        """
+        Get this worker thread's cursor, opening the shared connection if it is closed.
+
+        Opening it can wait for a pooled connection to be released, so it is done without
+        the lock, which run, _record and stats take on the event loop. One thread opens it,
+        and the others wait for it instead of checking out connections of their own.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # A connection inherited through a fork is the parent's, so drop it without closing it.
+                self._pid, self._connection, self._cursors = os.getpid(), None, []
+                self._connecting = False
+                self._generation += 1
+            while self._connection is None and self._connecting:
+                self._connected.wait()
+            if self._connection is not None:
+                return self._thread_cursor()
+            self._connecting = True
+
+        try:
+            connection = self._connect(str(self.db_path), read_only=True)
+        except BaseException:
+            with self._lock:
+                self._connecting = False
+                self._connected.notify_all()  # One of the waiting threads tries next.
+            raise
+        with self._lock:
+            self._connection, self._connecting = connection, False
+            self._connected.notify_all()
+            return self._thread_cursor()
+
+    def _thread_cursor(self) -> duckdb.DuckDBPyConnection:
+        """Get this worker thread's cursor on the open connection. Call with the lock held."""
+        if getattr(self._local, "generation", None) != self._generation:
+            self._local.cursor = self._connection.cursor()
+            self._local.generation = self._generation
+            self._cursors.append(self._local.cursor)
+        return self._local.cursor
+
+    def _close_connection(self) -> None:
+        """Close every cursor and the shared connection. Call with the lock held."""
+        for cursor in self._cursors:
+            try:
+                cursor.close()
+            except Exception as e:
+                self.logger.warning(f"Error closing database executor cursor: {e}")
+        self._cursors.clear()
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception as e:
+                self.logger.warning(f"Error closing database executor connection: {e}")
+            self._connection = None
+        self._generation += 1
+
+    def _run_job(self, job: _Job, func: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        job.started_at = time.perf_counter()
+        failed = True
+        try:
+            cursor = self._cursor()
+            job.cursor = cursor
+            result = func(cursor, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            with self._lock:
+                job.cursor = None  # The thread's next call reuses the cursor, so it mustn't be interrupted now.
+            self._record(job, failed=failed)
+
+    def _record(self, job: _Job, failed: bool) -> None:
+        finished_at = time.perf_counter()
+        started_at = job.started_at if job.started_at is not None else finished_at
+        with self._lock:
+            self._in_flight -= 1
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+            queue_wait = started_at - job.submitted_at
+            self._queue_wait_seconds += queue_wait
+            self._max_queue_wait = max(self._max_queue_wait, queue_wait)
+            self._run_seconds += finished_at - started_at
+            if self._in_flight == 0 and self.close_when_idle:
+                self._close_connection()
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a function on a worker thread's cursor, without blocking the event loop.
+
+        If the caller is cancelled, a call still in the queue is dropped, and a running
+        one has its query interrupted.
+
+        Example:
+            >>> table = await DB_EXECUTOR.run(bulk_key_lookup, cids, table="html", key_column="cid")
+
+        Args:
+            func: Called as func(cursor, *args, **kwargs) on a worker thread.
+            *args: Positional arguments for func, after the cursor.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            Whatever func returns.
+
+        Raises:
+            RuntimeError: If the executor has not been started.
+        """
+        job = _Job()
+        with self._lock:
+            if self._executor is None:
+                raise RuntimeError("Database executor has not been started.")
+            future = self._executor.submit(self._run_job, job, func, args, kwargs)
+            self._submitted += 1
+            self._in_flight += 1
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if future.cancel():
+                self._record(job, failed=True)
+            else:
+                with self._lock:
+                    # Only while the call is running. Once it finishes, job.cursor is None.
+                    if job.cursor is not None:
+                        try:
+                            job.cursor.interrupt()
+                        except duckdb.Error:
+                            pass  # The cursor was closed with the connection at shutdown.
+            raise
+
+    async def fetch_arrow(self, query: str, params: Optional[list | tuple | dict] = None) -> pa.Table:
+        """
+        Run a query and fetch every row as an Arrow table.
+
+        Args:
+            query: The SQL query.
+            params: Optional parameters for the query's placeholders.
+
+        Returns:
+            pa.Table: The query's rows.
+        """
+        return await self.run(lambda cursor: cursor.execute(query, params).fetch_arrow_table())
+
+    async def fetch_all(self, query: str, params: Optional[list | tuple | dict] = None) -> list[dict[str, Any]]:
+        """
+        Run a query and fetch every row as a dictionary.
+
+        Args:
+            query: The SQL query.
+            params: Optional parameters for the query's placeholders.
+
+        Returns:
+            list[dict[str, Any]]: The query's rows, keyed by column name.
+        """
+        return (await self.fetch_arrow(query, params)).to_pylist()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get counters for monitoring the executor.
+
+        Returns:
+            dict[str, Any]:
+                - workers: Number of worker threads.
+                - submitted, completed, failed: Calls submitted, finished and failed since start up.
+                - in_flight: Calls submitted but not finished yet.
+                - queue_depth: Calls waiting for a free thread.
+                - mean_queue_wait_seconds, max_queue_wait_seconds: How long finished calls waited for a thread.
+                - mean_run_seconds: How long finished calls ran once they had a thread.
+        """
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "workers": self.max_workers,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.max_workers),
+                "mean_queue_wait_seconds": self._queue_wait_seconds / finished if finished else 0.0,
+                "max_queue_wait_seconds": self._max_queue_wait,
+                "mean_run_seconds": self._run_seconds / finished if finished else 0.0,
+            }
+
+
+# Application-scoped executor. It is started and stopped by the FastAPI app's lifespan.
+DB_EXECUTOR = AsyncDatabaseExecutor(
+    db_path=configs.AMERICAN_LAW_DB_PATH,
+    max_workers=configs.DATABASE_EXECUTOR_MAX_WORKERS,
+    connect=connect_from_pool,
+    close_when_idle=not configs.DATABASE_CONNECTION_KEEP_IDLE,
+)
@@ -0,0 +1,361 @@
+"""
+A bounded, thread-safe database connection pool.
+
+The pool opens at most `size` connections that it keeps, plus up to `max_overflow`
+extra ones under load, which are closed again as soon as they are released.
+Once every connection is checked out, `acquire` blocks until one is released,
+or raises PoolTimeout after `timeout` seconds. Connections are opened and closed
+outside the pool's lock, so a slow connect never holds up callers releasing
+or reusing other connections.
+
+Checked out connections are PooledConnection proxies. Calling `close()` on one
+releases it back to the pool, so code written for a plain connection, e.g.
+`conn = get_html_db(); ...; conn.close()`, draws from the pool unchanged.
+
+The pool is fork-safe. A forked child, e.g. a worker of serve.py, starts with an
+empty pool and opens its own connections, instead of sharing its parent's.
+"""
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Generic, Iterator, Optional, TypeVar
+
+
+from logger import logger as module_logger
+
+
+C = TypeVar('C') # 'C' for connection type
+
+
+class PoolTimeout(TimeoutError):
+    """No connection was released within the acquire timeout."""
+
+
+@dataclass
+class _Slot(Generic[C]):
+    """A pooled connection, and when it was opened and last released."""
+    connection: C
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+
+
+class PooledConnection(Generic[C]):
+    """
+    A checked out connection. Attribute access goes to the connection itself.
+
+    `close()`, or leaving a `with` block, releases the connection to its pool instead of closing it.
+    Releasing it twice does nothing.
+    """
+
+    def __init__(self, pool: 'ConnectionPool[C]', slot: _Slot[C]):
+        self._pool = pool
+        self._slot: Optional[_Slot[C]] = slot
+        self._pid: int = os.getpid()
+
+    @property
+    def connection(self) -> C:
+        if self._slot is None:
+            raise RuntimeError("Connection has already been released to the pool.")
+        return self._slot.connection
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.connection, name)
+
+    def close(self) -> None:
+        """Release the connection to the pool."""
+        slot, self._slot = self._slot, None
+        # A connection checked out before a fork belongs to the parent process.
+        if slot is not None and self._pid == os.getpid():
+            self._pool._release(slot)
+
+    def __enter__(self) -> 'PooledConnection[C]':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class ConnectionPool(Generic[C]):
+    """
+    A pool of at most `size + max_overflow` open connections.
+
+    Attributes:
+        size: Number of connections kept open once released.
+        max_overflow: Extra connections opened when all `size` are checked out. They are closed on release.
+        timeout: Default seconds `acquire` waits for a connection. None waits forever.
+        max_age: Connections older than this many seconds are replaced instead of reused. 0 disables it.
+        keep_idle: If False, idle connections are closed whenever none is checked out,
+            so the pool only holds connections while it is in use.
+        health_check_after: Connections idle for longer than this many seconds are checked
+            with `health_check` before reuse, and replaced if it raises.
+        logger: Logger for recycling and health check messages.
+    """
+
+    def __init__(self,
+                 connect: Callable[[], C],
+                 close: Callable[[C], None],
+                 size: int = 10,
+                 max_overflow: int = 0,
+                 timeout: Optional[float] = 30.0,
+                 max_age: float = 0.0,
+                 keep_idle: bool = True,
+                 health_check: Optional[Callable[[C], Any]] = None,
+                 health_check_after: float = 30.0,
+                 logger: logging.Logger = module_logger
+                ):
+        self.size:               int             = max(1, size)
+        self.max_overflow:       int             = max(0, max_overflow)
+        self.timeout:            Optional[float] = timeout
+        self.max_age:            float           = max_age
+        self.keep_idle:          bool            = keep_idle
+        self.health_check_after: float           = health_check_after
+        self.logger:             logging.Logger  = logger
+        self._connect:           Callable[[], C]        = connect
+        self._close:             Callable[[C], None]    = close
+        self._health_check:      Optional[Callable[[C], Any]] = health_check
+
+        self._pid:       int                 = os.getpid()
+        self._lock:      threading.Lock      = threading.Lock()
+        self._released:  threading.Condition = threading.Condition(self._lock)
+        self._idle:      list[_Slot[C]]      = []  # Most recently used last.
+        self._open:      int  = 0  # Open connections, idle or checked out, including ones being opened.
+        self._closed:    bool = False
+
+        self._acquired:        int   = 0
+        self._waiting:         int   = 0
+        self._timeouts:        int   = 0
+        self._overflow_opened: int   = 0
+        self._recycled:        int   = 0
+        self._failed_checks:   int   = 0
+        self._wait_seconds:    float = 0.0
+        self._max_wait:        float = 0.0
+
+    def _reset_after_fork(self) -> None:
+        """
+        Forget the connections inherited from the parent process, if this is a forked child.
+
+        They are the parent's, so they are dropped without being closed. The lock is replaced,
+        in case another thread of the parent held it when the process forked.
+        """
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._idle = []
+        self._open = 0
+        self._waiting = 0
+
+    def fill(self) -> None:
+        """Open idle connections up to `size`, e.g. to warm the pool at start up."""
+        self._reset_after_fork()
+        while True:
+            with self._lock:
+                if self._closed or self._open >= self.size:
+                    return
+                self._open += 1
+            slot = self._open_slot()
+            with self._lock:
+                self._idle.append(slot)
+                self._released.notify()
+
+    def _open_slot(self) -> _Slot[C]:
+        """Open a connection for a place reserved in `_open`, giving the place up if it fails. Call without the lock."""
+        try:
+            return _Slot(self._connect())
+        except BaseException:
+            with self._lock:
+                self._open -= 1
+                self._released.notify()
+            raise
+
+    def _close_quietly(self, connection: C) -> None:
+        try:
+            self._close(connection)
+        except Exception as e:
+            self.logger.warning(f"Error closing pooled connection: {e}")
+
+    def _is_usable(self, slot: _Slot[C]) -> bool:
+        """Check a reused connection's age and, if it has been idle a while, its health."""
+        now = time.time()
+        if self.max_age and now - slot.created_at > self.max_age:
+            with self._lock:
+                self._recycled += 1
+            return False
+        if self._health_check is not None and now - slot.last_used > self.health_check_after:
+            try:
+                self._health_check(slot.connection)
+            except Exception as e:
+                self.logger.warning(f"Pooled connection failed its health check, replacing it: {e}")
+                with self._lock:
+                    self._failed_checks += 1
+                return False
+        return True
+
+    def acquire(self, timeout: Optional[float] = ...) -> PooledConnection[C]:
+        """
+        Check out a connection, waiting for one to be released if all are in use.
+
+        Args:
+            timeout: Seconds to wait. Defaults to the pool's timeout. None waits forever.
+
+        Returns:
+            PooledConnection: The connection. Close it, or use it in a `with` block, to release it.
+
+        Raises:
+            PoolTimeout: If no connection was free within the timeout.
+            RuntimeError: If the pool has been closed.
+        """
+        self._reset_after_fork()
+        timeout = self.timeout if timeout is ... else timeout
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+        slot = None
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                if self._idle:
+                    slot = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    # Reserve a place, and open the connection after letting go of the lock.
+                    self._open += 1
+                    if self._open > self.size:
+                        self._overflow_opened += 1
+                    break
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No connection was released within {timeout} seconds "
+                        f"({self._open} open, {self.size} + {self.max_overflow} overflow allowed)."
+                    )
+                self._waiting += 1
+                try:
+                    self._released.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        if slot is None:
+            slot = self._open_slot()
+        elif not self._is_usable(slot):
+            self._close_quietly(slot.connection)
+            slot = self._open_slot()
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._acquired += 1
+            self._wait_seconds += waited
+            self._max_wait = max(self._max_wait, waited)
+        return PooledConnection(self, slot)
+
+    def _release(self, slot: _Slot[C]) -> None:
+        to_close: list[C] = []
+        with self._lock:
+            if self._closed or self._open > self.size:
+                # Overflow connections, and every connection of a closed pool, are closed on release.
+                self._open -= 1
+                to_close.append(slot.connection)
+            else:
+                slot.last_used = time.time()
+                self._idle.append(slot)
+            if not self.keep_idle and self._open == len(self._idle):
+                # Nothing is checked out or being opened.
+                to_close.extend(idle.connection for idle in self._idle)
+                self._open -= len(self._idle)
+                self._idle.clear()
+            self._released.notify()
+        for connection in to_close:
+            self._close_quietly(connection)
+
+    async def acquire_async(self, timeout: Optional[float] = ...) -> PooledConnection[C]:
+        """
+        Check out a connection without blocking the event loop while waiting for one.
+
+        If the caller is cancelled while waiting, the connection is released as soon as it arrives.
+
+        Args:
+            timeout: Seconds to wait. Defaults to the pool's timeout. None waits forever.
+
+        Returns:
+            PooledConnection: The connection. Close it, or use it in an `async with` block, to release it.
+
+        Raises:
+            PoolTimeout: If no connection was free within the timeout.
+        """
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self.acquire, timeout))
+        try:
+            return await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(
+                lambda future: future.cancelled() or future.exception() or future.result().close()
+            )
+            raise
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = ...) -> Iterator[PooledConnection[C]]:
+        """Check out a connection for the duration of a `with` block."""
+        with self.acquire(timeout) as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def connection_async(self, timeout: Optional[float] = ...) -> AsyncIterator[PooledConnection[C]]:
+        """Check out a connection for the duration of an `async with` block."""
+        with await self.acquire_async(timeout) as conn:
+            yield conn
+
+    def flush(self) -> None:
+        """Close the idle connections. Checked out ones are kept, and reused once released."""
+        self._reset_after_fork()
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._released.notify_all()
+        for slot in idle:
+            self._close_quietly(slot.connection)
+
+    def close(self) -> None:
+        """Close the idle connections, and every checked out one once it is released."""
+        self._reset_after_fork()
+        with self._lock:
+            self._closed = True
+        self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get counters for monitoring the pool.
+
+        Returns:
+            dict[str, Any]:
+                - size, max_overflow: The pool's limits.
+                - open, idle, checked_out: Connections open now, and how many of them are idle or in use.
+                - overflow: Open connections beyond `size`.
+                - waiting: Callers waiting for a connection.
+                - acquired, timeouts: Connections checked out, and acquires that timed out, since start up.
+                - overflow_opened, recycled, failed_health_checks: Overflow connections opened,
+                  and connections replaced for their age or a failed health check, since start up.
+                - mean_wait_seconds, max_wait_seconds: How long acquires took.
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "checked_out": self._open - len(self._idle),
+                "overflow": max(0, self._open - self.size),
+                "waiting": self._waiting,
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "overflow_opened": self._overflow_opened,
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_checks,
+                "mean_wait_seconds": self._wait_seconds / self._acquired if self._acquired else 0.0,
+                "max_wait_seconds": self._max_wait,
+            }
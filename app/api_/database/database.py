@@ -2,20 +2,18 @@
 Database connection and session management for the FastAPI application.
 
 This module provides a Database class that encapsulates database connection management,
-connection pooling, and CRUD operations. It supports multiple database engines
+connection pooling (see ConnectionPool), and CRUD operations. It supports multiple database engines
 through a dependency injection pattern.
 """
 from contextlib import contextmanager
-from functools import wraps
+from functools import partial, wraps
 import logging
 import os
-from queue import Queue
-from threading import Lock
-import time
 import traceback
 from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, TypeVar
 
 
+from api_.database.connection_pool import ConnectionPool, PooledConnection
 from api_.database.dependencies.duckdb_database import DuckDbDatabase
 from configs import configs, Configs
 from logger import logger as module_logger
@@ -117,6 +115,9 @@ class Database:
 
     Methods:
         connect: Establish a connection to the database
+        connect_async: Establish a connection without blocking the event loop while waiting for one
+        warm_up: Open the pooled connections, if it wasn't done on init (resources["warm_up_on_init"])
+        pool_stats: Get counters for monitoring the connection pool
         close: Close the current database connection
         execute: Execute a database query
         fetch: Fetch a specified number of results from a query
@@ -146,7 +147,7 @@ class Database:
         self.configs = configs
         self.resources = resources
 
-        self.logger: logging.Logger = self.resources['logger']
+        self.logger: logging.Logger = self.resources.get('logger', module_logger)
 
         self._session: Optional[S] = None
         self._transaction_conn: Optional[C] = None
@@ -158,10 +159,8 @@ class Database:
         self._connection_pool_size: int = self.configs.DATABASE_CONNECTION_POOL_SIZE
         self._connection_timeout: float = self.configs.DATABASE_CONNECTION_TIMEOUT
         self._connection_max_age: float = self.configs.DATABASE_CONNECTION_MAX_AGE
-
-        # Initialize connection pool
-        self._connection_pool: Queue = Queue(maxsize=self._connection_pool_size)
-        self._pool_lock: Lock = Lock()
+        self._connection_max_overflow: int = self.configs.DATABASE_CONNECTION_MAX_OVERFLOW
+        self._connection_keep_idle: bool = self.configs.DATABASE_CONNECTION_KEEP_IDLE
 
         # Map resource functions if provided
         self._connect: Callable = self.resources["connect"]
@@ -177,52 +176,65 @@ class Database:
         # Optional session management if database supports it
         self._close_session: Optional[Callable] = self.resources.get("close_session")
 
-        # Initialize connection pool
-        self._init_connection_pool()
+        # Connections open the given database file, in read-only mode if set.
+        if "db_path" in self.resources:
+            connect = partial(self._connect, str(self._db_path), read_only=self._read_only)
+        else:
+            connect = self._connect
+
+        self._connection_pool: ConnectionPool[C] = ConnectionPool(
+            connect=connect,
+            close=self._close,
+            size=self._connection_pool_size,
+            max_overflow=self._connection_max_overflow,
+            timeout=self._connection_timeout,
+            max_age=self._connection_max_age,
+            keep_idle=self._connection_keep_idle,
+            health_check=lambda conn: self._execute(conn, "SELECT 1"),
+            logger=self.logger,
+        )
+
+        # Initialize connection pool, unless warm_up is called later, e.g. after serve.py has forked the workers.
+        if self.resources.get("warm_up_on_init", True):
+            self._init_connection_pool()
         self.logger.info("Database initialized")
 
     def _flush_connection_pool(self) -> None:
         """
-        Flush the connection pool by closing all connections.
+        Flush the connection pool by closing all idle connections.
 
         It should be called when the application
         is shutting down or when a new database engine is being used.
+        Checked out connections are closed once they are returned, if the pool is over its size.
         """
-        if self._connection_pool:
-            # Clear existing connections in the pool
-            while not self._connection_pool.empty():
-                try:
-                    conn_info = self._connection_pool.get(block=False)
-                    self._close(conn_info['connection'])
-                except Exception as e:
-                    self.logger.exception(f"Error closing connection: {e}")
-                    continue
-        # self.logger.debug("Connection pool flushed")
+        self._connection_pool.flush()
 
     def _init_connection_pool(self) -> None:
         """
-        Initialize the connection pool with a set of database connections.
-        
-        This method creates new connections and adds them to the connection pool
-        up to the maximum pool size defined in configuration.
-        """
-        if self._connection_pool:
-            # Flush existing connections in the pool
-            self._flush_connection_pool()
+        Open connections up to the pool size, if idle connections are kept.
 
-        for _ in range(self._connection_pool_size):
+        Otherwise connections are opened on demand, and closed again once none are in use.
+        """
+        if self._connection_keep_idle:
             try:
-                conn = self._connect()
-                self._connection_pool.put({
-                    'connection': conn,
-                    'created_at': time.time(),
-                    'last_used': time.time()
-                })
+                self._connection_pool.fill()
             except Exception as e:
                 self.logger.exception(f"Error initializing connection pool: {e}")
                 raise e
         self.logger.debug("Connection pool initialized")
 
+    def warm_up(self) -> None:
+        """
+        Open the pooled connections ahead of the first request, if idle connections are kept.
+
+        Called by the app's lifespan, so each server worker opens its own.
+        """
+        self._init_connection_pool()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Get counters for monitoring the connection pool, see ConnectionPool.stats."""
+        return self._connection_pool.stats()
+
     def __enter__(self) -> 'Database':
         """
         Context manager entry method.
@@ -257,78 +269,37 @@ class Database:
 
 
     @try_except(msg="Error getting connection from pool", raise_=True)
-    def _get_connection_from_pool(self) -> C:
+    def _get_connection_from_pool(self) -> PooledConnection[C]:
         """
-        Get a connection from the pool or create a new one if needed.
+        Check out a connection, waiting up to DATABASE_CONNECTION_TIMEOUT seconds if all are in use.
+
+        Up to DATABASE_CONNECTION_MAX_OVERFLOW connections beyond the pool size are opened under load.
+        Connections older than DATABASE_CONNECTION_MAX_AGE are replaced.
 
         Returns:
-            A database connection
+            A pooled database connection. Closing it returns it to the pool.
+
+        Raises:
+            PoolTimeout: If no connection was returned to the pool in time.
         """
-        if self._connection_pool.empty():
-            # If pool is empty, re-initialize the pool
-            self._init_connection_pool()
+        return self._connection_pool.acquire()
 
-        # Get a connection from the pool
-        with self._pool_lock:
-            conn_info = self._connection_pool.get(block=False)
-
-            # Check if connection is too old
-            if time.time() - conn_info['created_at'] > self._connection_max_age:
-                try:
-                    self._close(conn_info['connection'])
-                except Exception as e:
-                    self.logger.warning(f"Error closing aged connection: {e}")
-                
-                # Create a new connection
-                conn_info = {
-                    'connection': self._connect(),
-                    'created_at': time.time(),
-                    'last_used': time.time()
-                }
-                
-            # Update last used time
-            conn_info['last_used'] = time.time()
-            if self._read_only:
-                # If read-only, set the connection to read-only mode
-                conn_info['connection'].execute("PRAGMA read_only = true")
-            return conn_info['connection']
-
-
-    def _return_connection_to_pool(self, conn: C) -> None:
-        """
-        Return a connection to the pool if space is available.
+
+    def _return_connection_to_pool(self, conn: PooledConnection[C] | C) -> None:
+        """
+        Return a connection to the pool. Overflow connections are closed instead.
         
         Args:
             conn: The database connection to return to the pool
         """
-        # self.logger.debug("Returning connection to pool...")
         try:
-            # If pool is full, close the connection
-            if self._connection_pool.full():
-                # self.logger.debug("Connection pool is full, closing connection")
+            if isinstance(conn, PooledConnection):
+                conn.close()
+            else:
+                # Not from this pool, so there is nowhere to return it.
                 self._close(conn)
-                return
-            # self.logger.debug("Returning connection to pool")
-
-            # Add connection back to pool
-            with self._pool_lock:
-                # self.logger.debug("Acquired pool lock")
-                self._connection_pool.put({
-                    'connection': conn,
-                    'created_at': time.time(),
-                    'last_used': time.time()
-                }, block=False)
-                # self.logger.debug("Connection return to pool.")
-            # self.logger.debug("Pool lock released") 
-            return
         except Exception as e:
             self.logger.warning(f"Error returning connection to pool: {e}\n{traceback.format_exc()}")
-            
-            # Close connection if we couldn't return it
-            try:
-                self._close(conn)
-            except Exception as e2:
-                self.logger.warning(f"Error closing connection: {e2}\n{traceback.format_exc()}")
 
 
     @try_except(msg="Error connecting to database", raise_=True)
@@ -344,6 +315,19 @@ class Database:
         return conn
 
 
+    async def connect_async(self) -> PooledConnection[C]:
+        """
+        Check out a connection without blocking the event loop while waiting for one.
+
+        Returns:
+            A pooled database connection. Return it with `close`.
+
+        Raises:
+            PoolTimeout: If no connection was returned to the pool within DATABASE_CONNECTION_TIMEOUT seconds.
+        """
+        return await self._connection_pool.acquire_async()
+
+
     def close(self, conn: C) -> None:
         """
         Return the current database connection to the pool.
@@ -2,6 +2,7 @@
 Asynchronous API interface for the LLM integration with the American Law dataset.
 Provides access to OpenAI-powered legal research and RAG components with async support.
 """
+import asyncio
 import os
 from pathlib import Path
 import re
@@ -139,6 +140,9 @@ class AsyncLLMInterface:
     async def determine_user_intent(self, message: str) -> str:
         """
         Determine the user's intent based on the query asynchronously.
+
+        The moderation check and the intent classifier run at the same time.
+        If moderation flags the message, the classifier call is cancelled.
         
         Args:
             query: User's input query
@@ -146,15 +150,31 @@ class AsyncLLMInterface:
         Returns:
             Intent type as a string
         """
-        # Make sure the response isn't anything nasty.
-        response = await self.async_client.client.moderations.create(
-            model="omni-moderation-latest",
-            input=message,
-        )
-        if response.results[0].flagged:
-            logger.warning(f"Message flagged by moderation: {message}")
-            return "FLAGGED"
- 
+        classify_task = asyncio.create_task(self._classify_intent(message))
+        try:
+            # Make sure the response isn't anything nasty.
+            response = await self.async_client.client.moderations.create(
+                model="omni-moderation-latest",
+                input=message,
+            )
+            if response.results[0].flagged:
+                logger.warning(f"Message flagged by moderation: {message}")
+                return "FLAGGED"
+            return await classify_task
+        finally:
+            if not classify_task.done():
+                classify_task.cancel()
+
+    async def _classify_intent(self, message: str) -> str:
+        """
+        Classify the user's intent with the chat model, without moderation.
+
+        Args:
+            message: User's input query
+
+        Returns:
+            Intent type as a string
+        """
         logger.debug(f"Entering Determine Intent")
         system_prompt = """
         You are an intent classifier for a legal search system. Your job is to determine what the user wants to do with their query.
@@ -2,6 +2,7 @@
 OpenAI Client implementation for American Law database.
 Provides integration with OpenAI APIs and RAG components for legal research.
 """
+import os
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional
 
@@ -23,6 +24,7 @@ from configs import configs, Configs
 from logger import logger
 from ..constants import MODEL_USAGE_COSTS_USD_PER_MILLION_TOKENS
 from utils.app import clean_html
+from utils.database.arrow_results import fetch_arrow, table_rows
 from ..load_prompt_from_yaml import load_prompt_from_yaml, Prompt
 
 
@@ -298,8 +300,9 @@ class AsyncOpenAIClient:
         self.temperature:          float = temperature
         self.max_tokens:           int = max_tokens
         
-        # Start the async client
-        self.client:               AsyncOpenAI = AsyncOpenAI(api_key=self.api_key)
+        # The async client is started on first use, in the process that uses it. See `client`.
+        self._client:              Optional[AsyncOpenAI] = None
+        self._client_pid:          Optional[int] = None
 
         # Set data paths
         self.data_path: Path = configs.AMERICAN_LAW_DATA_DIR
@@ -309,6 +312,24 @@ class AsyncOpenAIClient:
 
         logger.info(f"Initialized AsyncOpenAI client: LLM model: {model}, embedding model: {embedding_model}")
 
+    @property
+    def client(self) -> AsyncOpenAI:
+        """
+        The OpenAI client of this process.
+
+        It is created on first use, and again in a forked process, e.g. a worker of serve.py,
+        so HTTP connections are never shared between processes.
+        """
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = AsyncOpenAI(api_key=self.api_key)
+            self._client_pid = os.getpid()
+        return self._client
+
+    @client.setter
+    def client(self, client: AsyncOpenAI) -> None:
+        self._client = client
+        self._client_pid = os.getpid()
+
     @property
     def total_tokens(self) -> int:
         """
@@ -475,23 +496,13 @@ class AsyncOpenAIClient:
             """
                 
             # Execute the query with the embedding as parameter
-            result_df = conn.execute(sql_query, [query_embedding]).fetchdf()
+            table = fetch_arrow(conn, sql_query, [query_embedding])
             
-            # Convert to list of dictionaries
-            results = []
-            for _, row in result_df.iterrows():
-                results.append({
-                    'id': row['id'],
-                    'cid': row['cid'],
-                    'title': row['title'],
-                    'chapter': row['chapter'],
-                    'place_name': row['place_name'],
-                    'state_name': row['state_name'],
-                    'date': row['date'],
-                    'bluebook_citation': row['bluebook_citation'],
-                    'content': row['content'],
-                    'similarity_score': float(row['similarity_score'])
-                })
+            # Convert to list of dictionaries, straight from the Arrow columns.
+            results = table_rows(table.select([
+                'id', 'cid', 'title', 'chapter', 'place_name', 'state_name',
+                'date', 'bluebook_citation', 'content', 'similarity_score',
+            ]))
 
             conn.close()
             return results
@@ -526,10 +537,10 @@ class AsyncOpenAIClient:
                 LIMIT {limit}
             """
             # Execute query and fetch results
-            result_df = conn.execute(sql_query).fetchdf()
+            table = fetch_arrow(conn, sql_query)
             
-            # Convert DataFrame to list of dictionaries
-            results = result_df.to_dict('records')
+            # Convert the Arrow table to list of dictionaries
+            results = table_rows(table)
             
             conn.close()
             return results
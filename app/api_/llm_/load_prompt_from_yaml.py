@@ -1,3 +1,5 @@
+from functools import lru_cache
+from pathlib import Path
 from typing import Literal, Never
 
 
@@ -55,10 +57,32 @@ class Prompt(BaseModel):
         self.user_prompt.content = safe_format(self.user_prompt.content, **user_kwargs)
 
 
+@lru_cache(maxsize=None)
+def _read_prompt_file(prompt_path: Path) -> dict:
+    """Read and parse a prompt template once. Callers validate it into a new Prompt, so the dict is never changed."""
+    with open(prompt_path, 'r') as file:
+        return dict(yaml.safe_load(file))
+
+
+def preload_prompts(configs: Configs) -> int:
+    """
+    Read every prompt template in configs.PROMPTS_DIR into the cache, e.g. before serve.py forks its workers.
+
+    Returns:
+        int: The number of templates read. 0 if the directory doesn't exist.
+    """
+    prompt_dir = Path(configs.PROMPTS_DIR)
+    if not prompt_dir.is_dir():
+        return 0
+    paths = sorted(prompt_dir.glob("*.yaml"))
+    for prompt_path in paths:
+        _read_prompt_file(prompt_path)
+    return len(paths)
+
+
 def load_prompt_from_yaml(name: str, configs: Configs, **kwargs) -> Prompt:
     prompt_dir = configs.PROMPTS_DIR
     prompt_path = prompt_dir / f"{name}.yaml"
 
-    with open(prompt_path, 'r') as file:
-        prompt = dict(yaml.safe_load(file))
-        return Prompt.model_validate(prompt).safe_format(**kwargs)
+    prompt = _read_prompt_file(Path(prompt_path))
+    return Prompt.model_validate(prompt).safe_format(**kwargs)
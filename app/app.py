@@ -17,6 +17,7 @@ from typing import Any, Callable, Optional, Union
 from types import ModuleType
 import logging
 from collections import defaultdict
+from contextlib import asynccontextmanager
 
 import smtplib
 import ssl
@@ -44,10 +45,18 @@ import paths.search_history as search_history
 from app.paths.upload_document import make_upload_document
 from schemas import LawItem
 from schemas import ErrorResponse
+from schemas import SearchMode
 
 from utils import get_html_db
+from utils.database.arrow_results import table_rows
+from utils.common.worker_pool import WorkerPool, WORKER_POOL
+from api_.database.async_database_executor import AsyncDatabaseExecutor, DB_EXECUTOR
+from utils.app.search.semantic_query_cache import SemanticQueryCache, SEMANTIC_QUERY_CACHE
+from utils.app.search.response_cache import ResponseCache, RESPONSE_CACHE
+from utils.app.search.search_cache_store import SearchCacheStore, SEARCH_CACHE_STORE
+from utils.app.search.results_delta_encoder import ResultsDeltaEncoder
 from llm import AsyncLLMInterface, LLM
-from app.read_only_database import Database, READ_ONLY_DB
+from read_only_database import Database, READ_ONLY_DB
 
 # Load environment variables
 load_dotenv()
@@ -311,6 +320,11 @@ class App:
         self.batch_processor: Callable          = None # TODO See pdf_processor in ipfs_datasets_py
         self._search_function: Callable         = resources['search_function']
         self._upload_document: Callable         = resources['upload_document'] 
+        self.worker_pool:     WorkerPool        = resources.get('worker_pool')
+        self.db_executor:     AsyncDatabaseExecutor = resources.get('db_executor')
+        self.semantic_query_cache: SemanticQueryCache = resources.get('semantic_query_cache')
+        self.search_cache_store: SearchCacheStore = resources.get('search_cache_store')
+        self.response_cache:  ResponseCache     = resources.get('response_cache')
 
         # Contact form email settings
         self._email_address: str = configs.ADMIN_EMAIL
@@ -566,7 +580,10 @@ class App:
         q: str = Query("", description="Search query"),
         page: int = Query(1, description="Page number"),
         per_page: int = Query(20, description="Items per page"),
-        client_id: str = None #Depends(search_history.get_or_create_client_id),
+        client_id: str = None, #Depends(search_history.get_or_create_client_id),
+        mode: Optional[str] = Query(None, description="Search mode: lexical, llm or hybrid"),
+        cursor: Optional[str] = Query(None, description="Cursor token from an earlier response for the same search"),
+        protocol: int = Query(1, description="SSE protocol version: 1 for cumulative results_update events, 2 for results_delta events"),
         ) -> EventSourceResponse:
         """Server-Sent Events endpoint that streams search results incrementally.
 
@@ -577,7 +594,13 @@ class App:
 
         The event stream includes:
         - A "search_started" event when the search begins
-        - Multiple "results_update" events as results are found
+        - Multiple "results_update" events as results are found (protocol 1).
+          Each one has every result found so far.
+        - Multiple "results_delta" events as results are found (protocol 2).
+          Each one only has the new results, the cids and new ranks of re-ranked results,
+          and the cids of removed results. See ResultsDelta.
+        - A "results_snapshot" event with the final order of the results (protocol 2). See ResultsSnapshot.
+        - A "count_update" event with the exact total, if it was still being counted when the first results were sent
         - A "search_complete" event when the search is finished
         - An "error" event if any errors occur during the search
 
@@ -588,6 +611,11 @@ class App:
             page: The page number to retrieve
             per_page: The number of results per page
             client_id: Client identifier for search history tracking
+            mode: "lexical" (BM25 only, no LLM), "llm" or "hybrid". Defaults to configs.SEARCH_MODE.
+            cursor: The `cursor` from an earlier results_update for the same search.
+                Other pages are then sliced from that search's ranking instead of searching again.
+            protocol: The SSE protocol version. 1 (the default) resends every result in each results_update.
+                2 sends results_delta events and a final results_snapshot instead.
 
         Returns:
             EventSourceResponse: A streaming response that sends events to the client
@@ -603,8 +631,18 @@ class App:
             ```
         """
         self._validate_query_params(q, page, per_page, client_id)
+        self._validate_string(mode, 'mode', skip_if_value_is_none=True)
+        self._validate_string(cursor, 'cursor', skip_if_value_is_none=True)
+        if protocol not in (1, 2):
+            raise ValueError(f"'protocol' must be 1 or 2, got {protocol}.")
+        if mode is not None and mode not in SearchMode:
+            raise ValueError(f"'mode' must be one of {[m.value for m in SearchMode]}, got '{mode}'.")
 
         kwargs = {"q": q, "page": page, "per_page": per_page, "client_id": client_id, "logger": self.logger, "llm": self.llm}
+        if mode is not None:
+            kwargs["mode"] = mode
+        if cursor is not None:
+            kwargs["cursor"] = cursor
 
         def _event_dict(event: str, data: dict) -> dict:
             return {"event": event, "data": json.dumps(data)}
@@ -613,9 +651,22 @@ class App:
             try:
                 yield _event_dict("search_started", {"message": "Search started", "query": q})
 
+                encoder = ResultsDeltaEncoder() if protocol == 2 else None
                 async for result in self._search_function(**kwargs):
-                    # Send each result chunk as it becomes available
-                    yield _event_dict("results_update", result)
+                    # Send each result chunk as it becomes available.
+                    # Events like count_update name themselves.
+                    if "event" in result or encoder is None:
+                        yield _event_dict(result.get("event", "results_update"), result)
+                        continue
+                    # Protocol 2 only sends what the client doesn't have yet.
+                    delta = encoder.encode(result)
+                    if delta is not None:
+                        yield _event_dict("results_delta", delta)
+
+                if encoder is not None:
+                    snapshot = encoder.snapshot()
+                    if snapshot is not None:
+                        yield _event_dict("results_snapshot", snapshot)
 
                 # Final event to indicate the search is complete
                 yield _event_dict("search_complete", {"message": "Search completed", "query": q})
@@ -638,12 +689,13 @@ class App:
         It returns the complete document including metadata and HTML content.
         
         The algorithm:
-        1. Connect to the HTML database in read-only mode
-        2. Execute a SQL query joining the citations and HTML tables
-        3. Filter by the provided CID
-        4. Format the result as a LawItem response
-        5. Close database resources
-        6. Return the document or a 404 error if not found
+        1. Return the document from the response cache, if it was served before
+        2. Otherwise connect to the HTML database in read-only mode
+        3. Execute a SQL query joining the citations and HTML tables
+        4. Filter by the provided CID
+        5. Format the result as a LawItem response and cache it
+        6. Close database resources
+        7. Return the document or a 404 error if not found
         
         Args:
             cid: The content identifier of the legal document to retrieve
@@ -659,25 +711,34 @@ class App:
             GET /api/law/bafkreihvwc5kg3estvqpicmmqghwiriti6mz5w3lk4k3app3guwk6onrq4
             ```
         """
-        law = None
-        html_conn = get_html_db(read_only=True)
-        html_cursor = html_conn.cursor()
-        try:
-            html_cursor.execute('''
-            SELECT *
-            FROM citations c
-            JOIN html h ON c.cid = h.cid
-            WHERE c.cid = ?
-            ''', (cid,))
-            
-            law: dict = html_cursor.fetchdf().to_dict('records')[0]
-        finally:
-            html_cursor.close()
-            html_conn.close()
+        if self.response_cache is not None:
+            law_item: Optional[dict] = self.response_cache.get("law", cid)
+            if law_item is not None:
+                return law_item
+
+        def _fetch_law() -> Optional[dict]:
+            # Checking out a pooled connection can wait for one to be released, so this runs in a thread.
+            html_conn = get_html_db(read_only=True)
+            html_cursor = html_conn.cursor()
+            try:
+                html_cursor.execute('''
+                SELECT *
+                FROM citations c
+                JOIN html h ON c.cid = h.cid
+                WHERE c.cid = ?
+                ''', (cid,))
+                
+                rows = table_rows(html_cursor.fetch_arrow_table().slice(0, 1))
+                return rows[0] if rows else None
+            finally:
+                html_cursor.close()
+                html_conn.close()
+
+        law: Optional[dict] = await asyncio.to_thread(_fetch_law)
         self.logger.debug(f"law: {law}")
 
         if law is not None:
-            return {
+            law_item = {
                 'cid': law['cid'],
                 'title': law['title'],
                 'chapter': law['chapter'],
@@ -687,6 +748,9 @@ class App:
                 'bluebook_citation': law['bluebook_citation'],
                 'html': law['html']
             }
+            if self.response_cache is not None:
+                self.response_cache.put("law", cid, law_item, tags=[cid])
+            return law_item
         else:
             raise HTTPException(status_code=404, detail="Law not found")
 
@@ -908,6 +972,37 @@ Message:
         )
         return app
 
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI):
+        """
+        Start the shared worker pool, database executor and search cache writer with the app, and shut them down gracefully when the app stops.
+
+        The read-only database connections are opened, and the semantic query cache is filled with the saved search queries at startup.
+        The search cache writer is stopped last, so it writes the rows queued by the last searches.
+        """
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+        if self.db_executor is not None:
+            self.db_executor.start()
+        if self.read_only_db is not None:
+            try:
+                await asyncio.to_thread(self.read_only_db.warm_up)
+            except Exception as e:
+                self.logger.warning(f"Could not open the read-only database connections at startup: {e}")
+        if self.semantic_query_cache is not None and self.search_cache_store is not None:
+            await asyncio.to_thread(self.semantic_query_cache.load, self.search_cache_store)
+        if self.search_cache_store is not None:
+            self.search_cache_store.start()
+        try:
+            yield
+        finally:
+            if self.worker_pool is not None:
+                self.worker_pool.shutdown(wait=True)
+            if self.db_executor is not None:
+                self.db_executor.shutdown(wait=True)
+            if self.search_cache_store is not None:
+                await self.search_cache_store.shutdown()
+
     def make_app(self) -> FastAPI:
         """
         Configure and return the FastAPI application instance.
@@ -918,7 +1013,7 @@ Message:
         Raises:
             TypeError: If any route handler function is not callable.
         """
-        app = FastAPI(title=self.TITLE, description=self.DESCRIPTION)
+        app = FastAPI(title=self.TITLE, description=self.DESCRIPTION, lifespan=self.lifespan)
         app = self._add_middleware(app)
         app = self._map_static_files(app)
 
@@ -972,7 +1067,12 @@ DEFAULT_RESOURCE_KEYS = {
     "side_menu",
     "upload_menu",
     "search_function",
-    "batch_processor"
+    "batch_processor",
+    "worker_pool",
+    "db_executor",
+    "semantic_query_cache",
+    "search_cache_store",
+    "response_cache",
 }
 
 def make_app(
@@ -995,6 +1095,11 @@ def make_app(
             - side_menu (SideMenu): SideMenu instance (default: get_side_menu())
             - upload_menu (UploadMenu): UploadMenu instance (default: get_upload_menu())
             - search_function (AsyncGenerator): Search function (default: search.function)
+            - worker_pool (WorkerPool): Process pool started and stopped with the app (default: WORKER_POOL if configs.WORKER_POOL_WITH_APP, else None)
+            - db_executor (AsyncDatabaseExecutor): Thread pool for read-only queries, started and stopped with the app (default: DB_EXECUTOR)
+            - semantic_query_cache (SemanticQueryCache): Filled with the saved search queries at startup (default: SEMANTIC_QUERY_CACHE)
+            - search_cache_store (SearchCacheStore): Writes the cached search queries and search history, started and stopped with the app (default: SEARCH_CACHE_STORE)
+            - response_cache (ResponseCache): In-memory cache of law documents served by the law endpoint (default: RESPONSE_CACHE)
 
         mock_configs (Configs, optional): A Configs object to override default initialization configurations. Defaults to None.
 
@@ -1034,6 +1139,11 @@ def make_app(
         "search_function": _resources.pop("search_function", search.function),
         "upload_document": _resources.pop("upload_document", make_upload_document().upload_document),
         "batch_processor": _resources.pop("batch_processor", None),
+        "worker_pool": _resources.pop("worker_pool", WORKER_POOL if configs.WORKER_POOL_WITH_APP else None),
+        "db_executor": _resources.pop("db_executor", DB_EXECUTOR),
+        "semantic_query_cache": _resources.pop("semantic_query_cache", SEMANTIC_QUERY_CACHE),
+        "search_cache_store": _resources.pop("search_cache_store", SEARCH_CACHE_STORE),
+        "response_cache": _resources.pop("response_cache", RESPONSE_CACHE),
     }
 
     try:
@@ -72,6 +72,10 @@ class Configs(BaseModel):
         PARQUET_FILES_DIR (DirectoryPath): Directory containing parquet files.
         AMERICAN_LAW_DB_PATH (DirectoryPath): Path to the American Law database file.
         SEARCH_HISTORY_DB_PATH (DirectoryPath): Path to the search history database file.
+        SEARCH_CACHE_DB_PATH (Path): SQLite file of cached search queries and search history, shared by the server workers. Only its background writers write to it, so the law database stays read-only.
+        SEARCH_CACHE_BATCH_SIZE (int): Max rows the search cache writer commits at once.
+        SEARCH_CACHE_FLUSH_SECONDS (float): Max seconds a queued row waits before the search cache writer commits it.
+        SEARCH_CACHE_QUEUE_SIZE (int): Max rows waiting for the search cache writer. Rows beyond that are dropped.
         PROMPTS_DIR (DirectoryPath): Directory containing LLM prompt templates.
         HUGGING_FACE_REPO_ID (str): Repository ID on Hugging Face.
         OPENAI_MODEL (str): Main OpenAI model to use for processing.
@@ -80,11 +84,53 @@ class Configs(BaseModel):
         LOG_LEVEL (int): Logging level for the application (e.g., logging.DEBUG).
         SIMILARITY_SCORE_THRESHOLD (float): Threshold for cosine similarity scoring.
         SEARCH_EMBEDDING_BATCH_SIZE (int): Batch size for embedding searches.
-        DATABASE_CONNECTION_POOL_SIZE (int): Max number of database connections in the pool.
-        DATABASE_CONNECTION_TIMEOUT (int): Timeout in seconds for database connections.
-        DATABASE_CONNECTION_MAX_OVERFLOW (int): Max connections beyond pool size.
+        DATABASE_CONNECTION_POOL_SIZE (int): Max number of database connections kept in the pool.
+        DATABASE_CONNECTION_TIMEOUT (int): Max seconds to wait for a pooled connection once all are in use.
+        DATABASE_CONNECTION_MAX_OVERFLOW (int): Max connections beyond pool size under load. They are closed when returned.
         DATABASE_CONNECTION_MAX_AGE (int): Max age in seconds for a database connection.
+        DATABASE_CONNECTION_KEEP_IDLE (bool): Keep idle read-only connections to the law database open for the life of the process. If False, they are closed once none are in use, so it can be opened read-write.
+        DATABASE_EXECUTOR_MAX_WORKERS (int): Threads running read-only DuckDB queries for async code, i.e. how many run at once.
         TOP_K (int): Number of top results to return in searches.
+        CHUNK_POOLING (str): How the chunk scores of a law are pooled into its score, "max", "mean" or "top2_mean" (mean of its best two chunks).
+        EMBEDDING_MATRIX_DIR (Path): Directory of the memory-mapped float32 embedding matrix.
+        VECTOR_INDEX_PATH (Path): Path to the approximate nearest neighbour index for the embeddings.
+        VECTOR_INDEX_N_LISTS (int): Number of inverted lists in the vector index. 0 picks sqrt(N).
+        VECTOR_INDEX_N_PROBE (int): Lists scanned per query. Higher is slower but has better recall.
+        GEO_SHARDS_DIR (Path): Directory of the per-state embedding shards. See GeoShardRouter.
+        GEO_SHARD_MAX_SHARDS (int): Max number of shards searched for a query that names no place. 0 means no limit.
+        GEO_SHARD_MIN_SIMILARITY (float): Shards whose centroid is less similar than this to the query are skipped, unless the query names their state.
+        WORKER_POOL_MAX_WORKERS (int): Processes in the app-wide worker pool. 0 uses all physical cores but one. In serve.py, each server worker gets its share.
+        WORKER_POOL_WITH_APP (bool): Start the worker pool with the app. Off by default, since no request runs work in it.
+        SERVER_WORKERS (int): Server processes forked by serve.py. 0 uses one per CPU core.
+        SERVER_HOST (str): Address serve.py listens on.
+        SERVER_PORT (int): Port serve.py listens on.
+        SEARCH_MODE (str): Default search mode, "lexical" (BM25 only), "llm" (LLM-written SQL) or "hybrid" (BM25 and embeddings).
+        LEXICAL_SEARCH_TOP_K (int): Max number of BM25 candidates for lexical and hybrid search.
+        BM25_K1 (float): BM25 term frequency saturation.
+        BM25_B (float): BM25 document length normalization.
+        RRF_K (int): Damping constant for reciprocal-rank fusion in hybrid search.
+        RESULT_CURSOR_MAX_RESULTS (int): Max number of candidates ranked by the first request for a search. Later pages are sliced from them.
+        RESULT_CURSOR_TTL_SECONDS (int): How long the ranking of a search is kept for later pages.
+        RESULT_CURSOR_MAX_BYTES (int): Memory budget for all kept rankings. The least recently used are evicted first.
+        SEMANTIC_CACHE_THRESHOLD (float): Min cosine similarity between two search queries for one to reuse the other's ranking.
+        SEMANTIC_CACHE_TTL_SECONDS (int): How long a search query can be reused by similar ones.
+        SEMANTIC_CACHE_MAX_ENTRIES (int): Max number of search queries in the semantic query cache.
+        RESPONSE_CACHE_PAGE_MAX_BYTES (int): Memory budget for cached pages of search results. The least recently used are evicted first.
+        RESPONSE_CACHE_LAW_MAX_BYTES (int): Memory budget for cached law documents.
+        RESPONSE_CACHE_CHECK_SECONDS (float): Min seconds between checks for a rebuilt law database, which clears the response cache, and for responses the other server workers invalidated.
+        RESPONSE_CACHE_SHARED_PATH (Path): SQLite file of the response cache shared by the server workers on a host. None to give each worker only its own.
+        RESPONSE_CACHE_SHARED_MAX_BYTES (int): Size cap of the shared response cache. The least recently used responses are evicted first.
+        WARM_CACHE_TOP_QUERIES (int): How many of the most popular searches in the search history warm_cache.py keeps cached.
+        WARM_CACHE_CONCURRENCY (int): Max searches warm_cache.py runs at once, to bound its LLM calls.
+        WARM_CACHE_HALF_LIFE_DAYS (float): Age at which a search in the search history counts half towards its popularity.
+        WARM_CACHE_INTERVAL_SECONDS (float): Seconds between runs of warm_cache.py when started by start_docker.sh. 0 runs it once.
+        SEARCH_DEADLINE_SECONDS (float): Max seconds a search may take. Stages still running then are cut off and the results so far are returned. 0 means no deadline.
+        INTENT_BUDGET_SECONDS (float): Max seconds for the LLM to check the user intent. 0 means only the deadline applies, likewise for the budgets below.
+        SQL_BUDGET_SECONDS (float): Max seconds for the LLM to write the SQL query.
+        QUERY_BUDGET_SECONDS (float): Max seconds for the SQL query or BM25 search to run. An SQL query that runs over is interrupted.
+        COUNT_BUDGET_SECONDS (float): Max seconds for the total count. The total then stays a lower bound.
+        SCORING_BUDGET_SECONDS (float): Max seconds to rank the candidates by embedding similarity. Candidates not scored by then are left out.
+        HYDRATION_BUDGET_SECONDS (float): Max seconds to get the rows and HTML of a page of results.
         USE_GPU_FOR_COSINE_SIMILARITY (str): Computed property, "cuda" or "cpu".
     """
     OPENAI_API_KEY:                   SecretStr = os.environ.get("OPENAI_API_KEY")
@@ -101,6 +147,10 @@ class Configs(BaseModel):
     PARQUET_FILES_DIR:                DirectoryPath = _ROOT_DIR / "data" / "parquet_files"
     AMERICAN_LAW_DB_PATH:             DirectoryPath = _ROOT_DIR / "data" / "american_law.db"
     SEARCH_HISTORY_DB_PATH:           DirectoryPath = _ROOT_DIR / "data" / "search_history.db"
+    SEARCH_CACHE_DB_PATH:             Path = _ROOT_DIR / "data" / "search_cache.sqlite"
+    SEARCH_CACHE_BATCH_SIZE:          int = 500
+    SEARCH_CACHE_FLUSH_SECONDS:       float = 1.0
+    SEARCH_CACHE_QUEUE_SIZE:          int = 10000
     PROMPTS_DIR:                      DirectoryPath = _ROOT_DIR / "api" / "llm" / "prompts"
     HUGGING_FACE_REPO_ID:             str = "the-ride-never-ends/american_municipal_law"
     OPENAI_MODEL:                     str = "gpt-4o"
@@ -113,9 +163,51 @@ class Configs(BaseModel):
     DATABASE_CONNECTION_TIMEOUT:      int = 30
     DATABASE_CONNECTION_MAX_OVERFLOW: int = 20
     DATABASE_CONNECTION_MAX_AGE:      int = 300
+    DATABASE_CONNECTION_KEEP_IDLE:    bool = True
+    DATABASE_EXECUTOR_MAX_WORKERS:    int = 4
     TOP_K :                           int = 100
+    CHUNK_POOLING:                    Literal["max", "mean", "top2_mean"] = "max"
     MAX_FILE_SIZE_BYTES:              int = 52428800  # 50MB
     SUPPORTED_FILE_TYPES:             set[str] = {"txt", "pdf", "docx", "doc"}
+    EMBEDDING_MATRIX_DIR:             Path = _ROOT_DIR / "data" / "embedding_matrix"
+    VECTOR_INDEX_PATH:                Path = _ROOT_DIR / "data" / "american_law.ivf.npz"
+    VECTOR_INDEX_N_LISTS:             int = 0
+    VECTOR_INDEX_N_PROBE:             int = 8
+    GEO_SHARDS_DIR:                   Path = _ROOT_DIR / "data" / "geo_shards"
+    GEO_SHARD_MAX_SHARDS:             int = 0
+    GEO_SHARD_MIN_SIMILARITY:         float = 0.15
+    WORKER_POOL_MAX_WORKERS:          int = 0
+    WORKER_POOL_WITH_APP:             bool = False
+    SERVER_WORKERS:                   int = 0
+    SERVER_HOST:                      str = "0.0.0.0"
+    SERVER_PORT:                      int = 8000
+    SEARCH_MODE:                      Literal["lexical", "llm", "hybrid"] = "llm"
+    LEXICAL_SEARCH_TOP_K:             int = 1000
+    BM25_K1:                          float = 1.2
+    BM25_B:                           float = 0.75
+    RRF_K:                            int = 60
+    RESULT_CURSOR_MAX_RESULTS:        int = 1000
+    RESULT_CURSOR_TTL_SECONDS:        int = 900
+    RESULT_CURSOR_MAX_BYTES:          int = 67108864  # 64MB
+    SEMANTIC_CACHE_THRESHOLD:         float = 0.92
+    SEMANTIC_CACHE_TTL_SECONDS:       int = 86400
+    SEMANTIC_CACHE_MAX_ENTRIES:       int = 10000
+    RESPONSE_CACHE_PAGE_MAX_BYTES:    int = 33554432  # 32MB
+    RESPONSE_CACHE_LAW_MAX_BYTES:     int = 134217728  # 128MB
+    RESPONSE_CACHE_CHECK_SECONDS:     float = 5.0
+    RESPONSE_CACHE_SHARED_PATH:       Optional[Path] = _ROOT_DIR / "data" / "response_cache.sqlite"
+    RESPONSE_CACHE_SHARED_MAX_BYTES:  int = 1073741824  # 1GB
+    WARM_CACHE_TOP_QUERIES:           int = 300
+    WARM_CACHE_CONCURRENCY:           int = 4
+    WARM_CACHE_HALF_LIFE_DAYS:        float = 7.0
+    WARM_CACHE_INTERVAL_SECONDS:      float = 21600  # 6 hours
+    SEARCH_DEADLINE_SECONDS:          float = 60.0
+    INTENT_BUDGET_SECONDS:            float = 10.0
+    SQL_BUDGET_SECONDS:               float = 20.0
+    QUERY_BUDGET_SECONDS:             float = 15.0
+    COUNT_BUDGET_SECONDS:             float = 15.0
+    SCORING_BUDGET_SECONDS:           float = 10.0
+    HYDRATION_BUDGET_SECONDS:         float = 10.0
 
 
     @computed_field # type: ignore[prop-decorator]
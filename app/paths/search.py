@@ -4,8 +4,8 @@ API endpoint for searching the American law database using natural language
 """
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime
-import functools
 import logging
 import os
 import sys
@@ -15,6 +15,8 @@ from typing import Any, AsyncGenerator, Callable, Coroutine, Optional, TypeVar
 
 import duckdb
 from fastapi import HTTPException, Query
+import numpy as np
+import pyarrow as pa
 from pydantic import BaseModel, PositiveInt
 
 sys.path.append("..")  # Add the parent directory to the path
@@ -24,29 +26,52 @@ from configs import configs, Configs
 
 
 from llm import LLM, AsyncLLMInterface
+from api_.database.async_database_executor import AsyncDatabaseExecutor, DB_EXECUTOR
+from vector_index import EMBEDDING_MATRIX, GEO_SHARD_ROUTER, VECTOR_INDEX
+from schemas.count_update import CountUpdate
+from schemas.search_mode import SearchMode
 from schemas.search_response import SearchResponse
 from utils.app.search.format_initial_sql_return_from_search import format_initial_sql_return_from_search
-from utils.app.search.get_embedding_and_calculate_cosine_similarity import (
-    get_embedding_and_calculate_cosine_similarity
-)
-from utils.app.get_html_for_this_citation import get_html_for_this_citation
+from utils.app.get_html_for_these_citations import get_html_for_these_citations, html_digest
 from utils.app._get_a_database_connection import get_a_database_connection
 
-from utils.common import get_cid
-from utils.common.run_in_process_pool import async_run_in_process_pool
+from utils.common import get_cid, SingleFlight
+from utils.app.search.citation_metadata import CITATION_COLUMNS
+from utils.database.arrow_results import embedding_matrix, table_rows
+from utils.database.bulk_key_lookup import bulk_key_lookup
+from utils.llm.cosine_similarity import batch_cosine_similarity, top_k_indices
+from utils.llm.embedding_matrix import EmbeddingMatrix
+from utils.llm.geo_shards import GeoShardRouter
+from utils.llm.pool_chunk_scores import PoolingMethod, pool_chunk_scores
+from utils.llm.vector_index import IvfFlatIndex, top_k_rows
 
 
 from utils.app.search import (
+    BackgroundCount,
+    CitationMetadata,
+    CITATION_METADATA,
     close_database_connection,
     close_database_cursor,
+    Deadline,
     estimate_the_total_count_without_pagination,
     format_initial_sql_return_from_search,
     get_cached_query_results,
     get_data_from_sql,
     get_database_cursor,
     get_embedding_cids,
+    lexical_search,
     LLMSqlOutput,
+    reciprocal_rank_fusion,
+    ResultCursor,
+    ResultCursorStore,
+    RESULT_CURSOR_STORE,
+    SemanticCacheEntry,
+    SemanticQueryCache,
+    SEMANTIC_QUERY_CACHE,
     sort_and_save_search_query_results,
+    StageScheduler,
+    StageTimedOut,
+    strip_pagination,
     turn_english_into_sql,
     make_search_query_table_if_it_doesnt_exist,
 )
@@ -75,25 +100,33 @@ class SearchFunction:
     resource cleanup.
     
     Attributes:
-        search_query: The natural language search query
+        search_query: The natural language search query, lowercased
+        search_query_as_typed: The search query as the user typed it, which search_query_cid is made from
         llm: The language model interface for query translation
         resources: Dictionary of utility functions and resources
         configs: Application configuration
         query_table_embedding_cids: List of content IDs with similarity scores
         cid_set: Set of content IDs to avoid duplicates
-        html_set: Set of HTML contents to avoid duplicates
-        total: Total number of results
+        html_hashes: Content hashes of the HTML already returned, to avoid duplicates
+        total: Number of ranked results, which the pages go up to
+        total_matches: Number of rows the SQL query matched, if more than could be ranked. Otherwise None.
+        total_is_exact: False while total_matches is only a lower bound from the LIMIT+1 probe
+        has_more: Whether the SQL query has rows after the current page
         class_connection: Database connection
         class_cursor: Database cursor
         search_query_cid: Content ID for the search query
         search_query_embedding: Vector embedding of the search query
+        mode: How candidates are found, see SearchMode
+        cursor_token: Token of the stored ranking this response was paged from, see ResultCursorStore
+        deadline: The time budgets of the search's stages, see Deadline
     """
     # TODO Abstract-out duckdb
 
     def __init__(self, 
                  search_query: str = None, 
                  resources: dict[str, Callable] = None, 
-                 configs: Configs = None
+                 configs: Configs = None,
+                 mode: Optional[SearchMode | str] = None
                 ):
         """
         Initialize the SearchFunction with necessary dependencies.
@@ -104,17 +137,19 @@ class SearchFunction:
         
         Args:
             search_query: The natural language search query
-            llm: The language model interface for query translation
-            resources: Dictionary of utility functions and resources
+            resources: Dictionary of utility functions, indexes and caches, see `resources` below.
+                resources['LLM'] is the language model interface the SQL query is generated with.
             configs: Application configuration
+            mode: "lexical", "llm" or "hybrid". Defaults to configs.SEARCH_MODE.
             
         Raises:
-            ValueError: If search_query is None or empty, or if llm is None
+            ValueError: If search_query is None or empty, if resources['LLM'] is None, or if mode is unknown
         """
         self.resources = resources
         self.configs = configs
 
         self.search_query: str = search_query.lower()
+        self.search_query_as_typed: str = search_query
         self.llm: AsyncLLMInterface = self.resources['LLM']
         self.logger: logging.Logger = self.resources['logger']
 
@@ -125,11 +160,21 @@ class SearchFunction:
         if not self.logger:
             raise ValueError("Logger cannot be None.")
 
+        try:
+            self.mode: SearchMode = SearchMode(mode or self.configs.SEARCH_MODE)
+        except ValueError as e:
+            raise ValueError(f"Unknown search mode '{mode}'. Expected one of {[m.value for m in SearchMode]}.") from e
+
         # Define initial variable states
         self.query_table_embedding_cids: list[str]    = []
         self.cid_set:                    set[str]     = set()
-        self.html_set:                   set[str]     = set()
+        self.html_hashes:                set[bytes]   = set()
         self.total:                      PositiveInt  = 0
+        self.total_matches:              Optional[int] = None
+        self.total_is_exact:             bool         = True
+        self.has_more:                   bool         = False
+        self.cursor_token:               Optional[str] = None
+        self.deadline:                   Deadline      = Deadline.from_configs(self.configs, logger=self.logger)
 
         self.class_connection = None
         self.class_cursor = None
@@ -145,20 +190,33 @@ class SearchFunction:
         self._get_data_from_sql:                             Callable = self.resources['get_data_from_sql']
         self._get_cached_query_results:                      Callable = self.resources['get_cached_query_results']
         self._get_cid:                                       Callable = self.resources['get_cid']
-        self._get_html_for_this_citation:                    Callable = self.resources['get_html_for_this_citation']
+        self._get_html_for_these_citations:                  Callable = self.resources['get_html_for_these_citations']
         self._sort_and_save_search_query_results:            Callable = self.resources['sort_and_save_search_query_results']
         self._format_initial_sql_return_from_search:         Callable = self.resources['format_initial_sql_return_from_search']
         self._estimate_the_total_count_without_pagination:   Callable = self.resources['estimate_the_total_count_without_pagination']
         self._close_database_connection:                     Callable = self.resources['close_database_connection']
         self._close_database_cursor:                         Callable = self.resources['close_database_cursor']
-        self._get_embedding_and_calculate_cosine_similarity: Callable = self.resources['get_embedding_and_calculate_cosine_similarity']
         # Async
-        self._async_run_in_process_pool:                     Coroutine = self.resources['async_run_in_process_pool']
         self._get_single_embedding:                          Coroutine = self.resources['get_single_embedding']
         self._turn_english_into_sql:                         Coroutine = self.resources['turn_english_into_sql']
         self._determine_user_intent:                         Coroutine = self.resources['determine_user_intent']
+        # Lexical search
+        self._lexical_search:                                Callable = self.resources['lexical_search']
+        self._reciprocal_rank_fusion:                        Callable = self.resources['reciprocal_rank_fusion']
         # Schemas
         self._LLMSqlOutput:                                  BaseModel  = self.resources['LLMSqlOutput'] 
+        # Indexes
+        self._embedding_matrix:                              Optional[EmbeddingMatrix] = self.resources.get('embedding_matrix')
+        self._vector_index:                                  Optional[IvfFlatIndex]    = self.resources.get('vector_index')
+        self._geo_shards:                                    Optional[GeoShardRouter]  = self.resources.get('geo_shards')
+        # Rankings of earlier searches, for later pages
+        self._result_cursors:                                Optional[ResultCursorStore] = self.resources.get('result_cursors')
+        # Embeddings of earlier queries, to reuse the rankings of similar ones
+        self._semantic_query_cache:                          Optional[SemanticQueryCache] = self.resources.get('semantic_query_cache')
+        # Runs read-only queries off the event loop
+        self._db_executor:                                   Optional[AsyncDatabaseExecutor] = self.resources.get('db_executor')
+        # The citations table in memory, if serve.py loaded it
+        self._citation_metadata:                             Optional[CitationMetadata] = self.resources.get('citation_metadata')
 
         # Run these start up functions
         #self._make_search_query_table_if_it_doesnt_exist()
@@ -167,16 +225,35 @@ class SearchFunction:
         self.class_connection = self._get_a_database_connection()
         self.class_cursor = self._get_database_cursor(self.class_connection)
         
-        self.search_query_cid = self._get_cid(search_query)
+        self.search_query_cid = self.make_search_query_cid(search_query, self.mode, self._get_cid)
+
+    @staticmethod
+    def make_search_query_cid(search_query: str, mode: SearchMode, get_cid: Callable = get_cid) -> str:
+        """
+        Make the content ID that a search's results are cached under.
+
+        Each mode's results are cached separately. LLM mode keeps the original cids so existing cache entries still hit.
+
+        Args:
+            search_query: The search query, as the user typed it.
+            mode: The search mode.
+            get_cid: Makes a content ID from a string.
+
+        Returns:
+            str: The search query's content ID.
+        """
+        return get_cid(search_query if mode == SearchMode.LLM else f"{mode}:{search_query}")
 
     async def __aenter__(self) -> 'SearchFunction':
         """
         Async context manager entry point.
 
+        The query embedding is not fetched here. It is one of the stages
+        scheduled concurrently in `search`.
+
         Returns:
             The SearchFunction instance
         """
-        self.search_query_embedding = await self._get_single_embedding(self.search_query)
         return self
 
 
@@ -223,28 +300,25 @@ class SearchFunction:
         return self._get_data_from_sql(cursor, return_a=return_a, sql_query=sql_query, how_many=how_many)
 
 
-    def estimate_the_total_count_without_pagination(self, sql_query: str) -> int:
+    def estimate_the_total_count_without_pagination(self, sql_query: str, cursor: Optional[Any] = None) -> int:
         """
         Estimate the total count of records that would be returned by a SQL query.
         This is used to determine the total number of pages for pagination and 
         to provide count information to the client.
 
         Args:
-            sql_query: The SQL query whose results we want to count
+            sql_query: The SQL query whose results we want to count, without LIMIT or OFFSET
+            cursor: The cursor to count on. Defaults to the class cursor.
 
         Returns:
             int: Total number of records that would be returned by the query
         """
-        # First, estimate the total count without pagination
-        count_query = f"SELECT COUNT(*) AS total FROM ({sql_query}) as subquery"
-        self._estimate_the_total_count_without_pagination(self.class_cursor, count_query)
-        self.class_cursor.execute(count_query)
-        total: int = self.class_cursor.fetchone()[0]
+        total: int = self._estimate_the_total_count_without_pagination(cursor or self.class_cursor, sql_query)
         self.logger.info(f"Total results from SQL query: {total}")
         return total
 
 
-    def execute_the_actual_query_with_pagination(self, sql_query: str) -> list[dict[str, Any]]:
+    def execute_the_actual_query_with_pagination(self, sql_query: str, per_page: Optional[int] = None) -> list[dict[str, Any]]:
         """
         Executes the SQL query with pagination and formats the initial results.
 
@@ -252,94 +326,490 @@ class SearchFunction:
         processes the results to avoid duplicates, and formats them using the
         _format_initial_sql_return_from_search utility.
 
+        If per_page is given, the query is expected to ask for one row more than that
+        (see turn_english_into_sql). That extra row is dropped, and sets has_more.
+
         Args:
             sql_query: The SQL query to execute
+            per_page: The number of rows the query was written for
 
         Returns:
             list[dict]: Initial formatted results from the SQL query
         """
         self.class_cursor.execute(sql_query)
-        df_dict = self.class_cursor.fetchdf().to_dict('records')
-        for row in df_dict:
-            # Skip if the CID isn't there or if it's already in the set.
-            if "cid" not in row.keys() or row['cid'] in self.cid_set:
+        table: pa.Table = self.class_cursor.fetch_arrow_table()
+
+        # Only the cid column is read until a new cid turns up.
+        new_cid_found = False
+        if "cid" in table.column_names:
+            for cid in table.column("cid").to_pylist():
+                # Skip if it's already in the set.
+                if cid in self.cid_set:
                     continue
-            else:
-                self.logger.debug(f"Adding cid {row['cid']} to cid_set")
-                self.cid_set.add(row['cid'])
+                self.logger.debug(f"Adding cid {cid} to cid_set")
+                self.cid_set.add(cid)
+                new_cid_found = True
+                break
+        if not new_cid_found or "bluebook_cid" not in table.column_names:
+            table = table.schema.empty_table()
+
+        if per_page is not None:
+            self.has_more = table.num_rows > per_page
+            if self.has_more:
+                table = table.slice(0, per_page)
+        # Only the rows that are returned become Python dicts.
+        return [self._format_initial_sql_return_from_search(row) for row in table_rows(table)]
+
+
+    async def run_on_database(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a read-only database call without blocking the event loop.
 
-                initial_results: list[dict] = [
-                    self._format_initial_sql_return_from_search(row) 
-                    for row in df_dict if "bluebook_cid" in row.keys()
-                ]
-                return initial_results
+        If the database executor is running, func runs on one of its threads and gets
+        that thread's cursor as the `cursor` keyword. Otherwise func runs in a worker
+        thread without one, and opens its own connection.
 
+        Args:
+            func: The database call. It must accept a `cursor` keyword.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
 
-    async def execute_embedding_search(
-            self, 
-            initial_results: list[dict[str, Any]], 
-            cumulative_results: list,
-            batch_size: int = 1000
-            ) -> AsyncGenerator[list[dict], None]:
+        Returns:
+            Whatever func returns.
         """
-        Performs embedding-based similarity search and retrieves content for results.
-        
-        This async generator method processes the initial SQL results, calculates
-        embedding similarity scores for semantic ranking, retrieves HTML content for
-        matching documents, and yields incremental result updates to enable streaming.
-        
-        The algorithm:
-        1. For each batch of content IDs from the initial results:
-           a. Create a partial function for calculating cosine similarity with the query embedding
-           b. Run the similarity calculations in parallel using process pools
-           c. Sort the results by similarity score (highest first)
-           d. Add the scored results to the query_table_embedding_cids list
-           e. For each content ID in the results:
-              i. Find the corresponding row in the initial results
-              ii. Get the HTML content for the citation
-              iii. Add the HTML to the row if not already seen
-              iv. Add the expanded row to cumulative_results
-           f. Yield the current cumulative_results for incremental updates
-        
+        if self._db_executor is not None and self._db_executor.started:
+            return await self._db_executor.run(lambda cursor: func(*args, cursor=cursor, **kwargs))
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+    async def run_query_within_budget(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a query on the class cursor in a worker thread, within configs.QUERY_BUDGET_SECONDS.
+
+        The worker thread can't be cancelled, but its query can. If the budget runs out,
+        or the search is cancelled, the query is interrupted and waited for, so the cursor is free again.
+
+        Args:
+            func: Runs the query on the class cursor, e.g. execute_the_actual_query_with_pagination.
+            *args: Arguments for func.
+
+        Returns:
+            Whatever func returns.
+
+        Raises:
+            StageTimedOut: If the query ran over its budget.
+        """
+        query = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        try:
+            return await self.deadline.run("query", asyncio.shield(query))
+        except (StageTimedOut, asyncio.CancelledError):
+            self.class_cursor.interrupt()
+            await asyncio.gather(query, return_exceptions=True)
+            raise
+
+
+    async def score_candidates(
+            self,
+            initial_results: list[dict[str, Any]],
+            batch_size: int = 1000,
+            top_k: Optional[int] = None
+            ) -> AsyncGenerator[list[tuple[str, float]], None]:
+        """
+        Score the embeddings of the initial SQL results against the search query embedding.
+
+        If the per-state shards are loaded, only the shards the query is routed to are
+        searched: the state or municipality it names, or else the states whose centroid
+        is close to the query embedding (see GeoShardRouter). Candidates in other states are left out.
+        Otherwise, if the vector index is loaded, it is asked for the top-k embeddings restricted
+        to the cids in the initial results, and a single scored list is yielded.
+        If only the memory-mapped embedding matrix is loaded, the candidates' rows
+        are scored exactly with one matrix-vector product.
+        Otherwise, the embeddings are pulled from the database batch by batch and scored
+        with the batch cosine similarity kernel, yielding one scored list per batch.
+
+        Every path scores all the chunks of the candidates, then pools them into one score
+        per law with configs.CHUNK_POOLING, so each cid is yielded at most once.
+
         Args:
             initial_results: Initial results from the SQL query
-            cumulative_results: Accumulated results list to update incrementally
-            
+            batch_size: Number of embeddings to score per batch when falling back to the database.
+            top_k: Max number of scored results from the index or matrix. Defaults to configs.TOP_K.
+
         Yields:
-            list[dict]: Updated cumulative results after each batch of processing
+            list[tuple[str, float]]: (cid, cosine similarity) pairs, highest score first.
         """
+        top_k = top_k or self.configs.TOP_K
+        if self._geo_shards is not None:
+            yield self._geo_shards.search(
+                self.search_query_embedding,
+                top_k=top_k,
+                candidate_cids=[row['cid'] for row in initial_results],
+                threshold=self.configs.SIMILARITY_SCORE_THRESHOLD,
+                query_text=self.search_query,
+                pooling=self.configs.CHUNK_POOLING,
+            )
+            return
+
+        if self._vector_index is not None:
+            yield self._vector_index.search(
+                self.search_query_embedding,
+                top_k=top_k,
+                candidate_cids=[row['cid'] for row in initial_results],
+                threshold=self.configs.SIMILARITY_SCORE_THRESHOLD,
+                pooling=self.configs.CHUNK_POOLING,
+            )
+            return
+
+        if self._embedding_matrix is not None:
+            yield top_k_rows(
+                self._embedding_matrix,
+                self.search_query_embedding,
+                self._embedding_matrix.rows_for_cids(row['cid'] for row in initial_results),
+                top_k=top_k,
+                threshold=self.configs.SIMILARITY_SCORE_THRESHOLD,
+                pooling=self.configs.CHUNK_POOLING,
+            )
+            return
+
         # Get the embedding CIDs from the initial results, piece-meal.
-        # NOTE TESTING at batch_size=1000
         for embedding_id_list in get_embedding_cids(initial_results, batch_size=batch_size):
-            pull_list = []
             embedding_id_list: list[dict[str, str]]
 
-            embedding_func: Callable = functools.partial(
-                get_embedding_and_calculate_cosine_similarity,
-                query_embedding=self.search_query_embedding,
+            # Already ordered by cosine similarity score.
+            # The batches are split by law, so every chunk of a law is pooled in the same batch.
+            yield await asyncio.to_thread(
+                score_embeddings_from_db, embedding_id_list, self.search_query_embedding, self.configs.CHUNK_POOLING
+            )
+
+
+    async def hydrate_results(
+            self,
+            pull_list: list[tuple[str, float]],
+            rows_by_cid: dict[str, dict[str, Any]],
+            cumulative_results: list
+            ) -> None:
+        """
+        Add the HTML content to a batch of scored results, and append the new ones to cumulative_results.
+
+        The HTML for the whole batch is fetched with one query, rows are looked up by cid,
+        and rows whose HTML has already been returned are skipped by comparing content hashes.
+
+        Args:
+            pull_list: (cid, cosine similarity) pairs, highest score first.
+            rows_by_cid: Initial results from the SQL query, keyed by cid.
+            cumulative_results: Accumulated results list to update.
+        """
+        cids = [cid for cid, _ in pull_list if cid in rows_by_cid]
+        if not cids:
+            return
+        html_by_cid: dict[str, str] = await self.run_on_database(self._get_html_for_these_citations, cids)
+
+        for cid in cids:
+            html = html_by_cid.get(cid, "Content not available")
+            digest = html_digest(html)
+            if digest in self.html_hashes:
+                continue
+            self.html_hashes.add(digest)
+
+            row_dict = rows_by_cid[cid]
+            row_dict['html'] = html
+            cumulative_results.append(row_dict)
+
+
+    async def rank_by_embedding(
+            self,
+            candidates: list[dict[str, Any]],
+            batch_size: int = 1000
+            ) -> list[tuple[str, float]]:
+        """
+        Rank every candidate by the similarity of its embedding to the search query embedding.
+
+        Unlike score_candidates alone, the ranking isn't cut off at configs.TOP_K but at
+        configs.RESULT_CURSOR_MAX_RESULTS, so later pages can be sliced from it. With the
+        vector index, only candidates in the inverted lists closest to the query are scored,
+        see IvfFlatIndex.probe_candidates. Candidates under configs.SIMILARITY_SCORE_THRESHOLD
+        are still left out.
+
+        If scoring runs over configs.SCORING_BUDGET_SECONDS, the candidates scored
+        so far are ranked and the rest are left out.
+
+        Args:
+            candidates: Rows with a 'cid', e.g. the initial results from the SQL query.
+            batch_size: Number of embeddings to score per batch when falling back to the database.
+
+        Returns:
+            list[tuple[str, float]]: (cid, cosine similarity) pairs, highest score first.
+        """
+        ranking: list[tuple[str, float]] = []
+        try:
+            async with self.deadline.stage("scoring"):
+                async for pull_list in self.score_candidates(
+                    candidates, batch_size=batch_size, top_k=self.configs.RESULT_CURSOR_MAX_RESULTS
+                ):
+                    ranking.extend(pull_list)
+        except StageTimedOut:
+            self.logger.warning(f"Ranking {len(ranking)} of {len(candidates)} candidates, the rest weren't scored in time.")
+        if not ranking:
+            return ranking
+
+        # Each batch is already pooled per law. Keep the best score of a cid that was in several batches.
+        cids, scores = pool_chunk_scores(
+            np.asarray([cid for cid, _ in ranking], dtype=str),
+            np.asarray([score for _, score in ranking], dtype=np.float32),
+            method="max"
+        )
+        ranked = top_k_indices(scores, top_k=self.configs.RESULT_CURSOR_MAX_RESULTS)
+        return [(str(cids[i]), float(scores[i])) for i in ranked]
+
+
+    def get_lexical_candidates(self) -> list[tuple[str, float]]:
+        """
+        Rank laws against the search query with BM25 over the lexical index, without calling the LLM.
+
+        Returns:
+            list[tuple[str, float]]: (cid, BM25 score) pairs, highest score first.
+        """
+        candidates = self._lexical_search(
+            self.class_cursor, self.search_query, top_k=self.configs.LEXICAL_SEARCH_TOP_K
+        )
+        self.logger.info(f"Lexical search found {len(candidates)} candidates.")
+        return candidates
+
+
+    def get_citation_rows(self, cids: list[str], cursor: Optional[Any] = None) -> list[dict[str, Any]]:
+        """
+        Get the citation rows for a list of cids, formatted like the initial SQL results.
+
+        Args:
+            cids: The content IDs to get.
+            cursor: The cursor to look them up on. Defaults to the class cursor.
+
+        Returns:
+            list[dict]: Formatted citation rows, in the order of cids.
+        """
+        if self._citation_metadata is not None and self._citation_metadata.loaded:
+            table = self._citation_metadata.rows(cids)
+        else:
+            table = bulk_key_lookup(
+                cursor or self.class_cursor, cids,
+                table="citations", key_column="cid",
+                columns=CITATION_COLUMNS,
+                preserve_order=True,
+            )
+        return [self._format_initial_sql_return_from_search(row) for row in table.to_pylist()]
+
+
+    async def rank_lexical_candidates(self, lexical_ranking: list[tuple[str, float]]) -> list[tuple[str, float]]:
+        """
+        Rank the BM25 candidates for lexical and hybrid mode.
+
+        Lexical mode uses the BM25 ranking as is. Hybrid mode also ranks the BM25
+        candidates by embedding similarity, and combines both rankings with
+        reciprocal-rank fusion. If the query embedding isn't set, e.g. because it
+        didn't arrive in time, hybrid mode falls back to the BM25 ranking.
+
+        Args:
+            lexical_ranking: (cid, BM25 score) pairs from get_lexical_candidates.
+
+        Returns:
+            list[tuple[str, float]]: (cid, score) pairs, highest score first.
+        """
+        if self.mode != SearchMode.HYBRID or not lexical_ranking or self.search_query_embedding is None:
+            return lexical_ranking
+        semantic_ranking = await self.rank_by_embedding([{'cid': cid} for cid, _ in lexical_ranking])
+        return self._reciprocal_rank_fusion(lexical_ranking, semantic_ranking, k=self.configs.RRF_K)
+
+
+    def store_ranking(self, ranking: list[tuple[str, float]]) -> None:
+        """
+        Keep the full ranking of this search, so other pages can be sliced from it without searching again.
+
+        The ranking is also what sort_and_save_search_query_results caches in the database.
+        A ranking cut short by the deadline is neither kept nor cached.
+
+        Args:
+            ranking: (cid, score) pairs, highest score first.
+        """
+        if self.deadline.partial:
+            return
+        self.query_table_embedding_cids.extend(ranking)
+        if self._result_cursors is not None and ranking:
+            total = self.total_matches if self.total_matches is not None else self.total
+            self.cursor_token = self._result_cursors.put(
+                self.search_query_cid, ranking, total=total, total_is_exact=self.total_is_exact
+            )
+
+
+    def get_result_cursor(self, cursor_token: Optional[str] = None) -> Optional[ResultCursor]:
+        """
+        Get the stored ranking of this search, if there is one.
+
+        Args:
+            cursor_token: The cursor token from an earlier response. If it is missing,
+                unknown or expired, the latest ranking of the same search is used.
+
+        Returns:
+            Optional[ResultCursor]: The ranking, or None if the search has to be run.
+        """
+        if self._result_cursors is None:
+            return None
+        return self._result_cursors.get(cursor_token, search_query_cid=self.search_query_cid)
+
+
+    async def serve_from_cursor(self, result_cursor: ResultCursor, page: int, per_page: int) -> dict:
+        """
+        Get one page of a stored ranking, without searching again.
+
+        Args:
+            result_cursor: The stored ranking, from get_result_cursor.
+            page: The page number of results to retrieve (1-based)
+            per_page: The number of results per page
+
+        Returns:
+            dict: The formatted search response for the page.
+        """
+        self.cursor_token = result_cursor.token
+        self.total = len(result_cursor)
+        self.total_matches = result_cursor.total if result_cursor.total > len(result_cursor) else None
+        self.total_is_exact = result_cursor.total_is_exact
+        cumulative_results = []
+        await self.hydrate_page(result_cursor.page(page, per_page), cumulative_results)
+        return self.format_search_response(cumulative_results, page, per_page)
+
+
+    def find_similar_cached_query(self) -> Optional[SemanticCacheEntry]:
+        """
+        Find an earlier search in the same mode whose query embedding is close to this one's.
+
+        The query embedding must already be set.
+
+        Returns:
+            Optional[SemanticCacheEntry]: The earlier search, or None if there isn't one
+                above configs.SEMANTIC_CACHE_THRESHOLD.
+        """
+        if self._semantic_query_cache is None or self.search_query_embedding is None:
+            return None
+        match = self._semantic_query_cache.lookup(self.search_query_embedding, mode=self.mode)
+        if match is None:
+            return None
+        entry, similarity = match
+        self.logger.info(
+            f"Query '{self.search_query}' is similar to cached query '{entry.search_query}' ({similarity:.3f})."
+        )
+        return entry
+
+
+    async def get_similar_query_results(self, similar: SemanticCacheEntry, page: int, per_page: int) -> Optional[dict]:
+        """
+        Get one page of the ranking of a similar earlier search.
+
+        The in-memory ranking is used if it is still stored, otherwise the search_query table.
+        If neither has it, the earlier search is dropped from the semantic query cache.
+
+        Args:
+            similar: The earlier search, from find_similar_cached_query.
+            page: The page number of results to retrieve (1-based)
+            per_page: The number of results per page
+
+        Returns:
+            Optional[dict]: The formatted search response, or None if the ranking is gone.
+        """
+        if self._result_cursors is not None:
+            result_cursor = self._result_cursors.get(search_query_cid=similar.search_query_cid)
+            if result_cursor is not None:
+                # Later pages of this search then find the same ranking.
+                self._result_cursors.link(self.search_query_cid, result_cursor.token)
+                return await self.serve_from_cursor(result_cursor, page, per_page)
+
+        cached_results = await self.run_on_database(
+            self._get_cached_query_results, search_query_cid=similar.search_query_cid, page=page, per_page=per_page
+        )
+        if cached_results:
+            return cached_results
+
+        self.logger.debug(f"Ranking of cached query '{similar.search_query}' is gone. Dropping it.")
+        self._semantic_query_cache.discard(similar.search_query_cid)
+        return None
+
+
+    def add_to_semantic_query_cache(self) -> None:
+        """Let similar searches reuse this search's ranking."""
+        if self._semantic_query_cache is None or self.search_query_embedding is None:
+            return
+        if self.cursor_token is None:  # Nothing was ranked, or the ranking wasn't stored.
+            return
+        try:
+            self._semantic_query_cache.add(
+                self.search_query_cid, self.search_query, self.search_query_embedding, mode=self.mode
             )
+        except ValueError as e:
+            self.logger.warning(f"Could not add query '{self.search_query}' to the semantic query cache: {e}")
 
-            pull_list: list[tuple[str, float]] = await get_embeddings_in_parallel(embedding_func, embedding_id_list, pull_list)
-
-            # Order the pull list by their cosine similarity score.
-            pull_list = sorted(pull_list, key=lambda x: x[1], reverse=True)
-            #self.logger.debug(f"pull_list: {pull_list}: pull_list") 
-            self.query_table_embedding_cids.extend(pull_list)
-
-            for cid, _ in pull_list:
-                # Find the corresponding row in the initial results
-                for row_dict in initial_results:
-                    if row_dict['cid'] == cid:
-                        # Get the HTML content for this citation
-                        html: str = self._get_html_for_this_citation(row_dict)
-                        if html in self.html_set:
-                            continue
-                        else:
-                            self.html_set.add(html)
-                            row_dict['html'] = html
-                            cumulative_results.append(row_dict)
-                            break
-            yield cumulative_results
+
+    async def hydrate_page(
+            self,
+            page_ranking: list[tuple[str, float]],
+            cumulative_results: list,
+            rows_by_cid: Optional[dict[str, dict[str, Any]]] = None
+            ) -> None:
+        """
+        Get the rows and HTML for one page of a ranking, and append them to cumulative_results.
+
+        Args:
+            page_ranking: (cid, score) pairs for the page, highest score first.
+            cumulative_results: Accumulated results list to update
+            rows_by_cid: Rows already at hand, keyed by cid, e.g. the initial results from the SQL query.
+                The rows of any other cids are looked up with get_citation_rows.
+
+        If this runs over configs.HYDRATION_BUDGET_SECONDS, it stops,
+        and cumulative_results keeps the results added so far.
+        """
+        rows_by_cid = dict(rows_by_cid or {})
+        missing = [cid for cid, _ in page_ranking if cid not in rows_by_cid]
+        try:
+            async with self.deadline.stage("hydration"):
+                if missing:
+                    for row_dict in await self.run_on_database(self.get_citation_rows, missing):
+                        rows_by_cid.setdefault(row_dict['cid'], row_dict)
+                await self.hydrate_results(page_ranking, rows_by_cid, cumulative_results)
+        except StageTimedOut:
+            self.logger.warning(f"Returning {len(cumulative_results)} of {len(page_ranking)} results, the rest weren't fetched in time.")
+
+
+    async def finish_total_count(self, total_count: BackgroundCount, page: int, per_page: int) -> Optional[dict]:
+        """
+        Wait for the background count and update total_matches with it.
+
+        Only the first configs.RESULT_CURSOR_MAX_RESULTS rows are ranked, so the pages
+        still end with the ranking, and total and total_pages don't change.
+
+        The count is interrupted if it runs over configs.COUNT_BUDGET_SECONDS, counted from when it started.
+
+        Args:
+            total_count: The running count of the SQL query's rows.
+            page: The page number of results to retrieve (1-based)
+            per_page: The number of results per page
+
+        Returns:
+            Optional[dict]: A CountUpdate event, or None if the count failed or ran out of time.
+                total_matches then stays a lower bound.
+        """
+        try:
+            self.total_matches = await self.deadline.run("count", total_count.result(), since=total_count.started_at)
+        except Exception as e:
+            self.logger.warning(f"Could not count the total results: {e}")
+            return None
+        self.total_is_exact = True
+        self.logger.info(f"Total results from SQL query: {self.total_matches}")
+        if self._result_cursors is not None and self.cursor_token is not None:
+            self._result_cursors.set_total(self.cursor_token, self.total_matches)
+        return CountUpdate(
+            total=self.total,
+            total_matches=self.total_matches,
+            page=page,
+            per_page=per_page,
+            total_pages=self._calc_total_pages(self.total, per_page)
+        ).model_dump()
 
 
     def sort_and_save_search_query_results(self) -> None:
@@ -350,22 +820,24 @@ class SearchFunction:
         Returns:
             None
         """
-        if self.query_table_embedding_cids:
+        # Lexical searches have no query embedding, and are fast enough not to need caching.
+        if self.query_table_embedding_cids and self.search_query_embedding is not None:
             self._sort_and_save_search_query_results(
                 search_query_cid=self.search_query_cid,
                 search_query=self.search_query,
                 search_query_embedding=self.search_query_embedding,
                 query_table_embedding_cids=self.query_table_embedding_cids,
-                total=self.total
+                total=self.total_matches if self.total_matches is not None else self.total,
+                mode=self.mode,
             )
 
-    async def turn_english_into_sql(self, page: int, per_page: int) -> str:
+    async def turn_english_into_sql(self) -> str:
         """
         Convert a natural language query to a SQL query using the LLM.
 
-        Args:
-            page: The page number of results to retrieve (1-based)
-            per_page: The number of results per page
+        The query asks for the first configs.RESULT_CURSOR_MAX_RESULTS + 1 rows, not for one page.
+        They are all ranked at once, and every page is sliced from that ranking.
+        The extra row tells whether there are more rows, without counting every row first.
 
         Returns:
             str: A SQL query string generated by the LLM
@@ -375,11 +847,10 @@ class SearchFunction:
                           fails to produce a valid query
         """
         try:
-            offset = (page - 1) * per_page
             sql_query = await self._turn_english_into_sql(
                 search_query=self.search_query,
-                per_page=per_page,
-                offset=offset,
+                per_page=self.configs.RESULT_CURSOR_MAX_RESULTS + 1, # Probe for more rows.
+                offset=0,
                 llm=self.llm,
                 parser=self._LLMSqlOutput
             )
@@ -394,7 +865,18 @@ class SearchFunction:
             return sql_query
 
 
-    def get_cached_query_results(self, page: int = 1, per_page: int = 20) -> dict[str, Any] | None:
+    async def get_search_query_embedding(self) -> list[float]:
+        """
+        Get the vector embedding of the search query from the LLM.
+
+        Returns:
+            list[float]: The search query embedding
+        """
+        self.search_query_embedding = await self._get_single_embedding(self.search_query)
+        return self.search_query_embedding
+
+
+    def get_cached_query_results(self, page: int = 1, per_page: int = 20, cursor: Optional[Any] = None) -> dict[str, Any] | None:
         """
         Retrieve previously cached search results for the current query.
         
@@ -413,6 +895,7 @@ class SearchFunction:
         Args:
             page: The page number of results to retrieve (1-based)
             per_page: The number of results per page
+            cursor: Optional cursor to look them up on. Without one, the lookup opens its own connection.
             
         Returns:
             dict[str, Any] | None: The cached search results if found, otherwise None
@@ -424,7 +907,8 @@ class SearchFunction:
             cached_results = self._get_cached_query_results(
                 search_query_cid=self.search_query_cid,
                 page=page,
-                per_page=per_page
+                per_page=per_page,
+                cursor=cursor
             )
             if cached_results is not None and len(cached_results) > 0:
                 self.logger.info(f"Cached results found for query '{self.search_query}'.\nReturning cached results...")
@@ -463,9 +947,13 @@ class SearchFunction:
         search_response: SearchResponse = SearchResponse(
             results=cumulative_results.copy(),
             total=self.total,
+            total_matches=self.total_matches,
             page=page,
             per_page=per_page,
-            total_pages=self._calc_total_pages(self.total, per_page)
+            total_pages=self._calc_total_pages(self.total, per_page),
+            total_is_exact=self.total_is_exact,
+            cursor=self.cursor_token,
+            partial=self.deadline.partial,
         )
         self.logger.debug(f"Sorting search response by cosine similarity score...")
         #search_response.order_by_cosine_similarity_score()
@@ -541,7 +1029,35 @@ class SearchFunction:
         return (total + per_page - 1) // per_page
 
 
-    async def search(self, page: int = 1, per_page: int = 20, batch_size: int = 1000, client_id: Optional[str] = None) -> AsyncGenerator[dict, None]:
+    def save_search_history(self, client_id: Optional[str], result_count: int) -> None:
+        """
+        Save the search to the user's search history.
+
+        The query is saved as typed, so its cid can be made again from it (see warm_cache.py).
+        The entry is only queued for the search cache writer, so this is safe to call on the event loop.
+
+        Args:
+            client_id: Client identifier for search history tracking. Nothing is saved if it is None.
+            result_count: The total number of results of the search.
+        """
+        if client_id:
+            from utils.app.search.save_search_history import save_search_history
+            save_search_history(
+                search_query_cid=self.search_query_cid,
+                search_query=self.search_query_as_typed,
+                client_id=client_id,
+                result_count=result_count
+            )
+
+
+    async def search(self,
+                     page: int = 1,
+                     per_page: int = 20,
+                     batch_size: int = 1000,
+                     client_id: Optional[str] = None,
+                     cursor: Optional[str] = None,
+                     use_cache: bool = True
+                     ) -> AsyncGenerator[dict, None]:
         """
         Search for citations in the database using a natural language query.
         
@@ -556,158 +1072,305 @@ class SearchFunction:
         6. Stream results incrementally to enable responsive UI
         7. Cache results for future use
         8. Save the search to the user's search history
+
+        Steps 1-3 and fetching the query embedding are independent, so they are
+        started together by a StageScheduler rather than awaited one after another.
+
+        Step 5 ranks every candidate, not one page. The ranking is kept in the
+        ResultCursorStore, and its token is returned as `cursor`. If this search
+        has a stored ranking, the requested page is sliced from it and hydrated,
+        and none of the steps above run again.
+
+        This describes "llm" mode. In "lexical" and "hybrid" mode, steps 2-4 are replaced
+        by a BM25 search over the lexical index (see rank_lexical_candidates). Lexical mode
+        makes no LLM calls and skips the cache, and hybrid mode fuses the BM25 and embedding ranks.
+
+        Every stage has a time budget within an overall deadline (see Deadline and
+        configs.SEARCH_DEADLINE_SECONDS). A stage that runs over is cut off, and the
+        search returns what it has ranked by then, with `partial` set to True. A count
+        that runs over only leaves `total_is_exact` False.
         
         The algorithm in detail:
-        1. Check for cached results in the search_query table
-           - If found, yield them and return early
-        2. Determine user intent using the LLM
-           - Reject inappropriate queries or non-search requests
-        3. Convert the natural language query to SQL using the LLM
-        4. Count total matching records for pagination
-        5. Execute the SQL query with pagination
-        6. For each batch of results:
-           a. Calculate embedding similarities
-           b. Retrieve HTML content
-           c. Yield incremental results for streaming
-        7. Close database connections
-        8. Sort and cache results for future use
-        9. Save the search to the user's search history if client_id is provided
-        10. Yield final complete results
+        1. If this search has a stored ranking, yield the requested page of it and return early
+        2. Start the cache lookup, intent check, SQL generation and query embedding concurrently
+        3. Wait for the cache lookup
+           - If found, cancel the LLM stages, yield the cached results and return early
+           - Otherwise, wait for the query embedding and look for a similar earlier search
+             in the SemanticQueryCache. If its ranking is still stored, yield a page of it and return early
+        4. Wait for the user intent
+           - Reject inappropriate queries or non-search requests.
+             This cancels SQL generation and the query embedding.
+        5. Wait for the SQL query, then execute it for one row more than configs.RESULT_CURSOR_MAX_RESULTS
+           - If there are more rows, count the total matching records in the background
+        6. Rank every row by embedding similarity and store the ranking
+        7. Retrieve the HTML content of the requested page and yield it
+        8. Yield a count_update event with the exact number of matching rows once the count finishes
+        9. Close database connections
+        10. Sort and cache results for future use
+        11. Save the search to the user's search history if client_id is provided
+        12. Yield final complete results, with `partial` and the `deadline` report
         
         Args:
             page: The page number of results to retrieve (1-based)
             per_page: The number of results per page
             client_id: Optional client identifier for search history tracking
+            cursor: Optional cursor token from an earlier response for the same search
+            use_cache: False to run the full search even if it, or a similar one, is cached,
+                e.g. to replace a stale ranking. The new ranking is cached either way.
             
         Yields:
-            dict: Search response containing results, pagination info, and totals
+            dict: Search response containing results, pagination info, totals and the cursor token.
+                `total` and `total_pages` cover the ranked results. If the SQL query matched more rows
+                than configs.RESULT_CURSOR_MAX_RESULTS, `total_matches` has how many.
+                If they are still being counted, `total_is_exact` is False and a
+                CountUpdate dict (with "event": "count_update") follows later.
+                The final one also has `partial` and `deadline`, see Deadline.report.
+
+        Raises:
+            HTTPException: If the query is inappropriate or not a search request
             
         Notes:
             This method yields incremental updates to enable streaming results
             to the client for a more responsive user experience.
         """
         self.logger.info(f"Received request for search at {datetime.now()}")
- 
-        # Check if the query already exists in the search_query table
-        # If they do, yield the cached results and return.
-        cached_results = self.get_cached_query_results(page, per_page)
-        if cached_results:
-            # If we have cached results and a client ID, save to search history
-            if client_id:
-                from utils.app.search.save_search_history import save_search_history
-                save_search_history(
-                    search_query_cid=self.search_query_cid,
-                    search_query=self.search_query,
-                    client_id=client_id,
-                    result_count=cached_results.get('total', 0)
-                )
-            yield cached_results
-            return # Return to prevent a full embedding search.
 
-        try:
-            await self.figure_out_what_the_user_wants(self.search_query)
-        except Exception as e:
-            # If the user intent is not a search, we tell the user to try again.
-            # TODO Implement this
-            self.logger.error(f"Error determining user intent: {e}")
-
-        sql_query = await self.turn_english_into_sql(page, per_page)
-
-        self.total = self.estimate_the_total_count_without_pagination(sql_query)
+        use_llm_sql = self.mode == SearchMode.LLM
+        refresh = not use_cache
+        use_cache = use_cache and self.mode != SearchMode.LEXICAL
         cumulative_results = []
 
-        if self.total != 0:
-            self.logger.debug(f"self.total: {self.total}")
-            initial_results = self.execute_the_actual_query_with_pagination(sql_query)
-            if initial_results:
-                async for cumulative_results in self.execute_embedding_search(initial_results, cumulative_results):
-                    search_response = self.format_search_response(cumulative_results, page, per_page)
-                    yield search_response
-
-        # NOTE we call close_cursor_and_connection because duckdb only allows concurrency for read-only connections.
-        # TODO Create separate database for intermediate cached results.
+        # Later pages of a recent search are sliced from its stored ranking.
+        result_cursor = self.get_result_cursor(cursor) if not refresh else None
+        if result_cursor is not None:
+            self.logger.info(f"Serving page {page} of query '{self.search_query}' from its stored ranking.")
+            search_response = await self.serve_from_cursor(result_cursor, page, per_page)
+            self.save_search_history(client_id, self.total)
+            yield search_response
+            return
+
+        async with StageScheduler(logger=self.logger) as stages:
+            # The cache lookup races the other stages. A rejected intent cancels the other LLM calls.
+            # Lexical and hybrid mode replace the intent check and SQL generation with BM25.
+            # Each stage is cut off if it runs over its budget, see Deadline.
+            if use_cache:
+                stages.add("cache", lambda: self.run_on_database(self.get_cached_query_results, page, per_page))
+            if use_llm_sql:
+                stages.add(
+                    "intent", lambda: self.deadline.run("intent", self.figure_out_what_the_user_wants(self.search_query)),
+                    cancels_on_failure=["sql", "embedding"]
+                )
+                stages.add("sql", lambda: self.deadline.run("sql", self.turn_english_into_sql()))
+            else:
+                stages.add("lexical", lambda: self.run_query_within_budget(self.get_lexical_candidates))
+            if self.mode != SearchMode.LEXICAL:
+                stages.add("embedding", lambda: self.deadline.run("embedding", self.get_search_query_embedding()))
+            if use_cache:
+                stages.add(
+                    "similar_query", lambda embedding: asyncio.to_thread(self.find_similar_cached_query),
+                    depends_on=["embedding"]
+                )
+            stages.start()
+
+            try:
+                # Check if the query already exists in the search_query table
+                # If they do, yield the cached results and return.
+                cached_results = await stages.result("cache") if use_cache else None
+                if cached_results:
+                    stages.cancel("intent", "sql", "lexical", "embedding", "similar_query")
+                    # If we have cached results and a client ID, save to search history
+                    self.save_search_history(client_id, cached_results.get('total', 0))
+                    yield cached_results
+                    return # Return to prevent a full embedding search.
+
+                # Then reuse the ranking of an earlier search that means the same thing.
+                try:
+                    similar = await stages.result("similar_query") if use_cache else None
+                except StageTimedOut:
+                    similar = None  # The query embedding didn't arrive in time.
+                if similar is not None:
+                    if self.mode == SearchMode.HYBRID:
+                        # The lexical stage uses the class cursor, which serving the page needs too.
+                        await stages.result("lexical")
+                    similar_results = await self.get_similar_query_results(similar, page, per_page)
+                    if similar_results is not None:
+                        stages.cancel("intent", "sql")
+                        self.save_search_history(client_id, similar_results.get('total', 0))
+                        yield similar_results
+                        return
+
+                if use_llm_sql:
+                    # If the user intent is not a search, this raises and the SQL and embedding stages are cancelled.
+                    await stages.result("intent")
+
+                    sql_query = await stages.result("sql")
+
+                    # Rank every candidate from a LIMIT+1 probe. If there are more rows, count them in the background.
+                    max_results = self.configs.RESULT_CURSOR_MAX_RESULTS
+                    initial_results = await self.run_query_within_budget(
+                        self.execute_the_actual_query_with_pagination, sql_query, max_results
+                    )
+                    # The pages end with the ranking. With more rows, the count of all of them is reported apart.
+                    self.total = len(initial_results)
+                    self.total_matches = len(initial_results) + 1 if self.has_more else None
+                    self.total_is_exact = not self.has_more
+                    self.logger.debug(f"self.total: {self.total}, matches: {self.total_matches} (exact: {self.total_is_exact})")
+
+                    total_count = None
+                    if self.has_more:
+                        total_count = BackgroundCount(
+                            self.class_connection, strip_pagination(sql_query),
+                            self._estimate_the_total_count_without_pagination, logger=self.logger
+                        )
+                        total_count.start()
+                    try:
+                        if initial_results:
+                            await stages.result("embedding")
+                            ranking = await self.rank_by_embedding(initial_results, batch_size=batch_size)
+                            self.total = len(ranking)
+                            self.store_ranking(ranking)
+
+                            # Keep the first row for each cid.
+                            rows_by_cid: dict[str, dict[str, Any]] = {}
+                            for row_dict in initial_results:
+                                rows_by_cid.setdefault(row_dict['cid'], row_dict)
+
+                            page_ranking = ranking[(page - 1) * per_page:page * per_page]
+                            if page_ranking:
+                                await self.hydrate_page(page_ranking, cumulative_results, rows_by_cid)
+                                yield self.format_search_response(cumulative_results, page, per_page)
+                        if total_count is not None:
+                            count_update = await self.finish_total_count(total_count, page, per_page)
+                            if count_update is not None:
+                                yield count_update
+                    finally:
+                        # Stops the count if the client disconnected.
+                        if total_count is not None:
+                            await total_count.cancel()
+                else:
+                    lexical_ranking = await stages.result("lexical")
+                    if self.mode == SearchMode.HYBRID:
+                        try:
+                            await stages.result("embedding")
+                        except StageTimedOut:
+                            pass  # Rank by BM25 alone.
+                    ranking = await self.rank_lexical_candidates(lexical_ranking)
+                    self.total = len(ranking)
+                    self.store_ranking(ranking)
+
+                    page_ranking = ranking[(page - 1) * per_page:page * per_page]
+                    if page_ranking:
+                        await self.hydrate_page(page_ranking, cumulative_results)
+                        yield self.format_search_response(cumulative_results, page, per_page)
+            except StageTimedOut as e:
+                # Nothing can be ranked without this stage. Return what there is.
+                self.logger.warning(f"Search for '{self.search_query}' stopped at stage '{e.stage}': {e}")
+
+        # Return the connection to the pool now. Saving the results only queues them for the search cache writer.
         self.close_cursor_and_connection()
 
-        self.sort_and_save_search_query_results()
+        await asyncio.to_thread(self.sort_and_save_search_query_results)
+        self.add_to_semantic_query_cache()
         
         # Save search to history if client_id is provided and we have results
-        if client_id and self.total > 0:
-            from utils.app.search.save_search_history import save_search_history
-            save_search_history(
-                search_query_cid=self.search_query_cid,
-                search_query=self.search_query,
-                client_id=client_id,
-                result_count=self.total
-            )
+        if self.total > 0:
+            self.save_search_history(client_id, self.total)
 
-        # Final yield with complete results
+        # Final yield with complete results, and how the time budgets were spent
         yield {
             'results': cumulative_results,
             'total': self.total,
+            'total_matches': self.total_matches,
             'page': page,
             'per_page': per_page,
-            'total_pages': self._calc_total_pages(self.total, per_page)
+            'total_pages': self._calc_total_pages(self.total, per_page),
+            'total_is_exact': self.total_is_exact,
+            'cursor': self.cursor_token,
+            'partial': self.deadline.partial,
+            'deadline': self.deadline.report(),
         }
 
 
+# Identical searches that are running at the same time share one run.
+SEARCH_FLIGHTS = SingleFlight()
+
+
 resources = {
-    'async_run_in_process_pool': async_run_in_process_pool,
+    'citation_metadata': CITATION_METADATA,
     'close_database_connection': close_database_connection,
     'close_database_cursor': close_database_cursor,
+    'db_executor': DB_EXECUTOR,
+    'embedding_matrix': EMBEDDING_MATRIX,
     'determine_user_intent': LLM.determine_user_intent,
     'estimate_the_total_count_without_pagination': estimate_the_total_count_without_pagination,
     'format_initial_sql_return_from_search': format_initial_sql_return_from_search,
+    'geo_shards': GEO_SHARD_ROUTER,
     'get_a_database_connection': get_a_database_connection,
     'get_cached_query_results': get_cached_query_results,
     'get_cid': get_cid,
     'get_data_from_sql': get_data_from_sql,
     'get_database_cursor': get_database_cursor,
-    'get_embedding_and_calculate_cosine_similarity': get_embedding_and_calculate_cosine_similarity,
     'get_embedding_cids': get_embedding_cids,
-    'get_html_for_this_citation': get_html_for_this_citation,
+    'get_html_for_these_citations': get_html_for_these_citations,
     'get_single_embedding': LLM.get_single_embedding,
     'LLM': LLM,
+    'lexical_search': lexical_search,
     'LLMSqlOutput': LLMSqlOutput,
     'make_search_query_table_if_it_doesnt_exist': make_search_query_table_if_it_doesnt_exist,
+    'reciprocal_rank_fusion': reciprocal_rank_fusion,
+    'result_cursors': RESULT_CURSOR_STORE,
+    'semantic_query_cache': SEMANTIC_QUERY_CACHE,
+    'single_flight': SEARCH_FLIGHTS,
     'sort_and_save_search_query_results': sort_and_save_search_query_results,
-    'turn_english_into_sql': turn_english_into_sql
+    'turn_english_into_sql': turn_english_into_sql,
+    'vector_index': VECTOR_INDEX,
 }
 
 
-def _make_cid_list(embedding_id_list: list[tuple[str, str]], cid_name: str) -> str:
-    cid_list = [
-        f" {cid_name} = '{cid[cid_name].strip()}'" if i == 1 else f" OR {cid_name} = '{cid[cid_name].strip()}'"
-        for i, cid in enumerate(embedding_id_list, start=1)
-    ]
-    cid_list = ''.join(cid_list)
-    return cid_list
+def _pull_embeddings_from_db(embedding_cids: list[str]) -> tuple[list[str], np.ndarray]:
 
-def _pull_embeddings_from_db(embedding_id_list: list[tuple[str, str]]) -> list[dict]:
-
-    # Create the SQL query to pull the embeddings from the database.
-    query = "SELECT embedding, cid FROM embeddings WHERE" + embedding_id_list
-
-    # Pull the embeddings from the database as a list of dictionaries.
+    # Pull the embeddings from the database as Arrow, then view them as one (N, D) matrix.
     with duckdb.connect(configs.AMERICAN_LAW_DATA_DIR / "embeddings.db", read_only=True) as conn:
         with conn.cursor() as cursor:
-            cursor.execute(query)
-            return cursor.fetchdf().to_dict(orient='records')
-
-# NOTE We need to do this to get around pickling errors.
-async def get_embeddings_in_parallel(
-        func: Callable, 
-        embedding_id_list: list[dict[str, str]], 
-        pull_list: list
+            table = bulk_key_lookup(
+                cursor, embedding_cids,
+                table="embeddings", key_column="embedding_cid", columns=["cid", "embedding"]
+            )
+
+    cids: list[str] = table.column("cid").to_pylist()
+    return cids, embedding_matrix(table.column("embedding"))
+
+
+def score_embeddings_from_db(
+        embedding_id_list: list[dict[str, str]],
+        query_embedding: list[float],
+        pooling: Optional[PoolingMethod] = None
         ) -> list[tuple[str, float]]:
+    """
+    Pull a batch of embeddings from the database and score them against the query in one go.
 
-    cid_list = _make_cid_list(embedding_id_list, "embedding_cid")
+    Args:
+        embedding_id_list: Dictionaries with the embedding_cid of each embedding to score.
+        query_embedding: The search query embedding.
+        pooling: If given, pool the chunk scores of each law with this method before
+            applying the threshold, see pool_chunk_scores.
+
+    Returns:
+        list[tuple[str, float]]: (cid, cosine similarity) pairs above configs.SIMILARITY_SCORE_THRESHOLD,
+            highest score first.
+    """
+    cids, embeddings = _pull_embeddings_from_db([row["embedding_cid"] for row in embedding_id_list])
+    if not cids:
+        return []
 
-    embeddings_with_cids = _pull_embeddings_from_db(cid_list) # -> list[dict[str, str|float]]
+    if pooling is None:
+        scores, selected = batch_cosine_similarity(query_embedding, embeddings)
+        return [(cids[i], float(scores[i])) for i in selected]
 
-    async for _, embedding_id in async_run_in_process_pool(func, embeddings_with_cids):
-        if embedding_id is not None:
-            pull_list.append(embedding_id)
-    return pull_list
+    scores, _ = batch_cosine_similarity(query_embedding, embeddings, threshold=None)
+    law_cids, law_scores = pool_chunk_scores(np.asarray(cids, dtype=str), scores, method=pooling)
+    selected = top_k_indices(law_scores, threshold=configs.SIMILARITY_SCORE_THRESHOLD)
+    return [(str(law_cids[i]), float(law_scores[i])) for i in selected]
 
 
 async def function(
@@ -717,6 +1380,8 @@ async def function(
     client_id: str = None,
     logger: logging.Logger = module_logger,
     llm: AsyncLLMInterface = LLM,
+    mode: Optional[str] = None,
+    cursor: Optional[str] = None,
 ) -> AsyncGenerator[dict[str, Any], None]:
     """
     API endpoint for searching the American law database using natural language.
@@ -730,20 +1395,25 @@ async def function(
     - Semantic ranking with embeddings
     - Cached results for performance
     - Streaming results for responsiveness
-    - Pagination support
+    - Pagination support, with later pages sliced from the stored ranking of the search
     - Search history tracking (when client_id is provided)
+    - Identical searches in flight at the same time share one run
     
     The algorithm:
-    1. Create a SearchFunction instance with the query and dependencies
-    2. Use the SearchFunction as an async context manager
-    3. Stream results from the search method to the client
-    4. Save the search to history if client_id is provided
+    1. Key the request by the content ID of its normalized query and mode, plus page and per_page
+    2. If a search with the same key is running, stream its results from the start and skip to step 6
+    3. Otherwise, create a SearchFunction instance with the query and dependencies
+    4. Use the SearchFunction as an async context manager
+    5. Stream results from the search method to the client, and to every request that joins it
+    6. Save the search to history if client_id is provided
     
     Args:
         q: The natural language search query
         page: The page number of results to retrieve (1-based)
         per_page: The number of results per page
         client_id: Optional client identifier for search history tracking
+        mode: "lexical", "llm" or "hybrid". Defaults to configs.SEARCH_MODE.
+        cursor: Optional cursor token from an earlier response for the same search
         
     Yields:
         dict: Search response containing results, pagination info, and totals
@@ -751,10 +1421,45 @@ async def function(
     Example:
         ```
         GET /api/search?q=zoning laws in California&page=1&per_page=20
+        GET /api/search?q=zoning laws in California&page=2&per_page=20&cursor=<cursor from page 1>
         ```
     """
     resources['logger'] = logger
     resources['LLM'] = llm
-    async with SearchFunction(search_query=q, resources=resources, configs=configs) as search_func:
-        async for result in search_func.search(page=page, per_page=per_page, client_id=client_id):
+    ran_search = False
+
+    async def _search() -> AsyncGenerator[dict[str, Any], None]:
+        nonlocal ran_search
+        ran_search = True
+        # Checking out a pooled connection can wait for another search to release one, so do it off the event loop.
+        search_function = await asyncio.to_thread(
+            SearchFunction, search_query=q, resources=resources, configs=configs, mode=mode
+        )
+        async with search_function as search_func:
+            async for result in search_func.search(page=page, per_page=per_page, client_id=client_id, cursor=cursor):
+                yield result
+
+    single_flight: Optional[SingleFlight] = resources.get('single_flight')
+    if single_flight is None or not q.strip():
+        async for result in _search():
             yield result
+        return
+
+    search_mode = SearchMode(mode or configs.SEARCH_MODE)
+    normalized_query = " ".join(q.lower().split())
+    key = (resources['get_cid'](f"{search_mode}:{normalized_query}"), page, per_page)
+
+    final_result = None
+    async for result in single_flight.stream(key, _search):
+        final_result = result
+        yield result
+
+    # The search that ran saved its own client's history.
+    if not ran_search and client_id and final_result is not None and final_result.get('total', 0) > 0:
+        from utils.app.search.save_search_history import save_search_history
+        save_search_history(
+            search_query_cid=SearchFunction.make_search_query_cid(q, search_mode, resources['get_cid']),
+            search_query=q,
+            client_id=client_id,
+            result_count=final_result['total']
+        )
@@ -46,7 +46,10 @@ def make_read_only_db(mock_resources: dict[str, Callable] = None, mock_configs:
         "get_cursor": _resources.pop("get_cursor", DuckDbDatabase.get_cursor),
         "rollback": _resources.pop("rollback", DuckDbDatabase.rollback),
         "read_only": _resources.pop("read_only", True),  # Set read_only to True for read-only access
+        "db_path": _resources.pop("db_path", configs.AMERICAN_LAW_DB_PATH),
         "logger": _resources.pop("logger", module_logger),
+        # READ_ONLY_DB is made on import. The app's lifespan opens its connections, in each server worker.
+        "warm_up_on_init": _resources.pop("warm_up_on_init", False),
     }
 
     for key in _resources.keys():
@@ -1,15 +1,25 @@
 from .citation_row import CitationRow
+from .count_update import CountUpdate
 from .embeddings_row import EmbeddingsRow
 from .error_response import ErrorResponse
 from .html_row import HtmlRow
 from .law_item import LawItem
+from .results_delta import RankChange, RankedResult, ResultsDelta
+from .results_snapshot import ResultsSnapshot
+from .search_mode import SearchMode
 from .search_response import SearchResponse
 
 __all__ = [
     "CitationRow",
+    "CountUpdate",
     "ErrorResponse"
     "EmbeddingsRow",
     "HtmlRow",
     "LawItem",
+    "RankChange",
+    "RankedResult",
+    "ResultsDelta",
+    "ResultsSnapshot",
+    "SearchMode",
     "SearchResponse"
 ]
@@ -0,0 +1,24 @@
+from typing import Literal
+
+
+from pydantic import BaseModel
+
+
+class CountUpdate(BaseModel):
+    """
+    The exact number of matching laws, sent after the first results when counting them took longer.
+
+    Attributes:
+        event (str): Always "count_update". The SSE endpoint uses it as the event name.
+        total (int): Total number of results that can be paged through. Only the first ones matched are ranked.
+        total_matches (int): Number of laws the search matched.
+        page (int): Current page number.
+        per_page (int): Number of items per page.
+        total_pages (int): Total number of pages, up to the end of the ranked results.
+    """
+    event: Literal["count_update"] = "count_update"
+    total: int
+    total_matches: int
+    page: int
+    per_page: int
+    total_pages: int
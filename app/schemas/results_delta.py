@@ -0,0 +1,64 @@
+from typing import Any, Literal, Optional
+
+
+from pydantic import BaseModel
+
+
+class RankedResult(BaseModel):
+    """
+    A search result and where it goes in the results.
+
+    Attributes:
+        rank (int): 1-based position of the result across all pages.
+        result (dict[str, Any]): The search result, HTML included.
+    """
+    rank: int
+    result: dict[str, Any]
+
+
+class RankChange(BaseModel):
+    """
+    A search result the client already has, at a new position.
+
+    Attributes:
+        cid (str): Content ID of the result.
+        rank (int): Its new 1-based position across all pages.
+    """
+    cid: str
+    rank: int
+
+
+class ResultsDelta(BaseModel):
+    """
+    The changes to the search results since the previous event, for version 2 of the SSE protocol.
+
+    Results the client already has are only sent again by cid if their rank changed.
+
+    Attributes:
+        event (str): Always "results_delta". The SSE endpoint uses it as the event name.
+        version (int): The SSE protocol version.
+        added (list[RankedResult]): New results.
+        moved (list[RankChange]): Results that were re-ranked.
+        removed (list[str]): Content IDs of results that are no longer in the results.
+        total (int): Total number of results that can be paged through.
+        total_matches (Optional[int]): Number of laws the search matched, if more than could be ranked, see SearchResponse.
+        page (int): Current page number.
+        per_page (int): Number of items per page.
+        total_pages (int): Total number of pages.
+        total_is_exact (bool): False if total_matches is only a lower bound because the count is still running.
+        cursor (Optional[str]): Token for the ranking of this search, see SearchResponse.
+        partial (bool): True if a stage of the search ran out of time, see SearchResponse.
+    """
+    event: Literal["results_delta"] = "results_delta"
+    version: int = 2
+    added: list[RankedResult]
+    moved: list[RankChange]
+    removed: list[str]
+    total: int
+    total_matches: Optional[int] = None
+    page: int
+    per_page: int
+    total_pages: int
+    total_is_exact: bool = True
+    cursor: Optional[str] = None
+    partial: bool = False
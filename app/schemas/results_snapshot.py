@@ -0,0 +1,38 @@
+from typing import Any, Literal, Optional
+
+
+from pydantic import BaseModel
+
+
+class ResultsSnapshot(BaseModel):
+    """
+    The final order of the search results, sent once at the end of a version 2 SSE stream.
+
+    The results themselves were already sent in ResultsDelta events.
+
+    Attributes:
+        event (str): Always "results_snapshot". The SSE endpoint uses it as the event name.
+        version (int): The SSE protocol version.
+        cids (list[str]): Content IDs of the results, in order.
+        total (int): Total number of results that can be paged through.
+        total_matches (Optional[int]): Number of laws the search matched, if more than could be ranked, see SearchResponse.
+        page (int): Current page number.
+        per_page (int): Number of items per page.
+        total_pages (int): Total number of pages.
+        total_is_exact (bool): False if total_matches is only a lower bound.
+        cursor (Optional[str]): Token for the ranking of this search, see SearchResponse.
+        partial (bool): True if a stage of the search ran out of time, see SearchResponse.
+        deadline (Optional[dict[str, Any]]): The time budgets of the search and how they were spent, see SearchResponse.
+    """
+    event: Literal["results_snapshot"] = "results_snapshot"
+    version: int = 2
+    cids: list[str]
+    total: int
+    total_matches: Optional[int] = None
+    page: int
+    per_page: int
+    total_pages: int
+    total_is_exact: bool = True
+    cursor: Optional[str] = None
+    partial: bool = False
+    deadline: Optional[dict[str, Any]] = None
@@ -0,0 +1,15 @@
+from enum import StrEnum
+
+
+class SearchMode(StrEnum):
+    """
+    How SearchFunction finds candidate laws.
+
+    Attributes:
+        LEXICAL: BM25 over the lexical index only. No LLM calls.
+        LLM: The LLM turns the query into SQL, then results are ranked by embedding similarity.
+        HYBRID: BM25 candidates, re-ranked by fusing BM25 and embedding ranks.
+    """
+    LEXICAL = "lexical"
+    LLM = "llm"
+    HYBRID = "hybrid"
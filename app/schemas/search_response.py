@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Optional
 
 
 from pydantic import BaseModel
@@ -9,16 +9,27 @@ class SearchResponse(BaseModel):
     """
     Attributes:
         results (List[Dict[str, Any]]): List of search results.
-        total (int): Total number of results.
+        total (int): Total number of results that can be paged through.
+        total_matches (Optional[int]): Number of laws the search matched, if more than could be ranked. None otherwise.
         page (int): Current page number.
         per_page (int): Number of items per page.
-        total_pages (int): Total number of pages.
+        total_pages (int): Total number of pages, up to the end of the ranked results.
+        total_is_exact (bool): False if total_matches is only a lower bound because the count is still running.
+            The exact number then follows in a CountUpdate.
+        cursor (Optional[str]): Token for the ranking of this search. Send it back to get other pages without searching again.
+        partial (bool): True if a stage of the search ran out of time, so the results are only the ones found by then. A slow count only leaves total_is_exact False.
+        deadline (Optional[dict[str, Any]]): The time budgets of the search and how they were spent. Only in the final response.
     """
     results: list[dict[str, Any]]
     total: int
+    total_matches: Optional[int] = None
     page: int
     per_page: int
     total_pages: int
+    total_is_exact: bool = True
+    cursor: Optional[str] = None
+    partial: bool = False
+    deadline: Optional[dict[str, Any]] = None
 
     def order_by_cosine_similarity_score(self) -> None:
         """
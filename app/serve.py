@@ -0,0 +1,227 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Production entry point: load the read-only state once, then fork the server workers.
+
+`python app.py` runs one uvicorn process with reload, for development. `uvicorn --workers N`
+starts every worker as a new process that imports the app itself, so each of them loads
+its own copy of the shared state and opens its own connection pools. serve.py instead
+loads the state once in a master process, then forks SERVER_WORKERS workers from it,
+which share its pages copy-on-write and accept connections from one listening socket.
+The shared state is:
+    - The app object, and with it the memory-mapped embedding matrix, vector index and geo shards.
+    - The prompt templates.
+    - The citation metadata, as Arrow columns.
+
+Nothing that holds a connection crosses the fork. The database pool and the OpenAI client
+open their own connections in each worker (see ConnectionPool and AsyncOpenAIClient.client),
+and each worker's lifespan starts its own database executor, and share of the worker pool
+if WORKER_POOL_WITH_APP is set.
+
+The master restarts workers that die, and stops them all on SIGINT or SIGTERM.
+
+Run it from the app directory with:
+    python serve.py [--workers N] [--host HOST] [--port PORT]
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+from pathlib import Path
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Any, Callable, Optional
+
+
+import uvicorn
+
+_APP_DIR = Path(__file__).resolve().parent
+for _path in (_APP_DIR, _APP_DIR.parent): # The app imports itself both ways, see start.sh.
+    if str(_path) not in sys.path:
+        sys.path.append(str(_path))
+
+
+from configs import configs as project_configs, Configs
+from logger import logger as module_logger
+
+
+def import_app(app_path: str) -> Any:
+    """Import an ASGI app from a 'module:attribute' string, like uvicorn does."""
+    module_name, _, attribute = app_path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "app")
+
+
+def preload_shared_state(app_path: str, configs: Configs = project_configs, logger: logging.Logger = module_logger) -> Any:
+    """
+    Import the app and load the read-only state the workers share.
+
+    Importing the app memory-maps the embedding matrix and its indexes. The prompt
+    templates and the citation metadata are loaded here. Then every object that
+    exists so far is frozen out of the garbage collector, so collections in the
+    workers don't write to, and so copy, the pages they are on.
+
+    Args:
+        app_path: The app to import, as 'module:attribute'.
+        configs: Configs with the prompt directory and database path.
+        logger: Logger for what was loaded.
+
+    Returns:
+        The ASGI app.
+    """
+    app = import_app(app_path)
+
+    from api_.llm_.load_prompt_from_yaml import preload_prompts
+    from utils.app.search.citation_metadata import CITATION_METADATA
+
+    logger.info(f"Preloaded {preload_prompts(configs)} prompt templates.")
+    CITATION_METADATA.load(configs.AMERICAN_LAW_DB_PATH)
+
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def share_worker_pool(workers: int, configs: Configs = project_configs) -> None:
+    """
+    Split the default worker pool size between the server workers, so they don't start one process per core each.
+
+    A WORKER_POOL_MAX_WORKERS set in the configs is used by every worker as is.
+    """
+    from utils.common.worker_pool import WORKER_POOL
+    if not configs.WORKER_POOL_MAX_WORKERS:
+        WORKER_POOL.max_workers = max(1, WORKER_POOL.max_workers // workers)
+
+
+class PreforkServer:
+    """
+    Fork uvicorn workers that share one listening socket, and keep them running.
+
+    Attributes:
+        app: The ASGI app, loaded before the workers are forked.
+        sock: The bound listening socket.
+        workers: Number of worker processes.
+        after_fork: Called in each worker before it starts serving.
+        logger: Logger for worker starts and exits.
+    """
+
+    # A worker that exits sooner than this after starting is restarted only after the same delay, to avoid a crash loop.
+    RESTART_DELAY_SECONDS: float = 1.0
+
+    def __init__(self,
+                 app: Any,
+                 sock: socket.socket,
+                 workers: int,
+                 after_fork: Optional[Callable[[], None]] = None,
+                 logger: logging.Logger = module_logger,
+                 **uvicorn_kwargs: Any
+                ):
+        self.app:            Any                          = app
+        self.sock:           socket.socket                = sock
+        self.workers:        int                          = max(1, workers)
+        self.after_fork:     Optional[Callable[[], None]] = after_fork
+        self.logger:         logging.Logger               = logger
+        self.uvicorn_kwargs: dict[str, Any]               = uvicorn_kwargs
+
+        self._pids:     dict[int, float] = {}  # Worker pid -> when it was started.
+        self._stopping: bool             = False
+
+    def _serve(self) -> None:
+        """Run one worker. Called in the forked process."""
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        random.seed()  # Don't repeat the master's random sequence in every worker.
+        if self.after_fork is not None:
+            self.after_fork()
+        config = uvicorn.Config(self.app, lifespan="on", **self.uvicorn_kwargs)
+        # uvicorn shuts the worker down gracefully on SIGTERM.
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self._serve()
+            except BaseException as e:
+                self.logger.exception(f"Worker {os.getpid()} failed: {e}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self._pids[pid] = time.monotonic()
+        self.logger.info(f"Started worker {pid}.")
+
+    def _stop(self, signum: int, frame: Any) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        """Start the workers, restart any that exit, and stop them all on SIGINT or SIGTERM."""
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        for _ in range(self.workers):
+            self._spawn()
+
+        while not self._stopping:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.1)
+                continue
+            started = self._pids.pop(pid, None)
+            if started is None:
+                continue
+            self.logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}. Restarting it.")
+            if time.monotonic() - started < self.RESTART_DELAY_SECONDS:
+                time.sleep(self.RESTART_DELAY_SECONDS)
+            if not self._stopping:
+                self._spawn()
+
+        self.shutdown()
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop the workers gracefully, and kill any still running after `timeout` seconds."""
+        for pid in self._pids:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while self._pids and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.1)
+            else:
+                self._pids.pop(pid, None)
+        for pid in list(self._pids):
+            self.logger.warning(f"Worker {pid} didn't stop within {timeout} seconds. Killing it.")
+            self._signal(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self._pids.pop(pid)
+        self.sock.close()
+        self.logger.info("All workers stopped.")
+
+    @staticmethod
+    def _signal(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=project_configs.SERVER_WORKERS, help="0 uses one per CPU core.")
+    parser.add_argument("--host", default=project_configs.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=project_configs.SERVER_PORT)
+    parser.add_argument("--app", default="app.app:app", help="The app to serve, as 'module:attribute'.")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    # Bind before loading anything, so a port in use fails fast.
+    sock = uvicorn.Config(args.app, host=args.host, port=args.port).bind_socket()
+    app = preload_shared_state(args.app)
+    module_logger.info(f"Serving on {args.host}:{args.port} with {workers} workers.")
+    PreforkServer(app, sock, workers, after_fork=lambda: share_worker_pool(workers)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,5 +10,8 @@ echo "  American Law Search"
 echo "  Starting on port $PORT"
 echo "=================================================="
 
-# Start the FastAPI application with Uvicorn
-python -m uvicorn app:app --host 0.0.0.0 --port $PORT --reload 
\ No newline at end of file
+# Warm the search cache with the most popular searches in the background, then again every WARM_CACHE_INTERVAL_SECONDS.
+python warm_cache.py &
+
+# Start the FastAPI application with pre-forked Uvicorn workers. start_docker_dev.sh runs it with reload.
+python serve.py --app app:app --host 0.0.0.0 --port $PORT 
\ No newline at end of file
@@ -1,12 +1,15 @@
 
 from .clean_html import clean_html
 from .get_html_for_this_citation import get_html_for_this_citation
+from .get_html_for_these_citations import get_html_for_these_citations, html_digest
 from ._get_a_database_connection import get_a_database_connection
 from .close_database_cursor import close_database_cursor
 
 __all__ = [
     "clean_html",
     "get_html_for_this_citation",
+    "get_html_for_these_citations",
+    "html_digest",
     "get_a_database_connection",
     "close_database_cursor"
 ]
\ No newline at end of file
@@ -1,53 +1,61 @@
 """
 Utility module for creating database connections to the American law database.
 
-This module provides a simple interface for obtaining a database cursor,
+This module provides a simple interface for obtaining a pooled database connection,
 with appropriate error handling for use in FastAPI routes.
 """
-import duckdb
 from fastapi import HTTPException
 
-from configs import configs
+from api_.database.connection_pool import PoolTimeout
 from logger import logger
-from utils.app.search.type_vars import SqlCursor
+from utils.app.search.type_vars import SqlConnection
+from utils.database.get_db import get_american_law_db
 
 
-def get_a_database_connection() -> SqlCursor:
+def get_a_database_connection() -> SqlConnection:
     """
-    Creates and returns a database cursor for the American law database.
+    Checks a read-only connection to the American law database out of the READ_ONLY_DB pool.
     
-    This function attempts to create a connection to the American law database
-    and returns a cursor for executing SQL queries. If the connection fails,
-    it logs the error and raises an HTTPException with a 500 status code.
+    If every pooled connection is in use, this waits up to configs.DATABASE_CONNECTION_TIMEOUT
+    seconds for one to be returned. Closing the connection returns it to the pool, so callers
+    must close it when they are done, e.g. with close_database_connection.
     
     The algorithm:
     1. Attempt to get a database connection using get_american_law_db()
-    2. If connection fails (returns None), log the error and raise an HTTPException
-    3. Otherwise, return a cursor for the database connection
+    2. If no connection is returned in time, log the error and raise an HTTPException
+    3. Otherwise, return the connection
     
     Args:
         None
         
     Returns:
-        SqlCursor: A database cursor object for executing SQL queries
+        SqlConnection: A pooled database connection. Make cursors for queries with `cursor()`.
         
     Raises:
         HTTPException: If the database connection could not be established
-            with status_code=500 and detail="Database connection failed"
+            with status_code=500 and detail="Database connection failed",
+            or with status_code=503 if every pooled connection stayed in use.
     
     Example:
         ```python
         try:
-            cursor = get_a_database_connection()
+            conn = get_a_database_connection()
+            cursor = conn.cursor()
             cursor.execute("SELECT * FROM citations LIMIT 10")
             results = cursor.fetchall()
+            cursor.close()
+            conn.close()
         except HTTPException as e:
             # Handle connection error
             return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
         ```
     """
-    db_conn = duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=True)
+    try:
+        db_conn = get_american_law_db(read_only=True)
+    except PoolTimeout as e:
+        logger.error(f"No database connection was free: {e}")
+        raise HTTPException(status_code=503, detail="Database busy, try again shortly") from e
     if db_conn is None:
         logger.error("Failed to get a database connection")
         raise HTTPException(status_code=500, detail="Database connection failed")
-    return db_conn.cursor()
\ No newline at end of file
+    return db_conn
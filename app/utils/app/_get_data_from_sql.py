@@ -78,7 +78,7 @@ def get_data_from_sql(
         
     Example:
         ```python
-        cursor = get_a_database_connection()
+        cursor = get_a_database_connection().cursor()
         
         # Get results as a list of dictionaries
         results_dict = get_data_from_sql(
@@ -19,7 +19,7 @@ def close_database_cursor(cursor: SqlCursor) -> None:
 
     Example:
         ```python
-        cursor = get_a_database_connection()
+        cursor = get_a_database_connection().cursor()
         try:
             # Execute some queries with the cursor
             cursor.execute("SELECT * FROM citations")
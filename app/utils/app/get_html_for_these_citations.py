@@ -0,0 +1,50 @@
+import hashlib
+from typing import Any, Iterable, Optional
+
+
+from utils.database.bulk_key_lookup import bulk_key_lookup
+from utils.database.get_db import get_html_db
+
+
+def html_digest(html: Optional[str]) -> bytes:
+    """
+    Get a short content hash of an HTML string, for deduplicating results
+    without keeping every HTML string in memory.
+
+    Args:
+        html (Optional[str]): The HTML content. None is hashed as an empty string.
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest of the content.
+    """
+    return hashlib.blake2b((html or "").encode("utf-8"), digest_size=16).digest()
+
+
+def get_html_for_these_citations(cids: Iterable[str], cursor: Optional[Any] = None) -> dict[str, str]:
+    """
+    Retrieves the HTML content for a batch of citation IDs (cids) with one connection and one query.
+
+    Args:
+        cids (Iterable[str]): The citation IDs to get HTML for.
+        cursor (Optional[Any]): A cursor to run the query on, e.g. from the AsyncDatabaseExecutor.
+            If None, a read-only connection is opened and closed for the call.
+
+    Returns:
+        dict[str, str]: A mapping of cid to HTML content. Cids with no HTML are left out,
+            so callers should fall back to "Content not available" like `get_html_for_this_citation`.
+    """
+    if cursor is not None:
+        table = bulk_key_lookup(cursor, cids, table="html", key_column="cid", columns=["cid", "html"])
+    else:
+        html_conn = get_html_db()
+        try:
+            with html_conn.cursor() as html_cursor:
+                table = bulk_key_lookup(html_cursor, cids, table="html", key_column="cid", columns=["cid", "html"])
+        finally:
+            html_conn.close()
+
+    html_by_cid: dict[str, str] = {}
+    for cid, html in zip(table.column("cid").to_pylist(), table.column("html").to_pylist()):
+        # Keep the first row per cid, like the LIMIT 1 in get_html_for_this_citation.
+        html_by_cid.setdefault(cid, html)
+    return html_by_cid
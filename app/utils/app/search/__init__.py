@@ -7,14 +7,27 @@ endpoint in app.py, providing database connection management, result caching,
 embedding retrieval, pagination, and other search-related functionality.
 """
 from utils.app.close_database_cursor import close_database_cursor
+from utils.app.search.background_count import BackgroundCount
+from utils.app.search.citation_metadata import CitationMetadata, CITATION_METADATA
 from utils.app.search.close_database_connection import close_database_connection
+from utils.app.search.deadline import Deadline, StageTimedOut
 from utils.app.search.estimate_the_total_count_without_pagination import estimate_the_total_count_without_pagination
 from utils.app.search.format_initial_sql_return_from_search import format_initial_sql_return_from_search
 from utils.app.search.get_cached_query_results import get_cached_query_results
 from utils.app.search.get_database_cursor import get_database_cursor
 from utils.app.search.get_embedding_cids import get_embedding_cids
+from utils.app.search.lexical_search import lexical_search
 from utils.app.search.llm_sql_output import LLMSqlOutput
+from utils.app.search.reciprocal_rank_fusion import reciprocal_rank_fusion
+from utils.app.search.response_cache import ResponseCache, RESPONSE_CACHE
+from utils.app.search.results_delta_encoder import ResultsDeltaEncoder
+from utils.app.search.result_cursor_store import ResultCursor, ResultCursorStore, RESULT_CURSOR_STORE
+from utils.app.search.search_cache_store import SearchCacheStore, SEARCH_CACHE_STORE
+from utils.app.search.semantic_query_cache import SemanticCacheEntry, SemanticQueryCache, SEMANTIC_QUERY_CACHE
+from utils.app.search.shared_response_cache import SharedResponseCache
 from utils.app.search.sort_and_save_search_query_results import sort_and_save_search_query_results
+from utils.app.search.stage_scheduler import StageScheduler
+from utils.app.search.strip_pagination import strip_pagination
 from utils.app.search.turn_english_into_sql import turn_english_into_sql
 from utils.app.search.type_vars import SqlConnection, SqlCursor
 from utils.app._get_data_from_sql import get_data_from_sql
@@ -24,18 +37,39 @@ from utils.app._get_data_from_sql import get_data_from_sql
 # from utils.app.search.save_search_history import save_search_history
 
 __all__ = [
+    "BackgroundCount",
+    "CitationMetadata",
+    "CITATION_METADATA",
     "close_database_connection",
     "close_database_cursor",
+    "Deadline",
     "estimate_the_total_count_without_pagination",
     "format_initial_sql_return_from_search",
     "get_cached_query_results",
     "get_data_from_sql",
     "get_database_cursor",
     "get_embedding_cids",
+    "lexical_search",
     "LLMSqlOutput",
+    "reciprocal_rank_fusion",
+    "ResponseCache",
+    "RESPONSE_CACHE",
+    "ResultsDeltaEncoder",
+    "ResultCursor",
+    "ResultCursorStore",
+    "RESULT_CURSOR_STORE",
+    "SearchCacheStore",
+    "SEARCH_CACHE_STORE",
+    "SemanticCacheEntry",
+    "SemanticQueryCache",
+    "SEMANTIC_QUERY_CACHE",
+    "SharedResponseCache",
     "sort_and_save_search_query_results",
     "SqlConnection",
     "SqlCursor",
+    "StageTimedOut",
+    "StageScheduler",
+    "strip_pagination",
     "turn_english_into_sql",
     # "make_search_query_table_if_it_doesnt_exist",
     # "make_search_history_table_if_it_doesnt_exist",
@@ -0,0 +1,92 @@
+"""
+Count the total rows of a search query off the critical path.
+
+The first page of results is served with a LIMIT+1 probe, so the client only
+waits for the rows it shows. The exact total is counted here, in a worker thread
+on its own cursor, and reported later. If the client disconnects, cancelling
+the count interrupts the running DuckDB query instead of letting it finish.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+
+from logger import logger as module_logger
+from .type_vars import SqlConnection, SqlCursor
+
+
+class BackgroundCount:
+    """
+    Count the rows of a query in a background task.
+
+    Example:
+        >>> count = BackgroundCount(connection, "SELECT * FROM citations WHERE ...", count_func)
+        >>> count.start()
+        >>> ...  # Serve the first page.
+        >>> total = await count.result()
+
+    Attributes:
+        sql_query: The query to count, without LIMIT or OFFSET.
+        logger: Logger for cancellations and failures.
+        started_at: time.monotonic() when the count started, or None if it hasn't.
+    """
+
+    def __init__(self,
+                 connection: SqlConnection,
+                 sql_query: str,
+                 count_func: Callable[[SqlCursor, str], int],
+                 logger: logging.Logger = module_logger
+                 ):
+        self.sql_query:  str             = sql_query
+        self.logger:     logging.Logger  = logger
+        self.started_at: Optional[float] = None
+
+        self._connection: SqlConnection                   = connection
+        self._count_func: Callable[[SqlCursor, str], int] = count_func
+        self._cursor:     Optional[SqlCursor]             = None
+        self._task:       Optional[asyncio.Task]          = None
+
+    def start(self) -> None:
+        """Start counting. The count runs on a new cursor, so the connection's other cursors stay free."""
+        if self._task is None:
+            self.started_at = time.monotonic()
+            self._task = asyncio.create_task(self._run(), name="search-total-count")
+
+    def _count(self) -> int:
+        try:
+            return self._count_func(self._cursor, self.sql_query)
+        finally:
+            self._cursor.close()
+
+    async def _run(self) -> int:
+        self._cursor = self._connection.cursor()
+        try:
+            return await asyncio.to_thread(self._count)
+        except asyncio.CancelledError:
+            # The worker thread can't be cancelled, but its query can.
+            self._cursor.interrupt()
+            self.logger.debug("Cancelled the total count.")
+            raise
+
+    def done(self) -> bool:
+        """Check if the count has finished, failed or been cancelled."""
+        return self._task is not None and self._task.done()
+
+    async def result(self) -> int:
+        """Wait for the count and return it."""
+        if self._task is None:
+            raise RuntimeError("BackgroundCount has not been started.")
+        return await self._task
+
+    async def cancel(self) -> None:
+        """Cancel the count if it is still running, and wait for it to stop."""
+        if self._task is None or self._task.done():
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
@@ -0,0 +1,110 @@
+"""
+The citation metadata of every law, held in memory as Arrow columns.
+
+SearchFunction.get_citation_rows looks up the rows of each page of results by cid.
+Once the citations are loaded, that is a lookup in sorted cid hashes instead of a query.
+serve.py loads them once, before it forks its workers. The columns are Arrow buffers
+and the hashes are a NumPy array, so, unlike Python objects, reading them never
+writes to their pages, and the workers share one copy of them.
+"""
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, Optional
+
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+
+from configs import configs
+from logger import logger as module_logger
+
+
+CITATION_COLUMNS = ["bluebook_cid", "cid", "title", "chapter", "place_name", "state_name", "bluebook_citation"]
+
+
+def _cid_hashes(cids: Iterable[str]) -> np.ndarray:
+    """64-bit hashes of cids. Matches are checked against the cids themselves, so a collision can't return a wrong row."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(cid.encode("utf-8"), digest_size=8).digest(), "little") for cid in cids),
+        dtype=np.uint64,
+    )
+
+
+class CitationMetadata:
+    """
+    The citations table, for looking up rows by cid without a query.
+
+    Attributes:
+        logger: Logger for load messages.
+    """
+
+    def __init__(self, logger: logging.Logger = module_logger):
+        self.logger:  logging.Logger       = logger
+        self._table:  Optional[pa.Table]   = None
+        self._hashes: Optional[np.ndarray] = None  # Sorted cid hashes.
+        self._rows:   Optional[np.ndarray] = None  # Row of each sorted hash.
+
+    def __len__(self) -> int:
+        return 0 if self._table is None else self._table.num_rows
+
+    @property
+    def loaded(self) -> bool:
+        return self._table is not None
+
+    def load(self, db_path: Path | str = configs.AMERICAN_LAW_DB_PATH) -> int:
+        """
+        Load the citations table.
+
+        Args:
+            db_path: Path to the database with the citations table.
+
+        Returns:
+            int: The number of citations loaded. 0 if the table can't be read.
+        """
+        try:
+            with duckdb.connect(db_path, read_only=True) as conn:
+                table = conn.execute(f"SELECT {', '.join(CITATION_COLUMNS)} FROM citations").fetch_arrow_table()
+        except duckdb.Error as e:
+            self.logger.warning(f"Could not load the citation metadata from {db_path}: {e}")
+            return 0
+
+        hashes = _cid_hashes(table.column("cid").to_pylist())
+        rows = np.argsort(hashes, kind="stable")
+        self._table = table.combine_chunks()
+        self._hashes = hashes[rows]
+        self._rows = rows
+        self.logger.info(f"Loaded the metadata of {len(self)} citations.")
+        return len(self)
+
+    def rows(self, cids: Iterable[str]) -> pa.Table:
+        """
+        Get the citation rows of some cids.
+
+        Args:
+            cids: The content IDs to get. Duplicates are ignored, and surrounding whitespace is stripped.
+
+        Returns:
+            pa.Table: The rows, with the CITATION_COLUMNS, in the order of cids. Unknown cids are left out.
+
+        Raises:
+            RuntimeError: If the citations haven't been loaded.
+        """
+        if self._table is None:
+            raise RuntimeError("The citation metadata hasn't been loaded.")
+        keys = list(dict.fromkeys(str(cid).strip() for cid in cids))
+        if not keys or not len(self):
+            return self._table.slice(0, 0)
+
+        wanted = _cid_hashes(keys)
+        positions = np.minimum(np.searchsorted(self._hashes, wanted), len(self._hashes) - 1)
+        found = self._hashes[positions] == wanted
+        candidates = self._table.take(pa.array(self._rows[positions[found]], type=pa.int64()))
+
+        matches = np.asarray(candidates.column("cid").to_pylist(), dtype=object) == np.asarray(keys, dtype=object)[found]
+        return candidates.filter(pa.array(matches, type=pa.bool_()))
+
+
+CITATION_METADATA = CitationMetadata()
@@ -0,0 +1,175 @@
+"""
+Time budgets for the stages of a search.
+
+A search has one overall deadline, and each stage (intent check, SQL generation,
+the query itself, scoring, hydration and the total count) has its own budget
+within it. A stage that runs over is cancelled and raises StageTimedOut, so the
+search can return whatever it has ranked so far instead of holding the request open.
+
+The count only makes the total exact. Running over it leaves the total a lower bound
+(see total_is_exact), and doesn't make the results partial.
+"""
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Optional
+
+
+from logger import logger as module_logger
+
+
+# Stages that don't change the results. Running over them doesn't make the search partial.
+RESULTS_COMPLETE_WITHOUT: frozenset[str] = frozenset({"count"})
+
+
+class StageTimedOut(TimeoutError):
+    """A search stage ran over its budget, or over the search's deadline."""
+
+    def __init__(self, stage: str, budget: float):
+        self.stage:  str   = stage
+        self.budget: float = budget
+        super().__init__(f"Search stage '{stage}' ran over its budget of {budget:.2f}s.")
+
+
+class Deadline:
+    """
+    The overall deadline of one search, and the budgets of its stages.
+
+    A stage gets the smaller of its own budget and the time left before the deadline.
+    Stages without a budget of their own only get the time left.
+
+    Example:
+        >>> deadline = Deadline({"sql": 15.0, "scoring": 5.0}, total_seconds=30.0)
+        >>> sql_query = await deadline.run("sql", make_sql())
+        >>> async with deadline.stage("scoring"):
+        ...     ...
+        >>> deadline.partial
+        False
+
+    Attributes:
+        budgets: Seconds each stage may take. A budget of 0 or less means no budget of its own.
+        total_seconds: Seconds the whole search may take. None or 0 means no deadline.
+        elapsed: Seconds each budgeted stage took.
+        timed_out: Names of the stages that ran over, in order.
+        logger: Logger for stages that ran over.
+    """
+
+    def __init__(self,
+                 budgets: Optional[dict[str, float]] = None,
+                 total_seconds: Optional[float] = None,
+                 logger: logging.Logger = module_logger
+                 ):
+        self.budgets:       dict[str, float]  = {name: seconds for name, seconds in (budgets or {}).items() if seconds and seconds > 0}
+        self.total_seconds: Optional[float]   = total_seconds or None
+        self.elapsed:       dict[str, float]  = {}
+        self.timed_out:     list[str]         = []
+        self.logger:        logging.Logger    = logger
+
+        self._started_at: float = time.monotonic()
+
+    @classmethod
+    def from_configs(cls, configs: Any, logger: logging.Logger = module_logger) -> 'Deadline':
+        """Make a Deadline with the budgets in the configs, see Configs.SEARCH_DEADLINE_SECONDS."""
+        return cls(
+            budgets={
+                "intent": configs.INTENT_BUDGET_SECONDS,
+                "sql": configs.SQL_BUDGET_SECONDS,
+                "query": configs.QUERY_BUDGET_SECONDS,
+                "count": configs.COUNT_BUDGET_SECONDS,
+                "scoring": configs.SCORING_BUDGET_SECONDS,
+                "hydration": configs.HYDRATION_BUDGET_SECONDS,
+            },
+            total_seconds=configs.SEARCH_DEADLINE_SECONDS,
+            logger=logger,
+        )
+
+    @property
+    def partial(self) -> bool:
+        """True if a stage the results depend on was cut off. See RESULTS_COMPLETE_WITHOUT."""
+        return any(name not in RESULTS_COMPLETE_WITHOUT for name in self.timed_out)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if there is no deadline."""
+        if self.total_seconds is None:
+            return None
+        return max(0.0, self.total_seconds - (time.monotonic() - self._started_at))
+
+    def budget_for(self, stage: str, since: Optional[float] = None) -> Optional[float]:
+        """
+        Get the seconds a stage may still take.
+
+        Args:
+            stage: Name of the stage.
+            since: time.monotonic() when the stage started, if it started before it is awaited.
+
+        Returns:
+            Optional[float]: The seconds left, or None if the stage is unbounded.
+        """
+        budget = self.budgets.get(stage)
+        if budget is not None and since is not None:
+            budget = max(0.0, budget - (time.monotonic() - since))
+        remaining = self.remaining()
+        if budget is None:
+            return remaining
+        return budget if remaining is None else min(budget, remaining)
+
+    @asynccontextmanager
+    async def stage(self, name: str, since: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Cancel the block if it runs over the stage's budget.
+
+        Args:
+            name: Name of the stage.
+            since: time.monotonic() when the stage started, if it started before the block.
+
+        Raises:
+            StageTimedOut: If the block ran over. The block has been cancelled.
+                Other TimeoutErrors raised in the block, like a PoolTimeout, pass through as they are.
+        """
+        budget = self.budget_for(name, since=since)
+        start = time.monotonic() if since is None else since
+        try:
+            async with asyncio.timeout(budget) as timeout:
+                yield
+        except TimeoutError as e:
+            if not timeout.expired():
+                raise
+            self.timed_out.append(name)
+            self.logger.warning(f"Search stage '{name}' was cut off after {time.monotonic() - start:.2f}s.")
+            raise StageTimedOut(name, budget) from e
+        finally:
+            self.elapsed[name] = time.monotonic() - start
+
+    async def run(self, name: str, awaitable: Awaitable[Any], since: Optional[float] = None) -> Any:
+        """
+        Await something within the stage's budget.
+
+        Args:
+            name: Name of the stage.
+            awaitable: What the stage waits for. A task is cancelled if it runs over.
+            since: time.monotonic() when the stage started, if it started before it is awaited.
+
+        Returns:
+            Whatever awaitable returns.
+
+        Raises:
+            StageTimedOut: If it ran over.
+        """
+        async with self.stage(name, since=since):
+            return await awaitable
+
+    def report(self) -> dict[str, Any]:
+        """
+        Get the budgets and how they were spent, for the final search event.
+
+        Returns:
+            dict: The budgets, the overall deadline, the seconds each stage took, and the stages that were cut off.
+        """
+        return {
+            "budgets": dict(self.budgets),
+            "total_seconds": self.total_seconds,
+            "elapsed": {name: round(seconds, 4) for name, seconds in self.elapsed.items()},
+            "timed_out": list(self.timed_out),
+        }
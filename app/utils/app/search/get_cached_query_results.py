@@ -1,4 +1,5 @@
-from typing import Any
+import sqlite3
+from typing import Any, Optional
 
 
 import duckdb
@@ -7,6 +8,12 @@ import duckdb
 from configs import configs 
 from logger import logger
 from schemas.search_response import SearchResponse
+from utils.app.get_html_for_these_citations import html_digest
+from utils.app.search.response_cache import ResponseCache, RESPONSE_CACHE
+from utils.app.search.search_cache_store import SearchCacheStore, SEARCH_CACHE_STORE
+from utils.database.arrow_results import table_rows
+from utils.database.bulk_key_lookup import bulk_key_lookup
+from utils.database.get_db import get_american_law_db
 from .format_initial_sql_return_from_search import format_initial_sql_return_from_search
 
 
@@ -17,79 +24,130 @@ def _calc_total_pages(total: int, per_page: int) -> int:
 def get_cached_query_results(
     search_query_cid: str = None,
     page: int = None,
-    per_page: int = None
+    per_page: int = None,
+    cursor: Optional[duckdb.DuckDBPyConnection] = None,
+    search_cache_store: SearchCacheStore = SEARCH_CACHE_STORE,
+    response_cache: Optional[ResponseCache] = RESPONSE_CACHE,
 ) -> dict[str, Any]:
+    """
+    Get a page of the cached results of a search query, if it has any.
 
-    html_set = set()
-    cid_set = set()
+    Only the cids of the requested page are read from the search cache database,
+    by slicing the cached ranking, and only their rows from the law database.
+    Pages served before are kept in the response cache, so popular ones skip both.
 
-    with duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=True) as conn:
+    Args:
+        search_query_cid: The content ID of the search query.
+        page: The page number of results to retrieve (1-based).
+        per_page: The number of results per page.
+        cursor: A cursor to run the lookups on, e.g. from the AsyncDatabaseExecutor.
+            If None, a read-only connection is checked out of the READ_ONLY_DB pool for the call.
+        search_cache_store: The search cache database the search_query table is in.
+        response_cache: The in-memory cache of pages. None to always read the databases.
+
+    Returns:
+        dict[str, Any]: The search response for the page, or None if the query isn't cached.
+    """
+    if response_cache is None:
+        return _read_cached_query_results(search_query_cid, page, per_page, cursor, search_cache_store)
+    return response_cache.get_or_load(
+        "query_page", (search_query_cid, page, per_page),
+        lambda: _read_cached_query_results(search_query_cid, page, per_page, cursor, search_cache_store),
+        tags=lambda response: [search_query_cid, *(row["cid"] for row in response["results"])],
+    )
+
+
+def _read_cached_query_results(
+    search_query_cid: str,
+    page: int,
+    per_page: int,
+    cursor: Optional[duckdb.DuckDBPyConnection],
+    search_cache_store: SearchCacheStore,
+) -> Optional[dict[str, Any]]:
+    start = (page - 1) * per_page
+    try:
+        cached: Optional[tuple[int, list[str]]] = search_cache_store.read(
+            _get_cached_cids, search_query_cid, start, start + per_page
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read the search cache, treating it as a miss: {e}")
+        return None
+    if cached is None:
+        return None
+    total, page_cids = cached
+
+    if cursor is not None:
+        return _get_cached_query_results(cursor, page_cids, total, page, per_page)
+
+    # Closing the pooled connection returns it to READ_ONLY_DB.
+    with get_american_law_db(read_only=True) as conn:
         with conn.cursor() as cursor:
-            # Check if the query already exists in the search_query table
-            cursor.execute('''
-            SELECT COUNT(*) FROM search_query WHERE search_query_cid = ?
-            ''', (search_query_cid,))
-            count = cursor.fetchone()[0]
-            
-            if count > 0:
-                # If the query already exists, fetch the results from the search_query table
-                logger.debug(f"Query already performed. Getting cached results.")
-                cursor.execute('''
-                SELECT cids_for_top_100 FROM search_query WHERE search_query_cid = ?
-                ''', (search_query_cid,))
-                cids_for_top_100: str = cursor.fetchone()[0] # -> comma-separated string
-                logger.debug(f"cids_for_top_100: {cids_for_top_100}")
-
-                # Convert the comma-separated string to a list of CIDs
-                # Then convert it to a list of strings for a SQL query.
-                cids_for_top_100: list[str] = cids_for_top_100.split(',')
-                cid_list = [
-                    f" c.cid = '{cid.strip()}'" if i == 1 else f" OR c.cid = '{cid.strip()}'"
-                    for i, cid in enumerate(cids_for_top_100, start=1)
-                ]
-                cid_list = ''.join(cid_list)
-                logger.debug(f"cid_list: {cid_list}")
-
-                cursor.execute(f'''
-                SELECT c.cid, 
-                    c.bluebook_cid,
-                    c.title,
-                    c.chapter,
-                    c.place_name,
-                    c.state_name,
-                    c.bluebook_citation,
-                    h.html
-                FROM citations c
-                JOIN html h ON c.cid = h.cid
-                WHERE
-                ''' + cid_list )
-                df_dict = cursor.fetchdf().to_dict('records')
-                total = len(df_dict)
-                logger.debug(f"Returned {total} rows from the cached query.")
-
-                # Format the results for the response.
-                results: list[dict] = []
-                for row in df_dict:
-                    if row['cid'] in cid_set:
-                        continue
-                    else:
-                        cid_set.add(row['cid'])
-
-                    row_dict = format_initial_sql_return_from_search(row)
-                    if row_dict['html'] in html_set:
-                        continue
-                    else:
-                        html_set.add(row_dict['html'])
-                        results.append(row_dict)
-
-                # Return the cached results
-                search_response = SearchResponse(
-                    results=results,
-                    total=total,
-                    page=page,
-                    per_page=per_page,
-                    total_pages=_calc_total_pages(total, per_page)
-                )
-                return search_response.model_dump()
-            else:
-                return None
+            return _get_cached_query_results(cursor, page_cids, total, page, per_page)
+
+
+def _get_cached_cids(
+    cursor: sqlite3.Cursor,
+    search_query_cid: str,
+    start: int,
+    stop: int
+) -> Optional[tuple[int, list[str]]]:
+    """The number of cached cids for a search query and the ones from start to stop, or None if it isn't cached."""
+    # Ranks are 1-based. One statement, so the count and the page are from the same commit.
+    rows = cursor.execute(
+        "SELECT q.n_ranked, r.cid FROM search_query q "
+        "LEFT JOIN search_query_rank r ON r.search_query_cid = q.search_query_cid AND r.rank > ? AND r.rank <= ? "
+        "WHERE q.search_query_cid = ? ORDER BY r.rank",
+        (start, stop, search_query_cid)
+    ).fetchall()
+    if not rows:
+        return None
+    return rows[0][0], [cid for _, cid in rows if cid is not None]
+
+
+def _get_cached_query_results(
+    cursor: duckdb.DuckDBPyConnection,
+    page_cids: list[str],
+    total: int,
+    page: int,
+    per_page: int
+) -> dict[str, Any]:
+
+    html_hashes = set()
+
+    logger.debug(f"Query already performed. Getting cached results.")
+    logger.debug(f"page_cids: {page_cids}")
+
+    # Fetch the page's rows in their ranked order.
+    table = bulk_key_lookup(
+        cursor, page_cids,
+        table="citations c JOIN html h ON c.cid = h.cid",
+        key_column="c.cid",
+        columns=[
+            "c.cid", "c.bluebook_cid", "c.title", "c.chapter", "c.place_name",
+            "c.state_name", "c.bluebook_citation", "h.html",
+        ],
+        preserve_order=True,
+    )
+    logger.debug(f"Returned {table.num_rows} rows from the cached query.")
+
+    # The cached cids are unique, so only repeated HTML on the page is dropped.
+    kept_rows: list[int] = []
+    for i, html in enumerate(table.column("html").to_pylist()):
+        digest = html_digest(html)
+        if digest in html_hashes:
+            continue
+        else:
+            html_hashes.add(digest)
+            kept_rows.append(i)
+
+    results: list[dict] = [
+        format_initial_sql_return_from_search(row) for row in table_rows(table, kept_rows)
+    ]
+    search_response = SearchResponse(
+        results=results,
+        total=total,
+        page=page,
+        per_page=per_page,
+        total_pages=_calc_total_pages(total, per_page)
+    )
+    return search_response.model_dump()
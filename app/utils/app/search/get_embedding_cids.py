@@ -1,5 +1,4 @@
 from itertools import batched
-import time
 from typing import Generator
 
 
@@ -8,6 +7,7 @@ import tqdm
 
 
 from logger import logger
+from utils.database.bulk_key_lookup import bulk_key_lookup
 from utils.database.get_db import get_embeddings_db
 
 
@@ -28,8 +28,8 @@ def get_embedding_cids(
 
     Notes:
         - The function establishes a read-only connection to the embeddings database.
-        - For each CID in the input list, it queries the database to fetch the corresponding 
-          embedding CIDs and appends the results to the output list.
+        - For each batch of CIDs, it fetches the corresponding embedding CIDs with a
+          single bulk lookup and yields them.
         - The database connection and cursor are properly closed after the operation.
     """
     # Get embeddings_cids for all the CIDs,
@@ -37,28 +37,16 @@ def get_embedding_cids(
     embeddings_cursor = embeddings_conn.cursor()
 
 
+    embedding_id_list: list[dict] = []
     if initial_results:
         for batch in tqdm.tqdm(batched(initial_results, batch_size)):
 
-            embedding_id_list: list[tuple] = []
-            for i, row in enumerate(batch, start=1):
-                if i == 1:
-                    cid_string = f" cid = '{row['cid']}'"
-                cid_string += f" OR cid = '{row['cid']}'"
-
-            # Query the embeddings table using the current row's cid
-            try: # TODO: Make it so I can select multiple rows at once.
-                embedding_ids: list[tuple] = embeddings_cursor.execute(f'''
-                    SELECT embedding_cid, cid
-                    FROM embeddings 
-                    WHERE
-                    ''' + cid_string + ";", 
-                ).fetchall()
-                for row in embedding_ids:
-                    embedding_id_list.append({'embedding_cid': row[0], 'cid': row[1]})
-            except IndexError:
-                #logger.debug(f"No embedding found for the given CID {row['cid']}.")
-                continue
+            # Query the embeddings table for every cid in the batch at once.
+            embedding_ids = bulk_key_lookup(
+                embeddings_cursor, [row['cid'] for row in batch],
+                table="embeddings", key_column="cid", columns=["embedding_cid", "cid"]
+            )
+            embedding_id_list = embedding_ids.to_pylist()
             logger.debug(f"Found {len(embedding_id_list)} embedding IDs for the given CIDs.")
             yield embedding_id_list
     else:
@@ -0,0 +1,54 @@
+import duckdb
+
+
+from configs import configs
+from utils.database.build_lexical_index import tokenize
+
+
+def lexical_search(
+        cursor: duckdb.DuckDBPyConnection,
+        search_query: str,
+        top_k: int = configs.LEXICAL_SEARCH_TOP_K,
+        k1: float = configs.BM25_K1,
+        b: float = configs.BM25_B,
+        ) -> list[tuple[str, float]]:
+    """
+    Rank laws against a search query with BM25 over the lexical index tables.
+
+    No LLM is involved, so this returns in milliseconds. The tables are built by
+    `utils.database.build_lexical_index`.
+
+    Args:
+        cursor: Cursor on the database holding the lexical index tables.
+        search_query: The search query, as typed by the user.
+        top_k: Max number of results to return.
+        k1: BM25 term frequency saturation.
+        b: BM25 document length normalization.
+
+    Returns:
+        list[tuple[str, float]]: (cid, BM25 score) pairs, highest score first.
+            Empty if the query has no indexed terms.
+    """
+    terms = list(dict.fromkeys(tokenize(search_query)))
+    if not terms:
+        return []
+
+    rows = cursor.execute("""
+        WITH query_terms AS (
+            SELECT unnest($terms::VARCHAR[]) AS term
+        )
+        SELECT t.cid,
+            SUM(
+                ln(1 + (s.n_docs - v.df + 0.5) / (v.df + 0.5))
+                * t.tf * ($k1 + 1) / (t.tf + $k1 * (1 - $b + $b * d.doc_len / s.avg_doc_len))
+            ) AS score
+        FROM query_terms q
+        JOIN lexical_vocab v ON v.term = q.term
+        JOIN lexical_terms t ON t.term = q.term
+        JOIN lexical_docs d ON d.cid = t.cid
+        CROSS JOIN lexical_stats s
+        GROUP BY t.cid
+        ORDER BY score DESC, t.cid
+        LIMIT $top_k
+    """, {"terms": terms, "k1": k1, "b": b, "top_k": top_k}).fetchall()
+    return [(cid, float(score)) for cid, score in rows]
@@ -0,0 +1,35 @@
+from typing import Iterable
+
+
+from configs import configs
+
+
+def reciprocal_rank_fusion(
+        *rankings: Iterable[tuple[str, float]],
+        k: int = configs.RRF_K
+        ) -> list[tuple[str, float]]:
+    """
+    Combine several rankings of the same documents with reciprocal-rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the rankings it appears in, so only
+    ranks matter and BM25 scores and cosine similarities don't need to be on the same scale.
+
+    Args:
+        *rankings: Lists of (cid, score) pairs, each sorted highest score first.
+        k: Damping constant. Larger values flatten the difference between top ranks.
+
+    Returns:
+        list[tuple[str, float]]: (cid, fused score) pairs, highest score first.
+            Ties keep the order in which the cids were first seen.
+    """
+    fused: dict[str, float] = {}
+    for ranking in rankings:
+        seen: set[str] = set()
+        rank = 0
+        for cid, _ in ranking:
+            if cid in seen:
+                continue
+            seen.add(cid)
+            rank += 1
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
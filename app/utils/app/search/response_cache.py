@@ -0,0 +1,301 @@
+"""
+Keep serialized responses for popular searches and laws in memory, in front of DuckDB.
+
+Laws and cached search rankings are content-addressed, so the response for a law's cid,
+or for a page of a cached search, only changes when the law database is rebuilt.
+Serving them again otherwise checks out a connection and runs a JOIN each time.
+
+Responses are kept as JSON bytes, so their memory use is known exactly and every hit
+gets its own copy to modify. Each tier ("query_page" and "law") is a least recently used
+cache with its own memory budget, so a burst of large law documents can't evict the pages
+of popular searches, and the other way round.
+
+Entries are tagged with the cids they contain, so `invalidate()` can drop everything that
+shows a law. The whole cache is cleared when the law database file changes, which is
+checked at most every few seconds.
+
+Behind the in-memory tiers there can be a SharedResponseCache, which every server worker
+on the host reads. A miss in memory is looked up there, and responses are written to both.
+`invalidate()` and `clear()` drop the responses from this worker's memory and the shared
+file, and log them there. The other workers read that log at most every check_seconds,
+along with the law database check, and drop the same responses from their memory.
+Without a shared cache, invalidating only reaches the worker it is called in.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+
+from configs import configs
+from logger import logger as module_logger
+from utils.app.search.shared_response_cache import SharedResponseCache
+
+
+class ResponseCache:
+    """
+    Thread-safe tiered LRU cache of serialized responses, sized in bytes.
+
+    Example:
+        >>> RESPONSE_CACHE.put("law", cid, law, tags=[cid])
+        >>> RESPONSE_CACHE.get("law", cid)
+        >>> RESPONSE_CACHE.invalidate(cid)
+
+    Attributes:
+        max_bytes: Memory budget of each tier, by tier name.
+        watch_path: The database the responses are read from. They are all dropped when it changes.
+            None to not watch any file.
+        check_seconds: Min seconds between checks of the watched file, and of the invalidations of the other workers.
+        shared: The cache shared with the other server workers, or None.
+        logger: Logger for invalidations.
+    """
+
+    def __init__(self,
+                 max_bytes: dict[str, int] = None,
+                 watch_path: Optional[Path] = configs.AMERICAN_LAW_DB_PATH,
+                 check_seconds: float = configs.RESPONSE_CACHE_CHECK_SECONDS,
+                 shared: Optional[SharedResponseCache] = None,
+                 logger: logging.Logger = module_logger
+                 ):
+        self.max_bytes:     dict[str, int] = max_bytes or {
+            "query_page": configs.RESPONSE_CACHE_PAGE_MAX_BYTES,
+            "law": configs.RESPONSE_CACHE_LAW_MAX_BYTES,
+        }
+        self.watch_path:    Optional[Path]  = watch_path
+        self.check_seconds: float           = check_seconds
+        self.shared:        Optional[SharedResponseCache] = shared
+        self.logger:        logging.Logger  = logger
+
+        # Each tier maps a key to its JSON bytes and tags, least recently used first.
+        self._lock:   threading.Lock                       = threading.Lock()
+        self._tiers:  dict[str, OrderedDict[Hashable, tuple[bytes, tuple[str, ...]]]] = {
+            tier: OrderedDict() for tier in self.max_bytes
+        }
+        self._by_tag: dict[str, set[tuple[str, Hashable]]] = {}
+        self._nbytes: dict[str, int]                       = dict.fromkeys(self.max_bytes, 0)
+        self._counts: dict[str, dict[str, int]]            = {
+            tier: {"hits": 0, "misses": 0, "evicted": 0, "invalidated": 0} for tier in self.max_bytes
+        }
+        self._source:     Optional[tuple[int, int, int]] = self._signature()
+        self._checked_at: float                          = time.monotonic()
+        self._shared_has_source: bool                    = False
+        self._invalidation_seq:  Optional[int]           = None
+
+    def get(self, tier: str, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached response.
+
+        Args:
+            tier: The tier it was cached in.
+            key: Its key in that tier.
+
+        Returns:
+            Optional[Any]: A fresh copy of the response, or None if it isn't cached.
+        """
+        self._check_source()
+        with self._lock:
+            entry = self._tiers[tier].get(key)
+            if entry is None:
+                self._counts[tier]["misses"] += 1
+            else:
+                self._tiers[tier].move_to_end(key)
+                self._counts[tier]["hits"] += 1
+
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(tier, _shared_key(key))
+            if entry is not None:
+                self._store(tier, key, *entry)
+        return json.loads(entry[0]) if entry is not None else None
+
+    def put(self, tier: str, key: Hashable, value: Any, tags: Iterable[str] = ()) -> bool:
+        """
+        Cache a response, replacing any under the same key.
+
+        Args:
+            tier: The tier to cache it in.
+            key: Its key in that tier.
+            value: The response. It must be JSON serializable; dates and the like become strings.
+            tags: The cids it contains, to invalidate it by.
+
+        Returns:
+            bool: False if the response is over the memory budget of the tier and the shared cache, so it wasn't cached.
+        """
+        self._check_source()
+        data = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+        tags = tuple(dict.fromkeys(tags))
+        stored = self._store(tier, key, data, tags)
+        if self.shared is not None:
+            stored = self.shared.put(tier, _shared_key(key), data, tags) or stored
+        return stored
+
+    def get_or_load(self,
+                    tier: str,
+                    key: Hashable,
+                    load: Callable[[], Optional[Any]],
+                    tags: Callable[[Any], Iterable[str]] = lambda value: ()
+                    ) -> Optional[Any]:
+        """
+        Get a cached response, or load and cache it. None is returned, but never cached.
+
+        Args:
+            tier: The tier it is cached in.
+            key: Its key in that tier.
+            load: Called without arguments on a miss, e.g. to query DuckDB.
+            tags: Called with the loaded response to get the cids it contains.
+
+        Returns:
+            Optional[Any]: The response.
+        """
+        value = self.get(tier, key)
+        if value is not None:
+            return value
+        value = load()
+        if value is not None:
+            self.put(tier, key, value, tags=tags(value))
+        return value
+
+    def invalidate(self, *tags: str) -> int:
+        """
+        Drop the cached responses with any of these tags, e.g. after the laws with these cids change.
+
+        Args:
+            tags: cids, or search query cids.
+
+        Returns:
+            int: The number of responses dropped from this worker's memory. The other workers
+                drop theirs within check_seconds, if there is a shared cache.
+        """
+        dropped = self._invalidate_memory(tags)
+        if self.shared is not None:
+            self.shared.invalidate(*tags)
+        return dropped
+
+    def _invalidate_memory(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            entries = set().union(*(self._by_tag.get(tag, ()) for tag in tags))
+            for tier, key in entries:
+                self._remove(tier, key)
+                self._counts[tier]["invalidated"] += 1
+        return len(entries)
+
+    def clear(self) -> None:
+        """Drop every cached response, e.g. after the law database is rebuilt."""
+        if self.shared is not None:
+            self.shared.clear()
+        self._clear_memory()
+
+    def _clear_memory(self) -> None:
+        with self._lock:
+            for tier, entries in self._tiers.items():
+                self._counts[tier]["invalidated"] += len(entries)
+                entries.clear()
+                self._nbytes[tier] = 0
+            self._by_tag.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the cache's counters.
+
+        Returns:
+            dict: For each tier, its entries, bytes, max_bytes, hits, misses, evicted and invalidated.
+                With a shared cache, its counters are under "shared".
+        """
+        with self._lock:
+            stats: dict[str, Any] = {
+                tier: {
+                    "entries": len(self._tiers[tier]),
+                    "bytes": self._nbytes[tier],
+                    "max_bytes": self.max_bytes[tier],
+                    **self._counts[tier],
+                }
+                for tier in self._tiers
+            }
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+    def _store(self, tier: str, key: Hashable, data: bytes, tags: tuple[str, ...]) -> bool:
+        if len(data) > self.max_bytes[tier]:
+            self.logger.debug(f"Response of {len(data)} bytes is over the {tier} cache budget. Not caching it.")
+            return False
+
+        with self._lock:
+            if key in self._tiers[tier]:
+                self._remove(tier, key)
+            self._tiers[tier][key] = (data, tags)
+            self._nbytes[tier] += len(data)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add((tier, key))
+            while self._nbytes[tier] > self.max_bytes[tier]:
+                self._remove(tier, next(iter(self._tiers[tier])))
+                self._counts[tier]["evicted"] += 1
+        return True
+
+    def _remove(self, tier: str, key: Hashable) -> None:
+        data, tags = self._tiers[tier].pop(key)
+        self._nbytes[tier] -= len(data)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard((tier, key))
+                if not keys:
+                    del self._by_tag[tag]
+
+    def _signature(self) -> Optional[tuple[int, int, int]]:
+        if self.watch_path is None:
+            return None
+        try:
+            stat = os.stat(self.watch_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _check_source(self) -> None:
+        if self.shared is not None:
+            if self.watch_path is not None and not self._shared_has_source:
+                # The shared cache can outlive this process, and the database it was filled from.
+                self._shared_has_source = True
+                self.shared.clear(source=repr(self._source))
+            if self._invalidation_seq is None:
+                # This worker's memory is empty, so only invalidations from now on apply to it.
+                self._invalidation_seq, _ = self.shared.invalidations()
+        now = time.monotonic()
+        if now - self._checked_at < self.check_seconds:
+            return
+        self._checked_at = now
+        if self.shared is not None and self._invalidation_seq is not None:
+            self._apply_shared_invalidations()
+        if self.watch_path is None:
+            return
+        # Rebuilding the law database replaces or rewrites its file.
+        source = self._signature()
+        if source != self._source:
+            self._source = source
+            self.logger.info(f"{self.watch_path} changed. Clearing the response cache.")
+            if self.shared is not None:
+                self.shared.clear(source=repr(source))  # Only the first worker to notice clears it.
+            self._clear_memory()
+
+    def _apply_shared_invalidations(self) -> None:
+        # Other workers' invalidate() and clear() only reach their own memory and the shared file.
+        self._invalidation_seq, tags = self.shared.invalidations(after=self._invalidation_seq)
+        if tags is None:
+            self.logger.info("The shared response cache was cleared. Clearing this worker's.")
+            self._clear_memory()
+        elif tags:
+            self._invalidate_memory(tags)
+
+
+def _shared_key(key: Hashable) -> str:
+    return json.dumps(key, separators=(",", ":"), default=str)
+
+
+# Application-scoped cache, shared by the search and law endpoints, and with the other server workers.
+RESPONSE_CACHE = ResponseCache(
+    shared=SharedResponseCache() if configs.RESPONSE_CACHE_SHARED_PATH is not None else None,
+)
@@ -0,0 +1,258 @@
+"""
+Keep the full ranking of recent searches in memory, so later pages don't search again.
+
+The first request for a query ranks every candidate once. The ranking is stored
+here as two NumPy arrays, one of fixed-width cids and one of float32 scores,
+under an opaque cursor token. Later pages slice the arrays and only hydrate
+that slice, so they cost O(per_page) instead of another LLM and embedding pass.
+
+Cursors expire after a TTL, and the least recently used ones are evicted when
+the arrays of all cursors would use more than the memory budget.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+import logging
+import secrets
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+
+import numpy as np
+
+
+from configs import configs
+from logger import logger as module_logger
+
+
+@dataclass(frozen=True)
+class ResultCursor:
+    """
+    The full ranking of one search.
+
+    Attributes:
+        token: Opaque token the client sends back to get another page.
+        search_query_cid: Content ID of the search query, including its mode.
+        cids: Ranked cids as fixed-width UTF-8 bytes.
+        scores: Score of each cid, in the same order.
+        total: How many results the search matched. Can be larger than the ranking if it was capped,
+            but the pages end with the ranking.
+        total_is_exact: False while total is only a lower bound.
+        expires_at: time.monotonic() after which the cursor is dropped.
+    """
+    token: str
+    search_query_cid: str
+    cids: np.ndarray
+    scores: np.ndarray
+    total: int
+    total_is_exact: bool
+    expires_at: float
+
+    def __len__(self) -> int:
+        return len(self.cids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the ranking arrays."""
+        return self.cids.nbytes + self.scores.nbytes
+
+    def page(self, page: int, per_page: int) -> list[tuple[str, float]]:
+        """
+        Get one page of the ranking.
+
+        Args:
+            page: The page number (1-based).
+            per_page: The number of results per page.
+
+        Returns:
+            list[tuple[str, float]]: (cid, score) pairs, highest score first.
+                Empty if the page is past the end of the ranking.
+        """
+        start = (page - 1) * per_page
+        cids = self.cids[start:start + per_page]
+        scores = self.scores[start:start + per_page]
+        return [(cid.decode("utf-8"), float(score)) for cid, score in zip(cids, scores)]
+
+
+class ResultCursorStore:
+    """
+    Thread-safe store of ResultCursors with a TTL and a memory budget.
+
+    Example:
+        >>> token = RESULT_CURSOR_STORE.put(search_query_cid, ranking, total=len(ranking))
+        >>> cursor = RESULT_CURSOR_STORE.get(token)
+        >>> cursor.page(3, per_page=20)
+
+    Attributes:
+        ttl_seconds: How long a cursor lives after it is stored.
+        max_bytes: Memory budget for the ranking arrays of all cursors.
+        logger: Logger for evictions.
+    """
+
+    def __init__(self,
+                 ttl_seconds: float = configs.RESULT_CURSOR_TTL_SECONDS,
+                 max_bytes: int = configs.RESULT_CURSOR_MAX_BYTES,
+                 logger: logging.Logger = module_logger
+                 ):
+        self.ttl_seconds: float          = ttl_seconds
+        self.max_bytes:   int            = max_bytes
+        self.logger:      logging.Logger = logger
+
+        self._lock:     threading.Lock                = threading.Lock()
+        self._cursors:  OrderedDict[str, ResultCursor] = OrderedDict()
+        self._by_query: dict[str, str]                 = {}
+        self._nbytes:   int                            = 0
+        self._hits:     int                            = 0
+        self._misses:   int                            = 0
+        self._evicted:  int                            = 0
+
+    def put(self,
+            search_query_cid: str,
+            ranking: Sequence[tuple[str, float]],
+            total: int,
+            total_is_exact: bool = True
+            ) -> Optional[str]:
+        """
+        Store the ranking of a search.
+
+        A newer ranking for the same search_query_cid replaces the old one.
+
+        Args:
+            search_query_cid: Content ID of the search query.
+            ranking: (cid, score) pairs, highest score first.
+            total: Total number of results.
+            total_is_exact: False if total is only a lower bound.
+
+        Returns:
+            Optional[str]: The cursor token, or None if the ranking alone is over the memory budget.
+        """
+        cids = np.array([cid.encode("utf-8") for cid, _ in ranking], dtype=np.bytes_)
+        scores = np.fromiter((score for _, score in ranking), dtype=np.float32, count=len(ranking))
+        cursor = ResultCursor(
+            token=secrets.token_urlsafe(16),
+            search_query_cid=search_query_cid,
+            cids=cids,
+            scores=scores,
+            total=total,
+            total_is_exact=total_is_exact,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        if cursor.nbytes > self.max_bytes:
+            self.logger.warning(
+                f"Ranking of {len(cursor)} results ({cursor.nbytes} bytes) is over the result cursor budget. Not storing it."
+            )
+            return None
+
+        with self._lock:
+            old_cursor = self._cursors.get(self._by_query.get(search_query_cid))
+            if old_cursor is not None and old_cursor.search_query_cid == search_query_cid:
+                self._remove(old_cursor.token)
+            self._cursors[cursor.token] = cursor
+            self._by_query[search_query_cid] = cursor.token
+            self._nbytes += cursor.nbytes
+            self._evict(time.monotonic())
+        return cursor.token
+
+    def get(self, token: Optional[str] = None, search_query_cid: Optional[str] = None) -> Optional[ResultCursor]:
+        """
+        Get a cursor by its token, or else by the search it ranks.
+
+        Args:
+            token: The cursor token from an earlier response.
+            search_query_cid: Content ID of the search query. If a token is given too,
+                the cursor must belong to this search. If the token is unknown, the
+                latest cursor for this search is used instead.
+
+        Returns:
+            Optional[ResultCursor]: The cursor, or None if it is unknown or expired.
+        """
+        with self._lock:
+            cursor = self._cursors.get(token)
+            if cursor is not None and search_query_cid is not None and not self._belongs_to(cursor, search_query_cid):
+                cursor = None
+            if cursor is None and search_query_cid is not None:
+                cursor = self._cursors.get(self._by_query.get(search_query_cid))
+
+            if cursor is not None and cursor.expires_at <= time.monotonic():
+                self._remove(cursor.token)
+                cursor = None
+
+            if cursor is None:
+                self._misses += 1
+                return None
+            self._cursors.move_to_end(cursor.token)
+            self._hits += 1
+            return cursor
+
+    def link(self, search_query_cid: str, token: str) -> None:
+        """
+        Let another search use an existing cursor, e.g. one that means the same thing.
+
+        Args:
+            search_query_cid: Content ID of the other search.
+            token: The cursor token.
+        """
+        with self._lock:
+            if token in self._cursors:
+                self._by_query[search_query_cid] = token
+
+    def set_total(self, token: str, total: int) -> None:
+        """
+        Replace a cursor's lower-bound total with the exact one, once it has been counted.
+
+        Args:
+            token: The cursor token.
+            total: The exact total.
+        """
+        with self._lock:
+            cursor = self._cursors.get(token)
+            if cursor is not None:
+                self._cursors[token] = replace(cursor, total=total, total_is_exact=True)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the store's counters.
+
+        Returns:
+            dict: cursors, bytes, max_bytes, hits, misses and evicted.
+        """
+        with self._lock:
+            return {
+                "cursors": len(self._cursors),
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evicted": self._evicted,
+            }
+
+    def clear(self) -> None:
+        """Drop every cursor."""
+        with self._lock:
+            self._cursors.clear()
+            self._by_query.clear()
+            self._nbytes = 0
+
+    def _belongs_to(self, cursor: ResultCursor, search_query_cid: str) -> bool:
+        return cursor.search_query_cid == search_query_cid or self._by_query.get(search_query_cid) == cursor.token
+
+    def _remove(self, token: str) -> None:
+        cursor = self._cursors.pop(token)
+        self._nbytes -= cursor.nbytes
+        for search_query_cid in [cid for cid, linked in self._by_query.items() if linked == token]:
+            del self._by_query[search_query_cid]
+
+    def _evict(self, now: float) -> None:
+        # Drop expired cursors first, then the least recently used until under budget.
+        for token in [token for token, cursor in self._cursors.items() if cursor.expires_at <= now]:
+            self._remove(token)
+            self._evicted += 1
+        while self._nbytes > self.max_bytes:
+            token = next(iter(self._cursors))
+            self.logger.debug(f"Evicting result cursor {token} to stay under the memory budget.")
+            self._remove(token)
+            self._evicted += 1
+
+
+RESULT_CURSOR_STORE = ResultCursorStore()
@@ -0,0 +1,81 @@
+"""
+Turn the cumulative search responses into version 2 SSE events.
+
+SearchFunction.search yields the whole page of results every time it has more.
+Sent as is, every event repeats all earlier results and their HTML. The encoder
+remembers what the client already has, and only sends new results, results
+whose rank changed, and the cids of results that dropped out.
+"""
+from typing import Any, Optional
+
+
+from schemas.results_delta import RankChange, RankedResult, ResultsDelta
+from schemas.results_snapshot import ResultsSnapshot
+
+
+_META_FIELDS = ("total", "total_matches", "page", "per_page", "total_pages", "total_is_exact", "cursor", "partial")
+
+
+class ResultsDeltaEncoder:
+    """
+    Encode one search's responses as ResultsDelta events and a final ResultsSnapshot.
+
+    Example:
+        >>> encoder = ResultsDeltaEncoder()
+        >>> async for response in search_func.search(page=1, per_page=20):
+        ...     delta = encoder.encode(response)
+        ...     if delta is not None:
+        ...         send("results_delta", delta)
+        >>> send("results_snapshot", encoder.snapshot())
+    """
+
+    def __init__(self):
+        self._ranks:    dict[str, int]           = {}
+        self._meta:     Optional[dict[str, Any]] = None
+        self._deadline: Optional[dict[str, Any]] = None
+
+    def encode(self, response: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """
+        Get the changes since the last response.
+
+        Args:
+            response: A search response, see SearchResponse.
+
+        Returns:
+            Optional[dict]: A ResultsDelta dict, or None if nothing changed.
+        """
+        offset = (response["page"] - 1) * response["per_page"]
+        ranks: dict[str, int] = {}
+        added: list[RankedResult] = []
+        moved: list[RankChange] = []
+        for index, result in enumerate(response["results"]):
+            cid, rank = result["cid"], offset + index + 1
+            ranks[cid] = rank
+            if cid not in self._ranks:
+                added.append(RankedResult(rank=rank, result=result))
+            elif self._ranks[cid] != rank:
+                moved.append(RankChange(cid=cid, rank=rank))
+        removed = [cid for cid in self._ranks if cid not in ranks]
+
+        meta = {name: response.get(name) for name in _META_FIELDS}
+        meta["total_is_exact"] = response.get("total_is_exact", True)
+        meta["partial"] = response.get("partial", False)
+        # Only the final response reports the deadline. It goes in the snapshot.
+        self._deadline = response.get("deadline") or self._deadline
+        changed = added or moved or removed or meta != self._meta
+        self._ranks, self._meta = ranks, meta
+        if not changed:
+            return None
+        return ResultsDelta(added=added, moved=moved, removed=removed, **meta).model_dump()
+
+    def snapshot(self) -> Optional[dict[str, Any]]:
+        """
+        Get the final order of the results.
+
+        Returns:
+            Optional[dict]: A ResultsSnapshot dict, or None if no response was encoded.
+        """
+        if self._meta is None:
+            return None
+        cids = sorted(self._ranks, key=self._ranks.get)
+        return ResultsSnapshot(cids=cids, deadline=self._deadline, **self._meta).model_dump()
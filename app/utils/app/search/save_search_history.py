@@ -2,20 +2,18 @@
 Utility for saving search query history.
 
 This module provides functionality to save search queries to the search_history table,
-enabling users to view their search history.
+enabling users to view their search history. The table is in the search cache database,
+and saved searches are written by its background writer, see SearchCacheStore.
 """
 from datetime import datetime
 import traceback
 from typing import Dict, List
 
 
-import duckdb
-from duckdb.typing import TIMESTAMP
-
-
 from configs import configs
 from logger import logger
 from utils.common.get_cid import get_cid
+from utils.app.search.search_cache_store import SearchCacheStore, SEARCH_CACHE_STORE
 
 
 class SearchHistory:
@@ -25,7 +23,11 @@ class SearchHistory:
     This class provides methods for saving, retrieving, and managing
     user search history in the database. It encapsulates all the SQL
     operations related to search history.
+
+    Attributes:
+        store: The search cache database the search_history table is in.
     """
+    store: SearchCacheStore = SEARCH_CACHE_STORE
     
     # SQL Statements as class constants
     SAVE_SEARCH_HISTORY = '''
@@ -81,6 +83,7 @@ class SearchHistory:
         """
         Saves a search query to the search_history table. 
         It enables the application to display search history to users when requested.
+        The row is only queued here. The search cache writer commits it with the next batch.
 
         Args:
             search_query_cid: The content identifier for the search query
@@ -102,24 +105,16 @@ class SearchHistory:
             )
             ```
         """
-        with duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=False) as conn:
-            with conn.cursor() as cursor:
-                timestamp = cls._get_datetime_iso_format()
-                try:
-                    conn.begin()
-                    cursor.execute(cls.SAVE_SEARCH_HISTORY, (
-                        get_cid(search_query_cid, timestamp),
-                        search_query_cid, 
-                        search_query, 
-                        client_id, 
-                        timestamp,
-                        result_count)
-                    )
-                    conn.commit()
-                    logger.info(f"Saved search history for query: {search_query}")
-                except Exception as e:
-                    logger.exception(f"Error saving search history: {e}")
-                    conn.rollback()
+        timestamp = cls._get_datetime_iso_format()
+        cls.store.submit("search_history", (
+            get_cid(search_query_cid, timestamp),
+            search_query_cid,
+            search_query,
+            client_id,
+            timestamp,
+            result_count)
+        )
+        logger.info(f"Queued search history for query: {search_query}")
 
     @classmethod
     def get_search_history(
@@ -136,7 +131,7 @@ class SearchHistory:
         It supports pagination with limit and offset parameters.
         
         The algorithm:
-        1. Connect to the database in read-only mode
+        1. Get a cursor on the search cache database
         2. Create a cursor for executing SQL
         3. Execute a SELECT query to retrieve search history for the specified client
         4. Format the results as a list of dictionaries
@@ -159,16 +154,16 @@ class SearchHistory:
             more_history = SearchHistory.get_search_history("user123", offset=10)
             ```
         """
-        with duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=True) as conn:
-            with conn.cursor() as cursor:
-                try:
-                    cursor.execute(cls.GET_SEARCH_HISTORY, (client_id, limit, offset))
-                    # Convert results to a list of dictionaries
-                    results = cursor.fetchdf().to_dict('records')
-                    return results
-                except Exception as e:
-                    logger.exception(f"Error retrieving search history: {e}")
-                    return []
+        with cls.store.cursor() as cursor:
+            try:
+                cursor.execute(cls.GET_SEARCH_HISTORY, (client_id, limit, offset))
+                # Convert results to a list of dictionaries
+                columns = [column[0] for column in cursor.description]
+                results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                return results
+            except Exception as e:
+                logger.exception(f"Error retrieving search history: {e}")
+                return []
 
     @classmethod
     def get_total_search_history_count(cls, client_id: str) -> int:
@@ -179,7 +174,7 @@ class SearchHistory:
         for a given client ID, which is useful for pagination calculations.
         
         The algorithm:
-        1. Connect to the database in read-only mode
+        1. Get a cursor on the search cache database
         2. Create a cursor for executing SQL
         3. Execute a COUNT query to get the total number of entries
         4. Return the count
@@ -196,15 +191,14 @@ class SearchHistory:
             total = SearchHistory.get_total_search_history_count("user123")
             ```
         """
-        with duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=True) as conn:
-            with conn.cursor() as cursor:
-                try:
-                    cursor.execute(cls.COUNT_SEARCH_HISTORY, (client_id,))
-                    result = cursor.fetchone()
-                    return result[0] if result else 0
-                except Exception as e:
-                    logger.exception(f"Error retrieving search history count: {e}")
-                    return 0
+        with cls.store.cursor() as cursor:
+            try:
+                cursor.execute(cls.COUNT_SEARCH_HISTORY, (client_id,))
+                result = cursor.fetchone()
+                return result[0] if result else 0
+            except Exception as e:
+                logger.exception(f"Error retrieving search history count: {e}")
+                return 0
 
     @classmethod
     def delete_search_history_entry(cls, search_id: int, client_id: str) -> bool:
@@ -216,7 +210,7 @@ class SearchHistory:
         This ensures users can only delete their own search history.
         
         The algorithm:
-        1. Connect to the database with write access
+        1. Get a cursor on the search cache database
         2. Create a cursor for executing SQL
         3. Execute a DELETE statement with both search_id and client_id conditions
         4. Return a boolean indicating success
@@ -234,19 +228,14 @@ class SearchHistory:
             success = SearchHistory.delete_search_history_entry(42, "user123")
             ```
         """
-        with duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=False) as conn:
-            with conn.cursor() as cursor:
-                try:
-                    conn.begin()
-                    cursor.execute(cls.DELETE_SEARCH_HISTORY_ENTRY, (search_id, client_id))
-                    
-                    conn.commit()
-                    logger.info(f"Deleted search history entry {search_id} for client {client_id}")
-                    return True
-                except Exception as e:
-                    logger.exception(f"Error deleting search history entry: {e}")
-                    conn.rollback()
-                    return False
+        try:
+            with cls.store.transaction() as cursor:
+                cursor.execute(cls.DELETE_SEARCH_HISTORY_ENTRY, (search_id, client_id))
+            logger.info(f"Deleted search history entry {search_id} for client {client_id}")
+            return True
+        except Exception as e:
+            logger.exception(f"Error deleting search history entry: {e}")
+            return False
 
     @classmethod
     def clear_search_history(cls, client_id: str) -> bool:
@@ -257,7 +246,7 @@ class SearchHistory:
         It provides users with the ability to clear their entire search history.
         
         The algorithm:
-        1. Connect to the database with write access
+        1. Get a cursor on the search cache database
         2. Create a cursor for executing SQL
         3. Execute a DELETE statement to remove all entries for the client
         4. Return a boolean indicating success
@@ -274,19 +263,14 @@ class SearchHistory:
             success = SearchHistory.clear_search_history("user123")
             ```
         """
-        with duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=False) as conn:
-            with conn.cursor() as cursor:
-                try:
-                    conn.begin()
-                    cursor.execute(cls.CLEAR_SEARCH_HISTORY, (client_id,))
-                    
-                    conn.commit()
-                    logger.info(f"Cleared all search history for client {client_id}")
-                    return True
-                except Exception as e:
-                    logger.exception(f"Error clearing search history: {e}")
-                    conn.rollback()
-                    return False
+        try:
+            with cls.store.transaction() as cursor:
+                cursor.execute(cls.CLEAR_SEARCH_HISTORY, (client_id,))
+            logger.info(f"Cleared all search history for client {client_id}")
+            return True
+        except Exception as e:
+            logger.exception(f"Error clearing search history: {e}")
+            return False
 
 # Alias functions for backward compatibility
 save_search_history = SearchHistory.save_search_history
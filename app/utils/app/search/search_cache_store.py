@@ -0,0 +1,459 @@
+"""
+The database of cached search queries and search history, written by one background task.
+
+Saving a search used to open american_law.db read-write from the request path. DuckDB
+lets only one connection write to a file, and none read it meanwhile, so that blocked
+every read-only open of the law database, in this process and the other workers.
+The cached search queries and the search history now live in their own database.
+Request handlers only queue their rows with `submit()`. One asyncio task takes them off
+the queue and commits them in batches, each batch in one transaction.
+
+The search cache is a SQLite file in WAL mode, like the shared response cache, because
+every server worker writes to it. A DuckDB file can only be open read-write in one process,
+and then in no other, even read-only. In WAL mode each worker keeps its connections open,
+reads never wait, and writers take turns on SQLite's write lock, waiting up to the busy
+timeout for it. The tables are created once per process, on its first connection.
+
+A cached search's ranking is stored in search_query_rank, with a row per ranked law keyed
+by the search and its rank, so a page of it is a range of one search's rows, and the cached
+searches that contain a law can be found by its cid.
+
+With nothing else writing to it, read-only connections to the law database are kept
+open for the life of the process (see DATABASE_CONNECTION_KEEP_IDLE).
+"""
+from __future__ import annotations
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+
+import numpy as np
+
+
+from configs import configs
+from logger import logger as module_logger
+
+
+T = TypeVar('T')
+
+# The tables rows are submitted to, and their columns in submit order. The first column is the key.
+# A search_query row's cids and scores are written to search_query_rank.
+TABLES: dict[str, list[str]] = {
+    "search_query": [
+        "search_query_cid", "search_query", "embedding", "total_results", "cids", "scores", "saved_at", "mode"
+    ],
+    "search_history": [
+        "search_history_cid", "search_query_cid", "search_query", "client_id", "timestamp", "result_count"
+    ],
+}
+
+# Bump when the schema changes. Files of an older version get the new tables, and the migrations since their version.
+SCHEMA_VERSION: int = 2
+
+_CREATE_TABLES = [
+    # The embedding is float32 bytes, and saved_at and timestamp are ISO 8601 text.
+    '''
+    CREATE TABLE IF NOT EXISTS search_query (
+        search_query_cid TEXT PRIMARY KEY,
+        search_query TEXT NOT NULL,
+        embedding BLOB NOT NULL,
+        total_results INTEGER NOT NULL,
+        n_ranked INTEGER NOT NULL,
+        saved_at TEXT,
+        mode TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS search_query_rank (
+        search_query_cid TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        cid TEXT NOT NULL,
+        score REAL,
+        PRIMARY KEY (search_query_cid, rank)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_search_query_rank_cid ON search_query_rank (cid)",
+    '''
+    CREATE TABLE IF NOT EXISTS search_history (
+        search_history_cid TEXT PRIMARY KEY,
+        search_query_cid TEXT NOT NULL,
+        search_query TEXT NOT NULL,
+        client_id TEXT NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        result_count INTEGER NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_search_history_client_id ON search_history (client_id)",
+]
+
+# The statements that bring a file of the version before each one up to it.
+_MIGRATIONS: dict[int, list[str]] = {
+    # Searches saved before have no mode, since it can't be told from their lowercased query.
+    2: ["ALTER TABLE search_query ADD COLUMN mode TEXT"],
+}
+
+_INSERT_SEARCH_QUERY = '''
+    INSERT OR REPLACE INTO search_query
+        (search_query_cid, search_query, embedding, total_results, n_ranked, saved_at, mode)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+_INSERT_SEARCH_HISTORY = f'''
+    INSERT OR REPLACE INTO search_history ({', '.join(TABLES['search_history'])}) VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+_STOP = object()
+
+
+def _to_sqlite(value: Any) -> Any:
+    """Datetimes as ISO 8601 text, embeddings as float32 bytes, and everything else as it is."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return np.asarray(value, dtype=np.float32).ravel().tobytes()
+    return value
+
+
+class SearchCacheStore:
+    """
+    Owns the search cache database: queues rows for it, writes them in batches, and runs reads on it.
+
+    Attributes:
+        db_path: The search cache database file. It is created with its tables on first use.
+        batch_size: Max rows committed at once.
+        flush_seconds: Max seconds a queued row waits for its batch to fill before it is committed.
+        max_queue: Max rows waiting to be written. Rows submitted beyond that are dropped.
+        busy_timeout_ms: How long a write waits for another worker's to finish before it fails.
+        logger: Logger for start up, shutdown and write errors.
+    """
+
+    def __init__(self,
+                 db_path: Path = configs.SEARCH_CACHE_DB_PATH,
+                 batch_size: int = 500,
+                 flush_seconds: float = 1.0,
+                 max_queue: int = 10000,
+                 busy_timeout_ms: int = 5000,
+                 logger: logging.Logger = module_logger
+                ):
+        self.db_path:         Path           = Path(db_path)
+        self.batch_size:      int            = max(1, batch_size)
+        self.flush_seconds:   float          = flush_seconds
+        self.max_queue:       int            = max(1, max_queue)
+        self.busy_timeout_ms: int            = busy_timeout_ms
+        self.logger:          logging.Logger = logger
+
+        # SQLite connections can't be shared between threads, or with a forked process.
+        self._local:       threading.local                         = threading.local()
+        self._lock:        threading.Lock                          = threading.Lock()
+        self._schema_lock: threading.Lock                          = threading.Lock()
+        self._schema_pid:  Optional[int]                           = None
+        self._loop:        Optional[asyncio.AbstractEventLoop]     = None
+        self._queue:       Optional[asyncio.Queue]                 = None
+        self._task:        Optional[asyncio.Task]                  = None
+        self._stopping:    bool                                    = False
+
+        self._submitted:     int   = 0
+        self._written:       int   = 0
+        self._dropped:       int   = 0
+        self._failed:        int   = 0
+        self._batches:       int   = 0
+        self._write_seconds: float = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Start the writer task on the running event loop. Does nothing if it is already running."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = self._loop.create_task(self._write_batches(), name="search_cache_writer")
+        self.logger.info(f"Started search cache writer for {self.db_path}.")
+
+    async def shutdown(self) -> None:
+        """Write every row still queued, then stop the writer task."""
+        task, queue = self._task, self._queue
+        if task is None:
+            return
+        await asyncio.sleep(0)  # Let rows submitted from other threads before now reach the queue.
+        self._stopping = True
+        await queue.put(_STOP)
+        await task
+        self._task = self._queue = self._loop = None
+        self._stopping = False
+        self.logger.info(f"Shut down search cache writer. Final stats: {self.stats()}")
+
+    def submit(self, table: str, row: tuple) -> None:
+        """
+        Queue a row to be written. Safe to call from the event loop and from other threads.
+
+        Rows of a table with the same key replace each other, the last one submitted wins.
+        A row is dropped, with a warning, if the writer isn't running or its queue is full.
+
+        Args:
+            table: One of TABLES.
+            row: The row's values, in the order of TABLES[table].
+
+        Raises:
+            ValueError: If the table is unknown or the row has the wrong number of values.
+        """
+        columns = TABLES.get(table)
+        if columns is None:
+            raise ValueError(f"Unknown search cache table '{table}'. Expected one of {list(TABLES)}.")
+        if len(row) != len(columns):
+            raise ValueError(f"A {table} row has {len(columns)} values, got {len(row)}.")
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._drop(table, "the search cache writer isn't running")
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._enqueue(table, row)
+        else:
+            loop.call_soon_threadsafe(self._enqueue, table, row)
+
+    def _enqueue(self, table: str, row: tuple) -> None:
+        if self._queue is None or self._stopping:
+            self._drop(table, "the search cache writer has stopped")
+            return
+        try:
+            self._queue.put_nowait((table, row))
+        except asyncio.QueueFull:
+            self._drop(table, f"the search cache queue is full ({self.max_queue} rows)")
+            return
+        with self._lock:
+            self._submitted += 1
+
+    def _drop(self, table: str, reason: str) -> None:
+        with self._lock:
+            self._dropped += 1
+        self.logger.warning(f"Dropped a {table} row because {reason}.")
+
+    async def _write_batches(self) -> None:
+        """Take rows off the queue and write them, a batch at a time, until shutdown."""
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = self._loop.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await asyncio.to_thread(self.write, batch)
+
+        # Rows queued before shutdown are still written.
+        batch = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            await asyncio.to_thread(self.write, batch)
+
+    def write(self, batch: list[tuple[str, tuple]]) -> int:
+        """
+        Commit a batch of rows in one transaction. Called by the writer task, in a worker thread.
+
+        Args:
+            batch: (table, row) pairs, as passed to submit.
+
+        Returns:
+            int: The number of rows written. 0 if the batch failed, which is logged.
+        """
+        rows_by_table: dict[str, dict[Any, tuple]] = {}
+        for table, row in batch:
+            rows_by_table.setdefault(table, {})[row[0]] = row  # One row per key, the last one wins.
+
+        started = time.perf_counter()
+        written = sum(len(rows) for rows in rows_by_table.values())
+        try:
+            with self.transaction() as cursor:
+                if "search_query" in rows_by_table:
+                    _write_search_queries(cursor, rows_by_table["search_query"].values())
+                if "search_history" in rows_by_table:
+                    cursor.executemany(
+                        _INSERT_SEARCH_HISTORY,
+                        [tuple(_to_sqlite(value) for value in row) for row in rows_by_table["search_history"].values()]
+                    )
+        except Exception as e:
+            self.logger.exception(f"Error writing {written} rows to the search cache: {e}")
+            with self._lock:
+                self._failed += written
+            return 0
+
+        with self._lock:
+            self._written += written
+            self._batches += 1
+            self._write_seconds += time.perf_counter() - started
+        self.logger.debug(f"Wrote {written} rows to the search cache.")
+        return written
+
+    @contextmanager
+    def cursor(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Get a cursor on the search cache database, e.g. to read it.
+
+        It is on this thread's connection, which stays open, in autocommit mode, so reads
+        see the latest commit of every worker and don't hold a transaction open.
+
+        Yields:
+            sqlite3.Cursor: A cursor. Don't share it between threads.
+        """
+        cursor = self._connection().cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Get a cursor in a write transaction, committed when the block exits, or rolled back if it raises.
+
+        Yields:
+            sqlite3.Cursor: A cursor. Don't share it between threads.
+
+        Raises:
+            sqlite3.OperationalError: If another worker held the write lock for longer than the busy timeout.
+        """
+        with self.cursor() as cursor:
+            # Take the write lock up front, so waiting for another worker happens before any work.
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+
+    def read(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a function on a cursor on the search cache database. It blocks, so call it off the event loop.
+
+        Args:
+            func: Called as func(cursor, *args, **kwargs).
+
+        Returns:
+            Whatever func returns.
+        """
+        with self.cursor() as cursor:
+            return func(cursor, *args, **kwargs)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._open()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")  # A crash can lose the last writes, which is fine for a cache.
+            with self._schema_lock:
+                if self._schema_pid != os.getpid():
+                    self._create_tables(conn)
+                    self._schema_pid = os.getpid()
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection) -> None:
+        """Create or migrate the tables, unless another worker already has. Run once per process."""
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]  # Another worker may have been first.
+            if version > 0:
+                for statement in (
+                    statement for to in range(version + 1, SCHEMA_VERSION + 1) for statement in _MIGRATIONS.get(to, [])
+                ):
+                    conn.execute(statement)
+            for statement in _CREATE_TABLES:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get counters for monitoring the writer.
+
+        Returns:
+            dict[str, Any]:
+                - queued: Rows waiting to be written.
+                - submitted, written: Rows queued and written since start up.
+                - dropped: Rows not queued, because the writer wasn't running or its queue was full.
+                - failed: Rows in batches that failed to write.
+                - batches, mean_batch_seconds: Batches written, and how long each took.
+        """
+        with self._lock:
+            return {
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "submitted": self._submitted,
+                "written": self._written,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "batches": self._batches,
+                "mean_batch_seconds": self._write_seconds / self._batches if self._batches else 0.0,
+            }
+
+
+def _write_search_queries(cursor: sqlite3.Cursor, rows: Iterable[tuple]) -> None:
+    """Insert or replace search_query rows, and replace the ranks of those searches."""
+    rows = list(rows)
+    cursor.executemany(_INSERT_SEARCH_QUERY, [
+        (search_query_cid, search_query, _to_sqlite(embedding), total_results, len(cids), _to_sqlite(saved_at), mode)
+        for search_query_cid, search_query, embedding, total_results, cids, _, saved_at, mode in rows
+    ])
+    cursor.executemany(
+        "DELETE FROM search_query_rank WHERE search_query_cid = ?", [(row[0],) for row in rows]
+    )
+    cursor.executemany(
+        "INSERT INTO search_query_rank (search_query_cid, rank, cid, score) VALUES (?, ?, ?, ?)",
+        [
+            (search_query_cid, rank, cid, None if score is None else float(score))
+            for search_query_cid, _, _, _, cids, scores, _, _ in rows
+            for rank, (cid, score) in enumerate(zip(cids, scores), start=1)
+        ]
+    )
+
+
+# Application-scoped store. Its writer is started and stopped by the FastAPI app's lifespan.
+SEARCH_CACHE_STORE = SearchCacheStore(
+    db_path=configs.SEARCH_CACHE_DB_PATH,
+    batch_size=configs.SEARCH_CACHE_BATCH_SIZE,
+    flush_seconds=configs.SEARCH_CACHE_FLUSH_SECONDS,
+    max_queue=configs.SEARCH_CACHE_QUEUE_SIZE,
+)
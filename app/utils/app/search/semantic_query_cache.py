@@ -0,0 +1,305 @@
+"""
+Find earlier searches that mean the same thing as a new one.
+
+get_cached_query_results only matches the exact search_query_cid, so
+"dog leash laws in ohio" and "ohio dog leash ordinances" both run a full search.
+This cache keeps the embeddings of earlier queries as one normalized float32
+matrix. A new query embedding is compared to all of them with one matrix-vector
+product, and a close enough match can reuse that search's ranking.
+
+Each entry counts its hits and expires after a TTL, so the cache can be audited
+and its threshold tuned. When it is full, the least recently used entry is evicted.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, asdict, replace
+from datetime import datetime
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+
+import numpy as np
+
+
+from configs import configs
+from logger import logger as module_logger
+from schemas.search_mode import SearchMode
+from utils.app.search.search_cache_store import SearchCacheStore, SEARCH_CACHE_STORE
+
+
+_MODE_IDS: dict[str, int] = {mode.value: i for i, mode in enumerate(SearchMode)}
+
+
+@dataclass
+class SemanticCacheEntry:
+    """
+    An earlier search whose ranking can be reused.
+
+    Attributes:
+        search_query_cid: Content ID of the earlier search, to look its ranking up with.
+        search_query: The earlier search query.
+        mode: The search mode it was run in. Only searches in the same mode match.
+        created_at: Unix time the search was ranked, usually when the entry was added.
+        expires_at: Unix time after which the entry no longer matches.
+        hits: Number of searches that reused this entry.
+        last_hit_at: Unix time of the last hit, or None.
+    """
+    search_query_cid: str
+    search_query: str
+    mode: str
+    created_at: float
+    expires_at: float
+    hits: int = 0
+    last_hit_at: Optional[float] = None
+
+
+class SemanticQueryCache:
+    """
+    Thread-safe nearest-neighbour cache of search query embeddings.
+
+    Example:
+        >>> cache = SemanticQueryCache(threshold=0.92)
+        >>> cache.add(search_query_cid, "dog leash laws in ohio", embedding, mode="llm")
+        >>> entry, similarity = cache.lookup(other_embedding, mode="llm")
+
+    Attributes:
+        threshold: Minimum cosine similarity for a match.
+        ttl_seconds: How long an entry matches after its search was ranked.
+        max_entries: Max number of entries.
+        logger: Logger for loading and evictions.
+    """
+
+    def __init__(self,
+                 threshold: float = configs.SEMANTIC_CACHE_THRESHOLD,
+                 ttl_seconds: float = configs.SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries: int = configs.SEMANTIC_CACHE_MAX_ENTRIES,
+                 logger: logging.Logger = module_logger
+                 ):
+        self.threshold:   float          = threshold
+        self.ttl_seconds: float          = ttl_seconds
+        self.max_entries: int            = max_entries
+        self.logger:      logging.Logger = logger
+
+        self._lock:       threading.Lock = threading.Lock()
+        # One row per slot. Empty slots never match, because they have expired.
+        self._matrix:     Optional[np.ndarray]                = None
+        self._expires_at: np.ndarray                          = np.empty(0, dtype=np.float64)
+        self._last_used:  np.ndarray                          = np.empty(0, dtype=np.float64)
+        self._modes:      np.ndarray                          = np.empty(0, dtype=np.int8)
+        self._entries:    list[Optional[SemanticCacheEntry]]  = []
+        self._slots:      dict[str, int]                      = {}
+        self._free:       list[int]                           = []
+        self._size:       int                                 = 0
+        self._lookups:    int                                 = 0
+        self._hits:       int                                 = 0
+        self._evicted:    int                                 = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float] | np.ndarray) -> np.ndarray:
+        # LLM.get_single_embedding returns [[...]], so flatten first.
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def add(self,
+            search_query_cid: str,
+            search_query: str,
+            embedding: Sequence[float] | np.ndarray,
+            mode: SearchMode | str = SearchMode.LLM,
+            saved_at: Optional[float] = None
+            ) -> None:
+        """
+        Add a search, or refresh it if it is already cached.
+
+        Args:
+            search_query_cid: Content ID of the search.
+            search_query: The search query.
+            embedding: The search query embedding.
+            mode: The search mode it was run in.
+            saved_at: Unix time the search was ranked, if it wasn't just now. The entry expires ttl_seconds after it.
+
+        Raises:
+            ValueError: If the embedding has a different dimension than the cached ones.
+        """
+        vector = self._normalize(embedding)
+        now = time.time()
+        created_at = now if saved_at is None else saved_at
+        entry = SemanticCacheEntry(
+            search_query_cid=search_query_cid,
+            search_query=search_query,
+            mode=str(mode),
+            created_at=created_at,
+            expires_at=created_at + self.ttl_seconds,
+        )
+        with self._lock:
+            if self._matrix is not None and vector.shape[0] != self._matrix.shape[1]:
+                raise ValueError(
+                    f"Embedding has {vector.shape[0]} dimensions, but the cached embeddings have {self._matrix.shape[1]}."
+                )
+            slot = self._slots.get(search_query_cid)
+            if slot is None:
+                slot = self._take_slot(vector.shape[0], now)
+            self._matrix[slot] = vector
+            self._expires_at[slot] = entry.expires_at
+            self._last_used[slot] = now
+            self._modes[slot] = _MODE_IDS[entry.mode]
+            self._entries[slot] = entry
+            self._slots[search_query_cid] = slot
+
+    def lookup(
+            self,
+            embedding: Sequence[float] | np.ndarray,
+            mode: SearchMode | str = SearchMode.LLM
+            ) -> Optional[tuple[SemanticCacheEntry, float]]:
+        """
+        Find the cached search most similar to a query embedding.
+
+        Args:
+            embedding: The new search query embedding.
+            mode: The new search's mode.
+
+        Returns:
+            Optional[tuple[SemanticCacheEntry, float]]: A copy of the matching entry and its cosine similarity,
+                or None if no unexpired entry in the same mode reaches the threshold.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._lookups += 1
+            if self._size == 0 or vector.shape[0] != self._matrix.shape[1]:
+                return None
+
+            now = time.time()
+            similarities = self._matrix[:self._size] @ vector
+            valid = (self._expires_at[:self._size] > now) & (self._modes[:self._size] == _MODE_IDS[str(mode)])
+            similarities = np.where(valid, similarities, -np.inf)
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity < self.threshold:
+                return None
+
+            entry = self._entries[slot]
+            entry.hits += 1
+            entry.last_hit_at = now
+            self._last_used[slot] = now
+            self._hits += 1
+            return replace(entry), similarity
+
+    def discard(self, search_query_cid: str) -> None:
+        """Remove a search, e.g. because its ranking is no longer available."""
+        with self._lock:
+            slot = self._slots.get(search_query_cid)
+            if slot is not None:
+                self._free_slot(slot)
+
+    def load(self, store: SearchCacheStore = SEARCH_CACHE_STORE) -> int:
+        """
+        Add the searches saved in the search_query table that haven't expired.
+
+        Each one expires ttl_seconds after it was saved. Searches saved without a mode or
+        a saved_at, by older versions, can't be matched safely, so they are left out.
+
+        Args:
+            store: The search cache database the search_query table is in.
+
+        Returns:
+            int: The number of searches added. 0 if the table can't be read.
+        """
+        try:
+            rows = store.read(lambda cursor: cursor.execute(
+                "SELECT search_query_cid, search_query, embedding, mode, saved_at FROM search_query "
+                "WHERE mode IS NOT NULL AND saved_at IS NOT NULL"
+            ).fetchall())
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not load cached search queries from {store.db_path}: {e}")
+            return 0
+
+        added = 0
+        oldest = time.time() - self.ttl_seconds
+        for search_query_cid, search_query, embedding, mode, saved_at in rows:
+            try:
+                saved_at = datetime.fromisoformat(saved_at).timestamp()
+                if saved_at <= oldest:
+                    continue
+                self.add(
+                    search_query_cid, search_query, np.frombuffer(embedding, dtype=np.float32),
+                    mode=SearchMode(mode), saved_at=saved_at
+                )
+                added += 1
+            except ValueError as e:
+                self.logger.warning(f"Skipping cached search query '{search_query}': {e}")
+        self.logger.info(f"Loaded {added} cached search queries into the semantic query cache.")
+        return added
+
+    def entries(self) -> list[dict[str, Any]]:
+        """
+        Get every unexpired entry, to audit which searches are reused.
+
+        Returns:
+            list[dict]: The entries as dicts, most hits first.
+        """
+        now = time.time()
+        with self._lock:
+            entries = [asdict(entry) for entry in self._entries if entry is not None and entry.expires_at > now]
+        return sorted(entries, key=lambda entry: entry["hits"], reverse=True)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the cache's counters.
+
+        Returns:
+            dict: entries, lookups, hits, hit_rate, evicted and threshold.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._slots),
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_rate": self._hits / self._lookups if self._lookups else 0.0,
+                "evicted": self._evicted,
+                "threshold": self.threshold,
+            }
+
+    def _take_slot(self, dim: int, now: float) -> int:
+        if not self._free and self._size == len(self._entries):
+            # Reuse the slots of expired entries before growing.
+            for slot in np.flatnonzero(self._expires_at[:self._size] <= now):
+                if self._entries[slot] is not None:
+                    self._free_slot(int(slot))
+                    self._evicted += 1
+        if not self._free and len(self._slots) >= self.max_entries:
+            slot = min(self._slots.values(), key=lambda slot: self._last_used[slot])
+            self.logger.debug(f"Evicting '{self._entries[slot].search_query}' from the semantic query cache.")
+            self._free_slot(slot)
+            self._evicted += 1
+        if self._free:
+            return self._free.pop()
+        if self._size == len(self._entries):
+            self._grow(dim)
+        self._size += 1
+        return self._size - 1
+
+    def _grow(self, dim: int) -> None:
+        capacity = min(max(16, 2 * len(self._entries)), self.max_entries)
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        if self._matrix is not None:
+            matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+        self._expires_at = np.resize(self._expires_at, capacity)
+        self._last_used = np.resize(self._last_used, capacity)
+        self._modes = np.resize(self._modes, capacity)
+        self._entries.extend([None] * (capacity - len(self._entries)))
+
+    def _free_slot(self, slot: int) -> None:
+        entry = self._entries[slot]
+        del self._slots[entry.search_query_cid]
+        self._entries[slot] = None
+        self._expires_at[slot] = -np.inf
+        self._free.append(slot)
+
+
+SEMANTIC_QUERY_CACHE = SemanticQueryCache()
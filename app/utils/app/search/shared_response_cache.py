@@ -0,0 +1,348 @@
+"""
+Share cached responses between the server workers on a host, in one SQLite file.
+
+Each server worker has its own ResponseCache, so with N workers a repeated search only
+hits it about 1 time in N. This is the tier behind them: a response one worker serves
+is found by the others, and by workers started after it.
+
+SQLite in WAL mode lets every worker read while one writes, and its pages are read
+through a memory map, so a hit is a primary key lookup in shared memory. The file has
+a size cap. Once the responses in it are over the cap, the least recently used are
+deleted until they are under 90% of it, and SQLite reuses the freed pages. When an
+entry was last used is only updated once it is a minute old, so most hits don't write.
+
+Invalidations and clears are also logged in the file, with a sequence number, so each
+worker's ResponseCache can drop the same responses from its memory (see `invalidations()`).
+Only the latest INVALIDATION_LOG_SIZE are kept.
+
+The cache is best-effort: if the file is locked for longer than the busy timeout,
+reads miss and writes are skipped.
+
+It is used through a ResponseCache (see RESPONSE_CACHE), so get_cached_query_results and
+the law endpoint read it without changes. To give a SearchFunction another cache, pass
+`functools.partial(get_cached_query_results, response_cache=...)` as its
+get_cached_query_results resource.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+
+from configs import configs
+from logger import logger as module_logger
+
+
+_CREATE_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS responses (
+        id INTEGER PRIMARY KEY,
+        tier TEXT NOT NULL,
+        key TEXT NOT NULL,
+        data BLOB NOT NULL,
+        nbytes INTEGER NOT NULL,
+        used_at REAL NOT NULL,
+        UNIQUE (tier, key)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_responses_used_at ON responses (used_at)",
+    '''
+    CREATE TABLE IF NOT EXISTS response_tags (
+        tag TEXT NOT NULL,
+        response_id INTEGER NOT NULL REFERENCES responses (id) ON DELETE CASCADE
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_response_tags_tag ON response_tags (tag)",
+    "CREATE INDEX IF NOT EXISTS idx_response_tags_response_id ON response_tags (response_id)",
+    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)",
+    # A log of the tags invalidated, for the other workers to drop from their memory. A NULL tag drops everything.
+    "CREATE TABLE IF NOT EXISTS invalidations (seq INTEGER PRIMARY KEY AUTOINCREMENT, tag TEXT)",
+    "INSERT OR IGNORE INTO meta VALUES ('bytes', 0), ('source', NULL)",
+    # Keep the total size of the responses, so a put doesn't have to sum them.
+    '''
+    CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN
+        UPDATE meta SET value = value + NEW.nbytes WHERE name = 'bytes';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN
+        UPDATE meta SET value = value - OLD.nbytes WHERE name = 'bytes';
+    END
+    ''',
+]
+
+# Delete the least recently used responses whose sizes add up to at least ? bytes.
+_EVICT = '''
+    DELETE FROM responses WHERE id IN (
+        SELECT id FROM (
+            SELECT id, nbytes, SUM(nbytes) OVER (ORDER BY used_at, id) AS running FROM responses
+        )
+        WHERE running - nbytes < ?
+    )
+'''
+
+
+class SharedResponseCache:
+    """
+    Size-capped cache of serialized responses in a SQLite file that every server worker opens.
+
+    Keys are strings, and values are the bytes ResponseCache keeps in memory.
+
+    Attributes:
+        db_path: The SQLite file. It is created with its tables on first use.
+        max_bytes: Cap on the total size of the cached responses.
+        busy_timeout_ms: How long to wait for another worker's write before giving up.
+        touch_seconds: Min age of an entry's last use before a hit updates it.
+        logger: Logger for errors and evictions.
+    """
+
+    # Invalidations kept in the log. A worker further behind than this drops its whole memory.
+    INVALIDATION_LOG_SIZE: int = 10000
+
+    def __init__(self,
+                 db_path: Path = configs.RESPONSE_CACHE_SHARED_PATH,
+                 max_bytes: int = configs.RESPONSE_CACHE_SHARED_MAX_BYTES,
+                 busy_timeout_ms: int = 100,
+                 touch_seconds: float = 60.0,
+                 logger: logging.Logger = module_logger
+                 ):
+        self.db_path:         Path           = Path(db_path)
+        self.max_bytes:       int            = max_bytes
+        self.busy_timeout_ms: int            = busy_timeout_ms
+        self.touch_seconds:   float          = touch_seconds
+        self.logger:          logging.Logger = logger
+
+        # SQLite connections can't be shared between threads, or with a forked process.
+        self._local:   threading.local = threading.local()
+        self._lock:    threading.Lock  = threading.Lock()
+        self._hits:    int             = 0
+        self._misses:  int             = 0
+        self._evicted: int             = 0
+        self._errors:  int             = 0
+
+    def get(self, tier: str, key: str) -> Optional[tuple[bytes, tuple[str, ...]]]:
+        """
+        Get a cached response.
+
+        Args:
+            tier: The tier it was cached in.
+            key: Its key in that tier.
+
+        Returns:
+            Optional[tuple[bytes, tuple[str, ...]]]: Its bytes and tags, or None if it isn't cached.
+        """
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT id, data, used_at FROM responses WHERE tier = ? AND key = ?", (tier, key)
+            ).fetchone()
+            if row is None:
+                self._count("_misses")
+                return None
+            response_id, data, used_at = row
+            tags = tuple(tag for tag, in conn.execute(
+                "SELECT tag FROM response_tags WHERE response_id = ?", (response_id,)
+            ))
+            now = time.time()
+            if now - used_at >= self.touch_seconds:
+                conn.execute("UPDATE responses SET used_at = ? WHERE id = ?", (now, response_id))
+        except sqlite3.Error as e:
+            self._error(f"Could not read the shared response cache, treating it as a miss: {e}")
+            return None
+        self._count("_hits")
+        return data, tags
+
+    def put(self, tier: str, key: str, data: bytes, tags: tuple[str, ...] = ()) -> bool:
+        """
+        Cache a response, replacing any under the same key, then evict if over the size cap.
+
+        Args:
+            tier: The tier to cache it in.
+            key: Its key in that tier.
+            data: The serialized response.
+            tags: The cids it contains, to invalidate it by.
+
+        Returns:
+            bool: False if it wasn't cached, because it is over the size cap or the file was locked.
+        """
+        if len(data) > self.max_bytes:
+            return False
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM responses WHERE tier = ? AND key = ?", (tier, key))
+                response_id = conn.execute(
+                    "INSERT INTO responses (tier, key, data, nbytes, used_at) VALUES (?, ?, ?, ?, ?)",
+                    (tier, key, data, len(data), time.time())
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO response_tags (tag, response_id) VALUES (?, ?)", [(tag, response_id) for tag in tags]
+                )
+                total = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+                if total > self.max_bytes:
+                    evicted = conn.execute(_EVICT, (total - int(self.max_bytes * 0.9),)).rowcount
+                    self._count("_evicted", evicted)
+                    self.logger.debug(f"Evicted {evicted} responses to keep the shared response cache under its cap.")
+        except sqlite3.Error as e:
+            self._error(f"Could not write to the shared response cache, skipping it: {e}")
+            return False
+        return True
+
+    def invalidate(self, *tags: str) -> int:
+        """
+        Drop the cached responses with any of these tags.
+
+        Args:
+            tags: cids, or search query cids.
+
+        Returns:
+            int: The number of responses dropped.
+        """
+        if not tags:
+            return 0
+        try:
+            with self._transaction() as conn:
+                dropped = conn.execute(
+                    "DELETE FROM responses WHERE id IN "
+                    f"(SELECT response_id FROM response_tags WHERE tag IN ({', '.join('?' * len(tags))}))",
+                    tags
+                ).rowcount
+                self._log_invalidations(conn, tags)
+                return dropped
+        except sqlite3.Error as e:
+            self._error(f"Could not invalidate the shared response cache: {e}")
+            return 0
+
+    def clear(self, source: Optional[str] = None) -> bool:
+        """
+        Drop every cached response.
+
+        Args:
+            source: Identifies the database the responses are read from. If given, the
+                responses are only dropped if it differs from the one last passed,
+                so only the first worker to see a rebuilt database clears them.
+
+        Returns:
+            bool: True if the responses were dropped.
+        """
+        try:
+            with self._transaction() as conn:
+                if source is not None:
+                    if conn.execute("SELECT value FROM meta WHERE name = 'source'").fetchone()[0] == source:
+                        return False
+                    conn.execute("UPDATE meta SET value = ? WHERE name = 'source'", (source,))
+                conn.execute("DELETE FROM responses")
+                self._log_invalidations(conn, (None,))
+        except sqlite3.Error as e:
+            self._error(f"Could not clear the shared response cache: {e}")
+            return False
+        return True
+
+    def invalidations(self, after: Optional[int] = None) -> tuple[Optional[int], Optional[frozenset[str]]]:
+        """
+        Get the tags invalidated by any worker since a point in the log.
+
+        Args:
+            after: The sequence number last returned. None to only get the latest one.
+
+        Returns:
+            tuple[Optional[int], Optional[frozenset[str]]]: The latest sequence number, and the tags
+                invalidated after `after`. The tags are None if everything was dropped since, by a
+                clear or because the log no longer goes back that far. If the file can't be read,
+                `after` and no tags, so the same range is read again next time.
+        """
+        try:
+            conn = self._connection()
+            if after is None:
+                return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0], frozenset()
+            rows = conn.execute("SELECT seq, tag FROM invalidations WHERE seq > ? ORDER BY seq", (after,)).fetchall()
+        except sqlite3.Error as e:
+            self._error(f"Could not read the shared response cache's invalidations: {e}")
+            return after, frozenset()
+        if not rows:
+            return after, frozenset()
+        # Sequence numbers have no gaps, so a gap after `after` means the log was trimmed.
+        if rows[0][0] != after + 1 or any(tag is None for _, tag in rows):
+            return rows[-1][0], None
+        return rows[-1][0], frozenset(tag for _, tag in rows)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the cache's counters. Hits, misses, evictions and errors are this worker's own.
+
+        Returns:
+            dict: entries, bytes, max_bytes, hits, misses, evicted and errors.
+        """
+        try:
+            conn = self._connection()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            nbytes = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        except sqlite3.Error:
+            entries = nbytes = None
+        with self._lock:
+            return {
+                "entries": entries,
+                "bytes": nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evicted": self._evicted,
+                "errors": self._errors,
+            }
+
+    def _log_invalidations(self, conn: sqlite3.Connection, tags: tuple[Optional[str], ...]) -> None:
+        conn.executemany("INSERT INTO invalidations (tag) VALUES (?)", [(tag,) for tag in tags])
+        conn.execute(
+            "DELETE FROM invalidations WHERE seq <= (SELECT MAX(seq) FROM invalidations) - ?",
+            (self.INVALIDATION_LOG_SIZE,)
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Autocommit, so reads don't hold a transaction open.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._open()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        # Take the write lock up front, so a busy file fails fast instead of midway.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _open(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")  # A crash can lose the last writes, which is fine for a cache.
+        conn.execute(f"PRAGMA mmap_size = {int(self.max_bytes * 1.25)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in _CREATE_TABLES:
+                conn.execute(statement)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+        return conn
+
+    def _count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def _error(self, message: str) -> None:
+        self._count("_errors")
+        self.logger.warning(message)
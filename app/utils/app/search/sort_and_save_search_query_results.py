@@ -5,12 +5,18 @@ This module provides functions for organizing search results by relevance
 and caching them in the search_query table for future retrieval, which
 improves performance for repeated searches.
 """
-import duckdb
+from datetime import datetime
+
+
+import numpy as np
 from pydantic import BaseModel, Field
 
 
 from configs import configs 
 from logger import logger
+from schemas.search_mode import SearchMode
+from utils.app.search.search_cache_store import SearchCacheStore, SEARCH_CACHE_STORE
+from utils.llm.cosine_similarity import top_k_indices
 
 
 class _SearchQuery(BaseModel):
@@ -18,21 +24,27 @@ class _SearchQuery(BaseModel):
     A Pydantic model representing a search query and its cached results.
     
     This model stores a search query, its embedding vector, and the content IDs
-    of the top 100 most relevant results, enabling fast retrieval of previous
-    search results.
+    and scores of the top 100 most relevant results, enabling fast retrieval of
+    previous search results.
     
     Attributes:
         search_query_cid: The content identifier for the search query
         search_query: The original search query text
         embedding: The vector embedding of the search query (OpenAI's small embedding, 1536 dimensions)
         total_results: The total number of results found for this query
-        cids_for_top_100: A comma-separated string of content IDs for the top 100 results
+        cids: The content IDs of the top 100 results, highest score first
+        scores: The similarity score of each of the cids
+        saved_at: When the results were ranked
+        mode: The search mode the results were ranked in
     """
     search_query_cid: str
     search_query: str
     embedding: list = Field(max_length=1536, min_length=1536) # NOTE Length of OpenAI's small embedding.
     total_results: int
-    cids_for_top_100: str
+    cids: list[str]
+    scores: list[float]
+    saved_at: datetime = Field(default_factory=datetime.now)
+    mode: str = SearchMode.LLM.value
 
     def to_tuple(self):
         """
@@ -46,7 +58,10 @@ class _SearchQuery(BaseModel):
             self.search_query,
             self.embedding,
             self.total_results,
-            self.cids_for_top_100,
+            self.cids,
+            self.scores,
+            self.saved_at,
+            self.mode,
         )
 
 
@@ -56,6 +71,8 @@ def sort_and_save_search_query_results(
     search_query_embedding: list[float] = None,
     query_table_embedding_cids: list[tuple[str, float]] = None,
     total: int = None,
+    search_cache_store: SearchCacheStore = SEARCH_CACHE_STORE,
+    mode: SearchMode = SearchMode.LLM,
 ) -> None:
     """
     Sorts search results by similarity score and saves them to the search_query table.
@@ -66,11 +83,10 @@ def sort_and_save_search_query_results(
     that can be reused for identical or similar future queries.
     
     The algorithm:
-    1. Sort the query_table_embedding_cids by similarity score in descending order
-    2. Extract the top 100 content IDs from the sorted results
+    1. Select the top 100 query_table_embedding_cids by similarity score with a vectorized partial sort
+    2. Extract their content IDs in descending score order
     3. Create a _SearchQuery object with the query information and top results
-    4. Connect to the database and insert or replace the record in the search_query table
-    5. Log the result of the operation
+    4. Queue the record for the search cache writer, which inserts or replaces it in the search_query table
     
     Args:
         search_query_cid: The content identifier for the search query
@@ -78,6 +94,8 @@ def sort_and_save_search_query_results(
         search_query_embedding: The vector embedding of the search query
         query_table_embedding_cids: A list of tuples containing (content_id, similarity_score)
         total: The total number of results found for this query
+        search_cache_store: The search cache database the search_query table is in
+        mode: The search mode the results were ranked in
         
     Returns:
         None
@@ -98,46 +116,30 @@ def sort_and_save_search_query_results(
         )
         ```
     """
-    # Sort the overall results by similarity score.
-    query_table_embedding_cids = sorted(query_table_embedding_cids, key=lambda x: x[1], reverse=True)
+    # Select the top 100 results by similarity score.
+    scores = np.fromiter((score for _, score in query_table_embedding_cids), dtype=np.float32)
     #logger.debug(f"query_table_embedding_cids: {query_table_embedding_cids}")
 
-    # String them together in that order for the query.
-    top_100_cids = [cid for cid, _ in query_table_embedding_cids[:100]]
-    #logger.debug(f"top_100_cids: {top_100_cids}")
+    # Keep them in that order, with the first score of any cid that is ranked twice.
+    top_100: dict[str, float] = {}
+    for i in top_k_indices(scores, top_k=100):
+        top_100.setdefault(query_table_embedding_cids[i][0], float(scores[i]))
+    #logger.debug(f"top_100: {top_100}")
 
     # If search_query_embedding is a list of list of floats, flatten it.
     # TODO This is hacky, refactor this to be more robust.
     if len(search_query_embedding) == 1 and isinstance(search_query_embedding[0], list):
         search_query_embedding = search_query_embedding[0]
 
-    # Save the results CIDs to the query_hash table
-    logger.info("Saving top 100 query results to search_query table...")
+    # Queue the results CIDs for the search_query table.
     search_query_tuple = _SearchQuery(
         search_query_cid=search_query_cid,
         search_query=search_query,
         embedding=search_query_embedding,
         total_results=total,
-        cids_for_top_100=','.join(top_100_cids)
+        cids=list(top_100),
+        scores=list(top_100.values()),
+        mode=SearchMode(mode).value,
     ).to_tuple()
-
-    # TODO Make this so it doesn't need run into an IO error because of read only.
-    # with duckdb.connect(configs.AMERICAN_LAW_DB_PATH, read_only=False) as conn:
-    #     with conn.cursor() as cursor:
-    #         try:
-    #             conn.begin()
-    #             cursor.execute('''
-    #             INSERT OR REPLACE INTO search_query (
-    #                 search_query_cid, 
-    #                 search_query, 
-    #                 embedding, 
-    #                 total_results, 
-    #                 cids_for_top_100 
-    #             ) 
-    #             VALUES (?, ?, ?, ?, ?)
-    #             ''', search_query_tuple)
-    #             conn.commit()
-    #             logger.info("Saved top 100 query results to search_query table.")
-    #         except Exception as e:
-    #             logger.error(f"Error inserting into search_query table: {e}")
-    #             conn.rollback()
\ No newline at end of file
+    search_cache_store.submit("search_query", search_query_tuple)
+    logger.info("Queued top 100 query results for the search_query table.")
@@ -0,0 +1,145 @@
+"""
+A small dependency-graph scheduler for the stages of a search.
+
+Each stage is a coroutine function. A stage starts as soon as the stages it
+depends on have finished, and receives their results as keyword arguments.
+Independent stages (e.g. the intent check, SQL generation and query embedding)
+therefore run at the same time instead of back to back.
+"""
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+
+from logger import logger as module_logger
+
+
+@dataclass
+class _Stage:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    depends_on: tuple[str, ...] = ()
+    cancels_on_failure: tuple[str, ...] = ()
+
+
+class StageScheduler:
+    """
+    Run search stages as asyncio tasks, ordered by their dependencies.
+
+    Use it as an async context manager so stages still running when the block
+    exits (e.g. on an early return or a client disconnect) are cancelled and awaited.
+
+    Example:
+        >>> async with StageScheduler() as stages:
+        ...     stages.add("sql", make_sql)
+        ...     stages.add("count", count_rows, depends_on=["sql"])  # Called as count_rows(sql=...)
+        ...     stages.start()
+        ...     total = await stages.result("count")
+
+    Attributes:
+        logger: Logger for stage timings and failures.
+        timings: Seconds each finished stage took, excluding time spent waiting on dependencies.
+    """
+
+    def __init__(self, logger: logging.Logger = module_logger):
+        self.logger:   logging.Logger   = logger
+        self.timings:  dict[str, float] = {}
+
+        self._stages:  dict[str, _Stage]       = {}
+        self._tasks:   dict[str, asyncio.Task] = {}
+        self._failure: Optional[Exception]     = None
+
+    async def __aenter__(self) -> 'StageScheduler':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.aclose()
+
+    def add(self,
+            name: str,
+            func: Callable[..., Awaitable[Any]],
+            depends_on: Iterable[str] = (),
+            cancels_on_failure: Iterable[str] = ()
+            ) -> None:
+        """
+        Add a stage to the graph.
+
+        Args:
+            name: Unique name of the stage.
+            func: Coroutine function to run. It is called with the results of
+                `depends_on` as keyword arguments.
+            depends_on: Names of stages that must finish first.
+            cancels_on_failure: Names of stages to cancel if this stage raises.
+        """
+        if self._tasks:
+            raise RuntimeError("Cannot add stages after the scheduler has started.")
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' was already added.")
+        for dependency in depends_on:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'.")
+        self._stages[name] = _Stage(name, func, tuple(depends_on), tuple(cancels_on_failure))
+
+    def start(self) -> None:
+        """Start every stage. Each one waits on its own dependencies."""
+        for name, stage in self._stages.items():
+            self._tasks[name] = asyncio.create_task(self._run(stage), name=f"search-stage-{name}")
+
+    async def _run(self, stage: _Stage) -> Any:
+        kwargs = {dependency: await self._tasks[dependency] for dependency in stage.depends_on}
+        start = time.perf_counter()
+        try:
+            return await stage.func(**kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if stage.cancels_on_failure:
+                self.logger.info(f"Stage '{stage.name}' failed, cancelling {', '.join(stage.cancels_on_failure)}.")
+                if self._failure is None:
+                    self._failure = e
+                self.cancel(*stage.cancels_on_failure)
+            raise
+        finally:
+            self.timings[stage.name] = time.perf_counter() - start
+
+    async def result(self, name: str) -> Any:
+        """
+        Wait for a stage and return its result.
+
+        Raises:
+            Exception: Whatever the stage raised. If the stage was cancelled because
+                another stage failed, that stage's exception is raised instead.
+        """
+        task = self._tasks[name]
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Don't mask our own cancellation (e.g. the client disconnected).
+            if task.cancelled() and self._failure is not None and not asyncio.current_task().cancelling():
+                raise self._failure
+            raise
+
+    def done(self, name: str) -> bool:
+        """Check if a stage has finished, failed or been cancelled."""
+        return self._tasks[name].done()
+
+    def cancel(self, *names: str) -> None:
+        """Cancel the named stages if they are still running."""
+        for name in names:
+            task = self._tasks.get(name)
+            if task is not None and not task.done():
+                task.cancel()
+
+    async def aclose(self) -> None:
+        """Cancel every unfinished stage and wait for them all to settle."""
+        self.cancel(*self._tasks.keys())
+        if self._tasks:
+            # Also retrieves exceptions nobody awaited, so asyncio doesn't warn about them.
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self.timings:
+            self.logger.debug(
+                "Search stage timings: " + ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.timings.items())
+            )
@@ -0,0 +1,25 @@
+import re
+
+
+_TRAILING_PAGINATION = re.compile(
+    r"\s+LIMIT\s+\d+(\s+OFFSET\s+\d+)?\s*;?\s*$",
+    flags=re.IGNORECASE,
+)
+
+
+def strip_pagination(sql_query: str) -> str:
+    """
+    Remove a trailing LIMIT/OFFSET clause from a SQL query, so its total number of rows can be counted.
+
+    Args:
+        sql_query: A SQL query, e.g. from turn_english_into_sql.
+
+    Returns:
+        str: The query without its trailing LIMIT and OFFSET, and without a trailing semicolon.
+            Queries without a trailing LIMIT are returned with only the semicolon removed.
+
+    Example:
+        >>> strip_pagination("SELECT * FROM citations WHERE title LIKE '%zoning%' LIMIT 21 OFFSET 40;")
+        "SELECT * FROM citations WHERE title LIKE '%zoning%'"
+    """
+    return _TRAILING_PAGINATION.sub("", sql_query).rstrip().rstrip(";").rstrip()
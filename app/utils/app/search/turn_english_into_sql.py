@@ -6,6 +6,7 @@ from pydantic import BaseModel
 
 from logger import logger
 from api_.llm_.interface import LLMInterface
+from .strip_pagination import strip_pagination
 
 
 async def turn_english_into_sql(
@@ -18,8 +19,8 @@ async def turn_english_into_sql(
     """
     Converts a plaintext search query into a SQL command using an LLM asynchronously.
     This function takes a plaintext search query and uses an LLM to generate a SQL 
-    command. It also ensures that the generated SQL query includes pagination parameters 
-    (`LIMIT` and `OFFSET`) if they are not already present.
+    command. Any trailing `LIMIT` and `OFFSET` the LLM wrote are replaced with its own,
+    so the caller decides how many rows the query returns.
 
     Args:
         search_query (str): The plaintext search query to be converted into a SQL command.
@@ -29,6 +30,7 @@ async def turn_english_into_sql(
         offset (int, optional): The number of results to skip before starting to return rows. 
             Defaults to 0.
         llm (Union[LLMInterface, AsyncLLMInterface], optional): The LLM interface to use. Defaults to None.
+        parser (BaseModel, optional): Validates and cleans the SQL query, e.g. LLMSqlOutput. Defaults to None.
     Returns:
         Optional[str]: The generated SQL query string with pagination applied, or None if the 
         query could not be generated.
@@ -48,20 +50,16 @@ async def turn_english_into_sql(
         sql_query: str = sql_result.get("sql_query")
         logger.debug(f"SQL query result: {sql_result}")
 
-        # Add pagination to the generated SQL if it doesn't already have it
-        if sql_query and "LIMIT" not in sql_query.upper():
-            if ";" in sql_query:
-                sql_query = sql_query.replace(";", f" LIMIT {per_page} OFFSET {offset};")
-            else:
-                sql_query = f"{sql_query} LIMIT {per_page} OFFSET {offset}"
-        
-        logger.info(f"Generated SQL query: {sql_query}")
-
     if parser:
-        # Validate the SQL query using the parser
+        # Validate the SQL query using the parser. It also strips markdown and the LLM's LIMIT.
         try:
-            parsed_query = parser.model_validate({"sql_query": sql_query})
-            return parsed_query.sql_query
+            sql_query = parser.model_validate({"sql_query": sql_query}).sql_query
         except Exception as e:
             logger.error(f"Error parsing SQL query: {e}")
             return None
+
+    # Replace the LLM's pagination with ours, e.g. the LIMIT+1 probe for has_more.
+    if sql_query:
+        sql_query = f"{strip_pagination(sql_query)} LIMIT {per_page} OFFSET {offset}"
+        logger.info(f"Generated SQL query: {sql_query}")
+    return sql_query
@@ -9,15 +9,21 @@ These utilities are designed to be general-purpose and reusable across
 different components of the application.
 """
 from .safe_format import safe_format
+from .single_flight import SingleFlight
 from .get_cid import get_cid
 from .run_in_parallel_with_concurrency_limiter import run_in_parallel_with_concurrency_limiter
 from .run_in_process_pool import run_in_process_pool
 from .type_name import type_name
+from .worker_pool import WorkerPool, SharedArray, WORKER_POOL
 
 __all__ = [
     "safe_format",
+    "SingleFlight",
     "get_cid",
     "run_in_parallel_with_concurrency_limiter",
     "run_in_process_pool",
     "type_name",
+    "WorkerPool",
+    "SharedArray",
+    "WORKER_POOL",
 ]
@@ -10,6 +10,7 @@ import tqdm
 
 
 from logger import logger
+from .worker_pool import WORKER_POOL
 
 def _garbage_collector_pbar_and_remaining_futures(
                             pbar: tqdm.tqdm = None, 
@@ -61,6 +62,7 @@ def run_in_process_pool(
     Note:
         - Results are yielded in the order they complete, not in the order of inputs
         - Progress is displayed using tqdm
+        - If the app's WORKER_POOL is running, its processes are reused instead of starting a new pool
         - This function properly cleans up resources even if exceptions occur
         - Multiprocessing has overhead, so this is best for compute-intensive tasks
 
@@ -75,13 +77,28 @@ def run_in_process_pool(
     """
 
     # Default to using all CPU cores but one.
+    max_workers = max(1, psutil.cpu_count(logical=False) - 1)
     if max_concurrency is None:
-        max_workers = max_concurrency = psutil.cpu_count(logical=False) - 1
+        max_concurrency = max_workers
 
     # Make sure we get a consistent iterator throughout, rather than
     # getting the first element repeatedly.
     func_inputs = iter(inputs)
     pbar = tqdm.tqdm(total=len(inputs), leave=False)
+    futures = {}
+
+    # Reuse the app's long-lived workers instead of spawning a new pool.
+    if WORKER_POOL.started:
+        try:
+            for original_input, output in WORKER_POOL.map(
+                func, func_inputs, ordered=False, max_in_flight=max_concurrency
+            ):
+                pbar.update(1)
+                yield original_input, output
+        finally:
+            # No per-call executor or futures to clean up, so skip the garbage collection.
+            pbar.close()
+        return
 
     try:
         with cf.ProcessPoolExecutor(max_workers=max_workers) as executor:
@@ -142,6 +159,7 @@ async def async_run_in_process_pool(
         - Results are yielded in the order they complete, not in the order of inputs
         - Progress is displayed using tqdm
         - This function integrates with the asyncio event loop
+        - If the app's WORKER_POOL is running, its processes are reused instead of starting a new pool
         - The event loop remains responsive to other tasks while processing
         - Proper resource cleanup occurs even if exceptions are raised
         - Use 'async for' to iterate over the results
@@ -154,8 +172,9 @@ async def async_run_in_process_pool(
         ...         print(f"{input_val}³ = {result}")
     """
     # Default to using all CPU cores but one.
+    max_workers = max(1, psutil.cpu_count(logical=False) - 1)
     if max_concurrency is None:
-        max_workers = max_concurrency = psutil.cpu_count(logical=False) - 1
+        max_concurrency = max_workers
 
     # If override_max_concurrency is set, use that instead.
     if override_max_concurrency is not None:
@@ -169,6 +188,19 @@ async def async_run_in_process_pool(
     pbar = tqdm.tqdm(total=len(inputs), leave=False)
     futures = {}
 
+    # Reuse the app's long-lived workers instead of spawning a new pool.
+    if WORKER_POOL.started:
+        try:
+            async for original_input, output in WORKER_POOL.amap(
+                func, func_inputs, ordered=False, max_in_flight=max_concurrency
+            ):
+                pbar.update(1)
+                yield original_input, output
+        finally:
+            # No per-call executor or futures to clean up, so skip the garbage collection.
+            pbar.close()
+        return
+
     try:
         with cf.ProcessPoolExecutor(max_workers=max_workers) as executor:
             # Submit the initial batch of futures
@@ -0,0 +1,138 @@
+"""
+Coalesce identical in-flight async streams.
+
+When many requests ask for the same thing at once, only the first one runs the
+work. The others subscribe to its stream: each gets every item from the start,
+through its own async generator, and then follows along as new items arrive.
+
+The work runs in its own task, so the first client disconnecting doesn't break
+the stream for the others. It is only cancelled once every subscriber has left.
+When it finishes, the key is released, so the next request starts fresh.
+"""
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+import logging
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Hashable, Optional
+
+
+from logger import logger as module_logger
+
+
+@dataclass
+class _Flight:
+    task: Optional[asyncio.Task] = None
+    items: list[Any] = field(default_factory=list)
+    updated: asyncio.Event = field(default_factory=asyncio.Event)
+    done: bool = False
+    error: Optional[BaseException] = None
+    subscribers: int = 0
+
+
+class SingleFlight:
+    """
+    Share one run of an async stream between every caller with the same key.
+
+    Example:
+        >>> flights = SingleFlight()
+        >>> async for result in flights.stream(("zoning laws", 1), lambda: search("zoning laws", page=1)):
+        ...     yield result
+
+    Attributes:
+        logger: Logger for coalesced requests.
+    """
+
+    def __init__(self, logger: logging.Logger = module_logger):
+        self.logger: logging.Logger = logger
+
+        self._flights:   dict[Hashable, _Flight] = {}
+        self._started:   int                     = 0
+        self._coalesced: int                     = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Check if a stream for this key is running."""
+        return key in self._flights
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the counters.
+
+        Returns:
+            dict: in_flight streams, streams started, and requests coalesced into a running stream.
+        """
+        return {
+            "in_flight": len(self._flights),
+            "started": self._started,
+            "coalesced": self._coalesced,
+        }
+
+    async def stream(
+            self,
+            key: Hashable,
+            factory: Callable[[], AsyncIterator[Any]]
+            ) -> AsyncGenerator[Any, None]:
+        """
+        Stream the items for a key, starting the work only if nobody else is running it.
+
+        Args:
+            key: What makes two requests the same.
+            factory: Makes the async iterator that does the work. Only called by the first request.
+
+        Yields:
+            Every item of the shared stream, from the first one.
+
+        Raises:
+            Exception: Whatever the shared stream raised.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory), name=f"single-flight-{key}")
+            self._started += 1
+        else:
+            self._coalesced += 1
+            self.logger.debug(f"Joining the in-flight stream for {key}.")
+
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(flight.items):
+                    yield flight.items[index]
+                    index += 1
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.updated.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more. Later requests start a new stream.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key: Hashable, flight: _Flight, factory: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for item in factory():
+                flight.items.append(item)
+                self._notify(flight)
+        except asyncio.CancelledError:
+            # Only reaches subscribers if it was cancelled from outside, e.g. on shutdown.
+            flight.error = RuntimeError(f"The shared stream for {key} was cancelled.")
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self._notify(flight)
+
+    @staticmethod
+    def _notify(flight: _Flight) -> None:
+        # Wake every subscriber, and give them a fresh event to wait on next.
+        updated, flight.updated = flight.updated, asyncio.Event()
+        updated.set()
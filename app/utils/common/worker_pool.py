@@ -0,0 +1,308 @@
+"""
+Application-scoped, long-lived process pool.
+
+Creating a ProcessPoolExecutor per call means every call pays for spawning
+processes, re-importing heavy modules (torch, duckdb, configs) in each of them,
+and tearing them down again. WorkerPool keeps one executor for the lifetime of
+the app instead. If configs.WORKER_POOL_WITH_APP is set, it is started and shut
+down by the FastAPI lifespan. Batch jobs can start it themselves.
+`run_in_process_pool` / `async_run_in_process_pool` reuse it while it is running.
+
+Large NumPy inputs can be handed to workers through shared memory with
+`WorkerPool.share`, so they are not pickled once per task.
+"""
+from __future__ import annotations
+import asyncio
+from collections import deque
+import concurrent.futures as cf
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import batched
+import logging
+from multiprocessing import shared_memory
+import threading
+import time
+from typing import Any, AsyncGenerator, Callable, Generator, Iterable, Iterator, Optional
+
+
+import numpy as np
+import psutil
+
+
+from configs import configs
+from logger import logger as module_logger
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """
+    A picklable handle to a NumPy array stored in shared memory.
+
+    Pass it to worker functions instead of the array itself, and read it there with `attach`.
+
+    Attributes:
+        name: Name of the shared memory block.
+        shape: Shape of the array.
+        dtype: NumPy dtype string of the array.
+    """
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+    @contextmanager
+    def attach(self) -> Iterator[np.ndarray]:
+        """Map the shared array into this process, read-only, without copying it."""
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            array = np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+            array.flags.writeable = False
+            yield array
+            del array
+        finally:
+            shm.close()
+
+
+def _run_chunk(func: Callable, chunk: tuple) -> tuple[list, float]:
+    """Run func over one chunk of inputs in a worker, timing how long the worker was busy."""
+    start = time.perf_counter()
+    outputs = [func(item) for item in chunk]
+    return outputs, time.perf_counter() - start
+
+
+class WorkerPool:
+    """
+    A process pool that is started once and reused by every caller.
+
+    Attributes:
+        max_workers: Number of worker processes.
+        logger: Logger for start up and shutdown messages.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, logger: logging.Logger = module_logger):
+        # Default to using all CPU cores but one.
+        self.max_workers: int            = max_workers or max(1, (psutil.cpu_count(logical=False) or 2) - 1)
+        self.logger:      logging.Logger = logger
+
+        self._executor:       Optional[cf.ProcessPoolExecutor] = None
+        self._lock:           threading.Lock = threading.Lock()
+        self._started_at:     Optional[float] = None
+        self._submitted:      int   = 0
+        self._completed:      int   = 0
+        self._failed:         int   = 0
+        self._in_flight:      int   = 0
+        self._busy_seconds:   float = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    def start(self) -> None:
+        """Start the worker processes. Does nothing if the pool is already running."""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = cf.ProcessPoolExecutor(max_workers=self.max_workers)
+            self._started_at = time.perf_counter()
+        self.logger.info(f"Started worker pool with {self.max_workers} workers.")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker processes. Queued chunks that haven't started are cancelled."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+            self.logger.info(f"Shut down worker pool. Final stats: {self.stats()}")
+
+    def _submit_chunk(self, func: Callable, chunk: tuple) -> cf.Future:
+        if self._executor is None:
+            raise RuntimeError("Worker pool has not been started.")
+        future = self._executor.submit(_run_chunk, func, chunk)
+        with self._lock:
+            self._submitted += len(chunk)
+            self._in_flight += len(chunk)
+        return future
+
+    def _collect(self, future: cf.Future | asyncio.Future, chunk: tuple) -> Iterator[tuple[Any, Any]]:
+        """Update the counters for a finished chunk and return its (input, output) pairs."""
+        try:
+            outputs, busy_seconds = future.result()
+        except BaseException:
+            self._record(len(chunk), failed=True)
+            raise
+        self._record(len(chunk), busy_seconds=busy_seconds)
+        return zip(chunk, outputs)
+
+    def _record(self, size: int, busy_seconds: float = 0.0, failed: bool = False) -> None:
+        with self._lock:
+            self._in_flight -= size
+            if failed:
+                self._failed += size
+            else:
+                self._completed += size
+                self._busy_seconds += busy_seconds
+
+    def _abandon(self, pending: dict) -> None:
+        """Cancel chunks nobody will collect, e.g. when the caller stops iterating early."""
+        for future, chunk in pending.items():
+            future.cancel()
+            self._record(len(chunk), failed=True)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get counters for monitoring the pool.
+
+        Returns:
+            dict[str, Any]:
+                - workers: Number of worker processes.
+                - submitted, completed, failed: Inputs submitted, finished and failed since start up.
+                - in_flight: Inputs submitted but not finished yet.
+                - queue_depth: Chunks waiting for a free worker.
+                - utilisation: Fraction of worker time spent running tasks since start up.
+        """
+        with self._lock:
+            in_flight_chunks = len(self._executor._pending_work_items) if self._executor is not None else 0
+            uptime = time.perf_counter() - self._started_at if self._started_at is not None else 0.0
+            return {
+                "workers": self.max_workers,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, in_flight_chunks - self.max_workers),
+                "utilisation": self._busy_seconds / (uptime * self.max_workers) if uptime else 0.0,
+            }
+
+    @contextmanager
+    def share(self, array: np.ndarray) -> Iterator[SharedArray]:
+        """
+        Copy a NumPy array into shared memory for the duration of the block.
+
+        Example:
+            >>> with WORKER_POOL.share(embeddings) as shared:
+            ...     func = functools.partial(score_rows, embeddings=shared)
+            ...     for rows, scores in WORKER_POOL.map(func, row_ranges):
+            ...         ...
+
+        Args:
+            array: The array to share.
+
+        Yields:
+            SharedArray: A picklable handle that workers read with `SharedArray.attach`.
+        """
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        try:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            yield SharedArray(name=shm.name, shape=array.shape, dtype=array.dtype.str)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _max_in_flight(self, max_in_flight: Optional[int]) -> int:
+        # Keep every worker busy without submitting the whole input at once.
+        return max_in_flight or 2 * self.max_workers
+
+    def map(self,
+            func: Callable,
+            inputs: Iterable,
+            *,
+            chunksize: int = 1,
+            ordered: bool = True,
+            max_in_flight: Optional[int] = None
+            ) -> Generator[tuple[Any, Any], None, None]:
+        """
+        Apply func to every input in the worker processes.
+
+        Args:
+            func: A picklable function that takes a single input.
+            inputs: The inputs. They are sent to workers in chunks of `chunksize`.
+            chunksize: Number of inputs sent to a worker per task.
+            ordered: If True, yield results in input order. If False, yield them as chunks finish.
+            max_in_flight: Max chunks submitted at once. Defaults to twice the number of workers.
+
+        Yields:
+            tuple[Any, Any]: (input, output) pairs.
+        """
+        chunks = batched(inputs, chunksize)
+        pending: dict[cf.Future, tuple] = {}
+        order: deque[cf.Future] = deque()
+        limit = self._max_in_flight(max_in_flight)
+
+        def _fill() -> None:
+            while len(pending) < limit:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                future = self._submit_chunk(func, chunk)
+                pending[future] = chunk
+                if ordered:
+                    order.append(future)
+
+        try:
+            _fill()
+            while pending:
+                if ordered:
+                    done = [order.popleft()]
+                else:
+                    done, _ = cf.wait(pending, return_when=cf.FIRST_COMPLETED)
+                for future in done:
+                    yield from self._collect(future, pending.pop(future))
+                _fill()
+        finally:
+            self._abandon(pending)
+
+    async def amap(self,
+                   func: Callable,
+                   inputs: Iterable,
+                   *,
+                   chunksize: int = 1,
+                   ordered: bool = True,
+                   max_in_flight: Optional[int] = None
+                   ) -> AsyncGenerator[tuple[Any, Any], None]:
+        """
+        Async version of `map` that doesn't block the event loop while workers run.
+
+        Args:
+            func: A picklable function that takes a single input.
+            inputs: The inputs. They are sent to workers in chunks of `chunksize`.
+            chunksize: Number of inputs sent to a worker per task.
+            ordered: If True, yield results in input order. If False, yield them as chunks finish.
+            max_in_flight: Max chunks submitted at once. Defaults to twice the number of workers.
+
+        Yields:
+            tuple[Any, Any]: (input, output) pairs.
+        """
+        chunks = batched(inputs, chunksize)
+        pending: dict[asyncio.Future, tuple] = {}
+        order: deque[asyncio.Future] = deque()
+        limit = self._max_in_flight(max_in_flight)
+
+        def _fill() -> None:
+            while len(pending) < limit:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                future = asyncio.wrap_future(self._submit_chunk(func, chunk))
+                pending[future] = chunk
+                if ordered:
+                    order.append(future)
+
+        try:
+            _fill()
+            while pending:
+                if ordered:
+                    future = order.popleft()
+                    await asyncio.wait([future])
+                    done = [future]
+                else:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    for item in self._collect(future, pending.pop(future)):
+                        yield item
+                _fill()
+        finally:
+            self._abandon(pending)
+
+
+# Application-scoped pool. It is started and stopped by the FastAPI app's lifespan.
+WORKER_POOL = WorkerPool(max_workers=configs.WORKER_POOL_MAX_WORKERS)
@@ -0,0 +1,78 @@
+"""
+Read query results as Arrow columns instead of pandas rows.
+
+`cursor.fetchdf().to_dict('records')` builds a DataFrame and then a dict per row,
+boxing every value on the way, e.g. 1536 Python floats per embedding. Fetching
+with `fetch_arrow_table()` keeps the results as columns. Embedding columns are
+viewed as NumPy matrices without copying, and only the rows that are returned
+are turned into Python objects (see tests/benchmarks/benchmark_arrow_results.py).
+"""
+from typing import Any, Optional, Sequence
+
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def fetch_arrow(cursor: duckdb.DuckDBPyConnection, query: str, params: Optional[Sequence[Any]] = None) -> pa.Table:
+    """
+    Run a query and fetch its results as an Arrow table.
+
+    Args:
+        cursor: DuckDB connection or cursor to run the query on.
+        query: The SQL query.
+        params: Parameters for the query's placeholders, if any.
+
+    Returns:
+        pa.Table: The results as columns.
+    """
+    return cursor.execute(query, params).fetch_arrow_table()
+
+
+def embedding_matrix(column: pa.ChunkedArray | pa.Array) -> np.ndarray:
+    """
+    View a column of equal-length float lists, e.g. `FLOAT[]` or `FLOAT[1536]`, as an (N, D) matrix.
+
+    The matrix is a read-only view of the Arrow buffer when the column is one chunk,
+    which is how DuckDB returns results that fit in one batch. Otherwise the chunks are copied once.
+
+    Args:
+        column: The embedding column.
+
+    Returns:
+        np.ndarray: One row per embedding, in the column's float type. (0, 0) if the column is empty.
+
+    Raises:
+        ValueError: If an embedding is missing, or they are not all the same length.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    if len(column) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    if column.null_count:
+        raise ValueError(f"{column.null_count} of {len(column)} embeddings are missing.")
+
+    if not pa.types.is_fixed_size_list(column.type):
+        lengths = pc.list_value_length(column)
+        if pc.min(lengths).as_py() != pc.max(lengths).as_py():
+            raise ValueError("The embeddings are not all the same length.")
+    values = column.flatten()
+    return values.to_numpy(zero_copy_only=values.null_count == 0).reshape(len(column), -1)
+
+
+def table_rows(table: pa.Table, indices: Optional[Sequence[int]] = None) -> list[dict[str, Any]]:
+    """
+    Turn the rows of a table into dicts, e.g. when building a response.
+
+    Args:
+        table: The results.
+        indices: If given, only these rows, in this order.
+
+    Returns:
+        list[dict[str, Any]]: One dict per row, with Python values.
+    """
+    if indices is not None:
+        table = table.take(pa.array(indices, type=pa.int64()))
+    return table.to_pylist()
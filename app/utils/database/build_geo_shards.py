@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Split the embedding matrix into per-state shards for scoped semantic search.
+
+Run this after the embedding matrix has been exported:
+    python -m utils.database.build_geo_shards
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional
+
+
+import duckdb
+
+
+from configs import configs
+from logger import logger
+from utils.llm.embedding_matrix import EmbeddingMatrix
+from utils.llm.geo_shards import GeoShardRouter, Place
+
+
+def build_geo_shards(
+        db_path: Path = configs.AMERICAN_LAW_DB_PATH,
+        matrix_dir: Path = configs.EMBEDDING_MATRIX_DIR,
+        shards_dir: Path = configs.GEO_SHARDS_DIR,
+        n_lists: Optional[int] = None
+        ) -> Path:
+    """
+    Write one shard per state, each with its own index and centroid, from the exported embedding matrix.
+
+    The gnis of each law comes from the embeddings table, and the state of each gnis from the citations table.
+
+    Args:
+        db_path: Path to the DuckDB database containing the embeddings and citations tables.
+        matrix_dir: The exported embedding matrix, see export_embedding_matrix.
+        shards_dir: Where to write the shards.
+        n_lists: Number of inverted lists per shard. Defaults to 0, roughly sqrt(N) per shard.
+
+    Returns:
+        Path: The directory the shards were written to.
+    """
+    with duckdb.connect(str(db_path), read_only=True) as conn:
+        cid_gnis = dict(conn.execute("SELECT DISTINCT cid, gnis FROM embeddings").fetchall())
+        places = [
+            Place(gnis=str(gnis), place_name=place_name, state_code=state_code, state_name=state_name)
+            for gnis, place_name, state_code, state_name in conn.execute(
+                "SELECT DISTINCT gnis, place_name, state_code, state_name FROM citations ORDER BY gnis"
+            ).fetchall()
+        ]
+
+    matrix = EmbeddingMatrix.load(matrix_dir)
+    logger.info(f"Sharding {len(matrix)} embeddings from {len(places)} places by state...")
+    router = GeoShardRouter.build(
+        matrix, cid_gnis, places, shards_dir, n_lists=n_lists or 0, n_probe=configs.VECTOR_INDEX_N_PROBE
+    )
+
+    logger.info(f"Saved {len(router)} geo shards to {shards_dir}")
+    return Path(shards_dir)
+
+
+if __name__ == "__main__":
+    build_geo_shards()
@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Build the BM25 inverted index for lexical search.
+
+DuckDB's fts extension has to be downloaded at runtime, so the index is kept in
+plain tables instead. They are built from the titles, chapters and tag-stripped
+HTML of every law:
+    - lexical_terms: (term, cid, tf) postings, sorted by term so lookups only read a few row groups.
+    - lexical_vocab: (term, df) document frequency of each term.
+    - lexical_docs: (cid, doc_len) number of indexed terms in each document.
+    - lexical_stats: (n_docs, avg_doc_len) corpus statistics for BM25.
+
+Run this after the citations and html tables have been merged into american_law.db:
+    python -m utils.database.build_lexical_index
+"""
+from __future__ import annotations
+from pathlib import Path
+import re
+
+
+import duckdb
+
+
+from configs import configs
+from logger import logger
+
+
+# Queries must be tokenized the same way as the documents, so both use these.
+TOKEN_PATTERN = r"[a-z0-9]+"
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of",
+    "on", "or", "that", "the", "this", "to", "was", "were", "which", "with",
+    # Leftover HTML entities.
+    "amp", "gt", "lt", "nbsp", "quot",
+})
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into the terms used by the lexical index.
+
+    Args:
+        text: The text to tokenize.
+
+    Returns:
+        list[str]: Lower-cased alphanumeric terms, without stopwords or single characters.
+    """
+    return [term for term in re.findall(TOKEN_PATTERN, text.lower()) if len(term) > 1 and term not in STOPWORDS]
+
+
+def build_lexical_index(db_path: Path = configs.AMERICAN_LAW_DB_PATH) -> None:
+    """
+    (Re)build the lexical index tables from the citations and html tables.
+
+    Args:
+        db_path: Path to the DuckDB database containing the citations and html tables.
+    """
+    logger.info(f"Building lexical index in {db_path}...")
+    with duckdb.connect(db_path, read_only=False) as conn:
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            conn.execute("""
+                CREATE OR REPLACE TABLE lexical_terms AS
+                WITH docs AS (
+                    SELECT c.cid,
+                        concat_ws(' ', c.title, c.chapter, regexp_replace(h.html, '<[^>]+>', ' ', 'g')) AS text
+                    FROM (
+                        SELECT cid, any_value(title) AS title, any_value(chapter) AS chapter
+                        FROM citations
+                        GROUP BY cid
+                    ) c
+                    LEFT JOIN html h ON c.cid = h.cid
+                ),
+                tokens AS (
+                    SELECT cid, unnest(regexp_extract_all(lower(text), $pattern)) AS term
+                    FROM docs
+                )
+                SELECT term, cid, COUNT(*)::INTEGER AS tf
+                FROM tokens
+                WHERE length(term) > 1 AND NOT list_contains($stopwords, term)
+                GROUP BY term, cid
+                ORDER BY term
+            """, {"pattern": TOKEN_PATTERN, "stopwords": sorted(STOPWORDS)})
+            conn.execute("""
+                CREATE OR REPLACE TABLE lexical_vocab AS
+                SELECT term, COUNT(*)::INTEGER AS df FROM lexical_terms GROUP BY term ORDER BY term
+            """)
+            conn.execute("""
+                CREATE OR REPLACE TABLE lexical_docs AS
+                SELECT cid, SUM(tf)::INTEGER AS doc_len FROM lexical_terms GROUP BY cid
+            """)
+            conn.execute("""
+                CREATE OR REPLACE TABLE lexical_stats AS
+                SELECT COUNT(*)::BIGINT AS n_docs, coalesce(AVG(doc_len), 0)::DOUBLE AS avg_doc_len FROM lexical_docs
+            """)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        n_docs, n_terms = conn.execute(
+            "SELECT (SELECT n_docs FROM lexical_stats), (SELECT COUNT(*) FROM lexical_vocab)"
+        ).fetchone()
+    logger.info(f"Built lexical index over {n_docs} documents with {n_terms} distinct terms.")
+
+
+if __name__ == "__main__":
+    build_lexical_index()
@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Build the approximate nearest neighbour index for the embeddings table.
+
+Run this after the embeddings have been merged into american_law.db:
+    python -m utils.database.build_vector_index
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional
+
+
+from configs import configs
+from logger import logger
+from utils.database.export_embedding_matrix import export_embedding_matrix
+from utils.llm.vector_index import IvfFlatIndex
+
+
+def build_vector_index(
+        db_path: Path = configs.AMERICAN_LAW_DB_PATH,
+        matrix_dir: Path = configs.EMBEDDING_MATRIX_DIR,
+        index_path: Path = configs.VECTOR_INDEX_PATH,
+        n_lists: Optional[int] = None
+        ) -> Path:
+    """
+    (Re)export the embedding matrix and build the vector index over it.
+
+    Args:
+        db_path: Path to the DuckDB database containing the embeddings table.
+        matrix_dir: Where to write the memory-mapped embedding matrix.
+        index_path: Where to write the index.
+        n_lists: Number of inverted lists. Defaults to configs.VECTOR_INDEX_N_LISTS.
+
+    Returns:
+        Path: The path the index was written to.
+    """
+    matrix = export_embedding_matrix(db_path=db_path, matrix_dir=matrix_dir)
+    n_lists = configs.VECTOR_INDEX_N_LISTS if n_lists is None else n_lists
+
+    logger.info(f"Building vector index over {len(matrix)} embeddings...")
+    index = IvfFlatIndex.build(matrix, n_lists=n_lists, n_probe=configs.VECTOR_INDEX_N_PROBE)
+    index.save(index_path)
+
+    logger.info(f"Saved vector index with {index.n_lists} lists to {index_path}")
+    return index_path
+
+
+if __name__ == "__main__":
+    build_vector_index()
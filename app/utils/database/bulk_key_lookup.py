@@ -0,0 +1,67 @@
+"""
+Look up many rows by key in one query.
+
+Building `cid = 'a' OR cid = 'b' OR ...` predicates makes DuckDB parse and plan
+one expression per key, which dominates the query time for thousands of keys
+(see tests/benchmarks/benchmark_bulk_key_lookup.py), and pastes the keys into
+the SQL text. Instead, the keys are registered as a small Arrow table and joined
+against, so the query text stays the same size however many keys there are.
+"""
+from typing import Iterable, Sequence
+import uuid
+
+
+import duckdb
+import pyarrow as pa
+
+
+def bulk_key_lookup(
+        cursor: duckdb.DuckDBPyConnection,
+        keys: Iterable[str],
+        *,
+        table: str,
+        key_column: str,
+        columns: Sequence[str],
+        preserve_order: bool = False,
+        ) -> pa.Table:
+    """
+    Fetch the rows of `table` whose `key_column` is in `keys`.
+
+    Args:
+        cursor: DuckDB connection or cursor to run the query on.
+        keys: The keys to look up. Duplicates are ignored, and surrounding whitespace is stripped.
+        table: Table to search, optionally with joins, e.g. "citations c JOIN html h ON c.cid = h.cid".
+        key_column: Column the keys are matched against, e.g. "c.cid".
+        columns: Columns to return.
+        preserve_order: If True, return rows in the order of `keys`.
+
+    Returns:
+        pa.Table: The matching rows as columns. Keys with no match are left out.
+
+    Example:
+        >>> rows = bulk_key_lookup(
+        ...     cursor, ["bafk...", "bafk..."],
+        ...     table="embeddings", key_column="embedding_cid", columns=["cid", "embedding"],
+        ... )
+        >>> rows.column("cid").to_pylist()
+    """
+    keys = list(dict.fromkeys(str(key).strip() for key in keys))
+    key_table = pa.table({
+        "key": pa.array(keys, type=pa.string()),
+        "key_order": pa.array(range(len(keys)), type=pa.int64()),
+    })
+    # Unique name, in case several lookups share a connection.
+    view_name = f"_bulk_keys_{uuid.uuid4().hex}"
+    query = f"""
+        SELECT {', '.join(columns)}
+        FROM {view_name} AS _keys
+        JOIN {table} ON {key_column} = _keys.key
+    """
+    if preserve_order:
+        query += " ORDER BY _keys.key_order"
+
+    cursor.register(view_name, key_table)
+    try:
+        return cursor.execute(query).fetch_arrow_table()
+    finally:
+        cursor.unregister(view_name)
@@ -15,6 +15,9 @@ from tqdm import tqdm
 from configs import configs
 from logger import logger
 from utils.common.run_in_process_pool import run_in_process_pool
+from utils.database.build_lexical_index import build_lexical_index
+from utils.database.build_geo_shards import build_geo_shards
+from utils.database.build_vector_index import build_vector_index
 from app.utils.for_parquet.fix_parquet_files_in_parallel import fix_parquet_files_in_parallel
 
 
@@ -761,6 +764,11 @@ def create_american_law_db():
 
                     merge_database_into_the_american_law_db(cursor)
 
+        # Re-export the embedding matrix and rebuild the vector, geo shard and lexical indexes so they match the merged tables.
+        # NOTE This has to happen after the read-write connection above is closed.
+        build_vector_index(db_path=AMERICAN_LAW_DB_PATH)
+        build_geo_shards(db_path=AMERICAN_LAW_DB_PATH)
+        build_lexical_index(db_path=AMERICAN_LAW_DB_PATH)
 
     logger.info("All databases merged into american_law.db successfully.")
 
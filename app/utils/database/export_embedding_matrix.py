@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Export the embeddings table to a memory-mappable float32 matrix.
+
+Run this after the embeddings have been merged into american_law.db:
+    python -m utils.database.export_embedding_matrix
+"""
+from __future__ import annotations
+from pathlib import Path
+
+
+import duckdb
+import numpy as np
+from tqdm import tqdm
+
+
+from configs import configs
+from logger import logger
+from utils.llm.embedding_matrix import EmbeddingMatrix, l2_normalize
+
+
+_EMBEDDING_DIMENSIONS = 1536
+
+
+def export_embedding_matrix(
+        db_path: Path = configs.AMERICAN_LAW_DB_PATH,
+        matrix_dir: Path = configs.EMBEDDING_MATRIX_DIR,
+        batch_size: int = 50_000
+        ) -> EmbeddingMatrix:
+    """
+    Write every embedding into one contiguous, L2-normalised float32 .npy file.
+
+    Rows are sorted by cid, then text_chunk_order, so each cid owns one contiguous
+    range of rows. Embeddings are streamed as Arrow record batches straight into
+    the memory-mapped output file, so the whole table never has to fit in memory.
+
+    Args:
+        db_path: Path to the DuckDB database containing the embeddings table.
+        matrix_dir: Directory to write the matrix and offset tables to.
+        batch_size: Number of rows to fetch per record batch.
+
+    Returns:
+        EmbeddingMatrix: The exported matrix, opened read-only as a memory map.
+    """
+    matrix_dir = Path(matrix_dir)
+    matrix_dir.mkdir(parents=True, exist_ok=True)
+
+    with duckdb.connect(str(db_path), read_only=True) as conn:
+        total = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Exporting {total} embeddings from {db_path} to {matrix_dir}")
+
+        vectors = np.lib.format.open_memmap(
+            matrix_dir / "vectors.npy", mode="w+", dtype=np.float32, shape=(total, _EMBEDDING_DIMENSIONS)
+        )
+        row_cids: list[str] = []
+        embedding_cids: list[str] = []
+
+        reader = conn.execute(
+            "SELECT cid, embedding_cid, embedding FROM embeddings ORDER BY cid, text_chunk_order"
+        ).fetch_record_batch(batch_size)
+
+        row = 0
+        with tqdm(total=total, desc="Exporting embeddings") as pbar:
+            for batch in reader:
+                matrix = batch.column("embedding").flatten().to_numpy(zero_copy_only=False)
+                vectors[row:row + batch.num_rows] = l2_normalize(matrix.reshape(-1, _EMBEDDING_DIMENSIONS))
+                row_cids.extend(batch.column("cid").to_pylist())
+                embedding_cids.extend(batch.column("embedding_cid").to_pylist())
+                row += batch.num_rows
+                pbar.update(batch.num_rows)
+
+        vectors.flush()
+        del vectors
+
+    # Rows are already sorted by cid, so each cid's range starts where its value first appears.
+    row_cids = np.asarray(row_cids, dtype=str)
+    cids, starts = np.unique(row_cids, return_index=True)
+    offsets = np.append(starts, len(row_cids)).astype(np.int64)
+
+    np.save(matrix_dir / "cids.npy", cids)
+    np.save(matrix_dir / "offsets.npy", offsets)
+    np.save(matrix_dir / "embedding_cids.npy", np.asarray(embedding_cids, dtype=str))
+
+    logger.info(f"Exported {len(row_cids)} embeddings for {len(cids)} laws to {matrix_dir}")
+    return EmbeddingMatrix.load(matrix_dir)
+
+
+if __name__ == "__main__":
+    export_embedding_matrix()
@@ -1,26 +1,41 @@
 import sqlite3
+from typing import TYPE_CHECKING
 
 
 import duckdb
 
 
 from configs import configs
+if TYPE_CHECKING:
+    from api_.database.connection_pool import PooledConnection
 
 
 _AMERICAN_LAW_DB_PATH =  configs.AMERICAN_LAW_DATA_DIR / "american_law.db"
 
 
-def _get_db(db_path: str, use_duckdb: bool = True, read_only: bool = True) -> sqlite3.Connection | duckdb.DuckDBPyConnection:
+def _get_db(
+        db_path: str,
+        use_duckdb: bool = True,
+        read_only: bool = True
+        ) -> 'sqlite3.Connection | duckdb.DuckDBPyConnection | PooledConnection[duckdb.DuckDBPyConnection]':
     """
     Get a database connection.
+
+    Read-only DuckDB connections to the law database are checked out of the READ_ONLY_DB pool.
+    Closing them returns them to the pool.
     
     Args:
         db_path: Path to the database file
         use_duckdb: Whether to use DuckDB (True) or SQLite (False)
+        read_only: Whether to open the database in read-only mode
         
     Returns:
         Database connection object
     """
+    if use_duckdb and read_only and db_path == _AMERICAN_LAW_DB_PATH:
+        # Imported here, as read_only_database imports this package through api_.database.
+        from read_only_database import READ_ONLY_DB
+        return READ_ONLY_DB.connect()
     if use_duckdb:
         return duckdb.connect(db_path, read_only=read_only)
     else:
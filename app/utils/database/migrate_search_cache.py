@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copy cached search queries and search history from DuckDB into the search cache database.
+
+Older versions saved them in the law database, with each search's ranking as a
+comma-separated cids_for_top_100 string, and later in a DuckDB search_cache.db, with
+the ranking as a list of cids and a list of scores. This copies either into the SQLite
+search cache, with a NULL score for each cid where the scores weren't saved. Searches
+and history already in the search cache are kept. The DuckDB file is only read, so its
+tables can be dropped, or the file deleted, once this has run.
+
+The search cache can be written by the server while this runs:
+    python -m utils.database.migrate_search_cache [DUCKDB_PATH ...]
+With no paths, american_law.db and data/search_cache.db are copied, if they exist.
+"""
+from __future__ import annotations
+from pathlib import Path
+import sys
+from typing import Any, Iterator
+
+
+import duckdb
+
+
+from configs import configs
+from logger import logger
+from schemas.search_mode import SearchMode
+from utils.app.search.search_cache_store import SearchCacheStore, TABLES
+
+
+# The DuckDB caches predate the other search modes.
+_MODE: str = SearchMode.LLM.value
+
+
+def _columns(conn: duckdb.DuckDBPyConnection, table: str) -> set[str]:
+    return {
+        column for column, in conn.execute(
+            "SELECT column_name FROM duckdb_columns() WHERE database_name = current_database() AND table_name = ?",
+            [table],
+        ).fetchall()
+    }
+
+
+def _legacy_search_queries(conn: duckdb.DuckDBPyConnection, columns: set[str]) -> Iterator[tuple[Any, ...]]:
+    """Read a DuckDB search_query table as search_query rows, in the order of TABLES['search_query']."""
+    if "cids_for_top_100" in columns:
+        rows = conn.execute(
+            "SELECT search_query_cid, search_query, embedding, total_results, cids_for_top_100 FROM search_query"
+        ).fetchall()
+        for search_query_cid, search_query, embedding, total_results, cids_for_top_100 in rows:
+            cids = list(dict.fromkeys(cids_for_top_100.split(",")))  # Repeated cids are dropped, keeping the first.
+            yield search_query_cid, search_query, embedding, total_results, cids, [None] * len(cids), None, _MODE
+    elif {"cids", "scores"} <= columns:
+        saved_at = "saved_at" if "saved_at" in columns else "NULL"
+        for row in conn.execute(
+            f"SELECT search_query_cid, search_query, embedding, total_results, cids, scores, {saved_at} FROM search_query"
+        ).fetchall():
+            yield *row, _MODE
+
+
+def migrate_search_cache(
+    legacy_db_path: Path = configs.AMERICAN_LAW_DB_PATH,
+    search_cache_db_path: Path = configs.SEARCH_CACHE_DB_PATH,
+) -> dict[str, int]:
+    """
+    Copy the search_query and search_history tables of a DuckDB database into the search cache database.
+
+    Args:
+        legacy_db_path: Path to the DuckDB database the searches used to be saved in.
+        search_cache_db_path: Path to the search cache database. It is created if it doesn't exist.
+
+    Returns:
+        dict[str, int]: The number of rows copied into each table.
+    """
+    logger.info(f"Copying cached searches from {legacy_db_path} to {search_cache_db_path}...")
+    store = SearchCacheStore(db_path=search_cache_db_path)
+    existing = {
+        table: store.read(lambda cursor: {key for key, in cursor.execute(f"SELECT {columns[0]} FROM {table}")})
+        for table, columns in TABLES.items()
+    }
+
+    batch: list[tuple[str, tuple]] = []
+    with duckdb.connect(str(legacy_db_path), read_only=True) as conn:
+        search_query_columns = _columns(conn, "search_query")
+        batch += [
+            ("search_query", row) for row in _legacy_search_queries(conn, search_query_columns)
+            if row[0] not in existing["search_query"]
+        ]
+        if _columns(conn, "search_history"):
+            batch += [
+                ("search_history", row) for row in conn.execute(
+                    f"SELECT {', '.join(TABLES['search_history'])} FROM search_history"
+                ).fetchall()
+                if row[0] not in existing["search_history"]
+            ]
+
+    copied = {table: sum(1 for batch_table, _ in batch if batch_table == table) for table in TABLES}
+    if batch and not store.write(batch):
+        raise RuntimeError(f"Could not write the searches copied from {legacy_db_path} to {search_cache_db_path}.")
+    logger.info(f"Copied {copied['search_query']} cached searches and {copied['search_history']} search history rows.")
+    return copied
+
+
+if __name__ == "__main__":
+    paths = [Path(path) for path in sys.argv[1:]] or [
+        configs.AMERICAN_LAW_DB_PATH, configs.SEARCH_CACHE_DB_PATH.with_suffix(".db")
+    ]
+    for path in paths:
+        if path.exists():
+            migrate_search_cache(path)
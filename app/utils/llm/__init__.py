@@ -6,12 +6,16 @@ This package provides utilities for working with language models, including
 vector similarity calculations and prompt template management. These utilities
 support the LLM integration components of the application.
 """
-from .cosine_similarity import cosine_similarity
+from .cosine_similarity import batch_cosine_similarity, cosine_similarity, top_k_indices
 from .load_prompt_from_yaml import load_prompt_from_yaml
+from .pool_chunk_scores import pool_chunk_scores
 
 
 __all__ = [
+    "batch_cosine_similarity",
     "cosine_similarity",
     "load_prompt_from_yaml",
+    "pool_chunk_scores",
+    "top_k_indices",
 ]
 
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 import numpy as np
 import torch
 
@@ -78,3 +81,71 @@ def cosine_similarity(x: list[float], y: list[float]) -> np.float64:
         return _torch_cosine_similarity(x, y)
     else:
         return _numpy_cosine_similarity(x, y)
+
+
+def top_k_indices(scores: np.ndarray, top_k: Optional[int] = None, threshold: Optional[float] = None) -> np.ndarray:
+    """
+    Select the indices of the highest scores, best first.
+
+    Uses argpartition so only the selected top_k scores are fully sorted.
+
+    Args:
+        scores: 1-D array of scores.
+        top_k: Max number of indices to return. If None, return every index that passes the threshold.
+        threshold: If given, drop scores below it.
+
+    Returns:
+        np.ndarray: Indices into `scores`, ordered by descending score.
+    """
+    indices = np.arange(len(scores))
+    if threshold is not None:
+        indices = indices[scores >= threshold]
+
+    if top_k is not None and len(indices) > top_k:
+        best = np.argpartition(scores[indices], -top_k)[-top_k:]
+        indices = indices[best]
+    return indices[np.argsort(scores[indices], kind="stable")[::-1]]
+
+
+def batch_cosine_similarity(
+        query: list[float] | np.ndarray,
+        matrix: np.ndarray,
+        top_k: Optional[int] = None,
+        threshold: Optional[float] = configs.SIMILARITY_SCORE_THRESHOLD,
+        normalized: bool = False
+        ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the cosine similarity between one query vector and every row of a matrix.
+
+    This replaces scoring pairs one at a time. The whole batch is a single BLAS
+    matrix-vector product, followed by a vectorized threshold and top-k selection.
+
+    Args:
+        query: The query vector. Nested lists (e.g. [[...]]) are flattened.
+        matrix: (N, D) array of vectors to score against.
+        top_k: Max number of rows to select. If None, select every row that passes the threshold.
+        threshold: Drop rows scoring below this. Defaults to configs.SIMILARITY_SCORE_THRESHOLD.
+        normalized: Set to True if the matrix rows are already unit length, to skip normalising them.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]:
+            - float32 scores for every row of the matrix
+            - indices of the selected rows, ordered by descending score
+    """
+    matrix = np.asarray(matrix)
+    if not np.issubdtype(matrix.dtype, np.floating):
+        matrix = matrix.astype(np.float32)
+    # Score in the matrix's own dtype. Casting a large float64 matrix costs more than the product.
+    query = np.asarray(query, dtype=matrix.dtype).reshape(-1)
+    if matrix.ndim != 2 or matrix.shape[1] != len(query):
+        raise ValueError(f"Expected an (N, {len(query)}) matrix, got shape {matrix.shape}.")
+
+    query_norm = np.linalg.norm(query)
+    scores = matrix @ (query / query_norm if query_norm else query)
+    if not normalized:
+        row_norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+        row_norms[row_norms == 0] = 1.0
+        scores /= row_norms
+
+    scores = scores.astype(np.float32, copy=False)
+    return scores, top_k_indices(scores, top_k=top_k, threshold=threshold)
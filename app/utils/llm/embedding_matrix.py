@@ -0,0 +1,190 @@
+"""
+Memory-mapped float32 matrix of the law embeddings.
+
+The embeddings table stores each embedding as DOUBLE[1536] (about 12 KB a row).
+Scoring them used to mean a SQL query, a trip through pandas, and a Python list
+per row. Instead, the export step writes every embedding once into a contiguous,
+L2-normalised float32 .npy file, sorted by cid then chunk order. It also writes
+an offset table mapping each cid to its range of rows.
+
+The matrix is opened with np.load(mmap_mode='r'), so it is never copied into
+process memory. Every worker that opens the same file shares the OS page cache.
+
+Files in an embedding matrix directory:
+    vectors.npy:        (N, D) float32, L2-normalised, sorted by cid then text_chunk_order.
+    cids.npy:           (M,) sorted unique law cids.
+    offsets.npy:        (M + 1,) int64. Rows for cids[i] are vectors[offsets[i]:offsets[i + 1]].
+    embedding_cids.npy: (N,) the embedding_cid of each row.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Optional
+
+
+import numpy as np
+
+
+_FILES = ("vectors", "cids", "offsets", "embedding_cids")
+_SCORE_CHUNK_ROWS = 128
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row of a matrix to unit length so dot products equal cosine similarities."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingMatrix:
+    """
+    Contiguous float32 embeddings with a cid -> row-range offset table.
+
+    Attributes:
+        vectors: (N, D) L2-normalised embeddings. Usually a read-only np.memmap.
+        cids: (M,) sorted unique law cids.
+        offsets: (M + 1,) start row of each cid in `vectors`, plus the total row count.
+        embedding_cids: (N,) the embedding_cid of each row.
+    """
+
+    def __init__(self,
+                 vectors: np.ndarray,
+                 cids: np.ndarray,
+                 offsets: np.ndarray,
+                 embedding_cids: np.ndarray
+                ):
+        if len(offsets) != len(cids) + 1 or offsets[-1] != len(vectors):
+            raise ValueError("Offset table does not match the cids and vectors.")
+
+        self.vectors:        np.ndarray = vectors
+        self.cids:           np.ndarray = cids
+        self.offsets:        np.ndarray = offsets
+        self.embedding_cids: np.ndarray = embedding_cids
+
+        self._embedding_cid_order = np.argsort(self.embedding_cids, kind="stable")
+        self._sorted_embedding_cids = self.embedding_cids[self._embedding_cid_order]
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def dimensions(self) -> int:
+        return self.vectors.shape[1]
+
+    @classmethod
+    def from_arrays(cls,
+                    vectors: np.ndarray,
+                    cids: Iterable[str],
+                    embedding_cids: Optional[Iterable[str]] = None
+                    ) -> 'EmbeddingMatrix':
+        """
+        Make an in-memory matrix from unsorted embeddings and the cid of each one.
+
+        Args:
+            vectors: (N, D) embeddings. They do not need to be normalised.
+            cids: The law cid of each embedding.
+            embedding_cids: The embedding_cid of each embedding. Defaults to the row number.
+
+        Returns:
+            EmbeddingMatrix: The matrix, sorted by cid.
+        """
+        row_cids = np.asarray(list(cids), dtype=str)
+        if embedding_cids is None:
+            embedding_cids = np.arange(len(row_cids)).astype(str)
+        embedding_cids = np.asarray(list(embedding_cids), dtype=str)
+        if not len(vectors) == len(row_cids) == len(embedding_cids):
+            raise ValueError(
+                f"Got {len(vectors)} embeddings, {len(row_cids)} cids and {len(embedding_cids)} embedding cids."
+            )
+
+        order = np.argsort(row_cids, kind="stable")
+        unique_cids, counts = np.unique(row_cids[order], return_counts=True)
+        offsets = np.zeros(len(unique_cids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+
+        return cls(
+            vectors=np.ascontiguousarray(l2_normalize(np.asarray(vectors)[order])),
+            cids=unique_cids,
+            offsets=offsets,
+            embedding_cids=embedding_cids[order],
+        )
+
+    def save(self, directory: Path) -> None:
+        """Write the matrix and its offset tables to a directory."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in _FILES:
+            np.save(directory / f"{name}.npy", np.asarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> 'EmbeddingMatrix':
+        """
+        Open a matrix written by `save` or by the export step.
+
+        Args:
+            directory: Directory containing the .npy files.
+            mmap: If True, memory-map the vectors read-only instead of reading them into memory.
+
+        Returns:
+            EmbeddingMatrix: The opened matrix.
+        """
+        directory = Path(directory)
+        return cls(
+            vectors=np.load(directory / "vectors.npy", mmap_mode="r" if mmap else None),
+            cids=np.load(directory / "cids.npy"),
+            offsets=np.load(directory / "offsets.npy"),
+            embedding_cids=np.load(directory / "embedding_cids.npy"),
+        )
+
+    @staticmethod
+    def _expand_ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+        """Turn parallel arrays of [start, stop) ranges into one array of row numbers."""
+        lengths = stops - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Each row is its range's start plus its position within the range.
+        range_starts = np.repeat(starts, lengths)
+        positions = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return (range_starts + positions).astype(np.int64)
+
+    def rows_for_cids(self, cids: Iterable[str]) -> np.ndarray:
+        """Get the rows of every embedding belonging to the given law cids, in row order."""
+        cids = np.unique(np.asarray(list(cids), dtype=str))
+        idx = np.searchsorted(self.cids, cids)
+        in_bounds = idx < len(self.cids)
+        idx, cids = idx[in_bounds], cids[in_bounds]
+        found = idx[self.cids[idx] == cids]
+        return self._expand_ranges(self.offsets[found], self.offsets[found + 1])
+
+    def rows_for_embedding_cids(self, embedding_cids: Iterable[str]) -> np.ndarray:
+        """Get the rows of the given embedding cids. Unknown embedding cids are skipped."""
+        embedding_cids = np.unique(np.asarray(list(embedding_cids), dtype=str))
+        idx = np.searchsorted(self._sorted_embedding_cids, embedding_cids)
+        in_bounds = idx < len(self._sorted_embedding_cids)
+        idx, embedding_cids = idx[in_bounds], embedding_cids[in_bounds]
+        found = idx[self._sorted_embedding_cids[idx] == embedding_cids]
+        return np.sort(self._embedding_cid_order[found])
+
+    def cids_for_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Get the law cid of each row."""
+        return self.cids[np.searchsorted(self.offsets, rows, side="right") - 1]
+
+    def score(self, query_embedding: list[float] | np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        Compute the cosine similarity between a query embedding and the given rows.
+
+        Args:
+            query_embedding: The query embedding. Nested lists (e.g. [[...]]) are flattened.
+            rows: Row numbers to score. Sorted rows read the memory map sequentially.
+
+        Returns:
+            np.ndarray: float32 scores, in the same order as `rows`.
+        """
+        query = l2_normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        scores = np.empty(len(rows), dtype=np.float32)
+        # Gather in small chunks so each block of rows is still in cache for the dot product.
+        for start in range(0, len(rows), _SCORE_CHUNK_ROWS):
+            chunk = rows[start:start + _SCORE_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = self.vectors[chunk] @ query
+        return scores
@@ -0,0 +1,385 @@
+"""
+Per-state shards of the law embeddings, and a router that picks which to search.
+
+Most searches are about one state or municipality, but the vector index covers
+the whole country. Here the embeddings are split by state into shard directories,
+each an EmbeddingMatrix with its own small IvfFlatIndex and a centroid. The gnis
+of every law is kept too, so a search can be narrowed to one municipality.
+
+The router sends a query that names a state or municipality only to that state's
+shard. A query that names no place is sent to the shards whose centroid is close
+enough to the query embedding. Either way, the cost of a scoped search depends on
+the size of the state, not of the whole dataset.
+
+Files in a geo shards directory:
+    places.json:        Every place, with its gnis, place name, state code and state name.
+    <state_code>/:      One EmbeddingMatrix directory per state, plus:
+        gnis.npy:       (M,) the gnis of each law cid in cids.npy.
+        centroid.npy:   (D,) L2-normalised mean of the state's embeddings.
+        index.npz:      IvfFlatIndex over the state's embeddings.
+"""
+from __future__ import annotations
+from dataclasses import asdict, dataclass
+import json
+from pathlib import Path
+import re
+from typing import Iterable, Mapping, Optional
+
+
+import numpy as np
+
+
+from .embedding_matrix import EmbeddingMatrix, l2_normalize
+from .pool_chunk_scores import PoolingMethod
+from .vector_index import IvfFlatIndex
+
+
+_COPY_CHUNK_CIDS = 4096
+_MAX_PLACE_WORDS = 5
+_PLACE_PREFIXES = ("city of ", "town of ", "village of ", "township of ", "borough of ", "county of ")
+
+
+def _normalize_name(text: str) -> str:
+    """Lowercase a name and turn anything that isn't a letter or digit into single spaces."""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+@dataclass(frozen=True)
+class Place:
+    """
+    A municipality with laws in the dataset.
+
+    Attributes:
+        gnis: The place's GNIS id.
+        place_name: e.g. "Salem".
+        state_code: e.g. "OR". Also the key of the state's shard.
+        state_name: e.g. "Oregon".
+    """
+    gnis: str
+    place_name: str
+    state_code: str
+    state_name: str
+
+
+class GeoShard:
+    """
+    The embeddings of one state, with their own index and centroid.
+
+    Attributes:
+        key: The state code.
+        matrix: The state's embeddings.
+        gnis: (M,) the gnis of each law cid in matrix.cids.
+        centroid: (D,) L2-normalised mean of the state's embeddings.
+        index: IvfFlatIndex over matrix.
+    """
+
+    def __init__(self, key: str, matrix: EmbeddingMatrix, gnis: np.ndarray, centroid: np.ndarray, index: IvfFlatIndex):
+        if len(gnis) != len(matrix.cids):
+            raise ValueError(f"Shard '{key}' has {len(matrix.cids)} cids but {len(gnis)} gnis.")
+        self.key:      str             = key
+        self.matrix:   EmbeddingMatrix = matrix
+        self.gnis:     np.ndarray      = gnis
+        self.centroid: np.ndarray      = centroid
+        self.index:    IvfFlatIndex    = index
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @classmethod
+    def load(cls, directory: Path, n_probe: int = 8) -> 'GeoShard':
+        """Open a shard directory written by GeoShardRouter.build. The embeddings are memory-mapped."""
+        directory = Path(directory)
+        matrix = EmbeddingMatrix.load(directory)
+        return cls(
+            key=directory.name,
+            matrix=matrix,
+            gnis=np.load(directory / "gnis.npy"),
+            centroid=np.load(directory / "centroid.npy"),
+            index=IvfFlatIndex.load(directory / "index.npz", matrix=matrix, n_probe=n_probe),
+        )
+
+    def search(self,
+               query_embedding: list[float] | np.ndarray,
+               top_k: int = 100,
+               candidate_cids: Optional[Iterable[str]] = None,
+               gnis: Optional[Iterable[str]] = None,
+               threshold: Optional[float] = None,
+               pooling: Optional[PoolingMethod] = None
+               ) -> list[tuple[str, float]]:
+        """
+        Find the state's embeddings most similar to a query embedding.
+
+        Args:
+            query_embedding: The query embedding.
+            top_k: Max number of (cid, score) pairs to return.
+            candidate_cids: If given, only embeddings belonging to these cids are considered.
+            gnis: If given, only embeddings of laws from these places are considered.
+            threshold: If given, drop results with a score below it.
+            pooling: If given, pool the chunk scores of each law with this method, see pool_chunk_scores.
+
+        Returns:
+            list[tuple[str, float]]: (cid, cosine similarity) pairs, highest score first.
+        """
+        if gnis is not None:
+            in_places = self.matrix.cids[np.isin(self.gnis, np.asarray(list(gnis), dtype=str))]
+            if candidate_cids is not None:
+                in_places = np.intersect1d(in_places, np.asarray(list(candidate_cids), dtype=str))
+            if len(in_places) == 0:
+                return []
+            candidate_cids = in_places
+        return self.index.search(
+            query_embedding, top_k=top_k, candidate_cids=candidate_cids, threshold=threshold, pooling=pooling
+        )
+
+
+class GeoShardRouter:
+    """
+    Route semantic searches to the shards of the states they are about.
+
+    Example:
+        >>> router = GeoShardRouter.load(configs.GEO_SHARDS_DIR)
+        >>> router.search(query_embedding, top_k=100, query_text="dog leash laws in salem oregon")
+        [('bafk...', 0.71), ...]
+
+    Attributes:
+        shards: The shards, by state code.
+        places: Every place with laws in the dataset.
+        max_shards: Max number of shards to search for a query that names no place. 0 means no limit.
+        min_centroid_similarity: Shards whose centroid is less similar than this to the query are
+            skipped, unless the query names their state.
+    """
+
+    def __init__(self,
+                 shards: Mapping[str, GeoShard],
+                 places: Iterable[Place],
+                 max_shards: int = 0,
+                 min_centroid_similarity: Optional[float] = None
+                 ):
+        self.shards:                  dict[str, GeoShard] = dict(shards)
+        self.places:                  list[Place]         = list(places)
+        self.max_shards:              int                 = max_shards
+        self.min_centroid_similarity: Optional[float]     = min_centroid_similarity
+
+        self._keys: list[str] = sorted(self.shards)
+        self._centroids: np.ndarray = (
+            np.stack([self.shards[key].centroid for key in self._keys]).astype(np.float32)
+            if self._keys else np.empty((0, 0), dtype=np.float32)
+        )
+        # Normalized names -> what they refer to.
+        self._state_names: dict[str, str] = {}
+        self._place_names: dict[str, list[Place]] = {}
+        for place in self.places:
+            self._state_names[_normalize_name(place.state_name)] = place.state_code
+            name = _normalize_name(place.place_name)
+            for prefix in _PLACE_PREFIXES:
+                if name.startswith(prefix):
+                    name = name[len(prefix):]
+                    break
+            if name:
+                self._place_names.setdefault(name, []).append(place)
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def find_places(self, query_text: str) -> dict[str, Optional[set[str]]]:
+        """
+        Find the states and municipalities a query names.
+
+        Names are matched longest first, and state names win over place names, so
+        "washington" is the state and "west virginia" isn't Virginia. A municipality
+        only counts if its state is named too, or if its name is more than one word,
+        since many single-word place names (e.g. "Commerce") are also common words.
+
+        Args:
+            query_text: The search query.
+
+        Returns:
+            dict: State code -> the gnis of the municipalities named in that state,
+                or None if only the state was named.
+        """
+        words = _normalize_name(query_text).split()
+        states: set[str] = set()
+        place_matches: list[tuple[str, list[Place]]] = []
+        i = 0
+        while i < len(words):
+            for n in range(min(_MAX_PLACE_WORDS, len(words) - i), 0, -1):
+                phrase = " ".join(words[i:i + n])
+                if phrase in self._state_names:
+                    states.add(self._state_names[phrase])
+                    break
+                if phrase in self._place_names:
+                    place_matches.append((phrase, self._place_names[phrase]))
+                    break
+            i += n  # n is 1 if nothing matched.
+
+        named: dict[str, Optional[set[str]]] = {state: None for state in states}
+        for phrase, places in place_matches:
+            for place in places:
+                if place.state_code in states or (not states and " " in phrase):
+                    gnis = named.get(place.state_code) or set()
+                    gnis.add(place.gnis)
+                    named[place.state_code] = gnis
+        return named
+
+    def route(
+            self,
+            query_embedding: list[float] | np.ndarray,
+            query_text: Optional[str] = None
+            ) -> list[tuple[GeoShard, Optional[set[str]]]]:
+        """
+        Pick the shards to search for a query.
+
+        Args:
+            query_embedding: The query embedding.
+            query_text: The search query. If it names a state or municipality, only that state's shard is searched.
+
+        Returns:
+            list[tuple[GeoShard, Optional[set[str]]]]: Each shard to search, with the gnis
+                to narrow it to, or None to search the whole shard.
+        """
+        named = self.find_places(query_text) if query_text else {}
+        if named:
+            return [(self.shards[key], gnis) for key, gnis in named.items() if key in self.shards]
+
+        if not self._keys:
+            return []
+        query = l2_normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        similarities = self._centroids @ query
+        order = np.argsort(similarities, kind="stable")[::-1]
+        if self.min_centroid_similarity is not None:
+            order = order[similarities[order] >= self.min_centroid_similarity]
+        if self.max_shards:
+            order = order[:self.max_shards]
+        return [(self.shards[self._keys[i]], None) for i in order]
+
+    def search(self,
+               query_embedding: list[float] | np.ndarray,
+               top_k: int = 100,
+               candidate_cids: Optional[Iterable[str]] = None,
+               threshold: Optional[float] = None,
+               query_text: Optional[str] = None,
+               pooling: Optional[PoolingMethod] = None
+               ) -> list[tuple[str, float]]:
+        """
+        Find the embeddings most similar to a query embedding, in the shards the query is routed to.
+
+        Args:
+            query_embedding: The query embedding. Nested lists (e.g. [[...]]) are flattened.
+            top_k: Max number of (cid, score) pairs to return.
+            candidate_cids: If given, only embeddings belonging to these cids are considered.
+            threshold: If given, drop results with a score below it.
+            query_text: The search query, for routing by place name. See route.
+            pooling: If given, pool the chunk scores of each law with this method, see pool_chunk_scores.
+                Each law lives in a single shard, so pooled results stay one per cid.
+
+        Returns:
+            list[tuple[str, float]]: (cid, cosine similarity) pairs, highest score first.
+        """
+        if candidate_cids is not None:
+            candidate_cids = np.unique(np.asarray(list(candidate_cids), dtype=str))
+        results: list[tuple[str, float]] = []
+        for shard, gnis in self.route(query_embedding, query_text=query_text):
+            results.extend(shard.search(
+                query_embedding, top_k=top_k, candidate_cids=candidate_cids, gnis=gnis,
+                threshold=threshold, pooling=pooling
+            ))
+        results.sort(key=lambda pair: pair[1], reverse=True)
+        return results[:top_k]
+
+    @classmethod
+    def build(cls,
+              matrix: EmbeddingMatrix,
+              cid_gnis: Mapping[str, str],
+              places: Iterable[Place],
+              directory: Path,
+              n_lists: int = 0,
+              n_probe: int = 8
+              ) -> 'GeoShardRouter':
+        """
+        Split an embedding matrix into per-state shards, and write them to a directory.
+
+        The shards are copied from the matrix a chunk of cids at a time, straight
+        into memory-mapped files, so a large state never has to fit in memory.
+
+        Args:
+            matrix: The embedding matrix of every law.
+            cid_gnis: The gnis of each law cid. Laws without one, or whose place is unknown, aren't sharded.
+            places: Every place, for its state.
+            directory: Where to write the shards.
+            n_lists: Number of inverted lists per shard index. 0 picks roughly sqrt(N) per shard.
+            n_probe: Default number of lists to scan per query.
+
+        Returns:
+            GeoShardRouter: The router over the written shards.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        places = list(places)
+        state_of_gnis = {place.gnis: place.state_code for place in places}
+
+        gnis = np.asarray([str(cid_gnis.get(str(cid), "")) for cid in matrix.cids], dtype=str)
+        states = np.asarray([state_of_gnis.get(value, "") for value in gnis], dtype=str)
+
+        for key in sorted(set(states) - {""}):
+            in_state = np.flatnonzero(states == key)  # Positions in matrix.cids, so still sorted by cid.
+            lengths = matrix.offsets[in_state + 1] - matrix.offsets[in_state]
+            offsets = np.zeros(len(in_state) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(lengths)
+            if offsets[-1] == 0:
+                continue
+
+            shard_dir = directory / key
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            vectors = np.lib.format.open_memmap(
+                shard_dir / "vectors.npy", mode="w+", dtype=np.float32, shape=(int(offsets[-1]), matrix.dimensions)
+            )
+            embedding_cids: list[np.ndarray] = []
+            total = np.zeros(matrix.dimensions, dtype=np.float64)
+            for start in range(0, len(in_state), _COPY_CHUNK_CIDS):
+                chunk = in_state[start:start + _COPY_CHUNK_CIDS]
+                rows = matrix.rows_for_cids(matrix.cids[chunk])
+                block = np.asarray(matrix.vectors[rows], dtype=np.float32)
+                vectors[offsets[start]:offsets[start] + len(rows)] = block
+                total += block.sum(axis=0)
+                embedding_cids.append(matrix.embedding_cids[rows])
+            vectors.flush()
+            del vectors
+
+            np.save(shard_dir / "cids.npy", matrix.cids[in_state])
+            np.save(shard_dir / "offsets.npy", offsets)
+            np.save(shard_dir / "embedding_cids.npy", np.concatenate(embedding_cids))
+            np.save(shard_dir / "gnis.npy", gnis[in_state])
+            np.save(shard_dir / "centroid.npy", l2_normalize(total.astype(np.float32)))
+            IvfFlatIndex.build(EmbeddingMatrix.load(shard_dir), n_lists=n_lists, n_probe=n_probe).save(shard_dir / "index.npz")
+
+        with open(directory / "places.json", "w") as file:
+            json.dump([asdict(place) for place in places], file)
+        return cls.load(directory, n_probe=n_probe)
+
+    @classmethod
+    def load(cls,
+             directory: Path,
+             n_probe: int = 8,
+             max_shards: int = 0,
+             min_centroid_similarity: Optional[float] = None
+             ) -> 'GeoShardRouter':
+        """
+        Open every shard in a directory written by `build`.
+
+        Args:
+            directory: The geo shards directory.
+            n_probe: Default number of lists to scan per query, in each shard.
+            max_shards: See GeoShardRouter.
+            min_centroid_similarity: See GeoShardRouter.
+
+        Returns:
+            GeoShardRouter: The router.
+        """
+        directory = Path(directory)
+        with open(directory / "places.json") as file:
+            places = [Place(**place) for place in json.load(file)]
+        shards = {
+            shard_dir.name: GeoShard.load(shard_dir, n_probe=n_probe)
+            for shard_dir in sorted(directory.iterdir()) if (shard_dir / "index.npz").exists()
+        }
+        return cls(shards, places, max_shards=max_shards, min_centroid_similarity=min_centroid_similarity)
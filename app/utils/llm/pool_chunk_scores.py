@@ -0,0 +1,71 @@
+"""
+Reduce the scores of a law's text chunks to one score per law.
+
+Each law has one embedding per text chunk, so scoring embeddings gives several
+scores per law cid. Ranking them as they are lets one long ordinance fill the
+ranking with its own chunks. Here the chunk scores are sorted by cid once,
+and each cid's run of scores is reduced with a single NumPy segment reduction.
+"""
+from __future__ import annotations
+from typing import Literal
+
+
+import numpy as np
+
+
+PoolingMethod = Literal["max", "mean", "top2_mean"]
+POOLING_METHODS: tuple[str, ...] = ("max", "mean", "top2_mean")
+
+
+def pool_chunk_scores(
+        cids: np.ndarray,
+        scores: np.ndarray,
+        method: PoolingMethod = "max"
+        ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pool chunk scores into one score per law cid.
+
+    Args:
+        cids: (N,) the law cid of each chunk. If they are already sorted, e.g. rows of
+            an EmbeddingMatrix, they aren't sorted again.
+        scores: (N,) the score of each chunk.
+        method: "max" takes the best chunk, "mean" averages every chunk, and
+            "top2_mean" averages the best two chunks (or takes the only one).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]:
+            - (M,) the unique law cids, sorted
+            - (M,) float32 pooled score of each law
+
+    Raises:
+        ValueError: If the method is unknown, or cids and scores differ in length.
+    """
+    if method not in POOLING_METHODS:
+        raise ValueError(f"Unknown pooling method '{method}'. Expected one of {list(POOLING_METHODS)}.")
+    cids = np.asarray(cids)
+    scores = np.asarray(scores, dtype=np.float32)
+    if len(cids) != len(scores):
+        raise ValueError(f"Got {len(cids)} cids but {len(scores)} scores.")
+    if len(cids) == 0:
+        return cids, scores
+
+    if np.any(cids[1:] < cids[:-1]):
+        order = np.argsort(cids, kind="stable")
+        cids, scores = cids[order], scores[order]
+
+    # Each law's chunks are one contiguous segment.
+    starts = np.flatnonzero(np.concatenate(([True], cids[1:] != cids[:-1])))
+    counts = np.diff(np.append(starts, len(cids)))
+
+    if method == "max":
+        pooled = np.maximum.reduceat(scores, starts)
+    elif method == "mean":
+        pooled = np.add.reduceat(scores, starts) / counts
+    else:
+        # Order each segment best first, then average its first two scores.
+        segment_ids = np.repeat(np.arange(len(starts)), counts)
+        by_score = scores[np.lexsort((-scores, segment_ids))]
+        best = by_score[starts]
+        second = np.where(counts > 1, by_score[np.minimum(starts + 1, len(by_score) - 1)], best)
+        pooled = (best + second) / 2
+    return cids[starts], pooled.astype(np.float32, copy=False)
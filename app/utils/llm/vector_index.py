@@ -0,0 +1,303 @@
+"""
+Approximate nearest neighbour (ANN) index over the law embeddings.
+
+The index is an inverted-file, flat (IVF-flat) index written in pure NumPy.
+Every embedding is assigned to the closest of `n_lists` k-means centroids.
+A query only scores the embeddings in the `n_probe` lists whose centroids are
+closest to it. Raising `n_probe` increases recall at the cost of latency.
+Setting it to `n_lists` makes the search exact. A search restricted to candidates
+scans more lists if the probed ones don't hold enough candidates to fill top_k.
+
+The index only stores centroids and row numbers. The embeddings themselves
+are read from the memory-mapped EmbeddingMatrix.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Optional
+
+
+import numpy as np
+
+
+from .cosine_similarity import top_k_indices
+from .embedding_matrix import EmbeddingMatrix, l2_normalize
+from .pool_chunk_scores import PoolingMethod, pool_chunk_scores
+
+
+def _spherical_kmeans(
+        vectors: np.ndarray,
+        n_lists: int,
+        n_iter: int = 10,
+        seed: int = 0
+        ) -> np.ndarray:
+    """
+    Cluster unit-length vectors with k-means on cosine similarity.
+
+    Args:
+        vectors: (N, D) float32 array of L2-normalised vectors.
+        n_lists: Number of centroids to produce.
+        n_iter: Number of Lloyd iterations.
+        seed: Seed for centroid initialisation.
+
+    Returns:
+        np.ndarray: (n_lists, D) float32 array of L2-normalised centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for list_id in range(n_lists):
+            members = vectors[assignments == list_id]
+            if len(members) == 0:
+                # Re-seed empty clusters with a random vector.
+                centroids[list_id] = vectors[rng.integers(len(vectors))]
+            else:
+                centroids[list_id] = members.sum(axis=0)
+        centroids = l2_normalize(centroids)
+    return centroids
+
+
+class IvfFlatIndex:
+    """
+    Inverted-file (IVF-flat) index for cosine-similarity search over an EmbeddingMatrix.
+
+    Attributes:
+        centroids: (n_lists, D) L2-normalised list centroids.
+        list_rows: (N,) matrix rows, grouped by inverted list.
+        list_offsets: (n_lists + 1,) start offsets of each inverted list in `list_rows`.
+        matrix: The embedding matrix the row numbers refer to.
+        n_probe: Default number of inverted lists to scan per query.
+    """
+
+    def __init__(self,
+                 centroids: np.ndarray,
+                 list_rows: np.ndarray,
+                 list_offsets: np.ndarray,
+                 matrix: EmbeddingMatrix,
+                 n_probe: int = 8
+                ):
+        if len(list_rows) != len(matrix):
+            raise ValueError(
+                f"Index covers {len(list_rows)} embeddings but the matrix has {len(matrix)}. Rebuild the index."
+            )
+        self.centroids:    np.ndarray      = centroids
+        self.list_rows:    np.ndarray      = list_rows
+        self.list_offsets: np.ndarray      = list_offsets
+        self.matrix:       EmbeddingMatrix = matrix
+        self.n_probe:      int             = n_probe
+
+        # Matrix row -> inverted list, for restricting candidates to the probed lists.
+        self._row_list = np.empty(len(list_rows), dtype=np.int32)
+        self._row_list[list_rows] = np.repeat(
+            np.arange(self.n_lists, dtype=np.int32), np.diff(list_offsets)
+        )
+
+    def __len__(self) -> int:
+        return len(self.list_rows)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls,
+              matrix: EmbeddingMatrix,
+              n_lists: int = 0,
+              n_probe: int = 8,
+              n_iter: int = 10,
+              sample_size: int = 100_000,
+              seed: int = 0
+              ) -> 'IvfFlatIndex':
+        """
+        Build an index over an embedding matrix.
+
+        Args:
+            matrix: The embedding matrix to index.
+            n_lists: Number of inverted lists. 0 picks roughly sqrt(N).
+            n_probe: Default number of lists to scan per query.
+            n_iter: Number of k-means iterations.
+            sample_size: Max number of embeddings used to train the centroids.
+            seed: Seed for the k-means sampling.
+
+        Returns:
+            IvfFlatIndex: The built index.
+        """
+        total = len(matrix)
+        if total == 0:
+            raise ValueError("Cannot build a vector index from zero embeddings.")
+
+        n_lists = n_lists or max(1, int(np.sqrt(total)))
+        n_lists = min(n_lists, total)
+
+        rng = np.random.default_rng(seed)
+        if total > sample_size:
+            # Sorted so the sample reads the memory map front to back.
+            training_set = matrix.vectors[np.sort(rng.choice(total, size=sample_size, replace=False))]
+        else:
+            training_set = np.asarray(matrix.vectors)
+        centroids = _spherical_kmeans(training_set, n_lists, n_iter=n_iter, seed=seed)
+
+        # Assign every embedding to its closest centroid, in chunks to bound memory.
+        assignments = np.empty(total, dtype=np.int32)
+        for start in range(0, total, 65_536):
+            chunk = matrix.vectors[start:start + 65_536]
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+
+        return cls(
+            centroids=centroids,
+            list_rows=np.argsort(assignments, kind="stable").astype(np.int64),
+            list_offsets=list_offsets,
+            matrix=matrix,
+            n_probe=n_probe,
+        )
+
+    def save(self, path: Path) -> None:
+        """Save the index to an uncompressed .npz file."""
+        np.savez(
+            path,
+            centroids=self.centroids,
+            list_rows=self.list_rows,
+            list_offsets=self.list_offsets,
+        )
+
+    @classmethod
+    def load(cls, path: Path, matrix: EmbeddingMatrix, n_probe: int = 8) -> 'IvfFlatIndex':
+        """Load an index previously written with `save`, over the matrix it was built from."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                centroids=data["centroids"],
+                list_rows=data["list_rows"],
+                list_offsets=data["list_offsets"],
+                matrix=matrix,
+                n_probe=n_probe,
+            )
+
+    def search(self,
+               query_embedding: list[float] | np.ndarray,
+               top_k: int = 100,
+               candidate_cids: Optional[Iterable[str]] = None,
+               n_probe: Optional[int] = None,
+               threshold: Optional[float] = None,
+               pooling: Optional[PoolingMethod] = None
+               ) -> list[tuple[str, float]]:
+        """
+        Find the embeddings most similar to a query embedding.
+
+        Args:
+            query_embedding: The query embedding. Nested lists (e.g. [[...]]) are flattened.
+            top_k: Max number of (cid, score) pairs to return.
+            candidate_cids: If given, only embeddings belonging to these cids are considered.
+            n_probe: Number of inverted lists to scan. Defaults to `self.n_probe`.
+            threshold: If given, drop results with a score below it.
+            pooling: If given, pool the chunk scores of each law with this method, see pool_chunk_scores.
+
+        Returns:
+            list[tuple[str, float]]: (cid, cosine similarity) pairs, highest score first.
+                Without pooling, a cid can appear more than once if several of its chunks match.
+        """
+        query = l2_normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+
+        if candidate_cids is not None:
+            rows = self.probe_candidates(
+                query, self.matrix.rows_for_cids(candidate_cids), top_k=top_k, n_probe=n_probe, per_law=pooling is not None
+            )
+        else:
+            probed_lists = self._lists_by_distance(query)[:n_probe]
+            rows = np.sort(np.concatenate([
+                self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probed_lists
+            ]))
+
+        return top_k_rows(self.matrix, query, rows, top_k=top_k, threshold=threshold, pooling=pooling)
+
+    def probe_candidates(self,
+                         query_embedding: list[float] | np.ndarray,
+                         rows: np.ndarray,
+                         top_k: int = 100,
+                         n_probe: Optional[int] = None,
+                         per_law: bool = False
+                         ) -> np.ndarray:
+        """
+        Keep the candidate rows in the inverted lists closest to a query.
+
+        The candidates in the `n_probe` closest lists are kept. If there are fewer than
+        top_k of them, the next closest lists are added until there are enough,
+        so a small candidate set is scored exactly.
+
+        Args:
+            query_embedding: The query embedding.
+            rows: The candidate matrix rows, in row order, e.g. from EmbeddingMatrix.rows_for_cids.
+            top_k: Number of candidates the kept rows should be able to fill.
+            n_probe: Min number of inverted lists to keep. Defaults to `self.n_probe`.
+            per_law: If True, candidates are laws rather than rows. A law is kept with all
+                of its chunks if any of them is in a kept list, so its pooled score is exact.
+
+        Returns:
+            np.ndarray: The kept rows, in row order.
+        """
+        if len(rows) <= top_k:
+            return rows
+        query = l2_normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+
+        list_rank = np.empty(self.n_lists, dtype=np.int64)
+        list_rank[self._lists_by_distance(query)] = np.arange(self.n_lists)
+        rank = list_rank[self._row_list[rows]]
+        if per_law:
+            # A law's rows are contiguous, so rank each law by its closest chunk.
+            laws = np.searchsorted(self.matrix.offsets, rows, side="right") - 1
+            starts = np.flatnonzero(np.r_[True, laws[1:] != laws[:-1]])
+            lengths = np.diff(np.r_[starts, len(rows)])
+            rank = np.minimum.reduceat(rank, starts)
+        if len(rank) <= top_k:
+            return rows
+
+        n_kept_lists = max(n_probe, int(np.partition(rank, top_k - 1)[top_k - 1]) + 1)
+        keep = rank < n_kept_lists
+        if per_law:
+            keep = np.repeat(keep, lengths)
+        return rows[keep]
+
+    def _lists_by_distance(self, query: np.ndarray) -> np.ndarray:
+        """Order the inverted lists from the closest centroid to the query to the furthest."""
+        return np.argsort(self.centroids @ query)[::-1]
+
+
+def top_k_rows(
+        matrix: EmbeddingMatrix,
+        query_embedding: list[float] | np.ndarray,
+        rows: np.ndarray,
+        top_k: int = 100,
+        threshold: Optional[float] = None,
+        pooling: Optional[PoolingMethod] = None
+        ) -> list[tuple[str, float]]:
+    """
+    Score the given rows of an embedding matrix exactly and keep the best.
+
+    With pooling, every chunk of the scored laws is reduced to one score per law
+    before the threshold and top_k are applied, so each cid appears at most once.
+
+    Args:
+        matrix: The embedding matrix.
+        query_embedding: The query embedding.
+        rows: The matrix rows to score.
+        top_k: Max number of (cid, score) pairs to return.
+        threshold: If given, drop results with a score below it.
+        pooling: If given, pool the chunk scores of each law with this method, see pool_chunk_scores.
+
+    Returns:
+        list[tuple[str, float]]: (cid, cosine similarity) pairs, highest score first.
+    """
+    scores = matrix.score(query_embedding, rows)
+    if pooling is not None:
+        # Matrix rows are sorted by cid, so sorted rows give already-sorted segments.
+        cids, scores = pool_chunk_scores(matrix.cids_for_rows(rows), scores, method=pooling)
+        ranked = top_k_indices(scores, top_k=top_k, threshold=threshold)
+        return [(str(cid), float(score)) for cid, score in zip(cids[ranked], scores[ranked])]
+    ranked = top_k_indices(scores, top_k=top_k, threshold=threshold)
+    cids = matrix.cids_for_rows(rows[ranked])
+    return [(str(cid), float(score)) for cid, score in zip(cids, scores[ranked])]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Initialize singletons for the embedding matrix, its vector index and its per-state shards.
+
+Both are loaded once at startup. The embedding matrix is memory-mapped read-only,
+so every worker process shares the same page cache pages.
+If they have not been built yet, EMBEDDING_MATRIX and VECTOR_INDEX are None
+and searches fall back to scoring embeddings from the database.
+Build them with `python -m utils.database.build_vector_index`.
+The per-state shards are built with `python -m utils.database.build_geo_shards`.
+If they have not been built, GEO_SHARD_ROUTER is None and the whole vector index is searched.
+"""
+import sys
+
+sys.path.append("..")  # Add the parent directory to the path
+
+
+from logger import logger
+from configs import configs
+from utils.llm.embedding_matrix import EmbeddingMatrix
+from utils.llm.geo_shards import GeoShardRouter
+from utils.llm.vector_index import IvfFlatIndex
+
+
+EMBEDDING_MATRIX = None
+if (configs.EMBEDDING_MATRIX_DIR / "vectors.npy").exists():
+    try:
+        EMBEDDING_MATRIX = EmbeddingMatrix.load(configs.EMBEDDING_MATRIX_DIR)
+        logger.info(f"Memory-mapped {len(EMBEDDING_MATRIX)} embeddings from {configs.EMBEDDING_MATRIX_DIR}")
+    except Exception as e:
+        logger.error(f"Failed to load embedding matrix from {configs.EMBEDDING_MATRIX_DIR}: {e}")
+else:
+    logger.warning(f"No embedding matrix found at {configs.EMBEDDING_MATRIX_DIR}. Embedding search will use the database.")
+
+
+VECTOR_INDEX = None
+if EMBEDDING_MATRIX is not None and configs.VECTOR_INDEX_PATH.exists():
+    try:
+        VECTOR_INDEX = IvfFlatIndex.load(
+            configs.VECTOR_INDEX_PATH, matrix=EMBEDDING_MATRIX, n_probe=configs.VECTOR_INDEX_N_PROBE
+        )
+        logger.info(f"Loaded vector index with {VECTOR_INDEX.n_lists} lists from {configs.VECTOR_INDEX_PATH}")
+    except Exception as e:
+        logger.error(f"Failed to load vector index from {configs.VECTOR_INDEX_PATH}: {e}")
+
+
+GEO_SHARD_ROUTER = None
+if (configs.GEO_SHARDS_DIR / "places.json").exists():
+    try:
+        GEO_SHARD_ROUTER = GeoShardRouter.load(
+            configs.GEO_SHARDS_DIR,
+            n_probe=configs.VECTOR_INDEX_N_PROBE,
+            max_shards=configs.GEO_SHARD_MAX_SHARDS,
+            min_centroid_similarity=configs.GEO_SHARD_MIN_SIMILARITY,
+        )
+        logger.info(f"Loaded {len(GEO_SHARD_ROUTER)} geo shards from {configs.GEO_SHARDS_DIR}")
+    except Exception as e:
+        logger.error(f"Failed to load geo shards from {configs.GEO_SHARDS_DIR}: {e}")
@@ -0,0 +1,345 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Batch job that runs the most popular searches ahead of time, so their results are cached.
+
+Traffic is heavy-tailed: a few hundred searches are most of it. This job ranks the searches
+in the search history by how often and how recently they were run, and runs the full
+search for the top ones that aren't cached, or were cached from an older law database.
+Their rankings are saved to the search_query table like any other search's, so the first
+users after a deploy or a database rebuild get cache hits.
+
+Every search is counted with a weight that halves every WARM_CACHE_HALF_LIFE_DAYS, so a
+search run often last month ranks below one run as often this week. Only searches that
+found results are counted. At most WARM_CACHE_CONCURRENCY searches run at once, each making
+a few LLM calls.
+
+Searches are re-run in the mode their cached results were saved under. The search history
+keeps each query as typed, since its cid is made from that. Lexical searches aren't cached,
+and a search whose cid can't be made again from its saved text is skipped, like a mixed-case
+one saved lowercased before the history kept queries as typed.
+
+Run it from the app directory with:
+    python warm_cache.py [--top N] [--concurrency N] [--every SECONDS]
+start_docker.sh runs it in the background when the container starts.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import sys
+from typing import Any, Optional
+
+
+_APP_DIR = Path(__file__).resolve().parent
+for _path in (_APP_DIR, _APP_DIR.parent): # The app imports itself both ways, see start.sh.
+    if str(_path) not in sys.path:
+        sys.path.append(str(_path))
+
+
+from configs import configs as project_configs, Configs
+from logger import logger as module_logger
+from schemas.search_mode import SearchMode
+
+
+@dataclass(frozen=True)
+class PopularQuery:
+    """
+    A search from the search history, and how popular it is.
+
+    Attributes:
+        search_query_cid: Content ID the search's results are cached under.
+        search_query: The search query.
+        searches: How many times it was run.
+        last_searched: When it was last run.
+        score: Its searches, each weighted by how recent it is.
+        cached: Whether its results are in the search_query table.
+        saved_at: When its cached results were ranked. None if unknown or not cached.
+    """
+    search_query_cid: str
+    search_query: str
+    searches: int
+    last_searched: datetime
+    score: float
+    cached: bool
+    saved_at: Optional[datetime]
+
+    def needs_warming(self, stale_before: Optional[datetime] = None) -> bool:
+        """
+        Check if the search should be run again.
+
+        Args:
+            stale_before: Cached results ranked before this are stale, e.g. the last law database rebuild.
+
+        Returns:
+            bool: True if the results aren't cached, or may be stale.
+        """
+        if not self.cached or self.saved_at is None:
+            return True
+        return stale_before is not None and self.saved_at < stale_before
+
+
+def get_popular_queries(
+    cursor: sqlite3.Cursor,
+    top: int,
+    half_life_days: float,
+    now: datetime
+) -> list[PopularQuery]:
+    """
+    Rank the searches in the search history by frequency and recency.
+
+    Args:
+        cursor: A cursor on the search cache database.
+        top: How many searches to return.
+        half_life_days: Age at which a search counts half.
+        now: The time the ages are measured from.
+
+    Returns:
+        list[PopularQuery]: The most popular searches, most popular first.
+    """
+    half_life_seconds = half_life_days * 86400
+
+    def recency_weight(timestamp: str) -> float:
+        age = (now - datetime.fromisoformat(timestamp)).total_seconds()
+        return 0.5 ** (max(age, 0) / half_life_seconds)
+
+    cursor.connection.create_function("recency_weight", 1, recency_weight, deterministic=True)
+    # With one MAX, SQLite takes search_query from the row it came from, i.e. the latest.
+    rows = cursor.execute('''
+        WITH popular AS (
+            SELECT
+                search_query_cid,
+                search_query,
+                COUNT(*) AS searches,
+                MAX(timestamp) AS last_searched,
+                SUM(recency_weight(timestamp)) AS score
+            FROM search_history
+            WHERE result_count > 0
+            GROUP BY search_query_cid
+            ORDER BY score DESC, search_query_cid
+            LIMIT :top
+        )
+        SELECT p.*, q.search_query_cid IS NOT NULL AS cached, q.saved_at
+        FROM popular p
+        LEFT JOIN search_query q ON q.search_query_cid = p.search_query_cid
+        ORDER BY p.score DESC, p.search_query_cid
+    ''', {"top": top}).fetchall()
+    return [
+        PopularQuery(
+            search_query_cid, search_query, searches, datetime.fromisoformat(last_searched), score, bool(cached),
+            datetime.fromisoformat(saved_at) if saved_at is not None else None,
+        )
+        for search_query_cid, search_query, searches, last_searched, score, cached, saved_at in rows
+    ]
+
+
+class CacheWarmer:
+    """
+    Runs the popular searches that aren't cached, a few at a time.
+
+    Attributes:
+        configs: Configs with the WARM_CACHE_* settings and the law database path.
+        search_function: The SearchFunction class.
+        search_resources: The resources each SearchFunction is made with.
+        search_cache_store: The search cache database the search history and cached results are in.
+        db_executor: Runs the searches' read-only queries. None to run them in worker threads.
+        response_cache: Its pages of the searches that were run again are dropped. None if there is none.
+        logger: Logger for progress and failed searches.
+    """
+
+    def __init__(self, *,
+                 configs: Configs = None,
+                 resources: dict[str, Any] = None
+                ) -> None:
+        self.configs = configs
+        self.resources = resources
+
+        self.search_function:    type           = resources['search_function']
+        self.search_resources:   dict[str, Any] = resources['search_resources']
+        self.search_cache_store: Any            = resources['search_cache_store']
+        self.db_executor:        Any            = resources.get('db_executor')
+        self.response_cache:     Any            = resources.get('response_cache')
+        self.logger:             logging.Logger = resources['logger']
+
+        self.top:            int   = configs.WARM_CACHE_TOP_QUERIES
+        self.concurrency:    int   = configs.WARM_CACHE_CONCURRENCY
+        self.half_life_days: float = configs.WARM_CACHE_HALF_LIFE_DAYS
+
+    async def warm(self) -> dict[str, int]:
+        """
+        Run the popular searches that need it once, and wait for their results to be saved.
+
+        Returns:
+            dict[str, int]:
+                - popular: Searches ranked.
+                - fresh: Of those, searches whose cached results are up to date.
+                - skipped: Searches that can't be run again in the mode they were cached under.
+                - warmed, failed: Searches run, and searches that failed or were rejected.
+        """
+        popular = await asyncio.to_thread(
+            self.search_cache_store.read, get_popular_queries, self.top, self.half_life_days, datetime.now()
+        )
+        stale_before = self._law_database_built_at()
+        stats = {"popular": len(popular), "fresh": 0, "skipped": 0, "warmed": 0, "failed": 0}
+
+        to_warm: list[tuple[PopularQuery, SearchMode]] = []
+        for query in popular:
+            if not query.needs_warming(stale_before):
+                stats["fresh"] += 1
+                continue
+            mode = self._mode_of(query)
+            if mode is None:
+                stats["skipped"] += 1
+                continue
+            to_warm.append((query, mode))
+
+        started_store = not self.search_cache_store.started
+        started_executor = self.db_executor is not None and not self.db_executor.started
+        if started_store:
+            self.search_cache_store.start()
+        if started_executor:
+            self.db_executor.start()
+        try:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            warmed = await asyncio.gather(*(self._warm_query(query, mode, semaphore) for query, mode in to_warm))
+        finally:
+            if started_executor:
+                self.db_executor.shutdown(wait=True)
+            if started_store:
+                await self.search_cache_store.shutdown()  # Writes the queued results.
+
+        stats["warmed"] = sum(warmed)
+        stats["failed"] = len(warmed) - stats["warmed"]
+        if self.response_cache is not None:
+            # Pages cached from the old results would hide the new ones.
+            self.response_cache.invalidate(*(query.search_query_cid for query, _ in to_warm))
+        self.logger.info(f"Warmed the search cache: {stats}")
+        return stats
+
+    async def run(self, every: float = 0) -> None:
+        """
+        Warm the search cache, then again every so often.
+
+        Args:
+            every: Seconds between the starts of two runs. 0 to run once.
+        """
+        while True:
+            started = asyncio.get_running_loop().time()
+            try:
+                await self.warm()
+            except Exception as e:
+                if not every:
+                    raise
+                self.logger.exception(f"Error warming the search cache: {e}")
+            if not every:
+                return
+            await asyncio.sleep(max(0.0, every - (asyncio.get_running_loop().time() - started)))
+
+    async def _warm_query(self, query: PopularQuery, mode: SearchMode, semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            self.logger.debug(f"Warming the search cache with '{query.search_query}' ({mode}, score {query.score:.2f}).")
+            try:
+                # Checking out a pooled connection can wait for one to be released, so do it off the event loop.
+                search_function = await asyncio.to_thread(
+                    self.search_function,
+                    search_query=query.search_query, resources=self.search_resources, configs=self.configs, mode=mode
+                )
+                async with search_function as search_func:
+                    async for _ in search_func.search(page=1, per_page=20, use_cache=False):
+                        pass
+            except Exception as e:
+                self.logger.warning(f"Could not warm the search cache with '{query.search_query}': {e}")
+                return False
+        return True
+
+    def _mode_of(self, query: PopularQuery) -> Optional[SearchMode]:
+        for mode in (SearchMode.LLM, SearchMode.HYBRID):
+            if self.search_function.make_search_query_cid(query.search_query, mode) == query.search_query_cid:
+                return mode
+        return None
+
+    def _law_database_built_at(self) -> Optional[datetime]:
+        try:
+            return datetime.fromtimestamp(os.stat(self.configs.AMERICAN_LAW_DB_PATH).st_mtime)
+        except OSError:
+            return None
+
+
+DEFAULT_RESOURCE_KEYS = {
+    "search_function",
+    "search_resources",
+    "search_cache_store",
+    "db_executor",
+    "response_cache",
+    "logger",
+}
+
+def make_cache_warmer(
+        mock_resources: Optional[dict[str, Any]] = None,
+        mock_configs: Optional[Configs] = None,
+        ) -> CacheWarmer:
+    """
+    Factory function to create a CacheWarmer.
+
+    Args:
+        mock_resources (dict[str, Any], optional): A dictionary of resources to override injected defaults. Defaults to None.
+
+        Resources are:
+            - search_function (type): The SearchFunction class (default: paths.search.SearchFunction)
+            - search_resources (dict): Resources of each SearchFunction (default: paths.search.resources, with this logger)
+            - search_cache_store (SearchCacheStore): The search cache database (default: SEARCH_CACHE_STORE)
+            - db_executor (AsyncDatabaseExecutor): Thread pool for read-only queries (default: DB_EXECUTOR)
+            - response_cache (ResponseCache): Drops its pages of the searches that were run again (default: RESPONSE_CACHE)
+            - logger (logging.Logger): Logger instance (default: module_logger)
+
+        mock_configs (Configs, optional): A Configs object to override the default configs. Defaults to None.
+
+    Returns:
+        CacheWarmer: The cache warmer.
+
+    Raises:
+        KeyError: If mock_resources contains unexpected keys.
+    """
+    configs = mock_configs or project_configs
+    _resources = dict(mock_resources or {})
+    for key in _resources.keys():
+        if key not in DEFAULT_RESOURCE_KEYS:
+            raise KeyError(f"Unexpected resource key in mock_resources: {key}")
+
+    logger = _resources.pop("logger", module_logger)
+    if "search_function" not in _resources or "search_resources" not in _resources:
+        # Importing the search loads its indexes, so only do it if they are needed.
+        from paths import search
+        _resources.setdefault("search_function", search.SearchFunction)
+        _resources.setdefault("search_resources", {**search.resources, "logger": logger})
+    if "search_cache_store" not in _resources:
+        from utils.app.search.search_cache_store import SEARCH_CACHE_STORE
+        _resources["search_cache_store"] = SEARCH_CACHE_STORE
+    if "db_executor" not in _resources:
+        from api_.database.async_database_executor import DB_EXECUTOR
+        _resources["db_executor"] = DB_EXECUTOR
+    if "response_cache" not in _resources:
+        from utils.app.search.response_cache import RESPONSE_CACHE
+        _resources["response_cache"] = RESPONSE_CACHE
+
+    return CacheWarmer(configs=configs, resources={**_resources, "logger": logger})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=project_configs.WARM_CACHE_TOP_QUERIES, help="How many of the most popular searches to warm.")
+    parser.add_argument("--concurrency", type=int, default=project_configs.WARM_CACHE_CONCURRENCY, help="Max searches running at once.")
+    parser.add_argument("--every", type=float, default=project_configs.WARM_CACHE_INTERVAL_SECONDS, help="Seconds between runs. 0 runs once.")
+    args = parser.parse_args()
+
+    warmer = make_cache_warmer()
+    warmer.top, warmer.concurrency = args.top, args.concurrency
+    asyncio.run(warmer.run(every=args.every))
+
+
+if __name__ == "__main__":
+    main()
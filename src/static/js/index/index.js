@@ -1,6 +1,7 @@
 // Global variables
 let currentPage = 1;
 let currentQuery = '';
+let currentCursor = null; // Token for the ranking of the current search, so other pages skip the search
 let totalPages = 1;
 let hasSearched = false; // Track if a search has been performed
 let stallingSSSE = null; // Server-Sent Events connection for stalling messages
@@ -8,6 +9,9 @@ let stallingSSSE = null; // Server-Sent Events connection for stalling messages
 // SSE global variables
 let eventSource = null;
 let resultsAccumulator = null;
+const SSE_PROTOCOL = 2; // Version 2 streams results_delta events instead of resending every result
+let resultsByCid = new Map(); // Results received in results_delta events
+let resultRanks = new Map(); // Their ranks
 
 // DOM elements
 document.addEventListener('DOMContentLoaded', () => {
@@ -105,6 +109,10 @@ document.addEventListener('DOMContentLoaded', () => {
         // Set hasSearched flag to true
         hasSearched = true;
         
+        // A new query starts a new ranking
+        if (query !== currentQuery) {
+            currentCursor = null;
+        }
         currentQuery = query;
         currentPage = page;
         
@@ -129,9 +137,14 @@ document.addEventListener('DOMContentLoaded', () => {
             per_page: 0,
             total_pages: 0
         };
+        resultsByCid = new Map();
+        resultRanks = new Map();
         
         // Create a new EventSource connection
-        const url = `/api/search/sse?q=${encodeURIComponent(query)}&page=${page}&per_page=${perPage}`;
+        let url = `/api/search/sse?q=${encodeURIComponent(query)}&page=${page}&per_page=${perPage}&protocol=${SSE_PROTOCOL}`;
+        if (currentCursor) {
+            url += `&cursor=${encodeURIComponent(currentCursor)}`;
+        }
         eventSource = new EventSource(url);
         
         // Handle the search_started event
@@ -141,12 +154,13 @@ document.addEventListener('DOMContentLoaded', () => {
             // You could update your UI here to indicate the search has started
         });
         
-        // Handle the results_update event
-        eventSource.addEventListener('results_update', function(event) {
-            const data = JSON.parse(event.data);
-            
+        // Show a full set of results, however they arrived
+        function showResults(data) {
             // Update our accumulator with the latest results
             resultsAccumulator = data;
+            if (data.cursor) {
+                currentCursor = data.cursor;
+            }
             
             // Update the UI with the latest results
             displayResults(data.results);
@@ -155,12 +169,57 @@ document.addEventListener('DOMContentLoaded', () => {
             // Show the results and pagination containers
             document.getElementById('results').style.display = 'block';
             document.getElementById('pagination').style.display = 'flex';
+        }
+
+        // Handle the results_update event (protocol 1), which has every result so far
+        eventSource.addEventListener('results_update', function(event) {
+            const data = JSON.parse(event.data);
+            showResults(data);
             
             // You could display an interim message here
             if (data.results.length > 0) {
                 showToast(`Found ${data.results.length} results so far...`, 'info');
             }
         });
+
+        // Handle the results_delta event (protocol 2), which only has what changed since the last one
+        eventSource.addEventListener('results_delta', function(event) {
+            const data = JSON.parse(event.data);
+
+            data.removed.forEach(cid => {
+                resultsByCid.delete(cid);
+                resultRanks.delete(cid);
+            });
+            data.moved.forEach(change => resultRanks.set(change.cid, change.rank));
+            data.added.forEach(item => {
+                resultsByCid.set(item.result.cid, item.result);
+                resultRanks.set(item.result.cid, item.rank);
+            });
+
+            const cids = Array.from(resultsByCid.keys()).sort((a, b) => resultRanks.get(a) - resultRanks.get(b));
+            showResults({ ...data, results: cids.map(cid => resultsByCid.get(cid)) });
+
+            if (data.added.length > 0) {
+                showToast(`Found ${resultsByCid.size} results so far...`, 'info');
+            }
+        });
+
+        // Handle the results_snapshot event (protocol 2), which has the final order of the results
+        eventSource.addEventListener('results_snapshot', function(event) {
+            const data = JSON.parse(event.data);
+            const results = data.cids.filter(cid => resultsByCid.has(cid)).map(cid => resultsByCid.get(cid));
+            showResults({ ...data, results: results });
+        });
+        
+        // Handle the count_update event, sent when the exact total arrives after the first results
+        eventSource.addEventListener('count_update', function(event) {
+            const data = JSON.parse(event.data);
+
+            resultsAccumulator.total = data.total;
+            resultsAccumulator.total_matches = data.total_matches;
+            resultsAccumulator.total_pages = data.total_pages;
+            displayPagination(data.total_pages);
+        });
         
         // Handle the search_complete event
         eventSource.addEventListener('search_complete', function(event) {
@@ -171,8 +230,13 @@ document.addEventListener('DOMContentLoaded', () => {
             stopStallingMessages();
             
             // Show final results message
-            if (resultsAccumulator.results.length === 0 && query) {
+            if (resultsAccumulator.partial && query) {
+                showToast('The search ran out of time. Showing the results found so far.', 'info');
+            } else if (resultsAccumulator.results.length === 0 && query) {
                 showToast('No results found. Try different keywords.', 'error');
+            } else if (query && resultsAccumulator.total_matches) {
+                // Only the best matches are ranked and paged through.
+                showToast(`Found ${resultsAccumulator.total_matches} results, showing the best ${resultsAccumulator.total}`, 'success');
             } else if (query) {
                 showToast(`Found ${resultsAccumulator.total} results`, 'success');
             }
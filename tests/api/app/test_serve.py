@@ -0,0 +1,100 @@
+"""
+Tests for the pre-fork server in serve.py.
+"""
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import unittest
+import urllib.request
+
+
+try:
+    from serve import PreforkServer
+except ImportError:
+    from app.serve import PreforkServer
+
+
+# Set before the fork, so every worker sees the same object, as with the preloaded state.
+_SHARED_STATE = {"loaded_in": os.getpid()}
+
+
+async def _pid_app(scope, receive, send):
+    """Answer every request with the worker's pid, its parent's pid and where the shared state was loaded."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    body = json.dumps({"pid": os.getpid(), "ppid": os.getppid(), "loaded_in": _SHARED_STATE["loaded_in"]}).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _run_master(sock: socket.socket) -> None:
+    _SHARED_STATE["loaded_in"] = os.getpid()
+    PreforkServer(_pid_app, sock, workers=2, log_level="warning").run()
+
+
+class TestPreforkServer(unittest.TestCase):
+    """Tests for the PreforkServer class."""
+
+    def setUp(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(128)
+        self.url = f"http://127.0.0.1:{self.sock.getsockname()[1]}/"
+        self.master = multiprocessing.get_context("fork").Process(target=_run_master, args=(self.sock,))
+        self.master.start()
+
+    def tearDown(self):
+        # SIGTERM rather than kill, so the master stops its workers instead of orphaning them.
+        if self.master.is_alive():
+            self.master.terminate()
+            self.master.join(15)
+        if self.master.is_alive():
+            self.master.kill()
+            self.master.join(5)
+        self.sock.close()
+
+    def _get(self, timeout: float = 10.0) -> dict:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(self.url, timeout=2) as response:
+                    return json.loads(response.read())
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def test_workers_are_forked_from_the_master(self):
+        response = self._get()
+        self.assertEqual(response["ppid"], self.master.pid)
+        self.assertNotEqual(response["pid"], self.master.pid)
+        self.assertEqual(response["loaded_in"], self.master.pid)
+
+    def test_dead_worker_is_restarted(self):
+        killed = self._get()["pid"]
+        os.kill(killed, signal.SIGKILL)
+        time.sleep(0.2)
+        pids = {self._get()["pid"] for _ in range(10)}
+        self.assertNotIn(killed, pids)
+
+    def test_sigterm_stops_the_workers(self):
+        worker = self._get()["pid"]
+        os.kill(self.master.pid, signal.SIGTERM)
+        self.master.join(15)
+        self.assertEqual(self.master.exitcode, 0)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(worker, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+"""
+Tests for the search cache warming job.
+"""
+import asyncio
+from datetime import datetime, timedelta
+import os
+import tempfile
+from types import SimpleNamespace
+import unittest
+from unittest.mock import MagicMock, patch
+
+
+try:
+    from warm_cache import get_popular_queries, make_cache_warmer
+    from paths.search import SearchFunction
+    from schemas.search_mode import SearchMode
+    from utils.app.search.save_search_history import SearchHistory
+    from utils.app.search.search_cache_store import SearchCacheStore
+except ImportError:
+    from app.warm_cache import get_popular_queries, make_cache_warmer
+    from app.paths.search import SearchFunction
+    from app.schemas.search_mode import SearchMode
+    from app.utils.app.search.save_search_history import SearchHistory
+    from app.utils.app.search.search_cache_store import SearchCacheStore
+
+
+NOW = datetime(2025, 6, 1, 12, 0)
+
+
+class _FakeSearchFunction:
+    """Records the searches run, and how many ran at once."""
+
+    searches: list[tuple[str, str]] = []
+    running: int = 0
+    max_running: int = 0
+
+    def __init__(self, search_query: str, resources: dict, configs, mode):
+        self.search_query, self.mode = search_query, mode
+
+    @staticmethod
+    def make_search_query_cid(search_query: str, mode) -> str:
+        return f"{mode}:{search_query}"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    async def search(self, page: int, per_page: int, use_cache: bool = True):
+        assert not use_cache
+        cls = type(self)
+        cls.searches.append((self.search_query, str(self.mode)))
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        try:
+            await asyncio.sleep(0.02)
+            if self.search_query == "rejected":
+                raise ValueError("Not a search request.")
+            yield {"results": [], "total": 0}
+        finally:
+            cls.running -= 1
+
+
+class _RealCidSearchFunction(_FakeSearchFunction):
+    """Makes its cids like SearchFunction does."""
+
+    make_search_query_cid = staticmethod(SearchFunction.make_search_query_cid)
+
+
+def _history_row(i: int, search_query: str, days_ago: float, mode: str = "llm", result_count: int = 5) -> tuple:
+    return (
+        f"history_{i}", f"{mode}:{search_query}", search_query, "client", NOW - timedelta(days=days_ago), result_count
+    )
+
+
+def _search_query_row(search_query: str, saved_at) -> tuple:
+    return (f"llm:{search_query}", search_query, [0.1] * 1536, 1, ["cid_1"], [0.9], saved_at, "llm")
+
+
+class TestCacheWarmer(unittest.IsolatedAsyncioTestCase):
+    """Tests for get_popular_queries and the CacheWarmer class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = SearchCacheStore(
+            db_path=os.path.join(self.temp_dir.name, "search_cache.sqlite"), flush_seconds=0.01, logger=MagicMock()
+        )
+        self.law_db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        with open(self.law_db_path, "wb") as f:
+            f.write(b"laws")
+        rebuilt_at = (NOW - timedelta(days=2)).timestamp()
+        os.utime(self.law_db_path, (rebuilt_at, rebuilt_at))
+
+        history = [
+            # "zoning" is searched most, "parking" less but more recently than "dogs".
+            *(_history_row(i, "zoning", days_ago=i) for i in range(4)),
+            _history_row(4, "parking", days_ago=0),
+            _history_row(5, "dogs", days_ago=30),
+            _history_row(6, "dogs", days_ago=31),
+            _history_row(7, "nothing found", days_ago=0, result_count=0),
+            _history_row(8, "fences", days_ago=0),
+            _history_row(9, "rejected", days_ago=0),
+            _history_row(10, "noise", days_ago=0, mode="lexical"),
+        ]
+        self.store.write(
+            [("search_history", row) for row in history]
+            + [
+                ("search_query", _search_query_row("zoning", NOW - timedelta(days=1))),  # Cached after the rebuild.
+                ("search_query", _search_query_row("parking", NOW - timedelta(days=3))),  # Cached before it.
+                ("search_query", _search_query_row("fences", None)),  # Converted from an old cache.
+            ]
+        )
+
+        _FakeSearchFunction.searches, _FakeSearchFunction.max_running = [], 0
+        self.response_cache = MagicMock()
+        self.configs = MagicMock(
+            WARM_CACHE_TOP_QUERIES=10, WARM_CACHE_CONCURRENCY=2, WARM_CACHE_HALF_LIFE_DAYS=7.0,
+            AMERICAN_LAW_DB_PATH=self.law_db_path,
+        )
+        self.warmer = make_cache_warmer(
+            mock_resources={
+                "search_function": _FakeSearchFunction,
+                "search_resources": {},
+                "search_cache_store": self.store,
+                "db_executor": None,
+                "response_cache": self.response_cache,
+                "logger": MagicMock(),
+            },
+            mock_configs=self.configs,
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_searches_are_ranked_by_frequency_and_recency(self):
+        popular = self.store.read(get_popular_queries, 3, 7.0, NOW)
+        self.assertEqual(len(popular), 3)
+        self.assertEqual((popular[0].search_query, popular[0].searches, popular[0].cached), ("zoning", 4, True))
+        self.assertEqual(popular[0].saved_at, NOW - timedelta(days=1))
+        self.assertAlmostEqual(popular[0].score, 1 + 0.5 ** (1 / 7) + 0.5 ** (2 / 7) + 0.5 ** (3 / 7), places=5)
+
+        queries = [query.search_query for query in self.store.read(get_popular_queries, 10, 7.0, NOW)]
+        self.assertLess(queries.index("parking"), queries.index("dogs"))
+        self.assertNotIn("nothing found", queries)
+
+    async def test_only_uncached_and_stale_searches_are_run(self):
+        stats = await self.warmer.warm()
+
+        self.assertEqual(
+            sorted(_FakeSearchFunction.searches),
+            [("dogs", "llm"), ("fences", "llm"), ("parking", "llm"), ("rejected", "llm")]
+        )
+        self.assertEqual(stats, {"popular": 6, "fresh": 1, "skipped": 1, "warmed": 3, "failed": 1})
+        self.assertLessEqual(_FakeSearchFunction.max_running, 2)
+        self.assertFalse(self.store.started)
+        self.response_cache.invalidate.assert_called_once()
+        self.assertEqual(
+            sorted(self.response_cache.invalidate.call_args.args),
+            ["llm:dogs", "llm:fences", "llm:parking", "llm:rejected"]
+        )
+
+    async def test_mixed_case_searches_are_run_again_as_typed(self):
+        typed = "Zoning in Cambridge, MA"
+        self.store.start()
+        with patch.object(SearchHistory, "store", self.store):
+            for mode in (SearchMode.LLM, SearchMode.HYBRID):
+                search = SimpleNamespace(
+                    search_query_cid=SearchFunction.make_search_query_cid(typed, mode), search_query_as_typed=typed
+                )
+                SearchFunction.save_search_history(search, "client", result_count=5)
+        await self.store.shutdown()
+
+        warmer = make_cache_warmer(
+            mock_resources={
+                "search_function": _RealCidSearchFunction,
+                "search_resources": {},
+                "search_cache_store": self.store,
+                "db_executor": None,
+                "response_cache": self.response_cache,
+                "logger": MagicMock(),
+            },
+            mock_configs=self.configs,
+        )
+        stats = await warmer.warm()
+
+        self.assertEqual(sorted(_FakeSearchFunction.searches), [(typed, "hybrid"), (typed, "llm")])
+        # Only the setUp searches, whose cids aren't real ones, are skipped.
+        self.assertEqual(stats["skipped"], 5)
+
+    async def test_unexpected_resources_are_rejected(self):
+        with self.assertRaises(KeyError):
+            make_cache_warmer(mock_resources={"llm": MagicMock()}, mock_configs=self.configs)
+
+
+if __name__ == "__main__":
+    unittest.main()
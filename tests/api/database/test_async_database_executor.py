@@ -0,0 +1,161 @@
+"""
+Tests for the AsyncDatabaseExecutor.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+
+import duckdb
+
+
+try:
+    from api_.database.async_database_executor import AsyncDatabaseExecutor
+    from api_.database.connection_pool import ConnectionPool
+except ImportError:
+    from app.api_.database.async_database_executor import AsyncDatabaseExecutor
+    from app.api_.database.connection_pool import ConnectionPool
+
+
+class TestAsyncDatabaseExecutor(unittest.IsolatedAsyncioTestCase):
+    """Tests for the AsyncDatabaseExecutor class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        with duckdb.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE citations (cid VARCHAR, title VARCHAR)")
+            conn.executemany("INSERT INTO citations VALUES (?, ?)", [(f"cid_{i}", f"Title {i}") for i in range(10)])
+        self.executor = AsyncDatabaseExecutor(db_path=self.db_path, max_workers=2)
+        self.executor.start()
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.temp_dir.cleanup()
+
+    async def test_fetch_all_and_fetch_arrow(self):
+        rows = await self.executor.fetch_all("SELECT cid, title FROM citations WHERE cid = ?", ["cid_3"])
+        self.assertEqual(rows, [{"cid": "cid_3", "title": "Title 3"}])
+
+        table = await self.executor.fetch_arrow("SELECT cid FROM citations ORDER BY cid")
+        self.assertEqual(table.num_rows, 10)
+        self.assertEqual(table.column_names, ["cid"])
+
+    async def test_queries_run_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        threads = await asyncio.gather(*(self.executor.run(lambda cursor: threading.get_ident()) for _ in range(4)))
+        self.assertNotIn(loop_thread, threads)
+        self.assertLessEqual(len(set(threads)), 2)
+
+    async def test_connection_is_read_only(self):
+        with self.assertRaises(duckdb.Error):
+            await self.executor.run(lambda cursor: cursor.execute("DELETE FROM citations"))
+
+    async def test_connection_is_closed_when_idle(self):
+        """Once every call has finished, a read-write connection can open the file."""
+        await self.executor.fetch_all("SELECT 1")
+        with duckdb.connect(self.db_path, read_only=False) as conn:
+            conn.execute("INSERT INTO citations VALUES ('cid_10', 'Title 10')")
+        rows = await self.executor.fetch_all("SELECT COUNT(*) AS n FROM citations")
+        self.assertEqual(rows, [{"n": 11}])
+
+    async def test_connection_can_stay_open_when_idle(self):
+        executor = AsyncDatabaseExecutor(db_path=self.db_path, max_workers=1, close_when_idle=False)
+        executor.start()
+        try:
+            first = await executor.run(lambda cursor: cursor)
+            second = await executor.run(lambda cursor: cursor)
+            self.assertIs(first, second)
+            with self.assertRaises(duckdb.Error):
+                duckdb.connect(self.db_path, read_only=False)
+        finally:
+            executor.shutdown()
+
+    async def test_connection_can_be_checked_out_of_a_pool(self):
+        """Like DB_EXECUTOR, which draws its connection from READ_ONLY_DB."""
+        pool = ConnectionPool(
+            connect=lambda: duckdb.connect(self.db_path, read_only=True), close=lambda conn: conn.close(), size=2
+        )
+        executor = AsyncDatabaseExecutor(
+            db_path=self.db_path, max_workers=2, connect=lambda db_path, read_only: pool.acquire()
+        )
+        executor.start()
+        try:
+            checked_out = await asyncio.gather(*(executor.run(lambda cursor: pool.stats()["checked_out"]) for _ in range(4)))
+            self.assertEqual(set(checked_out), {1})  # One connection, shared by the worker threads' cursors.
+            self.assertEqual(await executor.fetch_all("SELECT COUNT(*) AS n FROM citations"), [{"n": 10}])
+            self.assertEqual(pool.stats()["checked_out"], 0)  # Released, not closed, when idle.
+            self.assertEqual(pool.stats()["idle"], 1)
+        finally:
+            executor.shutdown()
+            pool.close()
+
+    async def test_connection_is_opened_without_the_lock(self):
+        """Waiting for a pooled connection doesn't block stats, and the other threads wait for the same connection."""
+        connecting, proceed = threading.Event(), threading.Event()
+        opened = []
+
+        def _connect(db_path, read_only):
+            connecting.set()
+            proceed.wait(5)
+            opened.append(duckdb.connect(db_path, read_only=read_only))
+            return opened[-1]
+
+        executor = AsyncDatabaseExecutor(db_path=self.db_path, max_workers=2, connect=_connect)
+        executor.start()
+        try:
+            calls = [asyncio.ensure_future(executor.fetch_all("SELECT COUNT(*) AS n FROM citations")) for _ in range(2)]
+            await asyncio.to_thread(connecting.wait, 5)
+            await asyncio.sleep(0.05)
+            stats = await asyncio.wait_for(asyncio.to_thread(executor.stats), timeout=1)
+            self.assertEqual(stats["in_flight"], 2)
+
+            proceed.set()
+            self.assertEqual(await asyncio.gather(*calls), [[{"n": 10}]] * 2)
+            self.assertEqual(len(opened), 1)
+        finally:
+            executor.shutdown()
+
+    async def test_cancelled_query_is_interrupted_and_its_cursor_reused(self):
+        executor = AsyncDatabaseExecutor(db_path=self.db_path, max_workers=1)
+        executor.start()
+        try:
+            slow = asyncio.ensure_future(executor.fetch_all("SELECT SUM(i) AS total FROM range(1000000000000) t(i)"))
+            await asyncio.sleep(0.1)
+            slow.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await slow
+
+            rows = await asyncio.wait_for(executor.fetch_all("SELECT COUNT(*) AS n FROM citations"), timeout=5)
+            self.assertEqual(rows, [{"n": 10}])
+            self.assertEqual(executor.stats()["failed"], 1)
+        finally:
+            executor.shutdown()
+
+    async def test_stats_count_calls_and_queue_waits(self):
+        release = threading.Event()
+        blocked = [asyncio.ensure_future(self.executor.run(lambda cursor: release.wait(5))) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        stats = self.executor.stats()
+        self.assertEqual(stats["in_flight"], 3)
+        self.assertEqual(stats["queue_depth"], 1)
+
+        release.set()
+        await asyncio.gather(*blocked)
+        with self.assertRaises(ZeroDivisionError):
+            await self.executor.run(lambda cursor: 1 / 0)
+
+        stats = self.executor.stats()
+        self.assertEqual((stats["submitted"], stats["completed"], stats["failed"], stats["in_flight"]), (4, 3, 1, 0))
+        self.assertGreater(stats["max_queue_wait_seconds"], 0.0)
+
+    async def test_run_requires_start(self):
+        executor = AsyncDatabaseExecutor(db_path=self.db_path)
+        with self.assertRaises(RuntimeError):
+            await executor.fetch_all("SELECT 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+Tests for the ConnectionPool.
+"""
+import asyncio
+import itertools
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+
+try:
+    from api_.database.connection_pool import ConnectionPool, PooledConnection, PoolTimeout
+except ImportError:
+    from app.api_.database.connection_pool import ConnectionPool, PooledConnection, PoolTimeout
+
+
+class _FakeConnection:
+
+    _ids = itertools.count()
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.closed = False
+
+    def cursor(self):
+        return f"cursor_{self.id}"
+
+
+def _make_pool(**kwargs) -> tuple[ConnectionPool, list[_FakeConnection]]:
+    opened = []
+
+    def connect():
+        conn = _FakeConnection()
+        opened.append(conn)
+        return conn
+
+    def close(conn):
+        conn.closed = True
+
+    kwargs.setdefault("logger", MagicMock())
+    return ConnectionPool(connect=connect, close=close, **kwargs), opened
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Tests for the ConnectionPool class."""
+
+    def test_released_connections_are_reused(self):
+        pool, opened = _make_pool(size=2)
+        conn = pool.acquire()
+        self.assertIsInstance(conn, PooledConnection)
+        self.assertEqual(conn.cursor(), f"cursor_{opened[0].id}")
+        conn.close()
+        conn.close()  # Releasing twice does nothing.
+
+        with pool.connection() as conn:
+            self.assertIs(conn.connection, opened[0])
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_fill_opens_connections_up_to_size(self):
+        pool, opened = _make_pool(size=3)
+        pool.fill()
+        self.assertEqual(len(opened), 3)
+        self.assertEqual((pool.stats()["open"], pool.stats()["idle"]), (3, 3))
+
+    def test_acquire_times_out_when_every_connection_is_checked_out(self):
+        pool, _ = _make_pool(size=1, timeout=0.05)
+        held = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        held.close()
+
+    def test_acquire_waits_for_a_release(self):
+        pool, opened = _make_pool(size=1, timeout=5)
+        held = pool.acquire()
+        threading.Timer(0.05, held.close).start()
+
+        conn = pool.acquire()
+        self.assertIs(conn.connection, opened[0])
+        self.assertGreater(pool.stats()["max_wait_seconds"], 0.0)
+        conn.close()
+
+    def test_overflow_connections_are_closed_on_release(self):
+        pool, opened = _make_pool(size=1, max_overflow=1, timeout=0.05)
+        first, second = pool.acquire(), pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((stats["open"], stats["overflow"], stats["overflow_opened"]), (2, 1, 1))
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        second.close()
+        self.assertTrue(opened[1].closed)
+        first.close()
+        self.assertFalse(opened[0].closed)
+        self.assertEqual((pool.stats()["open"], pool.stats()["idle"]), (1, 1))
+
+    def test_old_connections_are_replaced(self):
+        pool, opened = _make_pool(size=1, max_age=0.01)
+        pool.acquire().close()
+        time.sleep(0.02)
+        with pool.connection() as conn:
+            self.assertIs(conn.connection, opened[1])
+        self.assertTrue(opened[0].closed)
+        self.assertEqual(pool.stats()["recycled"], 1)
+
+    def test_connections_failing_their_health_check_are_replaced(self):
+        health_check = MagicMock(side_effect=RuntimeError("gone"))
+        pool, opened = _make_pool(size=1, health_check=health_check, health_check_after=0.0)
+        pool.acquire().close()
+        with pool.connection() as conn:
+            self.assertIs(conn.connection, opened[1])
+        health_check.assert_called_once_with(opened[0])
+        self.assertEqual(pool.stats()["failed_health_checks"], 1)
+
+    def test_failed_connect_gives_up_its_place(self):
+        pool = ConnectionPool(connect=MagicMock(side_effect=OSError("no file")), close=MagicMock(), size=1, timeout=0.05)
+        with self.assertRaises(OSError):
+            pool.acquire()
+        self.assertEqual(pool.stats()["open"], 0)
+
+    def test_idle_connections_are_closed_unless_kept(self):
+        pool, opened = _make_pool(size=2, keep_idle=False)
+        first, second = pool.acquire(), pool.acquire()
+        first.close()
+        self.assertFalse(opened[0].closed)
+        second.close()
+        self.assertTrue(all(conn.closed for conn in opened))
+        self.assertEqual(pool.stats()["open"], 0)
+
+    def test_close_closes_checked_out_connections_once_released(self):
+        pool, opened = _make_pool(size=2)
+        held = pool.acquire()
+        pool.acquire().close()
+        pool.close()
+        self.assertTrue(opened[1].closed)
+        self.assertFalse(opened[0].closed)
+        held.close()
+        self.assertTrue(opened[0].closed)
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+    def test_forked_process_opens_its_own_connections(self):
+        pool, opened = _make_pool(size=2)
+        inherited = pool.acquire()
+        pool.acquire().close()
+
+        with patch("os.getpid", return_value=-1):  # As seen from a forked worker.
+            with pool.connection() as conn:
+                self.assertIs(conn.connection, opened[2])
+            inherited.close()  # The parent's connection isn't released into the child's pool.
+            self.assertEqual(pool.stats()["open"], 1)
+        self.assertFalse(any(conn.closed for conn in opened))
+
+
+class TestConnectionPoolAsync(unittest.IsolatedAsyncioTestCase):
+    """Tests for acquiring connections from the event loop."""
+
+    async def test_acquire_async_does_not_block_the_event_loop(self):
+        pool, opened = _make_pool(size=1, timeout=5)
+        held = pool.acquire()
+
+        async def release_soon():
+            await asyncio.sleep(0.05)
+            held.close()
+
+        # The release is a coroutine on the same loop, so it only runs if waiting does not block the loop.
+        release = asyncio.ensure_future(release_soon())
+        async with pool.connection_async() as conn:
+            self.assertIs(conn.connection, opened[0])
+        await release
+        self.assertEqual(pool.stats()["checked_out"], 0)
+
+    async def test_cancelled_acquire_releases_the_connection(self):
+        pool, _ = _make_pool(size=1, timeout=5)
+        held = pool.acquire()
+        waiting = asyncio.ensure_future(pool.acquire_async())
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+
+        held.close()
+        await asyncio.sleep(0.1)
+        self.assertEqual(pool.stats()["checked_out"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -32,12 +32,16 @@ def _get_mock_configs():
         mock_configs.DATABASE_CONNECTION_POOL_SIZE = 2
         mock_configs.DATABASE_CONNECTION_TIMEOUT = 30
         mock_configs.DATABASE_CONNECTION_MAX_AGE = 300
+        mock_configs.DATABASE_CONNECTION_MAX_OVERFLOW = 0
+        mock_configs.DATABASE_CONNECTION_KEEP_IDLE = True
     """
     mock_configs = MagicMock(spec=Configs)
     mock_configs.AMERICAN_LAW_DATA_DIR = "/mock/path"
     mock_configs.DATABASE_CONNECTION_POOL_SIZE = 2
     mock_configs.DATABASE_CONNECTION_TIMEOUT = 30
     mock_configs.DATABASE_CONNECTION_MAX_AGE = 300
+    mock_configs.DATABASE_CONNECTION_MAX_OVERFLOW = 0
+    mock_configs.DATABASE_CONNECTION_KEEP_IDLE = True
     return mock_configs
 
 
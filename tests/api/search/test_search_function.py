@@ -0,0 +1,573 @@
+"""
+Tests for the stage scheduling and result hydration in SearchFunction.
+
+Every database and LLM dependency is replaced through the resources dict,
+so no database or API key is needed.
+"""
+import asyncio
+import logging
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+from fastapi import HTTPException
+import pyarrow as pa
+
+
+try:
+    from paths.search import SearchFunction, function as search_function, resources as search_resources
+    from utils.common.single_flight import SingleFlight
+    from utils.app.search.result_cursor_store import ResultCursorStore
+    from utils.app.search.semantic_query_cache import SemanticQueryCache
+except ImportError:
+    from app.paths.search import SearchFunction, function as search_function, resources as search_resources
+    from app.utils.common.single_flight import SingleFlight
+    from app.utils.app.search.result_cursor_store import ResultCursorStore
+    from app.utils.app.search.semantic_query_cache import SemanticQueryCache
+from configs import configs
+
+
+LLM_DELAY = 0.2
+
+
+def _make_resources(intent: str = "SEARCH", cached_results: dict = None) -> tuple[dict, dict]:
+    """Make a resources dict whose LLM calls each take LLM_DELAY seconds."""
+    cancelled = {}
+
+    def _slow(name, value):
+        async def _call(*args, **kwargs):
+            try:
+                await asyncio.sleep(LLM_DELAY)
+            except asyncio.CancelledError:
+                cancelled[name] = True
+                raise
+            return value
+        return _call
+
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (0,)  # No rows, so the SQL stage ends the search.
+    cursor.fetch_arrow_table.return_value = pa.table({})
+
+    resources = dict(search_resources)
+    resources.update({
+        "LLM": MagicMock(),
+        "logger": logging.getLogger("test_search_function"),
+        "get_a_database_connection": MagicMock(),
+        "get_database_cursor": MagicMock(return_value=cursor),
+        "close_database_connection": MagicMock(),
+        "close_database_cursor": MagicMock(),
+        "estimate_the_total_count_without_pagination": MagicMock(),
+        "get_cached_query_results": MagicMock(return_value=cached_results),
+        "determine_user_intent": _slow("intent", intent),
+        "turn_english_into_sql": _slow("sql", "SELECT * FROM citations"),
+        "get_single_embedding": _slow("embedding", [[0.1] * 1536]),
+        "sort_and_save_search_query_results": MagicMock(),
+        "result_cursors": ResultCursorStore(),
+        "semantic_query_cache": SemanticQueryCache(),
+    })
+    return resources, cancelled
+
+
+async def _collect(resources: dict) -> list[dict]:
+    async with SearchFunction(search_query="zoning laws", resources=resources, configs=configs) as search_func:
+        return [result async for result in search_func.search(page=1, per_page=20)]
+
+
+class TestSearchFunctionStages(unittest.IsolatedAsyncioTestCase):
+    """Tests for how SearchFunction.search schedules its stages."""
+
+    async def test_llm_stages_run_concurrently(self):
+        """Intent, SQL generation and the query embedding should overlap, not run back to back."""
+        resources, _ = _make_resources()
+        start = time.perf_counter()
+        results = await _collect(resources)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 2 * LLM_DELAY)
+        self.assertEqual(results[-1]["total"], 0)
+
+    async def test_rejected_intent_cancels_sql_and_embedding(self):
+        """A query that isn't a search should raise and cancel the other LLM stages."""
+        resources, _ = _make_resources()
+        resources["determine_user_intent"] = AsyncMock(return_value="QUESTION")  # Rejected immediately.
+
+        start = time.perf_counter()
+        with self.assertRaises(HTTPException) as context:
+            await _collect(resources)
+        self.assertEqual(context.exception.status_code, 400)
+        # Didn't wait for the SQL or embedding stages to finish.
+        self.assertLess(time.perf_counter() - start, LLM_DELAY)
+
+    async def test_cache_hit_skips_llm_stages(self):
+        """A cache hit should be returned without waiting for the LLM."""
+        cached = {"results": [], "total": 3, "page": 1, "per_page": 20, "total_pages": 1}
+        resources, cancelled = _make_resources(cached_results=cached)
+
+        start = time.perf_counter()
+        results = await _collect(resources)
+
+        self.assertEqual(results, [cached])
+        self.assertLess(time.perf_counter() - start, LLM_DELAY)
+        self.assertEqual(set(cancelled), {"intent", "sql", "embedding"})
+
+
+class TestSearchFunctionHydration(unittest.IsolatedAsyncioTestCase):
+    """Tests for SearchFunction.hydrate_results."""
+
+    async def test_batch_is_hydrated_with_one_lookup_and_deduped(self):
+        resources, _ = _make_resources()
+        get_html = MagicMock(return_value={"a": "<p>same</p>", "b": "<p>same</p>", "c": "<p>other</p>"})
+        resources["get_html_for_these_citations"] = get_html
+        rows_by_cid = {cid: {"cid": cid} for cid in ("a", "b", "c", "d")}
+        cumulative_results = []
+
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs)
+        await search_func.hydrate_results(
+            [("c", 0.9), ("a", 0.8), ("b", 0.7), ("missing", 0.6)], rows_by_cid, cumulative_results
+        )
+
+        get_html.assert_called_once_with(["c", "a", "b"])
+        # "b" has the same HTML as "a", so it is skipped.
+        self.assertEqual([row["cid"] for row in cumulative_results], ["c", "a"])
+        self.assertEqual(cumulative_results[0]["html"], "<p>other</p>")
+
+    async def test_lookups_run_on_the_database_executor_when_started(self):
+        """With the executor running, the HTML lookup gets one of its cursors instead of opening a connection."""
+        resources, _ = _make_resources()
+        get_html = MagicMock(return_value={"a": "<p>a</p>"})
+        executor = MagicMock(started=True)
+        executor.run = AsyncMock(side_effect=lambda func: func("executor cursor"))
+        resources["get_html_for_these_citations"] = get_html
+        resources["db_executor"] = executor
+
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs)
+        await search_func.hydrate_results([("a", 0.9)], {"a": {"cid": "a"}}, [])
+
+        executor.run.assert_awaited_once()
+        get_html.assert_called_once_with(["a"], cursor="executor cursor")
+
+    async def test_missing_html_falls_back_to_placeholder(self):
+        resources, _ = _make_resources()
+        resources["get_html_for_these_citations"] = MagicMock(return_value={})
+        cumulative_results = []
+
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs)
+        await search_func.hydrate_results([("a", 0.9)], {"a": {"cid": "a"}}, cumulative_results)
+
+        self.assertEqual(cumulative_results, [{"cid": "a", "html": "Content not available"}])
+
+
+class TestSearchFunctionModes(unittest.IsolatedAsyncioTestCase):
+    """Tests for the lexical and hybrid search modes."""
+
+    def _make_search_func(self, mode: str, resources: dict) -> SearchFunction:
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs, mode=mode)
+        search_func.get_citation_rows = MagicMock(
+            side_effect=lambda cids: [{"cid": cid, "title": cid.upper()} for cid in cids]
+        )
+        return search_func
+
+    async def test_lexical_mode_makes_no_llm_calls(self):
+        resources, _ = _make_resources()
+        for name in ("determine_user_intent", "turn_english_into_sql", "get_single_embedding"):
+            resources[name] = AsyncMock(side_effect=AssertionError(f"{name} should not be called"))
+        resources["lexical_search"] = MagicMock(return_value=[("a", 3.0), ("b", 2.0), ("c", 1.0)])
+        resources["get_html_for_these_citations"] = MagicMock(side_effect=lambda cids: {cid: f"<p>{cid}</p>" for cid in cids})
+
+        search_func = self._make_search_func("lexical", resources)
+        results = [result async for result in search_func.search(page=1, per_page=2)]
+
+        resources["get_cached_query_results"].assert_not_called()
+        self.assertEqual(results[-1]["total"], 3)
+        self.assertEqual([row["cid"] for row in results[-1]["results"]], ["a", "b"])
+        resources["sort_and_save_search_query_results"].assert_not_called()
+
+    async def test_hybrid_mode_fuses_lexical_and_semantic_ranks(self):
+        resources, _ = _make_resources()
+        resources["lexical_search"] = MagicMock(return_value=[("a", 4.0), ("b", 3.0), ("c", 2.0), ("d", 1.0)])
+        vector_index = MagicMock()
+        vector_index.search.return_value = [("d", 0.9), ("b", 0.8), ("c", 0.5), ("a", 0.1)]
+        resources["vector_index"] = vector_index
+        resources["get_html_for_these_citations"] = MagicMock(side_effect=lambda cids: {cid: f"<p>{cid}</p>" for cid in cids})
+
+        search_func = self._make_search_func("hybrid", resources)
+        results = [result async for result in search_func.search(page=1, per_page=20)]
+
+        # "b" is second in both rankings, so it beats "a" and "d", which are each first in one and last in the other.
+        self.assertEqual([row["cid"] for row in results[-1]["results"]][0], "b")
+        self.assertEqual(
+            set(vector_index.search.call_args.kwargs["candidate_cids"]), {"a", "b", "c", "d"}
+        )
+
+    async def test_geo_shards_are_searched_before_the_vector_index(self):
+        resources, _ = _make_resources()
+        resources["lexical_search"] = MagicMock(return_value=[("a", 2.0), ("b", 1.0)])
+        resources["vector_index"] = MagicMock()
+        geo_shards = MagicMock()
+        geo_shards.search.return_value = [("b", 0.9)]
+        resources["geo_shards"] = geo_shards
+        resources["get_html_for_these_citations"] = MagicMock(side_effect=lambda cids: {cid: f"<p>{cid}</p>" for cid in cids})
+
+        search_func = self._make_search_func("hybrid", resources)
+        [result async for result in search_func.search(page=1, per_page=20)]
+
+        resources["vector_index"].search.assert_not_called()
+        # The router gets the query text, to route by the places it names.
+        self.assertEqual(geo_shards.search.call_args.kwargs["query_text"], "zoning laws")
+        self.assertEqual(set(geo_shards.search.call_args.kwargs["candidate_cids"]), {"a", "b"})
+
+    def test_modes_are_cached_separately(self):
+        resources, _ = _make_resources()
+        llm_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs, mode="llm")
+        hybrid_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs, mode="hybrid")
+        self.assertNotEqual(llm_func.search_query_cid, hybrid_func.search_query_cid)
+
+    def test_unknown_mode_raises(self):
+        resources, _ = _make_resources()
+        with self.assertRaises(ValueError):
+            SearchFunction(search_query="zoning laws", resources=resources, configs=configs, mode="fuzzy")
+
+
+class TestSearchFunctionTotalCount(unittest.IsolatedAsyncioTestCase):
+    """Tests for serving the first page before the total count is known."""
+
+    # Rank at most two SQL rows, so a third row means there are more.
+    probe_configs = configs.model_copy(update={"RESULT_CURSOR_MAX_RESULTS": 2})
+
+    def _make_probe_resources(self, rows: int, count_delay: float = 0.0) -> dict:
+        resources, _ = _make_resources()
+        cursor = MagicMock()
+        cursor.fetch_arrow_table.return_value = pa.Table.from_pylist([
+            {"cid": f"cid_{i}", "bluebook_cid": f"bb_{i}"} for i in range(rows)
+        ])
+        resources["get_database_cursor"] = MagicMock(return_value=cursor)
+
+        def _count(cursor, sql_query):
+            time.sleep(count_delay)
+            return 57
+        resources["estimate_the_total_count_without_pagination"] = MagicMock(side_effect=_count)
+
+        vector_index = MagicMock()
+        vector_index.search.return_value = [("cid_0", 0.9), ("cid_1", 0.8)]
+        resources["vector_index"] = vector_index
+        resources["get_html_for_these_citations"] = MagicMock(return_value={"cid_0": "<p>0</p>", "cid_1": "<p>1</p>"})
+        return resources
+
+    async def test_count_arrives_as_a_later_event(self):
+        resources = self._make_probe_resources(rows=3)  # RESULT_CURSOR_MAX_RESULTS + 1 rows, so there are more.
+        results = [
+            result async for result in SearchFunction(
+                search_query="zoning laws", resources=resources, configs=self.probe_configs
+            ).search(page=1, per_page=2)
+        ]
+
+        first, count_update = results[0], results[1]
+        self.assertFalse(first["total_is_exact"])
+        self.assertEqual(first["total_matches"], 3)  # A lower bound: the ranked rows and at least one more.
+        self.assertEqual(count_update["event"], "count_update")
+        self.assertEqual(count_update["total_matches"], 57)
+        self.assertTrue(results[-1]["total_is_exact"])
+        self.assertEqual(results[-1]["total_matches"], 57)
+
+        # The count runs without LIMIT or OFFSET.
+        counted_sql = resources["estimate_the_total_count_without_pagination"].call_args.args[1]
+        self.assertNotIn("LIMIT", counted_sql.upper())
+
+    async def test_short_result_is_exact_without_counting(self):
+        resources = self._make_probe_resources(rows=2)
+        results = [
+            result async for result in SearchFunction(
+                search_query="zoning laws", resources=resources, configs=self.probe_configs
+            ).search(page=1, per_page=2)
+        ]
+
+        resources["estimate_the_total_count_without_pagination"].assert_not_called()
+        self.assertTrue(all(result.get("event") != "count_update" for result in results))
+        self.assertEqual(results[-1]["total"], 2)
+        self.assertIsNone(results[-1]["total_matches"])
+
+    async def test_pages_end_with_the_ranking_when_more_rows_matched(self):
+        """Only RESULT_CURSOR_MAX_RESULTS rows are ranked, so the pages don't go up to the count."""
+        resources = self._make_probe_resources(rows=3)
+        results = [
+            result async for result in SearchFunction(
+                search_query="zoning laws", resources=resources, configs=self.probe_configs
+            ).search(page=1, per_page=1)
+        ]
+        count_update = results[1]
+        self.assertEqual((count_update["total"], count_update["total_matches"], count_update["total_pages"]), (2, 57, 2))
+        self.assertEqual((results[-1]["total"], results[-1]["total_matches"], results[-1]["total_pages"]), (2, 57, 2))
+
+        # The last page is served from the stored ranking, with the same totals.
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=self.probe_configs)
+        search_func.get_citation_rows = MagicMock(side_effect=lambda cids: [{"cid": cid} for cid in cids])
+        last = [result async for result in search_func.search(page=2, per_page=1, cursor=results[-1]["cursor"])]
+        self.assertEqual([row["cid"] for row in last[-1]["results"]], ["cid_1"])
+        self.assertEqual((last[-1]["total"], last[-1]["total_matches"], last[-1]["total_pages"]), (2, 57, 2))
+
+    async def test_closing_the_stream_cancels_the_count(self):
+        resources = self._make_probe_resources(rows=3, count_delay=0.5)
+        search = SearchFunction(search_query="zoning laws", resources=resources, configs=self.probe_configs).search(page=1, per_page=2)
+
+        first = await anext(search)
+        self.assertFalse(first["total_is_exact"])
+        start = time.perf_counter()
+        await search.aclose()  # The client disconnected.
+        self.assertLess(time.perf_counter() - start, 0.4)
+
+
+class TestSearchFunctionResultCursor(unittest.IsolatedAsyncioTestCase):
+    """Tests for serving later pages from the stored ranking of a search."""
+
+    def _make_cursor_resources(self) -> dict:
+        resources, _ = _make_resources()
+        cursor = MagicMock()
+        cursor.fetch_arrow_table.return_value = pa.Table.from_pylist([
+            {"cid": f"cid_{i}", "bluebook_cid": f"bb_{i}"} for i in range(5)
+        ])
+        resources["get_database_cursor"] = MagicMock(return_value=cursor)
+        vector_index = MagicMock()
+        vector_index.search.side_effect = lambda query, top_k, candidate_cids, threshold, pooling: [
+            (cid, 1.0 - i / 10) for i, cid in enumerate(reversed(candidate_cids))
+        ][:top_k]
+        resources["vector_index"] = vector_index
+        resources["get_html_for_these_citations"] = MagicMock(side_effect=lambda cids: {cid: f"<p>{cid}</p>" for cid in cids})
+        return resources
+
+    def _make_search_func(self, resources: dict) -> SearchFunction:
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs)
+        search_func.get_citation_rows = MagicMock(
+            side_effect=lambda cids: [{"cid": cid, "title": cid.upper()} for cid in cids]
+        )
+        return search_func
+
+    async def test_first_search_ranks_every_candidate(self):
+        resources = self._make_cursor_resources()
+        results = [result async for result in self._make_search_func(resources).search(page=1, per_page=2)]
+
+        self.assertEqual([row["cid"] for row in results[-1]["results"]], ["cid_4", "cid_3"])
+        self.assertEqual(results[-1]["total"], 5)
+        self.assertIsNotNone(results[-1]["cursor"])
+        # The whole candidate window is ranked, not just the first page.
+        self.assertEqual(len(resources["result_cursors"].get(results[-1]["cursor"])), 5)
+        self.assertEqual(resources["vector_index"].search.call_args.kwargs["top_k"], configs.RESULT_CURSOR_MAX_RESULTS)
+
+    async def test_later_pages_skip_the_search(self):
+        resources = self._make_cursor_resources()
+        first = [result async for result in self._make_search_func(resources).search(page=1, per_page=2)]
+
+        for name in ("determine_user_intent", "turn_english_into_sql", "get_single_embedding"):
+            resources[name] = AsyncMock(side_effect=AssertionError(f"{name} should not be called"))
+        resources["get_cached_query_results"].reset_mock()
+
+        search_func = self._make_search_func(resources)
+        results = [result async for result in search_func.search(page=3, per_page=2, cursor=first[-1]["cursor"])]
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual([row["cid"] for row in results[0]["results"]], ["cid_0"])
+        self.assertEqual(results[0]["total"], 5)
+        self.assertEqual(results[0]["cursor"], first[-1]["cursor"])
+        resources["get_cached_query_results"].assert_not_called()
+        # Only the rows on the page are looked up.
+        search_func.get_citation_rows.assert_called_once_with(["cid_0"])
+
+    async def test_lexical_pages_are_sliced_from_the_ranking(self):
+        resources, _ = _make_resources()
+        resources["lexical_search"] = MagicMock(return_value=[("a", 3.0), ("b", 2.0), ("c", 1.0)])
+        resources["get_html_for_these_citations"] = MagicMock(side_effect=lambda cids: {cid: f"<p>{cid}</p>" for cid in cids})
+
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs, mode="lexical")
+        search_func.get_citation_rows = MagicMock(side_effect=lambda cids: [{"cid": cid} for cid in cids])
+        [result async for result in search_func.search(page=1, per_page=2)]
+
+        # Without a token, the ranking is found by the search it belongs to.
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs, mode="lexical")
+        search_func.get_citation_rows = MagicMock(side_effect=lambda cids: [{"cid": cid} for cid in cids])
+        results = [result async for result in search_func.search(page=2, per_page=2)]
+
+        resources["lexical_search"].assert_called_once()
+        self.assertEqual([row["cid"] for row in results[-1]["results"]], ["c"])
+
+
+class TestSearchFunctionSemanticCache(unittest.IsolatedAsyncioTestCase):
+    """Tests for reusing the ranking of a similar earlier search."""
+
+    def _make_search_func(self, search_query: str, resources: dict) -> SearchFunction:
+        search_func = SearchFunction(search_query=search_query, resources=resources, configs=configs)
+        search_func.get_citation_rows = MagicMock(side_effect=lambda cids: [{"cid": cid} for cid in cids])
+        return search_func
+
+    async def test_similar_query_reuses_the_stored_ranking(self):
+        resources, _ = _make_resources()
+        sql_cancelled = asyncio.Event()
+
+        async def _slow_sql(*args, **kwargs):
+            try:
+                await asyncio.sleep(10 * LLM_DELAY)
+            except asyncio.CancelledError:
+                sql_cancelled.set()
+                raise
+        resources["turn_english_into_sql"] = _slow_sql
+        resources["get_html_for_these_citations"] = MagicMock(side_effect=lambda cids: {cid: f"<p>{cid}</p>" for cid in cids})
+        earlier = self._make_search_func("dog leash laws in ohio", resources)
+        resources["result_cursors"].put(earlier.search_query_cid, [("a", 0.9), ("b", 0.8), ("c", 0.7)], total=3)
+        resources["semantic_query_cache"].add(earlier.search_query_cid, earlier.search_query, [[0.1] * 1536])
+
+        search_func = self._make_search_func("ohio dog leash ordinances", resources)
+        start = time.perf_counter()
+        results = [result async for result in search_func.search(page=2, per_page=2)]
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual([row["cid"] for row in results[0]["results"]], ["c"])
+        self.assertEqual(results[0]["total"], 3)
+        # Only the embedding was waited for. SQL generation was cancelled.
+        self.assertLess(time.perf_counter() - start, 2 * LLM_DELAY)
+        self.assertTrue(sql_cancelled.is_set())
+
+        # The next page of the new query finds the same ranking.
+        later = self._make_search_func("ohio dog leash ordinances", resources)
+        self.assertEqual(later.get_result_cursor(results[0]["cursor"]).search_query_cid, earlier.search_query_cid)
+
+    async def test_similar_query_without_a_ranking_is_searched_and_dropped(self):
+        resources, _ = _make_resources()
+        resources["semantic_query_cache"].add("gone", "dog leash laws in ohio", [[0.1] * 1536])
+
+        results = await _collect(resources)
+
+        resources["get_cached_query_results"].assert_any_call(search_query_cid="gone", page=1, per_page=20)
+        self.assertEqual(results[-1]["total"], 0)  # The full search ran.
+        self.assertEqual(len(resources["semantic_query_cache"]), 0)
+
+    async def test_searches_are_added_to_the_cache(self):
+        resources, _ = _make_resources()
+        resources["lexical_search"] = MagicMock(return_value=[("a", 3.0)])
+        vector_index = MagicMock()
+        vector_index.search.return_value = [("a", 0.9)]
+        resources["vector_index"] = vector_index
+        resources["get_html_for_these_citations"] = MagicMock(return_value={"a": "<p>a</p>"})
+
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=configs, mode="hybrid")
+        search_func.get_citation_rows = MagicMock(side_effect=lambda cids: [{"cid": cid} for cid in cids])
+        [result async for result in search_func.search(page=1, per_page=20)]
+
+        entry, _ = resources["semantic_query_cache"].lookup([[0.1] * 1536], mode="hybrid")
+        self.assertEqual(entry.search_query_cid, search_func.search_query_cid)
+
+
+class TestSearchFunctionDeadline(unittest.IsolatedAsyncioTestCase):
+    """Tests for cutting off stages that run over their time budgets."""
+
+    def _make_ranked_resources(self, rows: int = 3) -> dict:
+        resources = TestSearchFunctionTotalCount._make_probe_resources(self, rows=rows)
+        resources["get_html_for_these_citations"] = MagicMock(side_effect=lambda cids: {cid: f"<p>{cid}</p>" for cid in cids})
+        return resources
+
+    async def _search(self, resources: dict, **budgets) -> list[dict]:
+        budget_configs = configs.model_copy(update={"RESULT_CURSOR_MAX_RESULTS": 2, **budgets})
+        search_func = SearchFunction(search_query="zoning laws", resources=resources, configs=budget_configs)
+        return [result async for result in search_func.search(page=1, per_page=2)]
+
+    async def test_complete_search_reports_its_budgets(self):
+        results = await self._search(self._make_ranked_resources(rows=2))
+
+        self.assertFalse(results[-1]["partial"])
+        report = results[-1]["deadline"]
+        self.assertEqual(report["budgets"]["sql"], configs.SQL_BUDGET_SECONDS)
+        self.assertEqual(report["timed_out"], [])
+        self.assertTrue({"intent", "sql", "query", "scoring", "hydration"} <= set(report["elapsed"]))
+
+    async def test_slow_sql_generation_returns_partial_results(self):
+        resources, cancelled = _make_resources()
+        start = time.perf_counter()
+        results = await self._search(resources, SQL_BUDGET_SECONDS=LLM_DELAY / 4)
+
+        self.assertLess(time.perf_counter() - start, 2 * LLM_DELAY)
+        self.assertTrue(results[-1]["partial"])
+        self.assertEqual(results[-1]["results"], [])
+        self.assertEqual(results[-1]["deadline"]["timed_out"], ["sql"])
+        self.assertTrue(cancelled.get("sql"))
+
+    async def test_slow_query_is_interrupted(self):
+        resources = self._make_ranked_resources()
+        cursor = resources["get_database_cursor"].return_value
+        interrupted = threading.Event()
+        cursor.interrupt.side_effect = interrupted.set
+
+        def _execute(sql_query):
+            if interrupted.wait(timeout=5):
+                raise RuntimeError("INTERRUPT Error: Interrupted!")
+        cursor.execute.side_effect = _execute
+
+        start = time.perf_counter()
+        results = await self._search(resources, QUERY_BUDGET_SECONDS=0.05)
+
+        self.assertLess(time.perf_counter() - start, 1.0)
+        cursor.interrupt.assert_called_once()
+        self.assertTrue(results[-1]["partial"])
+        self.assertEqual(results[-1]["deadline"]["timed_out"], ["query"])
+
+    async def test_slow_scoring_ranks_the_candidates_scored_in_time(self):
+        resources = self._make_ranked_resources()
+
+        async def _score_candidates(self, initial_results, batch_size=1000, top_k=None):
+            yield [("cid_1", 0.9)]
+            await asyncio.sleep(1)
+            yield [("cid_0", 0.95)]
+
+        with patch.object(SearchFunction, "score_candidates", _score_candidates):
+            results = await self._search(resources, SCORING_BUDGET_SECONDS=0.05)
+
+        self.assertEqual([row["cid"] for row in results[-1]["results"]], ["cid_1"])
+        self.assertTrue(results[-1]["partial"])
+        self.assertEqual(results[-1]["deadline"]["timed_out"], ["scoring"])
+        # A cut-off ranking isn't kept for later pages.
+        self.assertIsNone(results[-1]["cursor"])
+        self.assertEqual(resources["result_cursors"].stats()["cursors"], 0)
+
+    async def test_slow_count_leaves_the_total_a_lower_bound(self):
+        resources = TestSearchFunctionTotalCount._make_probe_resources(self, rows=3, count_delay=0.5)
+        start = time.perf_counter()
+        results = await self._search(resources, COUNT_BUDGET_SECONDS=0.05)
+
+        self.assertLess(time.perf_counter() - start, 0.45)
+        self.assertTrue(all(result.get("event") != "count_update" for result in results))
+        self.assertFalse(results[-1]["total_is_exact"])
+        self.assertEqual(results[-1]["total_matches"], 3)
+        self.assertEqual(results[-1]["deadline"]["timed_out"], ["count"])
+        # The results themselves are complete.
+        self.assertFalse(results[-1]["partial"])
+
+
+class TestSearchCoalescing(unittest.IsolatedAsyncioTestCase):
+    """Tests for sharing one run between identical searches in flight."""
+
+    async def _run(self, *queries: str, page: int = 1) -> list[list[dict]]:
+        async def _one(q):
+            return [result async for result in search_function(q=q, page=page, per_page=20, logger=self.resources["logger"], llm=MagicMock())]
+        return await asyncio.gather(*(_one(q) for q in queries))
+
+    async def asyncSetUp(self):
+        self.resources, _ = _make_resources()
+        self.resources["determine_user_intent"] = AsyncMock(return_value="SEARCH")
+        self.resources["single_flight"] = SingleFlight()
+        patcher = patch.dict(search_resources, self.resources)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_identical_searches_run_once(self):
+        results = await self._run("Zoning  laws", "zoning laws", "ZONING LAWS")
+
+        self.resources["determine_user_intent"].assert_awaited_once()
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(self.resources["single_flight"].stats()["coalesced"], 2)
+
+    async def test_different_searches_run_separately(self):
+        await self._run("zoning laws", "parking laws")
+        self.assertEqual(self.resources["determine_user_intent"].await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
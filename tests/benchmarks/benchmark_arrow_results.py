@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark reading query results as pandas rows against Arrow columns and NumPy.
+
+The old hot paths ran `fetchdf().to_dict('records')`, which builds a DataFrame and then
+a dict per row, with a Python list of floats for every embedding. This compares it with
+`fetchnumpy()`, and with `fetch_arrow_table()` viewed through `embedding_matrix` and
+`table_rows`, where only the rows of one page become Python objects.
+
+Times are the best of several runs. Python allocations are the peak seen by tracemalloc.
+DuckDB allocates Arrow buffers itself, where tracemalloc can't see them, so the bytes
+the Arrow results hold are reported separately. All are per 1,000 rows.
+
+This is not collected by pytest. Run it with:
+    python tests/benchmarks/benchmark_arrow_results.py --rows 1000 10000
+"""
+import argparse
+from pathlib import Path
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "app"))  # Add the app directory to the path
+
+from utils.database.arrow_results import embedding_matrix, table_rows
+
+
+def _best_of(func: Callable[[], object], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _peak_allocations(func: Callable[[], object]) -> tuple[int, int]:
+    """Peak bytes allocated by Python while func runs, and the bytes held by the Arrow tables it returns."""
+    tracemalloc.start()
+    result = func()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow_bytes = sum(item.nbytes for item in result if isinstance(item, pa.Table))
+    return python_peak, arrow_bytes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--per-page", type=int, default=20, help="Rows turned into dicts on the Arrow path.")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = duckdb.connect()
+    conn.execute(f"""
+        CREATE TABLE embeddings AS
+        SELECT md5(i::VARCHAR) AS cid, 'Title ' || i AS title,
+            list_transform(range({args.dimensions}), d -> random()::FLOAT) AS embedding
+        FROM range({max(args.rows)}) AS r(i)
+    """)
+
+    print(f"{'rows':>6} | {'method':>16} | {'ms / 1k rows':>12} | {'python MB / 1k':>14} | {'arrow MB / 1k':>13}")
+    for n_rows in args.rows:
+        query = f"SELECT cid, title, embedding FROM embeddings LIMIT {n_rows}"
+
+        def _pandas_rows():
+            rows = conn.execute(query).fetchdf().to_dict('records')
+            return rows, np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+
+        def _numpy_columns():
+            columns = conn.execute(query).fetchnumpy()
+            return columns, np.stack(columns["embedding"]).astype(np.float32, copy=False)
+
+        def _arrow_columns():
+            table = conn.execute(query).fetch_arrow_table()
+            page = table_rows(table.select(["cid", "title"]).slice(0, args.per_page))
+            return page, embedding_matrix(table.column("embedding")), table
+
+        methods = {
+            "fetchdf records": _pandas_rows,
+            "fetchnumpy": _numpy_columns,
+            "arrow columns": _arrow_columns,
+        }
+        per_1k = 1_000 / n_rows
+        for name, func in methods.items():
+            seconds = _best_of(func, args.repeats)
+            python_bytes, arrow_bytes = _peak_allocations(func)
+            print(
+                f"{n_rows:>6} | {name:>16} | {seconds * 1000 * per_1k:12.2f} | "
+                f"{python_bytes / 2**20 * per_1k:14.2f} | {arrow_bytes / 2**20 * per_1k:13.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark OR-chained key predicates against bound-list and Arrow-join lookups.
+
+The old search path built `cid = 'a' OR cid = 'b' OR ...` strings. This compares it with
+`cid = ANY(?)` using a bound list, and with `bulk_key_lookup`, which registers the keys
+as an Arrow table and joins against it. Planning time is measured with EXPLAIN, and
+query time is parsing, planning and running the query, with the result fetched as Arrow.
+
+This is not collected by pytest. Run it with:
+    python tests/benchmarks/benchmark_bulk_key_lookup.py --keys 100 1000 10000
+"""
+import argparse
+from pathlib import Path
+import sys
+import time
+from typing import Callable
+
+
+import duckdb
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "app"))  # Add the app directory to the path
+
+from utils.database.bulk_key_lookup import bulk_key_lookup
+
+
+def _best_of(func: Callable[[], object], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows in the synthetic embeddings table.")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = duckdb.connect()
+    conn.execute(f"""
+        CREATE TABLE embeddings AS
+        SELECT md5(i::VARCHAR) AS embedding_cid, md5((i // 4)::VARCHAR) AS cid
+        FROM range({args.rows}) AS r(i)
+    """)
+
+    print(f"{'keys':>6} | {'method':>12} | {'plan (ms)':>10} | {'query (ms)':>10}")
+    for n_keys in args.keys:
+        keys = [row[0] for row in conn.execute(
+            f"SELECT embedding_cid FROM embeddings USING SAMPLE {n_keys} ROWS"
+        ).fetchall()]
+
+        or_chain = " OR ".join(f"embedding_cid = '{key}'" for key in keys)
+        or_query = f"SELECT cid, embedding_cid FROM embeddings WHERE {or_chain}"
+        any_query = "SELECT cid, embedding_cid FROM embeddings WHERE embedding_cid = ANY(?)"
+        join_query = "SELECT cid, embedding_cid FROM _keys JOIN embeddings ON embedding_cid = _keys.key"
+
+        def _explain_join() -> None:
+            conn.register("_keys", pa.table({"key": keys}))
+            conn.execute("EXPLAIN " + join_query)
+            conn.unregister("_keys")
+
+        methods = {
+            "or-chain": (
+                lambda: conn.execute("EXPLAIN " + or_query),
+                lambda: conn.execute(or_query).fetch_arrow_table(),
+            ),
+            "any(?)": (
+                lambda: conn.execute("EXPLAIN " + any_query, [keys]),
+                lambda: conn.execute(any_query, [keys]).fetch_arrow_table(),
+            ),
+            "arrow join": (
+                _explain_join,
+                lambda: bulk_key_lookup(
+                    conn, keys, table="embeddings", key_column="embedding_cid", columns=["cid", "embedding_cid"]
+                ),
+            ),
+        }
+        for name, (plan, query) in methods.items():
+            plan_seconds = _best_of(plan, args.repeats)
+            query_seconds = _best_of(query, args.repeats)
+            print(f"{n_keys:>6} | {name:>12} | {plan_seconds * 1000:10.2f} | {query_seconds * 1000:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark the batch cosine similarity kernel against the per-embedding process pool path.
+
+The old path hands each embedding to `async_run_in_process_pool` as a dict holding a
+Python list of floats, and scores one pair per task with
+`get_embedding_and_calculate_cosine_similarity`. The new path scores an (N, D) matrix
+with one matrix-vector product in `batch_cosine_similarity`.
+
+This is not collected by pytest. Run it with:
+    python tests/benchmarks/benchmark_cosine_similarity.py --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import functools
+from pathlib import Path
+import sys
+import time
+
+
+import numpy as np
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "app"))  # Add the app directory to the path
+
+from utils.app.search.get_embedding_and_calculate_cosine_similarity import (
+    get_embedding_and_calculate_cosine_similarity
+)
+from utils.common.run_in_process_pool import async_run_in_process_pool
+from utils.llm.cosine_similarity import batch_cosine_similarity
+
+
+_DIMENSIONS = 1536
+
+
+async def _process_pool_path(query: list[float], records: list[dict]) -> list[tuple[str, float]]:
+    func = functools.partial(get_embedding_and_calculate_cosine_similarity, query_embedding=query)
+    pull_list = []
+    async for _, result in async_run_in_process_pool(func, records):
+        if result is not None:
+            pull_list.append(result)
+    return sorted(pull_list, key=lambda x: x[1], reverse=True)
+
+
+def _batch_path(query: list[float], cids: list[str], matrix: np.ndarray) -> list[tuple[str, float]]:
+    scores, selected = batch_cosine_similarity(query, matrix)
+    return [(cids[i], float(scores[i])) for i in selected]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument(
+        "--process-pool-max", type=int, default=100_000,
+        help="Skip the process pool path above this many candidates, since it is very slow."
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats for the batch path.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=_DIMENSIONS).tolist()
+
+    # async_run_in_process_pool uses one worker per physical core, minus one.
+    if (psutil.cpu_count(logical=False) or 1) < 2:
+        print("Fewer than 2 physical cores: the process pool path cannot run and will be skipped.")
+        args.process_pool_max = 0
+
+    print(f"{'candidates':>10} | {'process pool (s)':>16} | {'batch (ms)':>10} | {'speedup':>8}")
+    for size in args.sizes:
+        matrix = rng.normal(size=(size, _DIMENSIONS))
+        cids = [f"cid_{i}" for i in range(size)]
+
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            _batch_path(query, cids, matrix)
+            timings.append(time.perf_counter() - start)
+        batch_seconds = min(timings)
+
+        pool_seconds = None
+        if size <= args.process_pool_max:
+            # This is the shape the old path received from fetchdf().to_dict('records').
+            records = [{"cid": cid, "embedding": row} for cid, row in zip(cids, matrix.tolist())]
+            start = time.perf_counter()
+            asyncio.run(_process_pool_path(query, records))
+            pool_seconds = time.perf_counter() - start
+
+        pool_column = f"{pool_seconds:16.3f}" if pool_seconds is not None else f"{'skipped':>16}"
+        speedup = f"{pool_seconds / batch_seconds:7.0f}x" if pool_seconds is not None else f"{'-':>8}"
+        print(f"{size:>10} | {pool_column} | {batch_seconds * 1000:10.2f} | {speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Tests for the Arrow result helpers.
+"""
+import unittest
+
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+
+try:
+    from utils.database.arrow_results import embedding_matrix, fetch_arrow, table_rows
+except ImportError:
+    from app.utils.database.arrow_results import embedding_matrix, fetch_arrow, table_rows
+
+
+class TestEmbeddingMatrix(unittest.TestCase):
+    """Tests for the embedding_matrix function."""
+
+    def setUp(self):
+        self.conn = duckdb.connect()
+        self.conn.execute("""
+            CREATE TABLE embeddings AS
+            SELECT 'cid_' || i AS cid, [i::FLOAT, i + 0.5, i + 0.25]::FLOAT[] AS embedding FROM range(5) AS r(i)
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_list_column_becomes_a_matrix(self):
+        table = fetch_arrow(self.conn, "SELECT cid, embedding FROM embeddings WHERE cid != ? ORDER BY cid", ["cid_0"])
+        matrix = embedding_matrix(table.column("embedding"))
+        self.assertEqual(matrix.shape, (4, 3))
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_array_equal(matrix[0], [1.0, 1.5, 1.25])
+
+    def test_matrix_is_a_view_of_the_arrow_buffer(self):
+        column = pa.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], type=pa.list_(pa.float32())).slice(1)
+        matrix = embedding_matrix(pa.chunked_array([column]))
+        np.testing.assert_array_equal(matrix, [[3.0, 4.0], [5.0, 6.0]])
+        self.assertFalse(matrix.flags.writeable)
+        self.assertFalse(matrix.flags.owndata)
+
+    def test_fixed_size_list_column(self):
+        table = fetch_arrow(self.conn, "SELECT embedding::FLOAT[3] AS embedding FROM embeddings")
+        self.assertEqual(embedding_matrix(table.column("embedding")).shape, (5, 3))
+
+    def test_empty_column(self):
+        table = fetch_arrow(self.conn, "SELECT embedding FROM embeddings WHERE false")
+        self.assertEqual(embedding_matrix(table.column("embedding")).shape, (0, 0))
+
+    def test_uneven_or_missing_embeddings_raise(self):
+        with self.assertRaises(ValueError):
+            embedding_matrix(pa.array([[1.0, 2.0], [3.0]], type=pa.list_(pa.float32())))
+        with self.assertRaises(ValueError):
+            embedding_matrix(pa.array([[1.0, 2.0], None], type=pa.list_(pa.float32())))
+
+
+class TestTableRows(unittest.TestCase):
+    """Tests for the table_rows function."""
+
+    def test_rows_at_indices(self):
+        table = pa.table({"cid": ["a", "b", "c"], "score": [0.1, 0.2, 0.3]})
+        self.assertEqual(table_rows(table, [2, 0]), [{"cid": "c", "score": 0.3}, {"cid": "a", "score": 0.1}])
+        self.assertEqual(len(table_rows(table)), 3)
+        self.assertEqual(table_rows(table, []), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
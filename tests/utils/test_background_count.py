@@ -0,0 +1,74 @@
+"""
+Tests for BackgroundCount and strip_pagination.
+"""
+import asyncio
+import time
+import unittest
+
+
+import duckdb
+
+
+try:
+    from utils.app.search.background_count import BackgroundCount
+    from utils.app.search.estimate_the_total_count_without_pagination import estimate_the_total_count_without_pagination
+    from utils.app.search.strip_pagination import strip_pagination
+except ImportError:
+    from app.utils.app.search.background_count import BackgroundCount
+    from app.utils.app.search.estimate_the_total_count_without_pagination import estimate_the_total_count_without_pagination
+    from app.utils.app.search.strip_pagination import strip_pagination
+
+
+class TestStripPagination(unittest.TestCase):
+
+    def test_strips_limit_and_offset(self):
+        self.assertEqual(
+            strip_pagination("SELECT * FROM citations WHERE title LIKE '%zoning%' LIMIT 21 OFFSET 40;"),
+            "SELECT * FROM citations WHERE title LIKE '%zoning%'"
+        )
+
+    def test_strips_limit_without_offset(self):
+        self.assertEqual(strip_pagination("select cid from citations limit 10"), "select cid from citations")
+
+    def test_leaves_inner_limits_alone(self):
+        sql = "SELECT * FROM (SELECT * FROM citations LIMIT 5) c WHERE c.title LIKE '%a%'"
+        self.assertEqual(strip_pagination(sql + ";"), sql)
+
+
+class TestBackgroundCount(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.conn = duckdb.connect()
+        self.conn.execute("CREATE TABLE citations AS SELECT i AS cid FROM range(1234) AS r(i)")
+
+    async def asyncTearDown(self):
+        self.conn.close()
+
+    async def test_counts_on_its_own_cursor(self):
+        count = BackgroundCount(self.conn, "SELECT * FROM citations", estimate_the_total_count_without_pagination)
+        count.start()
+        self.assertEqual(await count.result(), 1234)
+        self.assertTrue(count.done())
+
+    async def test_cancel_interrupts_the_query(self):
+        slow_query = "SELECT * FROM range(1000000000000) AS a(i) WHERE i % 7 = 3"
+        count = BackgroundCount(self.conn, slow_query, estimate_the_total_count_without_pagination)
+        count.start()
+        await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        await count.cancel()
+        self.assertTrue(count.done())
+        self.assertLess(time.perf_counter() - start, 1)
+
+        # The connection is still usable afterwards.
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM citations").fetchone()[0], 1234)
+
+    async def test_result_before_start_raises(self):
+        count = BackgroundCount(self.conn, "SELECT 1", estimate_the_total_count_without_pagination)
+        with self.assertRaises(RuntimeError):
+            await count.result()
+
+
+if __name__ == "__main__":
+    unittest.main()
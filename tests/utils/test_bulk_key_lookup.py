@@ -0,0 +1,76 @@
+"""
+Tests for bulk_key_lookup.
+"""
+import unittest
+
+
+import duckdb
+
+
+try:
+    from utils.database.bulk_key_lookup import bulk_key_lookup
+except ImportError:
+    from app.utils.database.bulk_key_lookup import bulk_key_lookup
+
+
+class TestBulkKeyLookup(unittest.TestCase):
+    """Tests for the bulk_key_lookup function."""
+
+    def setUp(self):
+        self.conn = duckdb.connect()
+        self.conn.execute("""
+            CREATE TABLE citations AS
+            SELECT 'cid_' || i AS cid, 'Title ' || i AS title FROM range(50) AS r(i)
+        """)
+        self.conn.execute("CREATE TABLE html AS SELECT 'cid_' || i AS cid, '<p>' || i || '</p>' AS html FROM range(50) AS r(i)")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_returns_only_matching_rows(self):
+        table = bulk_key_lookup(
+            self.conn, ["cid_3", "cid_7", "missing"],
+            table="citations", key_column="cid", columns=["cid", "title"]
+        )
+        self.assertEqual(sorted(table.column("cid").to_pylist()), ["cid_3", "cid_7"])
+        self.assertEqual(table.column_names, ["cid", "title"])
+
+    def test_preserve_order_follows_key_order(self):
+        keys = ["cid_9", "cid_1", "cid_40", "cid_2"]
+        table = bulk_key_lookup(
+            self.conn, keys,
+            table="citations c JOIN html h ON c.cid = h.cid", key_column="c.cid",
+            columns=["c.cid", "h.html"], preserve_order=True
+        )
+        self.assertEqual(table.column("cid").to_pylist(), keys)
+        self.assertEqual(table.column("html").to_pylist()[0], "<p>9</p>")
+
+    def test_duplicate_and_padded_keys_match_once(self):
+        table = bulk_key_lookup(
+            self.conn, ["cid_5", " cid_5 ", "cid_5"],
+            table="citations", key_column="cid", columns=["cid"]
+        )
+        self.assertEqual(table.column("cid").to_pylist(), ["cid_5"])
+
+    def test_empty_keys_return_empty_table(self):
+        table = bulk_key_lookup(self.conn, [], table="citations", key_column="cid", columns=["cid", "title"])
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.column_names, ["cid", "title"])
+
+    def test_keys_are_not_interpolated_into_sql(self):
+        """A key that looks like SQL should just fail to match."""
+        table = bulk_key_lookup(
+            self.conn, ["x' OR '1'='1"], table="citations", key_column="cid", columns=["cid"]
+        )
+        self.assertEqual(table.num_rows, 0)
+
+    def test_view_is_unregistered_afterwards(self):
+        bulk_key_lookup(self.conn, ["cid_1"], table="citations", key_column="cid", columns=["cid"])
+        views = self.conn.execute(
+            "SELECT view_name FROM duckdb_views() WHERE view_name LIKE '_bulk_keys_%'"
+        ).fetchall()
+        self.assertEqual(views, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
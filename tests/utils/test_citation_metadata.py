@@ -0,0 +1,66 @@
+"""
+Tests for the in-memory citation metadata.
+"""
+import os
+import tempfile
+import unittest
+
+
+import duckdb
+
+
+try:
+    from utils.app.search.citation_metadata import CITATION_COLUMNS, CitationMetadata
+except ImportError:
+    from app.utils.app.search.citation_metadata import CITATION_COLUMNS, CitationMetadata
+
+
+class TestCitationMetadata(unittest.TestCase):
+    """Tests for the CitationMetadata class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        with duckdb.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE citations AS
+                SELECT 'bb_' || i AS bluebook_cid, 'cid_' || i AS cid, 'Title ' || i AS title,
+                    'Chapter ' || i AS chapter, 'Place ' || i AS place_name, 'State' AS state_name,
+                    'Citation ' || i AS bluebook_citation
+                FROM range(50) AS r(i)
+            """)
+        self.metadata = CitationMetadata()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_load_reads_every_citation(self):
+        self.assertFalse(self.metadata.loaded)
+        self.assertEqual(self.metadata.load(self.db_path), 50)
+        self.assertTrue(self.metadata.loaded)
+        self.assertEqual(len(self.metadata), 50)
+
+    def test_load_without_the_table_returns_zero(self):
+        self.assertEqual(self.metadata.load(os.path.join(self.temp_dir.name, "missing.db")), 0)
+        self.assertFalse(self.metadata.loaded)
+
+    def test_rows_keep_the_order_of_the_cids(self):
+        self.metadata.load(self.db_path)
+        rows = self.metadata.rows(["cid_7", " cid_3 ", "cid_42"])
+        self.assertEqual(rows.column_names, CITATION_COLUMNS)
+        self.assertEqual(rows.column("cid").to_pylist(), ["cid_7", "cid_3", "cid_42"])
+        self.assertEqual(rows.column("title").to_pylist(), ["Title 7", "Title 3", "Title 42"])
+
+    def test_rows_skip_unknown_and_duplicate_cids(self):
+        self.metadata.load(self.db_path)
+        rows = self.metadata.rows(["cid_1", "nope", "cid_1", "cid_2"])
+        self.assertEqual(rows.column("cid").to_pylist(), ["cid_1", "cid_2"])
+        self.assertEqual(self.metadata.rows([]).num_rows, 0)
+
+    def test_rows_before_load_raises(self):
+        with self.assertRaises(RuntimeError):
+            self.metadata.rows(["cid_1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
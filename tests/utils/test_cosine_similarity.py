@@ -0,0 +1,68 @@
+"""
+Tests for the cosine similarity utilities.
+"""
+import unittest
+
+
+import numpy as np
+
+
+try:
+    from utils.llm.cosine_similarity import batch_cosine_similarity, cosine_similarity, top_k_indices
+except ImportError:
+    from app.utils.llm.cosine_similarity import batch_cosine_similarity, cosine_similarity, top_k_indices
+
+
+class TestTopKIndices(unittest.TestCase):
+    """Tests for the top_k_indices function."""
+
+    def setUp(self):
+        self.scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3], dtype=np.float32)
+
+    def test_returns_indices_in_descending_score_order(self):
+        self.assertEqual(top_k_indices(self.scores).tolist(), [1, 3, 2, 4, 0])
+
+    def test_top_k_limits_results(self):
+        self.assertEqual(top_k_indices(self.scores, top_k=2).tolist(), [1, 3])
+
+    def test_threshold_drops_low_scores(self):
+        self.assertEqual(top_k_indices(self.scores, threshold=0.5).tolist(), [1, 3, 2])
+
+    def test_empty_scores(self):
+        self.assertEqual(top_k_indices(np.array([], dtype=np.float32), top_k=3).tolist(), [])
+
+
+class TestBatchCosineSimilarity(unittest.TestCase):
+    """Tests for the batch_cosine_similarity function."""
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.query = rng.normal(size=16)
+        self.matrix = rng.normal(size=(50, 16))
+
+    def test_scores_match_pairwise_cosine_similarity(self):
+        """Batch scores should equal scoring each pair on its own."""
+        scores, _ = batch_cosine_similarity(self.query, self.matrix, threshold=None)
+        expected = [cosine_similarity(self.query.tolist(), row.tolist()) for row in self.matrix]
+        np.testing.assert_allclose(scores, expected, rtol=1e-4, atol=1e-6)
+
+    def test_selection_applies_threshold_and_top_k(self):
+        """Selected rows should pass the threshold, be capped at top_k and be sorted."""
+        scores, selected = batch_cosine_similarity(self.query, self.matrix, top_k=5, threshold=0.0)
+        self.assertLessEqual(len(selected), 5)
+        self.assertTrue(np.all(scores[selected] >= 0.0))
+        self.assertTrue(np.all(np.diff(scores[selected]) <= 0))
+
+    def test_nested_query_is_flattened(self):
+        """The LLM returns embeddings as a list of lists, which should be accepted."""
+        nested, _ = batch_cosine_similarity([self.query.tolist()], self.matrix, threshold=None)
+        flat, _ = batch_cosine_similarity(self.query, self.matrix, threshold=None)
+        np.testing.assert_array_equal(nested, flat)
+
+    def test_mismatched_dimensions_raise(self):
+        with self.assertRaises(ValueError):
+            batch_cosine_similarity(self.query, self.matrix[:, :8])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Tests for Deadline.
+"""
+import asyncio
+import time
+import unittest
+
+
+try:
+    from utils.app.search.deadline import Deadline, StageTimedOut
+except ImportError:
+    from app.utils.app.search.deadline import Deadline, StageTimedOut
+
+
+class TestDeadline(unittest.IsolatedAsyncioTestCase):
+
+    async def test_stage_within_budget_returns_its_result(self):
+        deadline = Deadline({"sql": 1.0}, total_seconds=5.0)
+        self.assertEqual(await deadline.run("sql", asyncio.sleep(0.01, result="SELECT 1")), "SELECT 1")
+        self.assertFalse(deadline.partial)
+        self.assertIn("sql", deadline.report()["elapsed"])
+
+    async def test_stage_over_budget_is_cancelled(self):
+        deadline = Deadline({"sql": 0.05})
+        cancelled = asyncio.Event()
+
+        async def _slow():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        start = time.perf_counter()
+        with self.assertRaises(StageTimedOut) as context:
+            await deadline.run("sql", _slow())
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(context.exception.stage, "sql")
+        self.assertTrue(cancelled.is_set())
+        self.assertTrue(deadline.partial)
+        self.assertEqual(deadline.report()["timed_out"], ["sql"])
+
+    async def test_stage_gets_at_most_the_time_left(self):
+        deadline = Deadline({"scoring": 10.0}, total_seconds=0.1)
+        self.assertLessEqual(deadline.budget_for("scoring"), 0.1)
+        # Stages without a budget only get the time left.
+        self.assertLessEqual(deadline.budget_for("embedding"), 0.1)
+
+        with self.assertRaises(StageTimedOut):
+            async with deadline.stage("scoring"):
+                await asyncio.sleep(1)
+
+    async def test_budget_counts_from_when_the_stage_started(self):
+        deadline = Deadline({"count": 1.0})
+        self.assertLessEqual(deadline.budget_for("count", since=time.monotonic() - 0.75), 0.25)
+        self.assertEqual(deadline.budget_for("count", since=time.monotonic() - 2.0), 0.0)
+
+    async def test_no_budget_means_no_limit(self):
+        deadline = Deadline({"sql": 0}, total_seconds=0)
+        self.assertIsNone(deadline.budget_for("sql"))
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.report()["budgets"], {})
+
+    async def test_timeout_raised_inside_the_stage_passes_through(self):
+        class _PoolTimeout(TimeoutError):
+            pass
+
+        deadline = Deadline({"query": 1.0})
+
+        async def _no_connection():
+            raise _PoolTimeout("No connection was returned to the pool in time.")
+
+        with self.assertRaises(_PoolTimeout):
+            await deadline.run("query", _no_connection())
+        self.assertFalse(deadline.partial)
+        self.assertEqual(deadline.report()["timed_out"], [])
+
+    async def test_slow_count_does_not_make_the_results_partial(self):
+        deadline = Deadline({"count": 0.05})
+
+        with self.assertRaises(StageTimedOut):
+            await deadline.run("count", asyncio.sleep(1))
+        self.assertFalse(deadline.partial)
+        self.assertEqual(deadline.report()["timed_out"], ["count"])
+
+    async def test_outside_cancellation_is_not_a_timeout(self):
+        deadline = Deadline({"sql": 1.0})
+        task = asyncio.create_task(deadline.run("sql", asyncio.sleep(1)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertFalse(deadline.partial)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Tests for the memory-mapped embedding matrix and its export step.
+"""
+import os
+import tempfile
+import unittest
+
+
+import duckdb
+import numpy as np
+
+
+try:
+    from utils.llm.embedding_matrix import EmbeddingMatrix
+    from utils.database.export_embedding_matrix import export_embedding_matrix
+except ImportError:
+    from app.utils.llm.embedding_matrix import EmbeddingMatrix
+    from app.utils.database.export_embedding_matrix import export_embedding_matrix
+
+
+class TestEmbeddingMatrix(unittest.TestCase):
+    """Tests for the EmbeddingMatrix class."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.vectors = rng.normal(size=(6, 8))
+        self.cids = ["b", "a", "c", "a", "b", "a"]
+        self.embedding_cids = ["e0", "e1", "e2", "e3", "e4", "e5"]
+        self.matrix = EmbeddingMatrix.from_arrays(self.vectors, self.cids, self.embedding_cids)
+
+    def test_rows_are_grouped_by_cid(self):
+        """Each cid should own one contiguous range of rows."""
+        self.assertEqual(self.matrix.cids.tolist(), ["a", "b", "c"])
+        self.assertEqual(self.matrix.offsets.tolist(), [0, 3, 5, 6])
+        self.assertEqual(self.matrix.cids_for_rows(np.arange(6)).tolist(), ["a", "a", "a", "b", "b", "c"])
+
+    def test_vectors_are_normalized_float32(self):
+        """Stored vectors should be unit length float32."""
+        self.assertEqual(self.matrix.vectors.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(self.matrix.vectors, axis=1), 1.0, rtol=1e-5)
+
+    def test_rows_for_cids(self):
+        """Rows should cover every chunk of the requested cids, and skip unknown cids."""
+        rows = self.matrix.rows_for_cids(["c", "a", "zzz"])
+        self.assertEqual(rows.tolist(), [0, 1, 2, 5])
+        self.assertEqual(self.matrix.rows_for_cids([]).tolist(), [])
+
+    def test_rows_for_embedding_cids(self):
+        """Embedding cids should map back to the rows holding them."""
+        rows = self.matrix.rows_for_embedding_cids(["e2", "e4", "missing"])
+        self.assertEqual(self.matrix.embedding_cids[rows].tolist(), ["e4", "e2"])
+
+    def test_score_is_cosine_similarity(self):
+        """Scores should equal the cosine similarity with the original vectors."""
+        query = self.vectors[2]
+        row = self.matrix.rows_for_embedding_cids(["e2"])
+        self.assertAlmostEqual(float(self.matrix.score(query, row)[0]), 1.0, places=5)
+
+    def test_save_and_load_memory_maps_vectors(self):
+        """Loaded vectors should be a read-only memory map with the same contents."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.matrix.save(temp_dir)
+            loaded = EmbeddingMatrix.load(temp_dir)
+            self.assertIsInstance(loaded.vectors, np.memmap)
+            self.assertFalse(loaded.vectors.flags.writeable)
+            np.testing.assert_array_equal(loaded.vectors, self.matrix.vectors)
+            self.assertEqual(loaded.offsets.tolist(), self.matrix.offsets.tolist())
+            del loaded
+
+
+class TestExportEmbeddingMatrix(unittest.TestCase):
+    """Tests for exporting the embeddings table to an embedding matrix."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        self.matrix_dir = os.path.join(self.temp_dir.name, "embedding_matrix")
+
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(20, 1536))
+        with duckdb.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE embeddings (
+                    embedding_cid VARCHAR, gnis VARCHAR, cid VARCHAR,
+                    text_chunk_order INTEGER, embedding DOUBLE[1536]
+                )
+            """)
+            # Insert in reverse so the export has to sort them.
+            conn.executemany(
+                "INSERT INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                [
+                    (f"e{i:02d}", "123", f"cid_{i // 4}", i % 4, self.embeddings[i].tolist())
+                    for i in reversed(range(20))
+                ]
+            )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_export_sorts_by_cid_and_chunk_order(self):
+        """Exported rows should be sorted by cid then chunk order, with matching offsets."""
+        matrix = export_embedding_matrix(db_path=self.db_path, matrix_dir=self.matrix_dir, batch_size=6)
+        self.assertEqual(matrix.cids.tolist(), [f"cid_{i}" for i in range(5)])
+        self.assertEqual(matrix.offsets.tolist(), [0, 4, 8, 12, 16, 20])
+        self.assertEqual(matrix.embedding_cids.tolist(), [f"e{i:02d}" for i in range(20)])
+
+        expected = self.embeddings[9] / np.linalg.norm(self.embeddings[9])
+        np.testing.assert_allclose(matrix.vectors[9], expected, rtol=1e-5)
+        del matrix
+
+
+if __name__ == "__main__":
+    unittest.main()
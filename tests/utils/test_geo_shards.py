@@ -0,0 +1,164 @@
+"""
+Tests for the per-state geo shards, their router and their builder.
+"""
+import os
+import tempfile
+import unittest
+
+
+import duckdb
+import numpy as np
+
+
+try:
+    from utils.llm.embedding_matrix import EmbeddingMatrix
+    from utils.llm.geo_shards import GeoShardRouter, Place
+    from utils.database.build_geo_shards import build_geo_shards
+    from utils.database.export_embedding_matrix import export_embedding_matrix
+except ImportError:
+    from app.utils.llm.embedding_matrix import EmbeddingMatrix
+    from app.utils.llm.geo_shards import GeoShardRouter, Place
+    from app.utils.database.build_geo_shards import build_geo_shards
+    from app.utils.database.export_embedding_matrix import export_embedding_matrix
+
+
+PLACES = [
+    Place(gnis="1", place_name="Salem", state_code="OR", state_name="Oregon"),
+    Place(gnis="2", place_name="City of Portland", state_code="OR", state_name="Oregon"),
+    Place(gnis="3", place_name="Charleston", state_code="WV", state_name="West Virginia"),
+    Place(gnis="4", place_name="Grand Rapids", state_code="MI", state_name="Michigan"),
+    Place(gnis="5", place_name="Commerce", state_code="MI", state_name="Michigan"),
+    Place(gnis="6", place_name="Salem", state_code="VA", state_name="Virginia"),
+]
+
+
+class TestGeoShardRouter(unittest.TestCase):
+    """Tests for the GeoShardRouter class."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        dimensions = 16
+        # The laws of each state lean towards their own direction, so the state centroids are far apart.
+        state_axis = {"OR": 0, "WV": 1, "MI": 2, "VA": 3}
+        vectors, row_cids, self.cid_gnis = [], [], {}
+        for place in PLACES:
+            for i in range(20):
+                cid = f"cid_{place.gnis}_{i:02d}"
+                self.cid_gnis[cid] = place.gnis
+                for _ in range(2):  # Two chunks per law.
+                    vector = rng.normal(size=dimensions)
+                    vector[state_axis[place.state_code]] += 6
+                    vectors.append(vector)
+                    row_cids.append(cid)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.matrix = EmbeddingMatrix.from_arrays(self.vectors, row_cids)
+        self.query = rng.normal(size=dimensions).astype(np.float32)
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.router = GeoShardRouter.build(self.matrix, self.cid_gnis, PLACES, self.temp_dir.name, n_lists=2)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_shards_are_split_by_state(self):
+        self.assertEqual(sorted(self.router.shards), ["MI", "OR", "VA", "WV"])
+        self.assertEqual(len(self.router.shards["OR"]), 2 * 20 * 2)
+        self.assertTrue(all(str(cid).startswith(("cid_1_", "cid_2_")) for cid in self.router.shards["OR"].matrix.cids))
+        self.assertEqual(sum(len(shard) for shard in self.router.shards.values()), len(self.matrix))
+
+    def test_find_places(self):
+        self.assertEqual(self.router.find_places("zoning laws in Oregon"), {"OR": None})
+        # A municipality narrows its state down.
+        self.assertEqual(self.router.find_places("dog leash laws in salem, oregon"), {"OR": {"1"}})
+        self.assertEqual(self.router.find_places("noise rules grand rapids"), {"MI": {"4"}})
+        self.assertEqual(self.router.find_places("parking in portland oregon"), {"OR": {"2"}})
+        # Longest name first: West Virginia isn't Virginia.
+        self.assertEqual(self.router.find_places("west virginia fireworks"), {"WV": None})
+        # A single-word place without its state could just be a word.
+        self.assertEqual(self.router.find_places("interstate commerce"), {})
+        self.assertEqual(self.router.find_places("salem"), {})
+
+    def test_named_state_only_searches_its_shard(self):
+        results = self.router.search(self.query, top_k=10, query_text="zoning in west virginia")
+        self.assertTrue(results)
+        self.assertTrue(all(cid.startswith("cid_3_") for cid, _ in results))
+
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_named_municipality_only_searches_its_laws(self):
+        results = self.router.search(self.query, top_k=100, query_text="dog leash laws in salem oregon")
+        self.assertEqual({cid[:6] for cid, _ in results}, {"cid_1_"})
+
+    def test_far_shards_are_skipped(self):
+        self.router.min_centroid_similarity = 0.5
+        query = np.zeros(16, dtype=np.float32)
+        query[2] = 1.0  # Michigan's direction.
+
+        routed = [shard.key for shard, _ in self.router.route(query)]
+        self.assertEqual(routed, ["MI"])
+        results = self.router.search(query, top_k=10)
+        self.assertTrue(all(self.cid_gnis[cid] in {"4", "5"} for cid, _ in results))
+
+    def test_candidate_cids_restrict_results(self):
+        candidates = {"cid_1_03", "cid_3_05", "cid_4_07", "not_a_cid"}
+        results = self.router.search(self.query, top_k=100, candidate_cids=candidates)
+        self.assertEqual({cid for cid, _ in results}, candidates - {"not_a_cid"})
+
+        results = self.router.search(self.query, top_k=100, candidate_cids=candidates, query_text="oregon")
+        self.assertEqual({cid for cid, _ in results}, {"cid_1_03"})
+
+    def test_load_round_trip(self):
+        loaded = GeoShardRouter.load(self.temp_dir.name)
+        self.assertEqual(
+            loaded.search(self.query, top_k=10, query_text="michigan"),
+            self.router.search(self.query, top_k=10, query_text="michigan"),
+        )
+
+
+class TestBuildGeoShards(unittest.TestCase):
+    """Tests for building the geo shards from the DuckDB tables and the exported matrix."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        self.matrix_dir = os.path.join(self.temp_dir.name, "embedding_matrix")
+        self.shards_dir = os.path.join(self.temp_dir.name, "geo_shards")
+
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(20, 1536))
+        gnis = ["1" if i < 12 else "3" for i in range(len(self.embeddings))]
+        with duckdb.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE embeddings (
+                    embedding_cid VARCHAR, gnis VARCHAR, cid VARCHAR,
+                    text_chunk_order INTEGER, embedding DOUBLE[1536]
+                )
+            """)
+            conn.executemany(
+                "INSERT INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                [(f"e{i}", gnis[i], f"cid_{i:02d}", 0, row.tolist()) for i, row in enumerate(self.embeddings)]
+            )
+            conn.execute("CREATE TABLE citations (cid VARCHAR, gnis VARCHAR, place_name TEXT, state_code TEXT, state_name TEXT)")
+            conn.executemany(
+                "INSERT INTO citations VALUES (?, ?, ?, ?, ?)",
+                [(f"cid_{i:02d}", gnis[i], *(("Salem", "OR", "Oregon") if gnis[i] == "1" else ("Charleston", "WV", "West Virginia")))
+                 for i in range(len(self.embeddings))]
+            )
+        export_embedding_matrix(db_path=self.db_path, matrix_dir=self.matrix_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_build_geo_shards_writes_loadable_shards(self):
+        build_geo_shards(db_path=self.db_path, matrix_dir=self.matrix_dir, shards_dir=self.shards_dir, n_lists=2)
+        router = GeoShardRouter.load(self.shards_dir)
+
+        self.assertEqual({key: len(shard) for key, shard in router.shards.items()}, {"OR": 12, "WV": 8})
+        results = router.search(self.embeddings[15], top_k=1, query_text="charleston west virginia")
+        self.assertEqual(results[0][0], "cid_15")
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
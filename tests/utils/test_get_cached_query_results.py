@@ -0,0 +1,103 @@
+"""
+Tests for get_cached_query_results.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+
+import duckdb
+
+
+try:
+    from api_.database.connection_pool import ConnectionPool
+    from utils.app.search.get_cached_query_results import get_cached_query_results
+    from utils.app.search.response_cache import ResponseCache
+    from utils.app.search.search_cache_store import SearchCacheStore
+except ImportError:
+    from app.api_.database.connection_pool import ConnectionPool
+    from app.utils.app.search.get_cached_query_results import get_cached_query_results
+    from app.utils.app.search.response_cache import ResponseCache
+    from app.utils.app.search.search_cache_store import SearchCacheStore
+
+
+class TestGetCachedQueryResults(unittest.TestCase):
+    """Tests for the get_cached_query_results function."""
+
+    def setUp(self):
+        self.conn = duckdb.connect()
+        self.conn.execute("""
+            CREATE TABLE citations AS
+            SELECT 'cid_' || i AS cid, 'bb_' || i AS bluebook_cid, 'Title ' || i AS title, 'Ch. 1' AS chapter,
+                'Place' AS place_name, 'State' AS state_name, 'Citation ' || i AS bluebook_citation
+            FROM range(6) AS r(i)
+        """)
+        # cid_2 has the same HTML as cid_0, so it is dropped from the page they share.
+        self.conn.execute("""
+            CREATE TABLE html AS
+            SELECT 'cid_' || i AS cid, '<p>' || CASE WHEN i = 2 THEN 0 ELSE i END || '</p>' AS html
+            FROM range(6) AS r(i)
+        """)
+        # The cached ranking is in the search cache database, apart from the law data.
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = SearchCacheStore(db_path=os.path.join(self.temp_dir.name, "search_cache.sqlite"), logger=MagicMock())
+        cids = ["cid_5", "cid_1", "cid_0", "cid_2", "cid_3"]
+        self.store.write([("search_query", ("query", "zoning", [0.1] * 1536, 6, cids, [0.9, 0.8, 0.7, 0.6, 0.5], None, "llm"))])
+        self.response_cache = ResponseCache(watch_path=None, logger=MagicMock())
+
+    def tearDown(self):
+        self.conn.close()
+        self.temp_dir.cleanup()
+
+    def _get(self, search_query_cid: str, page: int) -> dict:
+        return get_cached_query_results(
+            search_query_cid, page=page, per_page=2, cursor=self.conn, search_cache_store=self.store,
+            response_cache=self.response_cache
+        )
+
+    def test_pages_are_slices_of_the_cached_ranking(self):
+        first = self._get("query", page=1)
+        self.assertEqual([row["cid"] for row in first["results"]], ["cid_5", "cid_1"])
+        self.assertEqual((first["total"], first["total_pages"]), (5, 3))
+        self.assertEqual(first["results"][0]["html"], "<p>5</p>")
+        self.assertEqual(first["results"][0]["bluebook_citation"], "Citation 5")
+
+        second = self._get("query", page=2)
+        self.assertEqual([row["cid"] for row in second["results"]], ["cid_0"])
+
+        third = self._get("query", page=3)
+        self.assertEqual([row["cid"] for row in third["results"]], ["cid_3"])
+
+    def test_page_past_the_end_is_empty(self):
+        past = self._get("query", page=4)
+        self.assertEqual((past["results"], past["total"]), ([], 5))
+
+    def test_pages_served_before_skip_the_databases(self):
+        first = self._get("query", page=1)
+        self.conn.execute("DELETE FROM citations")
+        self.assertEqual(self._get("query", page=1), first)
+
+        self.response_cache.invalidate("cid_1")
+        self.assertEqual(self._get("query", page=1)["results"], [])
+
+    def test_unknown_query_returns_none(self):
+        self.assertIsNone(self._get("other", page=1))
+
+    def test_without_a_cursor_a_connection_is_checked_out_of_the_pool(self):
+        pool = ConnectionPool(connect=self.conn.cursor, close=lambda conn: conn.close(), size=1)
+        module = sys.modules[get_cached_query_results.__module__]
+        try:
+            with patch.object(module, "get_american_law_db", lambda read_only: pool.acquire()):
+                page = get_cached_query_results(
+                    "query", page=1, per_page=2, search_cache_store=self.store, response_cache=None
+                )
+            self.assertEqual([row["cid"] for row in page["results"]], ["cid_5", "cid_1"])
+            self.assertEqual((pool.stats()["checked_out"], pool.stats()["idle"]), (0, 1))  # Released, not closed.
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests for the lexical (BM25) index, lexical search, and reciprocal-rank fusion.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+
+import duckdb
+
+
+try:
+    from utils.app.search.lexical_search import lexical_search
+    from utils.app.search.reciprocal_rank_fusion import reciprocal_rank_fusion
+    from utils.database.build_lexical_index import build_lexical_index, tokenize
+except ImportError:
+    from app.utils.app.search.lexical_search import lexical_search
+    from app.utils.app.search.reciprocal_rank_fusion import reciprocal_rank_fusion
+    from app.utils.database.build_lexical_index import build_lexical_index, tokenize
+
+
+_LAWS = {
+    "zoning": ("Zoning Ordinance", "Chapter 5 Land Use", "<p>Residential zoning districts and setbacks.</p>"),
+    "dogs": ("Dog Licenses", "Chapter 9 Animals", "<p>Every dog must be licensed &amp; vaccinated.</p>"),
+    "parking": ("Parking", "Chapter 12 Traffic", "<div>No overnight parking in residential areas.</div>"),
+}
+
+
+class TestTokenize(unittest.TestCase):
+
+    def test_lowercases_and_drops_stopwords(self):
+        self.assertEqual(tokenize("The Zoning of Residential-Lots, 2024!"), ["zoning", "residential", "lots", "2024"])
+
+    def test_drops_html_entities_and_single_characters(self):
+        self.assertEqual(tokenize("dogs &amp; cats a b"), ["dogs", "cats"])
+
+
+class TestLexicalSearch(unittest.TestCase):
+    """Tests for build_lexical_index and lexical_search against a small database."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.db_path = Path(cls.temp_dir.name) / "american_law.db"
+        with duckdb.connect(cls.db_path) as conn:
+            conn.execute("CREATE TABLE citations (cid VARCHAR, title VARCHAR, chapter VARCHAR)")
+            conn.execute("CREATE TABLE html (cid VARCHAR, html VARCHAR)")
+            for cid, (title, chapter, html) in _LAWS.items():
+                conn.execute("INSERT INTO citations VALUES (?, ?, ?)", [cid, title, chapter])
+                conn.execute("INSERT INTO html VALUES (?, ?)", [cid, html])
+        build_lexical_index(db_path=cls.db_path)
+        cls.conn = duckdb.connect(cls.db_path, read_only=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        cls.temp_dir.cleanup()
+
+    def test_best_match_ranks_first(self):
+        results = lexical_search(self.conn, "residential zoning")
+        self.assertEqual([cid for cid, _ in results], ["zoning", "parking"])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_titles_and_chapters_are_indexed(self):
+        self.assertEqual([cid for cid, _ in lexical_search(self.conn, "traffic")], ["parking"])
+
+    def test_html_tags_are_not_indexed(self):
+        self.assertEqual(lexical_search(self.conn, "div"), [])
+
+    def test_query_without_indexed_terms_returns_nothing(self):
+        self.assertEqual(lexical_search(self.conn, "the of and"), [])
+        self.assertEqual(lexical_search(self.conn, "unicorns"), [])
+
+    def test_top_k_limits_results(self):
+        self.assertEqual(len(lexical_search(self.conn, "residential", top_k=1)), 1)
+
+    def test_corpus_statistics(self):
+        n_docs, avg_doc_len = self.conn.execute("SELECT n_docs, avg_doc_len FROM lexical_stats").fetchone()
+        self.assertEqual(n_docs, 3)
+        self.assertGreater(avg_doc_len, 0)
+
+
+class TestReciprocalRankFusion(unittest.TestCase):
+
+    def test_documents_ranked_well_in_both_lists_win(self):
+        lexical = [("a", 9.0), ("b", 5.0), ("c", 1.0)]
+        semantic = [("b", 0.9), ("c", 0.8), ("a", 0.1)]
+        fused = reciprocal_rank_fusion(lexical, semantic, k=60)
+        self.assertEqual([cid for cid, _ in fused], ["b", "a", "c"])
+        self.assertAlmostEqual(fused[0][1], 1 / 62 + 1 / 61)
+
+    def test_documents_in_one_list_are_kept(self):
+        fused = reciprocal_rank_fusion([("a", 1.0)], [("b", 1.0)], k=60)
+        self.assertEqual({cid for cid, _ in fused}, {"a", "b"})
+
+    def test_duplicates_count_once_per_ranking(self):
+        fused = dict(reciprocal_rank_fusion([("a", 1.0), ("a", 0.5), ("b", 0.4)], k=0))
+        self.assertEqual(fused, {"a": 1.0, "b": 0.5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Tests for pooling chunk scores into one score per law.
+"""
+import unittest
+
+
+import numpy as np
+
+
+try:
+    from utils.llm.pool_chunk_scores import pool_chunk_scores
+except ImportError:
+    from app.utils.llm.pool_chunk_scores import pool_chunk_scores
+
+
+class TestPoolChunkScores(unittest.TestCase):
+    """Tests for the pool_chunk_scores function."""
+
+    def setUp(self):
+        self.cids = np.array(["a", "a", "a", "b", "c", "c"])
+        self.scores = np.array([0.2, 0.9, 0.5, 0.7, 0.1, 0.3], dtype=np.float32)
+
+    def test_max(self):
+        cids, pooled = pool_chunk_scores(self.cids, self.scores, method="max")
+        self.assertEqual(cids.tolist(), ["a", "b", "c"])
+        np.testing.assert_allclose(pooled, [0.9, 0.7, 0.3], rtol=1e-6)
+
+    def test_mean(self):
+        _, pooled = pool_chunk_scores(self.cids, self.scores, method="mean")
+        np.testing.assert_allclose(pooled, [1.6 / 3, 0.7, 0.2], rtol=1e-6)
+
+    def test_top2_mean(self):
+        """The two best chunks are averaged, and a single-chunk law keeps its score."""
+        _, pooled = pool_chunk_scores(self.cids, self.scores, method="top2_mean")
+        np.testing.assert_allclose(pooled, [0.7, 0.7, 0.2], rtol=1e-6)
+
+    def test_unsorted_cids_are_grouped(self):
+        order = np.array([5, 0, 3, 2, 4, 1])
+        for method in ("max", "mean", "top2_mean"):
+            with self.subTest(method=method):
+                cids, pooled = pool_chunk_scores(self.cids[order], self.scores[order], method=method)
+                expected_cids, expected = pool_chunk_scores(self.cids, self.scores, method=method)
+                self.assertEqual(cids.tolist(), expected_cids.tolist())
+                np.testing.assert_allclose(pooled, expected, rtol=1e-6)
+
+    def test_empty_input(self):
+        cids, pooled = pool_chunk_scores(np.array([], dtype=str), np.array([], dtype=np.float32))
+        self.assertEqual(len(cids), 0)
+        self.assertEqual(len(pooled), 0)
+
+    def test_invalid_arguments_raise(self):
+        with self.assertRaises(ValueError):
+            pool_chunk_scores(self.cids, self.scores, method="median")
+        with self.assertRaises(ValueError):
+            pool_chunk_scores(self.cids, self.scores[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
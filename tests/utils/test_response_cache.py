@@ -0,0 +1,101 @@
+"""
+Tests for the ResponseCache.
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+
+try:
+    from utils.app.search.response_cache import ResponseCache
+except ImportError:
+    from app.utils.app.search.response_cache import ResponseCache
+
+
+def _make_cache(**kwargs) -> ResponseCache:
+    kwargs.setdefault("max_bytes", {"query_page": 100, "law": 100})
+    kwargs.setdefault("watch_path", None)
+    kwargs.setdefault("logger", MagicMock())
+    return ResponseCache(**kwargs)
+
+
+class TestResponseCache(unittest.TestCase):
+    """Tests for the ResponseCache class."""
+
+    def test_hits_return_a_copy_of_the_response(self):
+        cache = _make_cache()
+        self.assertIsNone(cache.get("law", "cid_1"))
+        self.assertTrue(cache.put("law", "cid_1", {"cid": "cid_1", "html": "<p>1</p>"}, tags=["cid_1"]))
+
+        law = cache.get("law", "cid_1")
+        self.assertEqual(law, {"cid": "cid_1", "html": "<p>1</p>"})
+        law["html"] = "changed"
+        self.assertEqual(cache.get("law", "cid_1")["html"], "<p>1</p>")
+
+        stats = cache.stats()["law"]
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (1, 2, 1))
+        self.assertEqual(stats["bytes"], len('{"cid":"cid_1","html":"<p>1</p>"}'))
+
+    def test_least_recently_used_are_evicted_to_stay_under_the_tier_budget(self):
+        cache = _make_cache()
+        for i in range(3):
+            cache.put("law", f"cid_{i}", "x" * 38)  # 40 bytes as JSON.
+        self.assertIsNone(cache.get("law", "cid_0"))
+        self.assertIsNotNone(cache.get("law", "cid_1"))
+        cache.put("law", "cid_3", "x" * 38)
+
+        self.assertIsNone(cache.get("law", "cid_2"))
+        self.assertIsNotNone(cache.get("law", "cid_1"))
+        self.assertEqual(cache.stats()["law"]["evicted"], 2)
+
+    def test_tiers_have_their_own_budget(self):
+        cache = _make_cache()
+        cache.put("query_page", ("query", 1, 20), "x" * 78)
+        cache.put("law", "cid_1", "x" * 78)
+        self.assertIsNotNone(cache.get("query_page", ("query", 1, 20)))
+        self.assertFalse(cache.put("law", "cid_2", "x" * 200))
+        self.assertIsNotNone(cache.get("law", "cid_1"))
+
+    def test_invalidate_drops_every_response_with_the_tag(self):
+        cache = _make_cache()
+        cache.put("query_page", ("query", 1, 2), {"results": ["cid_1", "cid_2"]}, tags=["query", "cid_1", "cid_2"])
+        cache.put("query_page", ("query", 2, 2), {"results": ["cid_3"]}, tags=["query", "cid_3"])
+        cache.put("law", "cid_1", {"cid": "cid_1"}, tags=["cid_1"])
+
+        self.assertEqual(cache.invalidate("cid_1"), 2)
+        self.assertIsNone(cache.get("law", "cid_1"))
+        self.assertIsNone(cache.get("query_page", ("query", 1, 2)))
+        self.assertEqual(cache.invalidate("query"), 1)
+        self.assertEqual(cache.stats()["query_page"]["invalidated"], 2)
+        self.assertEqual(cache.stats()["query_page"]["bytes"], 0)
+
+    def test_get_or_load_only_loads_on_a_miss_and_never_caches_none(self):
+        cache = _make_cache()
+        load = MagicMock(return_value={"cid": "cid_1"})
+        self.assertEqual(cache.get_or_load("law", "cid_1", load), {"cid": "cid_1"})
+        self.assertEqual(cache.get_or_load("law", "cid_1", load), {"cid": "cid_1"})
+        load.assert_called_once_with()
+
+        missing = MagicMock(return_value=None)
+        cache.get_or_load("law", "cid_2", missing)
+        cache.get_or_load("law", "cid_2", missing)
+        self.assertEqual(missing.call_count, 2)
+
+    def test_cache_is_cleared_when_the_watched_database_changes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "american_law.db")
+            with open(db_path, "wb") as f:
+                f.write(b"old")
+            cache = _make_cache(watch_path=db_path, check_seconds=0.0)
+            cache.put("law", "cid_1", {"cid": "cid_1"})
+            self.assertIsNotNone(cache.get("law", "cid_1"))
+
+            with open(db_path, "wb") as f:
+                f.write(b"rebuilt")
+            self.assertIsNone(cache.get("law", "cid_1"))
+            self.assertEqual(cache.stats()["law"]["invalidated"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests for ResultCursorStore.
+"""
+import time
+import unittest
+
+
+try:
+    from utils.app.search.result_cursor_store import ResultCursorStore
+except ImportError:
+    from app.utils.app.search.result_cursor_store import ResultCursorStore
+
+
+def _ranking(n: int, prefix: str = "cid") -> list[tuple[str, float]]:
+    return [(f"{prefix}_{i}", 1.0 - i / n) for i in range(n)]
+
+
+class TestResultCursorStore(unittest.TestCase):
+
+    def test_pages_are_slices_of_the_ranking(self):
+        store = ResultCursorStore()
+        token = store.put("query", _ranking(45), total=45)
+        cursor = store.get(token)
+
+        self.assertEqual(len(cursor), 45)
+        self.assertEqual([cid for cid, _ in cursor.page(1, 20)], [f"cid_{i}" for i in range(20)])
+        self.assertEqual([cid for cid, _ in cursor.page(3, 20)], [f"cid_{i}" for i in range(40, 45)])
+        self.assertEqual(cursor.page(4, 20), [])
+        self.assertAlmostEqual(cursor.page(1, 1)[0][1], 1.0)
+
+    def test_token_must_belong_to_the_search(self):
+        store = ResultCursorStore()
+        token = store.put("query", _ranking(3), total=3)
+        other_token = store.put("other query", _ranking(3, prefix="other"), total=3)
+
+        self.assertEqual(store.get(token, search_query_cid="query").token, token)
+        # A token for another search falls back to this search's own ranking.
+        self.assertEqual(store.get(other_token, search_query_cid="query").token, token)
+        self.assertIsNone(store.get("unknown"))
+
+    def test_lookup_by_search_without_a_token(self):
+        store = ResultCursorStore()
+        store.put("query", _ranking(3), total=3)
+        newer_token = store.put("query", _ranking(4), total=4)
+
+        cursor = store.get(search_query_cid="query")
+        self.assertEqual(cursor.token, newer_token)
+        self.assertEqual(store.stats()["cursors"], 1)
+
+    def test_linked_search_shares_the_cursor(self):
+        store = ResultCursorStore()
+        token = store.put("query", _ranking(3), total=3)
+        store.link("similar query", token)
+
+        self.assertEqual(store.get(token, search_query_cid="similar query").token, token)
+        # Storing the similar search's own ranking doesn't drop the one it was linked to.
+        store.put("similar query", _ranking(2), total=2)
+        self.assertIsNotNone(store.get(token, search_query_cid="query"))
+        self.assertEqual(store.stats()["cursors"], 2)
+
+    def test_cursors_expire(self):
+        store = ResultCursorStore(ttl_seconds=0.05)
+        token = store.put("query", _ranking(3), total=3)
+        time.sleep(0.1)
+
+        self.assertIsNone(store.get(token))
+        self.assertEqual(store.stats()["bytes"], 0)
+
+    def test_least_recently_used_is_evicted_over_budget(self):
+        probe = ResultCursorStore()
+        probe.put("probe", _ranking(100), total=100)
+        nbytes = probe.stats()["bytes"]
+
+        store = ResultCursorStore(max_bytes=2 * nbytes)
+        first = store.put("first", _ranking(100), total=100)
+        second = store.put("second", _ranking(100), total=100)
+        store.get(first)  # "second" is now the least recently used.
+        third = store.put("third", _ranking(100), total=100)
+
+        self.assertIsNotNone(store.get(first))
+        self.assertIsNone(store.get(second))
+        self.assertIsNotNone(store.get(third))
+        self.assertLessEqual(store.stats()["bytes"], 2 * nbytes)
+        self.assertEqual(store.stats()["evicted"], 1)
+
+    def test_ranking_over_budget_is_not_stored(self):
+        store = ResultCursorStore(max_bytes=10)
+        self.assertIsNone(store.put("query", _ranking(100), total=100))
+        self.assertEqual(store.stats()["cursors"], 0)
+
+    def test_exact_total_replaces_lower_bound(self):
+        store = ResultCursorStore()
+        token = store.put("query", _ranking(3), total=4, total_is_exact=False)
+        store.set_total(token, 57)
+
+        cursor = store.get(token)
+        self.assertEqual(cursor.total, 57)
+        self.assertTrue(cursor.total_is_exact)
+
+
+if __name__ == "__main__":
+    unittest.main()
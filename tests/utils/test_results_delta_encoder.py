@@ -0,0 +1,88 @@
+"""
+Tests for ResultsDeltaEncoder.
+"""
+import json
+import unittest
+
+
+try:
+    from utils.app.search.results_delta_encoder import ResultsDeltaEncoder
+except ImportError:
+    from app.utils.app.search.results_delta_encoder import ResultsDeltaEncoder
+
+
+def _response(cids: list[str], page: int = 1, per_page: int = 20, total: int = None, **kwargs) -> dict:
+    return {
+        "results": [{"cid": cid, "html": f"<p>{cid}</p>" * 100} for cid in cids],
+        "total": len(cids) if total is None else total,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": 1,
+        **kwargs,
+    }
+
+
+class TestResultsDeltaEncoder(unittest.TestCase):
+
+    def test_first_response_adds_everything(self):
+        delta = ResultsDeltaEncoder().encode(_response(["a", "b"]))
+        self.assertEqual(delta["event"], "results_delta")
+        self.assertEqual(delta["version"], 2)
+        self.assertEqual([(item["rank"], item["result"]["cid"]) for item in delta["added"]], [(1, "a"), (2, "b")])
+        self.assertEqual(delta["moved"], [])
+        self.assertEqual(delta["removed"], [])
+
+    def test_only_new_results_are_resent(self):
+        encoder = ResultsDeltaEncoder()
+        encoder.encode(_response(["a", "b"]))
+        delta = encoder.encode(_response(["a", "b", "c"]))
+        self.assertEqual([item["result"]["cid"] for item in delta["added"]], ["c"])
+        self.assertEqual(delta["moved"], [])
+
+    def test_reranked_and_removed_results_are_sent_by_cid(self):
+        encoder = ResultsDeltaEncoder()
+        encoder.encode(_response(["a", "b", "c"]))
+        delta = encoder.encode(_response(["c", "a", "d"]))
+
+        self.assertEqual([item["result"]["cid"] for item in delta["added"]], ["d"])
+        self.assertEqual(delta["moved"], [{"cid": "c", "rank": 1}, {"cid": "a", "rank": 2}])
+        self.assertEqual(delta["removed"], ["b"])
+
+    def test_unchanged_response_is_skipped(self):
+        encoder = ResultsDeltaEncoder()
+        encoder.encode(_response(["a"]))
+        self.assertIsNone(encoder.encode(_response(["a"])))
+        # A new total is still sent, without any results.
+        delta = encoder.encode(_response(["a"], total=57))
+        self.assertEqual((delta["added"], delta["total"]), ([], 57))
+
+    def test_ranks_are_across_pages(self):
+        delta = ResultsDeltaEncoder().encode(_response(["a"], page=3, per_page=20, cursor="token"))
+        self.assertEqual(delta["added"][0]["rank"], 41)
+        self.assertEqual(delta["cursor"], "token")
+
+    def test_snapshot_has_the_final_order(self):
+        encoder = ResultsDeltaEncoder()
+        self.assertIsNone(encoder.snapshot())
+        encoder.encode(_response(["a", "b"]))
+        encoder.encode(_response(["b", "a"], total_is_exact=False))
+
+        snapshot = encoder.snapshot()
+        self.assertEqual(snapshot["event"], "results_snapshot")
+        self.assertEqual(snapshot["cids"], ["b", "a"])
+        self.assertFalse(snapshot["total_is_exact"])
+
+    def test_bytes_grow_linearly(self):
+        encoder = ResultsDeltaEncoder()
+        cids: list[str] = []
+        delta_bytes = cumulative_bytes = 0
+        for i in range(10):
+            cids.append(f"cid_{i}")
+            response = _response(cids)
+            delta_bytes += len(json.dumps(encoder.encode(response)))
+            cumulative_bytes += len(json.dumps(response))
+        self.assertLess(delta_bytes, cumulative_bytes / 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,248 @@
+"""
+Tests for the SearchCacheStore and its background writer.
+"""
+import asyncio
+from contextlib import closing
+from datetime import datetime
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+
+import duckdb
+
+
+try:
+    from utils.app.search.search_cache_store import SCHEMA_VERSION, SearchCacheStore
+    from utils.database.migrate_search_cache import migrate_search_cache
+except ImportError:
+    from app.utils.app.search.search_cache_store import SCHEMA_VERSION, SearchCacheStore
+    from app.utils.database.migrate_search_cache import migrate_search_cache
+
+
+# The search_query table of the law database, with the ranking as a comma-separated string.
+_LEGACY_SEARCH_QUERY = """
+    CREATE TABLE search_query (
+        search_query_cid VARCHAR PRIMARY KEY,
+        search_query TEXT NOT NULL,
+        embedding DOUBLE[1536] NOT NULL,
+        total_results INTEGER NOT NULL,
+        cids_for_top_100 TEXT NOT NULL,
+    )
+"""
+
+# The search_query table of the DuckDB search cache, with the ranking as lists.
+_DUCKDB_SEARCH_QUERY = """
+    CREATE TABLE search_query (
+        search_query_cid VARCHAR PRIMARY KEY,
+        search_query TEXT NOT NULL,
+        embedding DOUBLE[1536] NOT NULL,
+        total_results INTEGER NOT NULL,
+        cids VARCHAR[] NOT NULL,
+        scores FLOAT[] NOT NULL,
+        saved_at TIMESTAMP,
+    )
+"""
+
+
+def _history_row(i: int, client_id: str = "client") -> tuple:
+    return (f"history_{i}", f"query_{i}", f"query {i}", client_id, "2025-01-01T00:00:00", i)
+
+
+class TestSearchCacheStore(unittest.IsolatedAsyncioTestCase):
+    """Tests for the SearchCacheStore class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "search_cache.sqlite")
+        self.store = SearchCacheStore(db_path=self.db_path, batch_size=3, flush_seconds=0.05, logger=MagicMock())
+
+    async def asyncTearDown(self):
+        await self.store.shutdown()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _count(self, table: str) -> int:
+        return self.store.read(lambda cursor: cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+
+    async def test_queued_rows_are_written_in_batches(self):
+        self.store.start()
+        for i in range(7):
+            self.store.submit("search_history", _history_row(i))
+        await asyncio.sleep(0.3)
+
+        self.assertEqual(self._count("search_history"), 7)
+        stats = self.store.stats()
+        self.assertEqual((stats["submitted"], stats["written"], stats["queued"]), (7, 7, 0))
+        self.assertEqual(stats["batches"], 3)
+
+    async def test_rows_can_be_submitted_from_other_threads(self):
+        self.store.start()
+        threads = [threading.Thread(target=self.store.submit, args=("search_history", _history_row(i))) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        await self.store.shutdown()
+        self.assertEqual(self._count("search_history"), 4)
+
+    async def test_shutdown_writes_the_rows_still_queued(self):
+        self.store = SearchCacheStore(db_path=self.db_path, batch_size=100, flush_seconds=60, logger=MagicMock())
+        self.store.start()
+        self.store.submit("search_history", _history_row(1))
+        await self.store.shutdown()
+        self.assertEqual(self._count("search_history"), 1)
+        self.assertFalse(self.store.started)
+
+    async def test_the_last_row_for_a_key_wins(self):
+        self.store.start()
+        embedding = [0.1] * 1536
+        saved_at = datetime(2025, 1, 1, 12, 30)
+        self.store.submit("search_query", ("query", "zoning", embedding, 10, ["cid_1", "cid_2"], [0.9, 0.8], None, "llm"))
+        self.store.submit("search_query", ("query", "zoning", embedding, 3, ["cid_3"], [0.7], None, "llm"))
+        await self.store.shutdown()
+        self.store.start()
+        self.store.submit("search_query", ("query", "zoning", embedding, 1, ["cid_4", "cid_5"], [0.5, 0.25], saved_at, "llm"))
+        await self.store.shutdown()
+
+        rows = self.store.read(lambda cursor: cursor.execute(
+            "SELECT total_results, n_ranked, saved_at FROM search_query"
+        ).fetchall())
+        self.assertEqual(rows, [(1, 2, saved_at.isoformat())])
+        ranks = self.store.read(lambda cursor: cursor.execute(
+            "SELECT rank, cid, score FROM search_query_rank ORDER BY rank"
+        ).fetchall())
+        self.assertEqual(ranks, [(1, "cid_4", 0.5), (2, "cid_5", 0.25)])
+
+    async def test_rows_are_dropped_when_the_writer_is_not_running_or_full(self):
+        self.store.submit("search_history", _history_row(1))
+        self.assertEqual(self.store.stats()["dropped"], 1)
+
+        self.store = SearchCacheStore(db_path=self.db_path, max_queue=1, flush_seconds=60, logger=MagicMock())
+        self.store.start()
+        for i in range(3):
+            self.store.submit("search_history", _history_row(i))
+        self.assertGreaterEqual(self.store.stats()["dropped"], 1)
+
+    async def test_invalid_rows_raise(self):
+        self.store.start()
+        with self.assertRaises(ValueError):
+            self.store.submit("citations", ("cid",))
+        with self.assertRaises(ValueError):
+            self.store.submit("search_history", ("too", "short"))
+
+    async def test_other_processes_can_write_while_the_connection_is_open(self):
+        """Every server worker keeps its connection open, and writes to the same file."""
+        self.store.start()
+        self.store.submit("search_history", _history_row(1))
+        await asyncio.sleep(0.2)
+        script = (
+            "import sqlite3, sys\n"
+            "conn = sqlite3.connect(sys.argv[1], timeout=5, isolation_level=None)\n"
+            "conn.execute(\"INSERT INTO search_history VALUES ('h2', 'q', 'query', 'other', '2025-01-01', 1)\")\n"
+            "print(conn.execute('SELECT COUNT(*) FROM search_history').fetchone()[0])\n"
+        )
+        other = await asyncio.to_thread(
+            subprocess.run, [sys.executable, "-c", script, self.db_path], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(other.stdout.strip(), "2")
+        self.store.submit("search_history", _history_row(3))
+        await self.store.shutdown()
+        self.assertEqual(self._count("search_history"), 3)
+
+    async def test_tables_are_created_once_per_process(self):
+        self.assertEqual(self.store.read(lambda cursor: cursor.execute("PRAGMA user_version").fetchone()[0]), SCHEMA_VERSION)
+        with patch.object(SearchCacheStore, "_create_tables") as create_tables:
+            await asyncio.to_thread(self._count, "search_history")  # A new thread opens its own connection.
+            SearchCacheStore(db_path=self.db_path, logger=MagicMock()).read(lambda cursor: None)
+        # Only the new store's first connection checks the schema.
+        create_tables.assert_called_once()
+
+    def test_older_files_are_migrated(self):
+        old_path = os.path.join(self.temp_dir.name, "version_1.sqlite")
+        with closing(sqlite3.connect(old_path)) as conn:
+            conn.execute(
+                "CREATE TABLE search_query (search_query_cid TEXT PRIMARY KEY, search_query TEXT NOT NULL, "
+                "embedding BLOB NOT NULL, total_results INTEGER NOT NULL, n_ranked INTEGER NOT NULL, saved_at TEXT)"
+            )
+            conn.execute("INSERT INTO search_query VALUES ('old', 'zoning', x'00', 1, 1, NULL)")
+            conn.execute("PRAGMA user_version = 1")
+            conn.commit()
+
+        store = SearchCacheStore(db_path=old_path, logger=MagicMock())
+        store.write([("search_query", ("new", "parking", [0.1] * 1536, 1, ["cid_1"], [0.9], None, "hybrid"))])
+        self.assertEqual(
+            store.read(lambda cursor: cursor.execute("SELECT search_query_cid, mode FROM search_query ORDER BY 1").fetchall()),
+            [("new", "hybrid"), ("old", None)]
+        )
+        self.assertEqual(store.read(lambda cursor: cursor.execute("PRAGMA user_version").fetchone()[0]), SCHEMA_VERSION)
+
+
+class TestMigrateSearchCache(unittest.TestCase):
+    """Tests for copying the searches saved in DuckDB by older versions."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "search_cache.sqlite")
+        self.legacy_db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        with duckdb.connect(self.legacy_db_path) as conn:
+            conn.execute(_LEGACY_SEARCH_QUERY)
+            conn.execute("INSERT INTO search_query VALUES ('query', 'zoning', ?, 4, 'cid_2,cid_1,cid_2,cid_3')", [[0.1] * 1536])
+            conn.execute(
+                "CREATE TABLE search_history AS "
+                "SELECT 'history_1' AS search_history_cid, 'query' AS search_query_cid, 'zoning' AS search_query, "
+                "'client' AS client_id, TIMESTAMP '2025-01-01' AS timestamp, 4 AS result_count"
+            )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _ranks(self, store: SearchCacheStore) -> list[tuple]:
+        return store.read(lambda cursor: cursor.execute(
+            "SELECT rank, cid, score FROM search_query_rank ORDER BY rank"
+        ).fetchall())
+
+    def test_duckdb_search_cache_is_copied(self):
+        duckdb_cache_path = os.path.join(self.temp_dir.name, "search_cache.db")
+        saved_at = datetime(2025, 1, 1, 12, 30)
+        with duckdb.connect(duckdb_cache_path) as conn:
+            conn.execute(_DUCKDB_SEARCH_QUERY)
+            conn.execute(
+                "INSERT INTO search_query VALUES ('query', 'zoning', ?, 4, ['cid_2', 'cid_1'], [0.5, 0.25], ?)",
+                [[0.1] * 1536, saved_at]
+            )
+        self.assertEqual(migrate_search_cache(duckdb_cache_path, self.db_path), {"search_query": 1, "search_history": 0})
+
+        store = SearchCacheStore(db_path=self.db_path, logger=MagicMock())
+        self.assertEqual(self._ranks(store), [(1, "cid_2", 0.5), (2, "cid_1", 0.25)])
+        self.assertEqual(
+            store.read(lambda cursor: cursor.execute("SELECT n_ranked, saved_at, mode FROM search_query").fetchall()),
+            [(2, saved_at.isoformat(), "llm")]
+        )
+
+    def test_migration_copies_legacy_rows_without_replacing_newer_ones(self):
+        store = SearchCacheStore(db_path=self.db_path, logger=MagicMock())
+        self.assertEqual(
+            migrate_search_cache(self.legacy_db_path, self.db_path), {"search_query": 1, "search_history": 1}
+        )
+        self.assertEqual(self._ranks(store), [(1, "cid_2", None), (2, "cid_1", None), (3, "cid_3", None)])
+        self.assertEqual(
+            store.read(lambda cursor: cursor.execute("SELECT timestamp FROM search_history").fetchall()),
+            [("2025-01-01T00:00:00",)]
+        )
+
+        store.write([("search_query", ("query", "zoning", [0.1] * 1536, 4, ["cid_4"], [0.5], None, "llm"))])
+        self.assertEqual(
+            migrate_search_cache(self.legacy_db_path, self.db_path), {"search_query": 0, "search_history": 0}
+        )
+        self.assertEqual(self._ranks(store), [(1, "cid_4", 0.5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests for SemanticQueryCache.
+"""
+from datetime import datetime, timedelta
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+
+import numpy as np
+
+
+try:
+    from utils.app.search.search_cache_store import SearchCacheStore
+    from utils.app.search.semantic_query_cache import SemanticQueryCache
+except ImportError:
+    from app.utils.app.search.search_cache_store import SearchCacheStore
+    from app.utils.app.search.semantic_query_cache import SemanticQueryCache
+
+
+DIM = 8
+
+
+def _embedding(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+
+
+def _nearby(embedding: np.ndarray, noise: float = 0.05) -> np.ndarray:
+    return embedding + noise * np.random.default_rng(99).standard_normal(DIM).astype(np.float32)
+
+
+class TestSemanticQueryCache(unittest.TestCase):
+
+    def test_similar_query_matches(self):
+        cache = SemanticQueryCache(threshold=0.9)
+        cache.add("dogs", "dog leash laws in ohio", _embedding(1))
+        cache.add("parking", "overnight parking", _embedding(2))
+
+        entry, similarity = cache.lookup(_nearby(_embedding(1)))
+        self.assertEqual(entry.search_query_cid, "dogs")
+        self.assertGreaterEqual(similarity, 0.9)
+
+    def test_dissimilar_query_misses(self):
+        cache = SemanticQueryCache(threshold=0.9)
+        cache.add("dogs", "dog leash laws in ohio", _embedding(1))
+        self.assertIsNone(cache.lookup(_embedding(3)))
+        self.assertEqual(cache.stats()["lookups"], 1)
+        self.assertEqual(cache.stats()["hits"], 0)
+
+    def test_nested_embeddings_are_flattened(self):
+        cache = SemanticQueryCache(threshold=0.9)
+        cache.add("dogs", "dog leash laws in ohio", [_embedding(1).tolist()])
+        self.assertIsNotNone(cache.lookup([_embedding(1).tolist()]))
+
+    def test_only_the_same_mode_matches(self):
+        cache = SemanticQueryCache(threshold=0.9)
+        cache.add("dogs", "dog leash laws in ohio", _embedding(1), mode="hybrid")
+        self.assertIsNone(cache.lookup(_embedding(1), mode="llm"))
+        self.assertIsNotNone(cache.lookup(_embedding(1), mode="hybrid"))
+
+    def test_hits_are_counted(self):
+        cache = SemanticQueryCache(threshold=0.9)
+        cache.add("dogs", "dog leash laws in ohio", _embedding(1))
+        cache.add("parking", "overnight parking", _embedding(2))
+        for _ in range(3):
+            cache.lookup(_embedding(1))
+
+        entries = cache.entries()
+        self.assertEqual(entries[0]["search_query_cid"], "dogs")
+        self.assertEqual(entries[0]["hits"], 3)
+        self.assertIsNotNone(entries[0]["last_hit_at"])
+        self.assertAlmostEqual(cache.stats()["hit_rate"], 1.0)
+
+    def test_entries_expire(self):
+        cache = SemanticQueryCache(threshold=0.9, ttl_seconds=0.05)
+        cache.add("dogs", "dog leash laws in ohio", _embedding(1))
+        time.sleep(0.1)
+        self.assertIsNone(cache.lookup(_embedding(1)))
+        self.assertEqual(cache.entries(), [])
+
+    def test_least_recently_used_is_evicted_when_full(self):
+        cache = SemanticQueryCache(threshold=0.9, max_entries=2)
+        cache.add("a", "a", _embedding(1))
+        cache.add("b", "b", _embedding(2))
+        cache.lookup(_embedding(1))  # "b" is now the least recently used.
+        cache.add("c", "c", _embedding(3))
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.lookup(_embedding(1)))
+        self.assertIsNone(cache.lookup(_embedding(2)))
+        self.assertIsNotNone(cache.lookup(_embedding(3)))
+
+    def test_discard(self):
+        cache = SemanticQueryCache(threshold=0.9)
+        cache.add("dogs", "dog leash laws in ohio", _embedding(1))
+        cache.discard("dogs")
+        self.assertIsNone(cache.lookup(_embedding(1)))
+        self.assertEqual(len(cache), 0)
+
+    def test_wrong_dimension_raises(self):
+        cache = SemanticQueryCache()
+        cache.add("dogs", "dog leash laws in ohio", _embedding(1))
+        with self.assertRaises(ValueError):
+            cache.add("short", "short", [1.0, 2.0])
+
+    def test_load_from_search_query_table(self):
+        saved_at = datetime.now() - timedelta(seconds=30)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = SearchCacheStore(db_path=Path(temp_dir) / "search_cache.sqlite", logger=MagicMock())
+            store.write([
+                ("search_query", ("dogs", "dog leash laws in ohio", _embedding(1), 1, ["cid_1"], [0.9], saved_at, "llm")),
+                ("search_query", ("fences", "fence heights", _embedding(2), 1, ["cid_2"], [0.9], saved_at, "hybrid")),
+                # Too old, with no saved_at, and with no mode.
+                ("search_query", ("old", "old", _embedding(3), 1, ["cid_3"], [0.9], saved_at - timedelta(hours=2), "llm")),
+                ("search_query", ("undated", "undated", _embedding(4), 1, ["cid_4"], [0.9], None, "llm")),
+                ("search_query", ("no_mode", "no mode", _embedding(5), 1, ["cid_5"], [0.9], saved_at, None)),
+            ])
+
+            cache = SemanticQueryCache(threshold=0.9, ttl_seconds=3600)
+            self.assertEqual(cache.load(store), 2)
+            entry, _ = cache.lookup(_embedding(1), mode="llm")
+            self.assertEqual(entry.search_query, "dog leash laws in ohio")
+            self.assertAlmostEqual(entry.expires_at, saved_at.timestamp() + 3600, places=3)
+            # A hybrid ranking only matches hybrid searches.
+            self.assertIsNone(cache.lookup(_embedding(2), mode="llm"))
+            self.assertEqual(cache.lookup(_embedding(2), mode="hybrid")[0].search_query_cid, "fences")
+
+            empty = SearchCacheStore(db_path=Path(temp_dir) / "empty.sqlite", logger=MagicMock())
+            self.assertEqual(SemanticQueryCache().load(empty), 0)
+
+if __name__ == "__main__":
+    unittest.main()
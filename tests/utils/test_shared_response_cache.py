@@ -0,0 +1,167 @@
+"""
+Tests for the SharedResponseCache and the ResponseCache tier in front of it.
+"""
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+
+try:
+    from utils.app.search.response_cache import ResponseCache
+    from utils.app.search.shared_response_cache import SharedResponseCache
+except ImportError:
+    from app.utils.app.search.response_cache import ResponseCache
+    from app.utils.app.search.shared_response_cache import SharedResponseCache
+
+
+def _put_in_child(db_path: str) -> None:
+    SharedResponseCache(db_path=db_path, logger=MagicMock()).put("law", "cid_2", b'{"cid":"cid_2"}', ("cid_2",))
+
+
+class TestSharedResponseCache(unittest.TestCase):
+    """Tests for the SharedResponseCache class."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "response_cache.sqlite")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _make_cache(self, **kwargs) -> SharedResponseCache:
+        kwargs.setdefault("max_bytes", 100)
+        return SharedResponseCache(db_path=self.db_path, logger=MagicMock(), **kwargs)
+
+    def test_responses_are_read_with_their_tags(self):
+        cache = self._make_cache()
+        self.assertIsNone(cache.get("law", "cid_1"))
+        self.assertTrue(cache.put("law", "cid_1", b"first", ("cid_1",)))
+        self.assertTrue(cache.put("law", "cid_1", b"second", ("cid_1", "query")))
+
+        self.assertEqual(cache.get("law", "cid_1"), (b"second", ("cid_1", "query")))
+        self.assertIsNone(cache.get("query_page", "cid_1"))
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["bytes"], stats["hits"], stats["misses"]), (1, 6, 1, 2))
+
+    def test_least_recently_used_are_evicted_to_under_the_cap(self):
+        cache = self._make_cache(touch_seconds=0.0)
+        for i in range(3):
+            cache.put("law", f"cid_{i}", b"x" * 30)
+        cache.get("law", "cid_0")
+        cache.put("law", "cid_3", b"x" * 30)
+
+        self.assertIsNone(cache.get("law", "cid_1"))
+        self.assertIsNotNone(cache.get("law", "cid_0"))
+        self.assertEqual(cache.stats()["bytes"], 90)
+        self.assertFalse(cache.put("law", "cid_4", b"x" * 101))
+
+    def test_invalidate_drops_the_tagged_responses_and_their_tags(self):
+        cache = self._make_cache()
+        cache.put("query_page", '["query",1,2]', b"page", ("query", "cid_1"))
+        cache.put("law", "cid_1", b"law", ("cid_1",))
+        cache.put("law", "cid_2", b"law", ("cid_2",))
+
+        self.assertEqual(cache.invalidate("cid_1"), 2)
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.invalidate("query"), 0)
+
+    def test_clear_with_a_source_only_clears_when_it_changes(self):
+        cache = self._make_cache()
+        cache.put("law", "cid_1", b"law")
+        self.assertTrue(cache.clear(source="v1"))
+        cache.put("law", "cid_1", b"law")
+        self.assertFalse(cache.clear(source="v1"))
+        self.assertIsNotNone(cache.get("law", "cid_1"))
+        self.assertTrue(cache.clear(source="v2"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_invalidations_are_logged_for_the_other_workers(self):
+        cache = self._make_cache()
+        start, _ = cache.invalidations()
+        cache.invalidate("cid_1", "cid_2")
+        cache.invalidate("cid_3")
+        self.assertEqual(cache.invalidations(after=start), (start + 3, frozenset({"cid_1", "cid_2", "cid_3"})))
+        self.assertEqual(cache.invalidations(after=start + 3), (start + 3, frozenset()))
+
+        cache.clear()
+        self.assertEqual(cache.invalidations(after=start + 3), (start + 4, None))
+
+    def test_a_worker_behind_the_trimmed_log_drops_everything(self):
+        cache = self._make_cache()
+        cache.INVALIDATION_LOG_SIZE = 2
+        start, _ = cache.invalidations()
+        cache.invalidate("cid_1", "cid_2", "cid_3")
+        self.assertEqual(cache.invalidations(after=start), (start + 3, None))
+        self.assertEqual(cache.invalidations(after=start + 1), (start + 3, frozenset({"cid_2", "cid_3"})))
+
+    def test_other_processes_share_the_file(self):
+        cache = self._make_cache()
+        cache.put("law", "cid_1", b'{"cid":"cid_1"}')  # Opens a connection before forking.
+        child = multiprocessing.get_context("fork").Process(target=_put_in_child, args=(self.db_path,))
+        child.start()
+        child.join(10)
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(cache.get("law", "cid_2"), (b'{"cid":"cid_2"}', ("cid_2",)))
+
+
+class TestResponseCacheWithSharedTier(unittest.TestCase):
+    """Tests for ResponseCaches in several workers, in front of one SharedResponseCache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        with open(self.db_path, "wb") as f:
+            f.write(b"v1")
+        self.workers = [self._make_worker() for _ in range(2)]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _make_worker(self) -> ResponseCache:
+        shared = SharedResponseCache(db_path=os.path.join(self.temp_dir.name, "response_cache.sqlite"), logger=MagicMock())
+        return ResponseCache(
+            max_bytes={"query_page": 1000, "law": 1000}, watch_path=self.db_path, check_seconds=0.0,
+            shared=shared, logger=MagicMock()
+        )
+
+    def test_a_response_served_by_one_worker_is_found_by_the_others(self):
+        first, second = self.workers
+        first.put("query_page", ("query", 1, 20), {"results": [{"cid": "cid_1"}]}, tags=["query", "cid_1"])
+
+        self.assertEqual(second.get("query_page", ("query", 1, 20)), {"results": [{"cid": "cid_1"}]})
+        self.assertEqual(second.stats()["query_page"]["entries"], 1)  # Now in its memory too.
+        self.assertEqual(second.stats()["shared"]["hits"], 1)
+
+        second.invalidate("cid_1")
+        self.assertIsNone(self._make_worker().get("query_page", ("query", 1, 20)))
+
+    def test_an_invalidation_in_one_worker_reaches_the_others_memory(self):
+        first, second = self.workers
+        first.put("law", "cid_1", {"cid": "cid_1"}, tags=["cid_1"])
+        first.put("law", "cid_2", {"cid": "cid_2"}, tags=["cid_2"])
+        self.assertEqual(second.get("law", "cid_1"), {"cid": "cid_1"})
+
+        second.invalidate("cid_1")
+        self.assertIsNone(first.get("law", "cid_1"))
+        self.assertEqual(first.stats()["law"]["invalidated"], 1)
+        self.assertEqual(first.get("law", "cid_2"), {"cid": "cid_2"})
+
+        second.clear()
+        self.assertIsNone(first.get("law", "cid_2"))
+        self.assertEqual(first.stats()["law"]["entries"], 0)
+
+    def test_a_rebuilt_database_clears_the_shared_cache(self):
+        first, second = self.workers
+        first.put("law", "cid_1", {"cid": "cid_1"}, tags=["cid_1"])
+        with open(self.db_path, "wb") as f:
+            f.write(b"rebuilt")
+
+        self.assertIsNone(second.get("law", "cid_1"))
+        second.put("law", "cid_1", {"cid": "cid_1", "title": "new"}, tags=["cid_1"])
+        self.assertEqual(first.get("law", "cid_1"), {"cid": "cid_1", "title": "new"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Tests for SingleFlight.
+"""
+import asyncio
+import unittest
+
+
+try:
+    from utils.common.single_flight import SingleFlight
+except ImportError:
+    from app.utils.common.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    def _make_factory(self, items: list, delay: float = 0.01, error: Exception = None):
+        calls = {"started": 0, "cancelled": False}
+
+        async def _stream():
+            calls["started"] += 1
+            try:
+                for item in items:
+                    await asyncio.sleep(delay)
+                    yield item
+                if error is not None:
+                    raise error
+            except asyncio.CancelledError:
+                calls["cancelled"] = True
+                raise
+        return _stream, calls
+
+    async def _consume(self, flights: SingleFlight, key, factory) -> list:
+        return [item async for item in flights.stream(key, factory)]
+
+    async def test_identical_streams_share_one_run(self):
+        flights = SingleFlight()
+        factory, calls = self._make_factory([1, 2, 3])
+
+        results = await asyncio.gather(*(self._consume(flights, "zoning", factory) for _ in range(20)))
+
+        self.assertEqual(calls["started"], 1)
+        self.assertTrue(all(result == [1, 2, 3] for result in results))
+        self.assertEqual(flights.stats(), {"in_flight": 0, "started": 1, "coalesced": 19})
+
+    async def test_different_keys_run_separately(self):
+        flights = SingleFlight()
+        factory, calls = self._make_factory([1])
+        await asyncio.gather(self._consume(flights, ("zoning", 1), factory), self._consume(flights, ("zoning", 2), factory))
+        self.assertEqual(calls["started"], 2)
+
+    async def test_late_subscriber_gets_every_item(self):
+        flights = SingleFlight()
+        factory, calls = self._make_factory([1, 2, 3], delay=0.05)
+
+        first = asyncio.create_task(self._consume(flights, "zoning", factory))
+        await asyncio.sleep(0.07)  # The first item has been sent.
+        late = await self._consume(flights, "zoning", factory)
+
+        self.assertEqual(late, [1, 2, 3])
+        self.assertEqual(await first, [1, 2, 3])
+        self.assertEqual(calls["started"], 1)
+
+    async def test_errors_reach_every_subscriber(self):
+        flights = SingleFlight()
+        factory, _ = self._make_factory([1], error=ValueError("rejected"))
+
+        results = await asyncio.gather(
+            self._consume(flights, "zoning", factory), self._consume(flights, "zoning", factory),
+            return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_first_subscriber_leaving_doesnt_stop_the_others(self):
+        flights = SingleFlight()
+        factory, calls = self._make_factory([1, 2, 3])
+
+        first = flights.stream("zoning", factory)
+        self.assertEqual(await anext(first), 1)
+        second = asyncio.create_task(self._consume(flights, "zoning", factory))
+        await asyncio.sleep(0)
+        await first.aclose()
+
+        self.assertEqual(await second, [1, 2, 3])
+        self.assertFalse(calls["cancelled"])
+
+    async def test_last_subscriber_leaving_cancels_the_run(self):
+        flights = SingleFlight()
+        factory, calls = self._make_factory([1, 2, 3], delay=0.05)
+
+        stream = flights.stream("zoning", factory)
+        await anext(stream)
+        await stream.aclose()
+        self.assertFalse(flights.in_flight("zoning"))
+        await asyncio.sleep(0.01)
+
+        self.assertTrue(calls["cancelled"])
+        # The next request starts over.
+        self.assertEqual(await self._consume(flights, "zoning", factory), [1, 2, 3])
+        self.assertEqual(calls["started"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Tests for the StageScheduler used by SearchFunction.search.
+"""
+import asyncio
+import time
+import unittest
+
+
+try:
+    from utils.app.search.stage_scheduler import StageScheduler
+except ImportError:
+    from app.utils.app.search.stage_scheduler import StageScheduler
+
+
+class TestStageScheduler(unittest.IsolatedAsyncioTestCase):
+    """Tests for the StageScheduler class."""
+
+    async def test_independent_stages_run_concurrently(self):
+        """Three 0.1 second stages should take about 0.1 seconds in total, not 0.3."""
+        async def stage():
+            await asyncio.sleep(0.1)
+            return True
+
+        start = time.perf_counter()
+        async with StageScheduler() as stages:
+            for name in ("a", "b", "c"):
+                stages.add(name, stage)
+            stages.start()
+            results = [await stages.result(name) for name in ("a", "b", "c")]
+        self.assertEqual(results, [True, True, True])
+        self.assertLess(time.perf_counter() - start, 0.25)
+
+    async def test_dependencies_receive_results(self):
+        """A stage should start after its dependencies and get their results as kwargs."""
+        async def make_sql():
+            return "SELECT 1"
+
+        async def count(sql):
+            return f"COUNT({sql})"
+
+        async with StageScheduler() as stages:
+            stages.add("sql", make_sql)
+            stages.add("count", count, depends_on=["sql"])
+            stages.start()
+            self.assertEqual(await stages.result("count"), "COUNT(SELECT 1)")
+
+    async def test_failure_cancels_listed_stages(self):
+        """A failing stage should cancel the stages it lists, which then re-raise its error."""
+        cancelled = []
+
+        async def reject():
+            await asyncio.sleep(0.01)
+            raise PermissionError("rejected")
+
+        async def slow(name):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+
+        async with StageScheduler() as stages:
+            stages.add("intent", reject, cancels_on_failure=["sql"])
+            stages.add("sql", lambda: slow("sql"))
+            stages.add("other", lambda: slow("other"))
+            stages.start()
+            with self.assertRaises(PermissionError):
+                await stages.result("sql")
+            self.assertFalse(stages.done("other"))
+        self.assertEqual(sorted(cancelled), ["other", "sql"])  # "other" is cancelled on exit.
+
+    async def test_exit_cancels_unfinished_stages(self):
+        """Leaving the context early should cancel stages nobody waited for."""
+        async def slow():
+            await asyncio.sleep(5)
+
+        start = time.perf_counter()
+        async with StageScheduler() as stages:
+            stages.add("slow", slow)
+            stages.start()
+        self.assertTrue(stages.done("slow"))
+        self.assertLess(time.perf_counter() - start, 1)
+
+    async def test_unknown_dependency_raises(self):
+        scheduler = StageScheduler()
+        with self.assertRaises(ValueError):
+            scheduler.add("count", asyncio.sleep, depends_on=["sql"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Tests for turn_english_into_sql's pagination.
+"""
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+
+try:
+    from utils.app.search.llm_sql_output import LLMSqlOutput
+    from utils.app.search.turn_english_into_sql import turn_english_into_sql
+except ImportError:
+    from app.utils.app.search.llm_sql_output import LLMSqlOutput
+    from app.utils.app.search.turn_english_into_sql import turn_english_into_sql
+
+
+def _llm_returning(sql_query: str) -> MagicMock:
+    llm = MagicMock()
+    llm.query_to_sql = AsyncMock(return_value={"sql_query": sql_query})
+    return llm
+
+
+class TestTurnEnglishIntoSql(unittest.IsolatedAsyncioTestCase):
+    """Tests for the LIMIT and OFFSET turn_english_into_sql puts on the LLM's SQL."""
+
+    async def test_the_llms_limit_is_replaced_with_the_probe(self):
+        llm = _llm_returning("SELECT * FROM citations WHERE title LIKE '%zoning%' ORDER BY year DESC LIMIT 10;")
+        sql_query = await turn_english_into_sql("zoning laws", per_page=1001, llm=llm)
+        self.assertEqual(
+            sql_query, "SELECT * FROM citations WHERE title LIKE '%zoning%' ORDER BY year DESC LIMIT 1001 OFFSET 0"
+        )
+
+    async def test_the_llms_limit_and_offset_are_replaced(self):
+        llm = _llm_returning("select cid from citations limit 10 offset 20")
+        sql_query = await turn_english_into_sql("zoning laws", per_page=21, offset=0, llm=llm)
+        self.assertEqual(sql_query, "select cid from citations LIMIT 21 OFFSET 0")
+
+    async def test_the_probe_is_kept_after_parsing(self):
+        """LLMSqlOutput strips the LLM's LIMIT, which shouldn't take the probe with it."""
+        llm = _llm_returning("```sql\nSELECT * FROM citations WHERE state_code = 'OR' LIMIT 10\n```")
+        sql_query = await turn_english_into_sql("zoning laws", per_page=1001, llm=llm, parser=LLMSqlOutput)
+        self.assertEqual(sql_query, "SELECT * FROM citations WHERE state_code = 'OR' LIMIT 1001 OFFSET 0")
+
+    async def test_sql_without_a_limit_gets_one(self):
+        llm = _llm_returning("SELECT * FROM citations;")
+        sql_query = await turn_english_into_sql("zoning laws", per_page=21, offset=40, llm=llm)
+        self.assertEqual(sql_query, "SELECT * FROM citations LIMIT 21 OFFSET 40")
+
+
+if __name__ == "__main__":
+    unittest.main()
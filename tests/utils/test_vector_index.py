@@ -0,0 +1,168 @@
+"""
+Tests for the IVF-flat vector index and its builder.
+"""
+import os
+import tempfile
+import unittest
+
+
+import duckdb
+import numpy as np
+
+
+try:
+    from utils.llm.embedding_matrix import EmbeddingMatrix
+    from utils.llm.vector_index import IvfFlatIndex
+    from utils.database.build_vector_index import build_vector_index
+except ImportError:
+    from app.utils.llm.embedding_matrix import EmbeddingMatrix
+    from app.utils.llm.vector_index import IvfFlatIndex
+    from app.utils.database.build_vector_index import build_vector_index
+
+
+def _brute_force(vectors: np.ndarray, cids: list[str], query: np.ndarray, top_k: int) -> list[tuple[str, float]]:
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normed @ (query / np.linalg.norm(query))
+    order = np.argsort(scores)[::-1][:top_k]
+    return [(cids[i], float(scores[i])) for i in order]
+
+
+class TestIvfFlatIndex(unittest.TestCase):
+    """Tests for the IvfFlatIndex class."""
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.vectors = rng.normal(size=(2000, 32)).astype(np.float32)
+        self.cids = [f"cid_{i // 2}" for i in range(len(self.vectors))]  # Two chunks per cid.
+        self.query = rng.normal(size=32).astype(np.float32)
+        self.matrix = EmbeddingMatrix.from_arrays(self.vectors, self.cids)
+        self.index = IvfFlatIndex.build(self.matrix, n_lists=16, n_probe=4)
+
+    def test_exhaustive_probe_matches_brute_force(self):
+        """Probing every list should give exactly the brute force results."""
+        expected = _brute_force(self.vectors, self.cids, self.query, top_k=10)
+        results = self.index.search(self.query, top_k=10, n_probe=self.index.n_lists)
+        self.assertEqual([cid for cid, _ in results], [cid for cid, _ in expected])
+        for (_, score), (_, expected_score) in zip(results, expected):
+            self.assertAlmostEqual(score, expected_score, places=5)
+
+    def test_results_are_sorted_and_limited(self):
+        """Results should be sorted by descending score and capped at top_k."""
+        results = self.index.search(self.query, top_k=25)
+        self.assertLessEqual(len(results), 25)
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_candidate_cids_restrict_results(self):
+        """Only embeddings belonging to candidate cids should be returned."""
+        candidates = {"cid_3", "cid_10", "cid_500", "not_a_cid"}
+        results = self.index.search(self.query, top_k=100, candidate_cids=candidates)
+        self.assertEqual({cid for cid, _ in results}, candidates - {"not_a_cid"})
+        self.assertEqual(len(results), 6)
+
+    def test_pooling_gives_one_score_per_cid(self):
+        """With pooling, each cid should appear once, with the score of its best chunk for max pooling."""
+        candidates = {"cid_3", "cid_10", "cid_500"}
+        results = self.index.search(self.query, top_k=100, candidate_cids=candidates, pooling="max")
+        self.assertEqual(sorted(cid for cid, _ in results), sorted(candidates))
+
+        unpooled = self.index.search(self.query, top_k=100, candidate_cids=candidates)
+        best = {}
+        for cid, score in unpooled:
+            best[cid] = max(score, best.get(cid, -1.0))
+        for cid, score in results:
+            self.assertAlmostEqual(score, best[cid], places=6)
+
+    def test_n_probe_limits_the_candidate_rows_scanned(self):
+        """For a candidate set larger than top_k, only candidates in the probed lists should be scanned."""
+        rows = self.matrix.rows_for_cids(f"cid_{i}" for i in range(0, 1000, 2))  # 500 laws, 1000 rows.
+        scanned = [
+            len(self.index.probe_candidates(self.query, rows, top_k=20, n_probe=n_probe, per_law=True))
+            for n_probe in (2, 8, self.index.n_lists)
+        ]
+        self.assertLess(scanned[0], scanned[1])
+        self.assertLess(scanned[1], scanned[2])
+        self.assertEqual(scanned[2], len(rows))
+
+        # Laws are kept with all of their chunks.
+        kept = self.index.probe_candidates(self.query, rows, top_k=20, n_probe=2, per_law=True)
+        kept_cids, counts = np.unique(self.matrix.cids_for_rows(kept), return_counts=True)
+        self.assertTrue(np.all(counts == 2))
+        self.assertGreaterEqual(len(kept_cids), 20)
+
+    def test_probe_widens_until_the_candidates_can_fill_top_k(self):
+        """A probe that holds too few candidates should scan more lists, and a small candidate set all of them."""
+        rows = self.matrix.rows_for_cids(f"cid_{i}" for i in range(0, 1000, 2))
+        kept = self.index.probe_candidates(self.query, rows, top_k=400, n_probe=1, per_law=True)
+        self.assertGreaterEqual(len(np.unique(self.matrix.cids_for_rows(kept))), 400)
+
+        few = self.matrix.rows_for_cids(["cid_3", "cid_10", "cid_500"])
+        self.assertEqual(self.index.probe_candidates(self.query, few, top_k=20, n_probe=1).tolist(), few.tolist())
+
+    def test_nested_query_embedding_is_flattened(self):
+        """The LLM returns embeddings as a list of lists, which should be accepted."""
+        nested = [self.query.tolist()]
+        self.assertEqual(self.index.search(nested, top_k=5), self.index.search(self.query, top_k=5))
+
+    def test_threshold_filters_low_scores(self):
+        """Results below the threshold should be dropped."""
+        results = self.index.search(self.query, top_k=100, threshold=0.2, n_probe=self.index.n_lists)
+        self.assertTrue(all(score >= 0.2 for _, score in results))
+
+    def test_save_and_load_round_trip(self):
+        """A saved index should load back and give the same results."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "index.npz")
+            self.index.save(path)
+            loaded = IvfFlatIndex.load(path, matrix=self.matrix, n_probe=4)
+        self.assertEqual(loaded.search(self.query, top_k=10), self.index.search(self.query, top_k=10))
+
+    def test_load_rejects_mismatched_matrix(self):
+        """An index built over a different matrix should not load."""
+        other = EmbeddingMatrix.from_arrays(self.vectors[:100], self.cids[:100])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "index.npz")
+            self.index.save(path)
+            with self.assertRaises(ValueError):
+                IvfFlatIndex.load(path, matrix=other)
+
+
+class TestBuildVectorIndex(unittest.TestCase):
+    """Tests for building the vector index from a DuckDB embeddings table."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "american_law.db")
+        self.matrix_dir = os.path.join(self.temp_dir.name, "embedding_matrix")
+        self.index_path = os.path.join(self.temp_dir.name, "american_law.ivf.npz")
+
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(50, 1536))
+        with duckdb.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE embeddings (
+                    embedding_cid VARCHAR, gnis VARCHAR, cid VARCHAR,
+                    text_chunk_order INTEGER, embedding DOUBLE[1536]
+                )
+            """)
+            conn.executemany(
+                "INSERT INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                [(f"e{i}", "123", f"cid_{i:02d}", 0, row.tolist()) for i, row in enumerate(self.embeddings)]
+            )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_build_vector_index_writes_loadable_index(self):
+        """The built index should find an embedding's own cid first."""
+        build_vector_index(
+            db_path=self.db_path, matrix_dir=self.matrix_dir, index_path=self.index_path, n_lists=4
+        )
+        index = IvfFlatIndex.load(self.index_path, matrix=EmbeddingMatrix.load(self.matrix_dir))
+        results = index.search(self.embeddings[12], top_k=1, n_probe=index.n_lists)
+        self.assertEqual(results[0][0], "cid_12")
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Tests for the application-scoped WorkerPool.
+"""
+import functools
+import sys
+import unittest
+from unittest.mock import patch
+
+
+import numpy as np
+
+
+try:
+    from utils.common.worker_pool import SharedArray, WorkerPool
+    from utils.common.run_in_process_pool import run_in_process_pool
+except ImportError:
+    from app.utils.common.worker_pool import SharedArray, WorkerPool
+    from app.utils.common.run_in_process_pool import run_in_process_pool
+
+
+def _square(x: int) -> int:
+    return x * x
+
+
+def _fail_on_three(x: int) -> int:
+    if x == 3:
+        raise ValueError("three")
+    return x
+
+
+def _row_sum(row: int, matrix: SharedArray) -> float:
+    with matrix.attach() as array:
+        return float(array[row].sum())
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Tests for the WorkerPool class."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = WorkerPool(max_workers=2)
+        cls.pool.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_ordered_map_keeps_input_order(self):
+        results = list(self.pool.map(_square, range(20), chunksize=3))
+        self.assertEqual(results, [(x, x * x) for x in range(20)])
+
+    def test_unordered_map_returns_every_result(self):
+        results = list(self.pool.map(_square, range(20), chunksize=4, ordered=False))
+        self.assertEqual(sorted(results), [(x, x * x) for x in range(20)])
+
+    def test_worker_errors_propagate(self):
+        with self.assertRaises(ValueError):
+            list(self.pool.map(_fail_on_three, range(5)))
+
+    def test_shared_array_is_read_in_workers(self):
+        matrix = np.arange(12, dtype=np.float32).reshape(4, 3)
+        with self.pool.share(matrix) as shared:
+            results = dict(self.pool.map(functools.partial(_row_sum, matrix=shared), range(4)))
+        self.assertEqual(results, {row: float(matrix[row].sum()) for row in range(4)})
+
+    def test_stats_count_completed_inputs(self):
+        before = self.pool.stats()["completed"]
+        list(self.pool.map(_square, range(10), chunksize=5))
+        stats = self.pool.stats()
+        self.assertEqual(stats["completed"] - before, 10)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertGreaterEqual(stats["utilisation"], 0.0)
+
+    def test_run_in_process_pool_reuses_started_pool(self):
+        """run_in_process_pool should use WORKER_POOL instead of making its own executor."""
+        module = sys.modules[run_in_process_pool.__module__]
+        original = module.WORKER_POOL
+        module.WORKER_POOL = self.pool
+        try:
+            before = self.pool.stats()["submitted"]
+            with patch.object(module.gc, "collect") as collect:
+                results = sorted(run_in_process_pool(_square, list(range(6))))
+            self.assertEqual(self.pool.stats()["submitted"] - before, 6)
+            collect.assert_not_called()  # Nothing per call to clean up.
+        finally:
+            module.WORKER_POOL = original
+        self.assertEqual(results, [(x, x * x) for x in range(6)])
+
+
+class TestWorkerPoolAsync(unittest.IsolatedAsyncioTestCase):
+    """Tests for WorkerPool.amap."""
+
+    async def test_amap_yields_all_results(self):
+        pool = WorkerPool(max_workers=2)
+        pool.start()
+        try:
+            results = [item async for item in pool.amap(_square, range(10), chunksize=2)]
+        finally:
+            pool.shutdown()
+        self.assertEqual(results, [(x, x * x) for x in range(10)])
+
+    async def test_unstarted_pool_raises(self):
+        pool = WorkerPool(max_workers=1)
+        with self.assertRaises(RuntimeError):
+            [item async for item in pool.amap(_square, range(3))]
+
+
+if __name__ == "__main__":
+    unittest.main()